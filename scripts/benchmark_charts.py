@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк построения графиков свечей
+
+Генерирует минутные свечи за несколько лет и сравнивает построение фигуры
+Plotly по всем свечам с прореженной под ширину графика (charts.candle_figure):
+время построения и сериализации (ее выполняет Streamlit при каждой отрисовке)
+и объем данных, уходящих в браузер.
+
+Использование:
+    python -m scripts.benchmark_charts [--years 3] [--width 1000]
+"""
+
+import time
+
+import click
+import numpy as np
+import plotly.graph_objects as go
+
+from src.app.interfaces.charts import FigureCache, candle_figure
+from src.app.models import Bars
+
+
+def synthetic_bars(count: int) -> Bars:
+    """Случайное блуждание цены с шагом в минуту"""
+    rng = np.random.default_rng(0)
+    timestamp = (np.datetime64("2022-01-03T07:00:00") + np.arange(count).astype("timedelta64[m]")).astype(
+        "datetime64[s]"
+    )
+    close = 250 + np.cumsum(rng.normal(0, 0.05, count))
+    spread = np.abs(rng.normal(0, 0.05, count))
+    return Bars("SBER@MISX", timestamp, close - rng.normal(0, 0.02, count), close + spread, close - spread, close,
+                rng.integers(1, 1000, count).astype(np.float64))  # fmt: skip
+
+
+def measure(build) -> tuple[float, int]:
+    t0 = time.perf_counter()
+    size = len(build().to_json())
+    return time.perf_counter() - t0, size
+
+
+@click.command()
+@click.option("--years", type=float, default=3.0, help="Период минутных свечей, лет (торговые дни по 14 часов)")
+@click.option("--width", type=int, default=1000, help="Ширина графика, пиксели")
+@click.option("--raw-limit", type=int, default=200_000, help="Сколько свечей строить без прореживания для сравнения")
+def main(years: float, width: int, raw_limit: int) -> None:
+    """Замерить построение графика свечей с прореживанием и без"""
+    count = int(years * 252 * 14 * 60)
+    bars = synthetic_bars(count)
+    click.echo(f"📦 {count} минутных свечей, ширина графика {width} px\n")
+    click.echo(f"{'Вариант':<34} {'свечей':>9} {'время, с':>9} {'JSON, КБ':>10}")
+    click.echo("-" * 66)
+
+    raw = min(count, raw_limit)
+    elapsed, size = measure(lambda: go.Figure(go.Candlestick(
+        x=bars.timestamp[:raw], open=bars.open[:raw], high=bars.high[:raw], low=bars.low[:raw], close=bars.close[:raw]
+    )))  # fmt: skip
+    click.echo(f"{'все свечи':<34} {raw:>9} {elapsed:>9.3f} {size / 1024:>10.0f}")
+
+    elapsed, size = measure(lambda: candle_figure(bars, width))
+    click.echo(f"{'прореживание (min-max + LTTB)':<34} {count:>9} {elapsed:>9.3f} {size / 1024:>10.0f}")
+
+    cache = FigureCache()
+    cache.get(("SBER@MISX", "TIME_FRAME_M1", "", ""), lambda: candle_figure(bars, width))
+    elapsed, size = measure(lambda: cache.get(("SBER@MISX", "TIME_FRAME_M1", "", ""), lambda: None))
+    click.echo(f"{'из кэша фигур':<34} {count:>9} {elapsed:>9.3f} {size / 1024:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
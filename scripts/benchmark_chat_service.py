@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный тест сервиса чата (chat_service) на симуляторе Finam TradeAPI
+
+Поднимает в процессе симулятор Finam API и сервис чата с имитацией потоковой
+LLM (запрос котировки, затем итоговый ответ), открывает заданное число сессий
+и параллельно задает в каждой несколько вопросов через HTTP API. Выводит
+перцентили времени до первого фрагмента ответа и полного ответа.
+
+Использование:
+    python -m scripts.benchmark_chat_service [--sessions 300] [--questions 3] [--llm-ms 200]
+"""
+
+import asyncio
+import json
+import random
+import threading
+import time
+from collections.abc import Callable, Iterator
+
+import click
+import httpx
+import numpy as np
+import uvicorn
+
+from src.app.adapters.finam_simulator import ASSETS, FinamSimulator, SimulatorConfig
+from src.app.interfaces.chat_service import ChatService, create_app
+
+SYMBOLS = [f"{a[0]}@{a[1]}" for a in ASSETS]
+CHUNKS = 8
+API_KEY = "benchmark-key"
+
+
+def make_fake_llm(base_url: str, llm_ms: float) -> Callable[..., Iterator[str]]:
+    """Потоковая LLM: на вопрос - запрос котировки, на результаты API - итоговый ответ"""
+
+    def stream(messages: list[dict[str, str]], **_kwargs) -> Iterator[str]:
+        if messages[-1]["content"].startswith("Результат API"):
+            answer = {"message": "Котировка получена, цена в пределах дневного диапазона.", "requests": None, "last": 1}
+        else:
+            url = f"{base_url}/v1/instruments/{random.choice(SYMBOLS)}/quotes/latest"
+            answer = {"message": "Запрашиваю котировку", "requests": [{"method": "GET", "url": url}], "last": 0}
+        text = json.dumps(answer, ensure_ascii=False)
+        size = len(text) // CHUNKS + 1
+        for i in range(0, len(text), size):
+            time.sleep(llm_ms / 1000 / CHUNKS)
+            yield text[i : i + size]
+
+    return stream
+
+
+def start_server(service: ChatService, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(create_app(service), host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+async def run_session(port: int, finam_url: str, questions: int) -> list[tuple[float, float]]:
+    """Сессия из нескольких вопросов: (время до первого фрагмента, время ответа)"""
+    # Отдельный клиент на сессию: общий пул httpx на сотни соединений сам становится узким местом
+    headers = {"Authorization": f"Bearer {API_KEY}"}
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=300, headers=headers) as http:
+        return await ask_questions(http, finam_url, questions)
+
+
+async def ask_questions(http: httpx.AsyncClient, finam_url: str, questions: int) -> list[tuple[float, float]]:
+    response = await http.post("/v1/chat/sessions", json={"token": "benchmark-secret", "base_url": finam_url})
+    session_id = response.json()["session_id"]
+    timings = []
+    for _ in range(questions):
+        started = time.perf_counter()
+        first = None
+        async with http.stream(
+            "POST", f"/v1/chat/sessions/{session_id}/messages", json={"text": "Какая цена Сбербанка?"}
+        ) as stream:
+            async for line in stream.aiter_lines():
+                if first is None:
+                    first = time.perf_counter() - started
+                event = json.loads(line)
+                if event["type"] == "error":
+                    raise RuntimeError(event["error"])
+        timings.append((first or 0.0, time.perf_counter() - started))
+    return timings
+
+
+async def run_load(port: int, finam_url: str, sessions: int, questions: int) -> list[tuple[float, float]]:
+    results = await asyncio.gather(*(run_session(port, finam_url, questions) for _ in range(sessions)))
+    return [t for session in results for t in session]
+
+
+@click.command()
+@click.option("--sessions", type=int, default=300, help="Количество одновременных сессий")
+@click.option("--questions", type=int, default=3, help="Вопросов в каждой сессии")
+@click.option("--llm-ms", type=float, default=200.0, help="Время генерации одного ответа LLM, мс")
+@click.option("--latency-ms", type=float, default=20.0, help="Задержка симулятора Finam API, мс")
+@click.option("--port", type=int, default=8766, help="Порт сервиса чата")
+def main(sessions: int, questions: int, llm_ms: float, latency_ms: float, port: int) -> None:
+    """Нагрузочный тест сервиса чата"""
+    simulator = FinamSimulator(SimulatorConfig(latency_ms=latency_ms, jitter_ms=latency_ms / 4)).start()
+    service = ChatService(
+        stream=make_fake_llm(simulator.url, llm_ms),
+        max_active_turns=sessions,
+        llm_concurrency=sessions,
+        api_key=API_KEY,
+    )
+    server = start_server(service, port)
+
+    click.echo(f"🚀 {sessions} сессий × {questions} вопросов, LLM {llm_ms:.0f} мс, Finam API {latency_ms:.0f} мс")
+    started = time.perf_counter()
+    try:
+        timings = asyncio.run(run_load(port, simulator.url, sessions, questions))
+    finally:
+        server.should_exit = True
+        simulator.stop()
+    elapsed = time.perf_counter() - started
+
+    # Нижняя граница ответа: два шага LLM и один запрос API подряд
+    floor = 2 * llm_ms + latency_ms
+    click.echo(f"\n✅ {len(timings)} ответов за {elapsed:.1f} с, {len(timings) / elapsed:.1f} ответов/с")
+    click.echo(f"   минимально возможное время ответа ≈ {floor:.0f} мс\n")
+    click.echo(f"{'Метрика':<22} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9}")
+    click.echo("-" * 52)
+    for name, values in (("первый фрагмент", [t[0] for t in timings]), ("полный ответ", [t[1] for t in timings])):
+        p50, p95, p99 = np.percentile(np.array(values) * 1000, [50, 95, 99])
+        click.echo(f"{name:<22} {p50:>9.1f} {p95:>9.1f} {p99:>9.1f}")
+    click.echo(f"\n📊 Сервис: {service.summary()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный тест FinamAPIClient на локальном симуляторе Finam TradeAPI
+
+Запускает симулятор в процессе (или использует внешний через --base-url), гоняет
+смесь запросов из нескольких потоков и выводит пропускную способность и
+перцентили задержки по каждому типу запроса.
+
+Использование:
+    python -m scripts.benchmark_client [--threads 32] [--duration 10] [--latency-ms 20]
+"""
+
+import random
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Callable
+
+import click
+import numpy as np
+
+from src.app.adapters import FinamAPIClient
+from src.app.adapters.finam_simulator import ASSETS, FinamSimulator, SimulatorConfig
+
+SYMBOLS = [f"{a[0]}@{a[1]}" for a in ASSETS]
+
+
+def make_workload(client: FinamAPIClient, account_id: str) -> dict[str, Callable[[], dict]]:
+    """Смесь типичных запросов чата"""
+    return {
+        "quote": lambda: client.get_quote(random.choice(SYMBOLS)),
+        "orderbook": lambda: client.get_orderbook(random.choice(SYMBOLS)),
+        "account": lambda: client.get_account(account_id),
+        "orders": lambda: client.get_orders(account_id),
+        "candles_d": lambda: client.get_candles(random.choice(SYMBOLS), "TIME_FRAME_D"),
+        "quotes_x20": lambda: client.get_quotes(random.sample(SYMBOLS, 20)),
+    }
+
+
+def run_load(
+    workload: dict[str, Callable[[], dict]], threads: int, duration: float
+) -> tuple[dict[str, list[float]], dict[str, int]]:
+    latencies: dict[str, list[float]] = defaultdict(list)
+    errors: dict[str, int] = defaultdict(int)
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+    names = list(workload)
+
+    def worker() -> None:
+        while time.perf_counter() < deadline:
+            name = random.choice(names)
+            t0 = time.perf_counter()
+            response = workload[name]()
+            elapsed = time.perf_counter() - t0
+            failed = "error" in response or bool(response.get("errors"))
+            with lock:
+                latencies[name].append(elapsed)
+                if failed:
+                    errors[name] += 1
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return latencies, errors
+
+
+@click.command()
+@click.option("--base-url", default=None, help="URL внешнего симулятора (по умолчанию запускается встроенный)")
+@click.option("--threads", type=int, default=32, help="Количество параллельных потоков")
+@click.option("--duration", type=float, default=10.0, help="Длительность теста, секунды")
+@click.option("--latency-ms", type=float, default=20.0, help="Задержка встроенного симулятора, мс")
+@click.option("--jitter-ms", type=float, default=5.0, help="Разброс задержки встроенного симулятора, мс")
+@click.option("--error-rate", type=float, default=0.0, help="Доля ошибок встроенного симулятора")
+@click.option("--rate-limit", type=float, default=0.0, help="Лимит rps встроенного симулятора (0 - без лимита)")
+def main(
+    base_url: str | None,
+    threads: int,
+    duration: float,
+    latency_ms: float,
+    jitter_ms: float,
+    error_rate: float,
+    rate_limit: float,
+) -> None:
+    """Нагрузочный тест клиента Finam API"""
+    simulator = None
+    if base_url is None:
+        config = SimulatorConfig(
+            latency_ms=latency_ms, jitter_ms=jitter_ms, error_rate=error_rate, rate_limit=rate_limit
+        )
+        simulator = FinamSimulator(config).start()
+        base_url = simulator.url
+
+    click.echo(f"🚀 Нагрузка на {base_url}: {threads} потоков, {duration:.0f} с")
+    client = FinamAPIClient(access_token="benchmark-secret", base_url=base_url)
+    try:
+        latencies, errors = run_load(make_workload(client, "1899011"), threads, duration)
+    finally:
+        if simulator is not None:
+            simulator.stop()
+
+    total = sum(len(v) for v in latencies.values())
+    click.echo(f"\n✅ Выполнено {total} вызовов, {total / duration:.1f} вызовов/с\n")
+    click.echo(f"{'Запрос':<12} {'вызовов':>8} {'ошибок':>7} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9}")
+    click.echo("-" * 60)
+    for name in sorted(latencies):
+        ms = np.array(latencies[name]) * 1000
+        p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+        click.echo(f"{name:<12} {len(ms):>8} {errors[name]:>7} {p50:>9.1f} {p95:>9.1f} {p99:>9.1f}")
+    if simulator is not None:
+        click.echo(f"\n📊 Симулятор: {simulator.stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Сравнение бэкендов модели эмбеддингов на CPU: скорость и точность относительно float32
+
+Для каждого бэкенда (torch, onnx, onnx-int8) измеряются загрузка и прогрев,
+задержка кодирования одного вопроса (как на ходе чата, без кэша) и скорость
+пачкой. Точность - на вопросах train.csv относительно первого бэкенда в списке:
+косинус между векторами одного вопроса, совпадение k ближайших соседей и
+попадания leave-one-out (среди k ближайших есть вопрос с тем же эндпоинтом).
+
+Использование:
+    python -m scripts.benchmark_embeddings [--backends torch,onnx,onnx-int8] [--threads 4] [-k 5]
+"""
+
+import time
+
+import click
+import numpy as np
+
+from src.app.interfaces.embeddings import DEFAULT_MODEL, load_sentence_transformer
+from src.app.interfaces.rag import DEFAULT_TRAIN_PATH, find_endpoint, load_examples, split_api_docs
+
+
+def neighbours(vectors: np.ndarray, k: int) -> np.ndarray:
+    """k ближайших соседей каждого вектора, кроме него самого"""
+    similarity = vectors @ vectors.T
+    np.fill_diagonal(similarity, -np.inf)
+    return np.argsort(-similarity, axis=1)[:, :k]
+
+
+@click.command()
+@click.option("--backends", default="torch,onnx,onnx-int8", help="Бэкенды через запятую; первый - эталон")
+@click.option("--model", "model_name", default=DEFAULT_MODEL, help="Модель sentence-transformers")
+@click.option("--threads", type=int, default=None, help="Потоков модели (по умолчанию решает библиотека)")
+@click.option("--train", "train_path", type=click.Path(exists=True), default=DEFAULT_TRAIN_PATH)
+@click.option("-k", "k", type=int, default=5, help="Число соседей для сравнения")
+def main(backends: str, model_name: str, threads: int | None, train_path: str, k: int) -> None:
+    """Скорость и точность бэкендов эмбеддингов"""
+    examples = load_examples(train_path)
+    questions = [e.question for e in examples]
+    api_docs = split_api_docs()
+    labels = np.array([find_endpoint(e.type, e.request, api_docs).summary for e in examples])
+    click.echo(f"🚀 {model_name}, {len(questions)} вопросов, потоков: {threads or 'по умолчанию'}, k={k}\n")
+    click.echo(
+        f"{'Бэкенд':<10} {'Загрузка, с':>11} {'Прогрев, мс':>11} {'p50, мс':>8} {'p99, мс':>8} {'Текстов/с':>9} "
+        f"{'Косинус':>8} {'Соседи':>7} {'hit@1':>6} {'hit@' + str(k):>6}"
+    )
+    click.echo("-" * 96)
+
+    reference: tuple[np.ndarray, np.ndarray] | None = None
+    for backend in backends.split(","):
+        try:
+            started = time.perf_counter()
+            encode = load_sentence_transformer(model_name, backend=backend, threads=threads, warmup=False)
+            loaded = time.perf_counter() - started
+        except Exception as e:
+            click.echo(f"{backend:<10} ⚠️  не загрузился: {e}")
+            continue
+
+        started = time.perf_counter()
+        encode(questions[:1])
+        warmup = (time.perf_counter() - started) * 1000
+        latencies = []
+        for question in questions:
+            started = time.perf_counter()
+            encode([question])
+            latencies.append(time.perf_counter() - started)
+        p50, p99 = np.percentile(np.array(latencies) * 1000, [50, 99])
+        started = time.perf_counter()
+        vectors = encode(questions)
+        throughput = len(questions) / (time.perf_counter() - started)
+
+        found = neighbours(vectors, k)
+        if reference is None:
+            reference = (vectors, found)
+        cosine = float(np.mean(np.sum(vectors * reference[0], axis=1)))
+        overlap = float(np.mean([len(set(a) & set(b)) / k for a, b in zip(found, reference[1], strict=True)]))
+        hits = labels[found] == labels[:, None]
+        click.echo(
+            f"{backend:<10} {loaded:>11.1f} {warmup:>11.1f} {p50:>8.2f} {p99:>8.2f} {throughput:>9.0f} "
+            f"{cosine:>8.4f} {overlap:>7.3f} {hits[:, 0].mean():>6.3f} {hits.any(axis=1).mean():>6.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Скорость и память потоковой оценки submission на синтетических файлах
+
+Генерирует эталон и предсказания на N строк (перемешанный порядок, ~20% промахов,
+пропуски, повторы и лишние uid), затем в отдельном процессе на каждый бюджет
+памяти запускает scan_submission и печатает время и пиковую память процесса.
+
+Использование:
+    python -m scripts.benchmark_evaluation [--rows 1000000] [--memory-mb 64,256]
+"""
+
+import csv
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import click
+
+METHODS = ("GET", "POST", "DELETE")
+
+
+def write_files(directory: Path, rows: int, seed: int) -> tuple[Path, Path]:
+    """Эталон и предсказания на rows строк"""
+    rng = random.Random(seed)
+    truth_path, pred_path = directory / "truth.csv", directory / "pred.csv"
+    with truth_path.open("w", newline="") as truth_file, pred_path.open("w", newline="") as pred_file:
+        truth, pred = csv.writer(truth_file, delimiter=";"), csv.writer(pred_file, delimiter=";")
+        truth.writerow(("uid", "type", "request"))
+        pred.writerow(("uid", "type", "request"))
+        predictions = []
+        for i in range(rows):
+            row = (f"{rng.getrandbits(48):012x}", METHODS[i % 3], f"/v1/accounts/ACC-{i % 997}/orders?limit={i % 100}")
+            truth.writerow(row)
+            chance = rng.random()
+            if chance < 0.01:
+                continue
+            if chance < 0.2:
+                row = (row[0], row[1], f"/v1/assets/{i % 50}")
+            predictions.append(row)
+            if chance > 0.995:
+                predictions.append(row)
+            # Пачками, чтобы генератор не держал в памяти весь файл
+            if len(predictions) >= 100_000:
+                rng.shuffle(predictions)
+                pred.writerows(predictions)
+                predictions.clear()
+        predictions += [(f"extra{i}", "GET", "/v1/assets") for i in range(10)]
+        rng.shuffle(predictions)
+        pred.writerows(predictions)
+    return truth_path, pred_path
+
+
+def measure(pred_path: Path, truth_path: Path, memory_mb: int) -> None:
+    """Один прогон в текущем процессе: строка с временем, памятью и точностью"""
+    from scripts.evaluate import scan_submission
+
+    started = time.perf_counter()
+    scan = scan_submission(pred_path, {"truth": truth_path}, memory_mb=memory_mb)
+    elapsed = time.perf_counter() - started
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    click.echo(
+        f"{memory_mb:>10} {scan.rows:>12} {elapsed:>9.1f} {scan.rows / elapsed:>12.0f} {peak:>12.0f} "
+        f"{scan.accuracy['truth'].accuracy:>9.4f}"
+    )
+
+
+@click.command()
+@click.option("--rows", type=int, default=1_000_000, help="Строк в эталоне")
+@click.option("--memory-mb", "budgets", default="64,256", help="Бюджеты памяти scan_submission через запятую")
+@click.option("--seed", type=int, default=0)
+@click.option("--measure", "measure_paths", nargs=3, hidden=True, default=None)
+def main(rows: int, budgets: str, seed: int, measure_paths: tuple[str, str, str] | None) -> None:
+    """Время и пиковая память потоковой оценки"""
+    if measure_paths:
+        pred_path, truth_path, memory_mb = measure_paths
+        measure(Path(pred_path), Path(truth_path), int(memory_mb))
+        return
+
+    with tempfile.TemporaryDirectory(prefix="benchmark-evaluation-") as tmp:
+        started = time.perf_counter()
+        truth_path, pred_path = write_files(Path(tmp), rows, seed)
+        size = (truth_path.stat().st_size + pred_path.stat().st_size) / 2**20
+        click.echo(f"📝 {rows} строк, {size:.0f} МБ за {time.perf_counter() - started:.1f} с\n")
+        click.echo(
+            f"{'Бюджет, МБ':>10} {'Строк':>12} {'Время, с':>9} {'Строк/с':>12} {'Пик RSS, МБ':>12} {'Accuracy':>9}"
+        )
+        click.echo("-" * 70)
+        for memory_mb in budgets.split(","):
+            # Отдельный процесс: пиковая память не накапливается между прогонами
+            subprocess.run(
+                [sys.executable, "-m", "scripts.benchmark_evaluation", "--measure", pred_path, truth_path, memory_mb],
+                check=True,
+            )
+
+
+if __name__ == "__main__":
+    main()
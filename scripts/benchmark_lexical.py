@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Качество и скорость гибридного поиска: BM25, плотный поиск и их объединение (RRF)
+
+Качество - leave-one-out на train.csv: для каждого вопроса ищутся похожие среди
+остальных, попадание - если среди top-k есть пример с тем же эндпоинтом
+(find_endpoint), и отдельно - попадание нужного эндпоинта в top-k описаний
+ApiDocRetriever. Плотный поиск требует модели эмбеддингов; без нее
+сравнивается только BM25.
+
+Скорость - BM25 на синтетических выборках: вопросы train.csv, в которых тикеры и
+числа заменены случайными (как в журналах вопросов), задержка одиночных запросов.
+Выборка из сотни шаблонов - худший случай: каждое слово вопроса встречается в
+тысячах документов.
+
+Использование:
+    python -m scripts.benchmark_lexical [--sizes 10000,300000] [-k 5] [--no-dense]
+"""
+
+import random
+import re
+import time
+
+import click
+import numpy as np
+
+from src.app.interfaces.lexical import BM25Index
+from src.app.interfaces.rag import (
+    DEFAULT_TRAIN_PATH,
+    ApiDocRetriever,
+    Example,
+    ExampleRetriever,
+    find_endpoint,
+    load_examples,
+    split_api_docs,
+)
+
+_IDENTIFIER_RE = re.compile(r"\b[A-Z][A-Z0-9]{1,11}\b|\d+")
+
+
+def perturb(text: str, rng: random.Random, tickers: list[str]) -> str:
+    """Вопрос с другими тикерами и числами"""
+
+    def replace(match: re.Match) -> str:
+        value = match.group(0)
+        if value.isdigit():
+            return "".join(rng.choice("0123456789") for _ in value)
+        return rng.choice(tickers)
+
+    return _IDENTIFIER_RE.sub(replace, text)
+
+
+def hit_rate(rankings: list[list[str]], labels: list[str], k: int) -> float:
+    return float(np.mean([label in ranking[:k] for ranking, label in zip(rankings, labels, strict=True)]))
+
+
+def leave_one_out(retriever: ExampleRetriever, labels: list[str], k: int) -> list[list[str]]:
+    """Эндпоинты найденных примеров для каждого вопроса без него самого"""
+    positions = {id(e): i for i, e in enumerate(retriever.examples)}
+    rankings = []
+    for example in retriever.examples:
+        found = retriever.search(example.question, k + 1)
+        rankings.append([labels[positions[id(e)]] for e, _ in found if e is not example][:k])
+    return rankings
+
+
+def bm25_leave_one_out(examples: list[Example], labels: list[str], k: int) -> list[list[str]]:
+    index = BM25Index()
+    index.add([e.question for e in examples])
+    rankings = []
+    for i, example in enumerate(examples):
+        _, ids = index.search(example.question, k + 1)
+        rankings.append([labels[j] for j in ids.tolist() if j != i][:k])
+    return rankings
+
+
+def echo_quality(name: str, examples: list[list[str]], docs: list[list[str]], labels: list[str], k: int) -> None:
+    click.echo(
+        f"{name:<8} {hit_rate(examples, labels, 1):>12.3f} {hit_rate(examples, labels, k):>12.3f} "
+        f"{hit_rate(docs, labels, k):>12.3f}"
+    )
+
+
+@click.command()
+@click.option("--train", "train_path", type=click.Path(exists=True), default=DEFAULT_TRAIN_PATH)
+@click.option("--sizes", default="10000,100000,300000", help="Размеры синтетических выборок через запятую")
+@click.option("--queries", type=int, default=1000, help="Количество запросов для замера скорости")
+@click.option("-k", "k", type=int, default=5, help="Глубина поиска для попаданий")
+@click.option("--no-dense", is_flag=True, help="Не загружать модель эмбеддингов")
+@click.option("--seed", type=int, default=0)
+def main(train_path: str, sizes: str, queries: int, k: int, no_dense: bool, seed: int) -> None:
+    """Попадания BM25 / плотного / гибридного поиска и задержка BM25"""
+    examples = load_examples(train_path)
+    api_docs = split_api_docs()
+    labels = [find_endpoint(e.type, e.request, api_docs).summary for e in examples]
+    click.echo(f"🎯 Leave-one-out на {len(examples)} вопросах, {len(api_docs)} эндпоинтов, k={k}\n")
+    click.echo(f"{'Поиск':<8} {'пример@1':>12} {'пример@' + str(k):>12} {'эндпоинт@' + str(k):>12}")
+    click.echo("-" * 48)
+
+    lexical_docs = BM25Index()
+    lexical_docs.add([f"{d.summary}\n{d.text}" for d in api_docs])
+    docs_rankings = [
+        [api_docs[i].summary for i in lexical_docs.search(e.question, k)[1].tolist()] for e in examples
+    ]
+    echo_quality("bm25", bm25_leave_one_out(examples, labels, k), docs_rankings, labels, k)
+
+    if not no_dense:
+        try:
+            from src.app.interfaces.embeddings import get_embedding_service
+
+            encoder = get_embedding_service().encode
+            encoder(["проверка"])
+        except Exception as e:
+            click.echo(f"⚠️  Плотный поиск пропущен: модель эмбеддингов недоступна ({e})")
+        else:
+            for name, hybrid in (("dense", False), ("hybrid", True)):
+                retriever = ExampleRetriever(examples, encoder=encoder, index="exact", hybrid=hybrid)
+                docs_retriever = ApiDocRetriever(api_docs, encoder=encoder, hybrid=hybrid)
+                docs_rankings = [[d.summary for d, _ in docs_retriever.search(e.question, k)] for e in examples]
+                echo_quality(name, leave_one_out(retriever, labels, k), docs_rankings, labels, k)
+
+    rng = random.Random(seed)
+    tickers = ["".join(rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ") for _ in range(4)) for _ in range(3000)]
+    probes = [perturb(rng.choice(examples).question, rng, tickers) for _ in range(queries)]
+    click.echo(f"\n⚡ BM25 на синтетических вопросах, {queries} запросов, k={k}\n")
+    click.echo(
+        f"{'Вопросов':>10} {'Построение, с':>14} {'Терминов':>10} {'Вхождений':>10} {'p50, мс':>9} {'p99, мс':>9}"
+    )
+    click.echo("-" * 67)
+    for size in (int(v) for v in sizes.split(",")):
+        corpus = [perturb(rng.choice(examples).question, rng, tickers) for _ in range(size)]
+        started = time.perf_counter()
+        index = BM25Index()
+        index.add(corpus)
+        build = time.perf_counter() - started
+        index.search(probes[0], k)
+        latencies = []
+        for probe in probes:
+            started = time.perf_counter()
+            index.search(probe, k)
+            latencies.append(time.perf_counter() - started)
+        p50, p99 = np.percentile(np.array(latencies) * 1000, [50, 99])
+        click.echo(
+            f"{size:>10} {build:>14.1f} {len(index.vocabulary):>10} {index.postings:>10} {p50:>9.2f} {p99:>9.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк декодирования свечей: словари vs массивы Bars
+
+Генерирует синтетический ответ GET /v1/instruments/{symbol}/bars и сравнивает
+время разбора и потребление памяти разными способами.
+
+Использование:
+    python -m scripts.benchmark_models [--bars 100000] [--repeat 5]
+"""
+
+import json
+import random
+import time
+import tracemalloc
+from collections.abc import Callable
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+import click
+
+from src.app.models import Bar, Bars
+from src.app.models.finam_response import loads
+
+
+def make_bars_response(n: int, seed: int = 0) -> bytes:
+    """Синтетический JSON ответа со свечами"""
+    rng = random.Random(seed)
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    price = 250.0
+    bars = []
+    for i in range(n):
+        open_ = price
+        price = max(price + rng.gauss(0, 0.5), 1.0)
+        bars.append({
+            "timestamp": (start + timedelta(minutes=i)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "open": {"value": f"{open_:.2f}"},
+            "high": {"value": f"{max(open_, price) + rng.random():.2f}"},
+            "low": {"value": f"{min(open_, price) - rng.random():.2f}"},
+            "close": {"value": f"{price:.2f}"},
+            "volume": {"value": str(rng.randint(1, 10_000))},
+        })
+    return json.dumps({"symbol": "SBER@MISX", "bars": bars}).encode()
+
+
+def measure(fn: Callable[[], Any], repeat: int) -> tuple[float, float, float]:
+    """(лучшее время в мс, пиковая память в МБ, удерживаемая результатом память в МБ)"""
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+
+    tracemalloc.start()
+    result = fn()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return best * 1000, peak / 2**20, retained / 2**20
+
+
+@click.command()
+@click.option("--bars", "n_bars", type=int, default=100_000, help="Количество свечей в ответе")
+@click.option("--repeat", type=int, default=5, help="Количество повторов для замера времени")
+def main(n_bars: int, repeat: int) -> None:
+    """Сравнить способы декодирования свечей"""
+    raw = make_bars_response(n_bars)
+    click.echo(f"📦 Ответ: {n_bars} свечей, {len(raw) / 2**20:.1f} МБ JSON\n")
+
+    cases: dict[str, Callable[[], Any]] = {
+        "json.loads -> dict": lambda: json.loads(raw),
+        "loads (orjson) -> dict": lambda: loads(raw),
+        "loads -> list[Bar]": lambda: [Bar.from_dict(b) for b in loads(raw)["bars"]],
+        "loads -> Bars.from_response": lambda: Bars.from_response(loads(raw)),
+        "Bars.from_json": lambda: Bars.from_json(raw),
+    }
+
+    click.echo(f"{'Способ':<30} {'время, мс':>10} {'пик, МБ':>10} {'результат, МБ':>14}")
+    click.echo("-" * 68)
+    for name, fn in cases.items():
+        elapsed, peak, retained = measure(fn, repeat)
+        click.echo(f"{name:<30} {elapsed:>10.1f} {peak:>10.1f} {retained:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк стакана на массивах: время аналитики на один инструмент
+
+Строит N синтетических стаканов (по умолчанию 500 инструментов по 50 уровней на
+сторону) и измеряет среднее время на стакан для разбора снимка, инкрементального
+обновления уровня, отдельных метрик и полной сводки summary(), которая уходит в LLM.
+
+Использование:
+    python -m scripts.benchmark_orderbook [--symbols 500] [--depth 50] [--repeat 5]
+"""
+
+import random
+import time
+from collections.abc import Callable
+from typing import Any
+
+import click
+
+from src.app.models import OrderBook
+from src.app.models.order_book import BUY, SELL
+
+
+def make_response(symbol: str, depth: int, rng: random.Random) -> dict[str, Any]:
+    """Синтетический ответ GET /v1/instruments/{symbol}/orderbook"""
+    mid = rng.uniform(10, 5000)
+    step = round(mid / 10_000, 4) or 0.0001
+    rows = []
+    for level in range(1, depth + 1):
+        size = {"value": str(rng.randint(1, 10_000))}
+        rows.append({"price": {"value": f"{mid - level * step:.4f}"}, "buy_size": size, "action": "ACTION_ADD"})
+        rows.append({"price": {"value": f"{mid + level * step:.4f}"}, "sell_size": size, "action": "ACTION_ADD"})
+    rng.shuffle(rows)
+    return {"symbol": symbol, "orderbook": {"rows": rows}}
+
+
+def per_book(fn: Callable[[Any], Any], items: list[Any], repeat: int) -> float:
+    """Лучшее из repeat среднее время одного вызова на элементах items, мкс"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for item in items:
+            fn(item)
+        best = min(best, time.perf_counter() - started)
+    return best / len(items) * 1e6
+
+
+@click.command()
+@click.option("--symbols", type=int, default=500, help="Количество инструментов")
+@click.option("--depth", type=int, default=50, help="Уровней на каждой стороне")
+@click.option("--repeat", type=int, default=5, help="Количество повторов для замера времени")
+@click.option("--seed", type=int, default=0)
+def main(symbols: int, depth: int, repeat: int, seed: int) -> None:
+    """Время операций со стаканом на один инструмент"""
+    rng = random.Random(seed)
+    responses = [make_response(f"SYM{i}@MISX", depth, rng) for i in range(symbols)]
+    books = [OrderBook.from_response(response) for response in responses]
+    click.echo(f"📊 {symbols} стаканов по {depth} уровней на сторону\n")
+
+    cases: dict[str, tuple[Callable[[Any], Any], list[Any]]] = {
+        "from_response (снимок)": (OrderBook.from_response, responses),
+        "update (изменение уровня)": (lambda b: b.update(BUY, b.best_bid, 5.0), books),
+        "spread + mid": (lambda b: (b.spread(), b.mid()), books),
+        "cumulative_depth": (lambda b: b.cumulative_depth(SELL, 10), books),
+        "imbalance": (lambda b: b.imbalance(5), books),
+        "vwap 100 лотов": (lambda b: b.vwap(BUY, 100), books),
+        "summary (в LLM)": (lambda b: b.summary(), books),
+    }
+    click.echo(f"{'Операция':<30} {'мкс на стакан':>14} {'всего, мс':>10}")
+    click.echo("-" * 56)
+    for name, (fn, items) in cases.items():
+        micros = per_book(fn, items, repeat)
+        click.echo(f"{name:<30} {micros:>14.1f} {micros * len(items) / 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк разбора ответов ассистента
+
+Сравнивает parse_assistant_response (одно декодирование) с прежней схемой, где
+message, requests и last декодировались из того же текста трижды, на типичных
+ответах модели: корректный JSON, JSON в ```json, JSON с текстом вокруг и
+оборванный ответ.
+
+Использование:
+    python -m scripts.benchmark_parser [--repeat 20000]
+"""
+
+import json
+import logging
+import timeit
+
+import click
+
+from src.app.interfaces.chat import parse_assistant_response
+
+_REQUEST = {
+    "method": "POST",
+    "url": "https://api.finam.ru/v1/accounts/1899011/orders",
+    "body": {
+        "symbol": "SBER@MISX",
+        "quantity": {"value": "10"},
+        "side": "SIDE_BUY",
+        "type": "ORDER_TYPE_LIMIT",
+        "limit_price": {"value": "270.50"},
+        "legs": [{"symbol": "SBER@MISX", "side": "SIDE_BUY"}],
+    },
+}
+_RESPONSE = json.dumps(
+    {
+        "instructions": "Запрошу котировку и выставлю заявку {по плану}",
+        "message": "Выставляю лимитную заявку на **10** лотов SBER по 270.50 ₽",
+        "requests": [
+            {"method": "GET", "url": "https://api.finam.ru/v1/instruments/SBER@MISX/quotes/latest"},
+            _REQUEST,
+        ],
+        "last": 0,
+    },
+    ensure_ascii=False,
+    indent=1,
+)
+
+CASES = {
+    "valid JSON": _RESPONSE,
+    "```json fenced": f"```json\n{_RESPONSE}\n```",
+    "text around JSON": f"Конечно! Вот ответ:\n{_RESPONSE}\nНадеюсь, помог.",
+    "truncated": _RESPONSE[: _RESPONSE.rindex("limit_price")],
+}
+
+
+def triple_decode(text: str) -> tuple:
+    """Прежняя схема для корректного JSON: три независимых json.loads"""
+    return (json.loads(text).get("message"), json.loads(text).get("requests"), json.loads(text).get("last"))
+
+
+@click.command()
+@click.option("--repeat", type=int, default=20_000, help="Количество разборов на случай")
+def main(repeat: int) -> None:
+    """Замерить стоимость разбора одного ответа ассистента"""
+    # Разбор некорректных ответов логирует ошибку - не замеряем вывод в консоль
+    logging.disable(logging.ERROR)
+    click.echo(f"📦 Ответ: {len(_RESPONSE)} символов, {repeat} повторов\n")
+    click.echo(f"{'Случай':<20} {'мкс/ответ':>10} {'запросов':>9} {'last':>5}")
+    click.echo("-" * 48)
+
+    baseline = timeit.timeit(lambda: triple_decode(_RESPONSE), number=repeat) / repeat * 1e6
+    click.echo(f"{'3 x json.loads':<20} {baseline:>10.1f} {'-':>9} {'-':>5}")
+
+    for name, text in CASES.items():
+        parsed = parse_assistant_response(text)
+        elapsed = timeit.timeit(lambda text=text: parse_assistant_response(text), number=repeat) / repeat * 1e6
+        click.echo(f"{name:<20} {elapsed:>10.1f} {len(parsed.requests):>9} {int(parsed.last):>5}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Сравнение приближенного индекса IVF-PQ с точным поиском NumPy
+
+Строит ExactIndex и IVFPQIndex на одних векторах (синтетических - с низкой
+внутренней размерностью и темами, как у эмбеддингов вопросов, или загруженных из
+.npy), дополняет IVF-PQ еще частью векторов, сохраняет и загружает его, а
+затем по одиночным запросам измеряет recall@k относительно точного поиска,
+запросы в секунду и перцентили задержки для сетки nprobe × refine.
+
+Использование:
+    python -m scripts.benchmark_vector_index [--size 200000] [--dim 384] [--nprobe 8,16,32] [--refine 0,4,16]
+"""
+
+import tempfile
+import time
+from pathlib import Path
+
+import click
+import numpy as np
+
+from src.app.interfaces.vector_index import ExactIndex, IVFPQIndex, VectorIndex
+
+
+def make_vectors(size: int, dim: int, latent: int, topics: int, seed: int) -> np.ndarray:
+    """Нормированные векторы: проекция latent-мерных точек вокруг центров тем плюс шум"""
+    rng = np.random.default_rng(seed)
+    projection = rng.standard_normal((latent, dim)).astype(np.float32)
+    centers = rng.standard_normal((topics, latent)).astype(np.float32)
+    points = centers[rng.integers(0, topics, size)] + 0.5 * rng.standard_normal((size, latent)).astype(np.float32)
+    vectors = points @ projection
+    vectors += 0.5 * rng.standard_normal((size, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def make_queries(vectors: np.ndarray, count: int, seed: int) -> np.ndarray:
+    """Запросы рядом с векторами базы (перефразированные вопросы)"""
+    rng = np.random.default_rng(seed + 1)
+    queries = vectors[rng.integers(0, len(vectors), count)]
+    queries = queries + 0.02 * rng.standard_normal(queries.shape).astype(np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def timed_search(index: VectorIndex, queries: np.ndarray, k: int, **params: int) -> tuple[np.ndarray, np.ndarray]:
+    """ID результатов и задержки одиночных запросов, секунды"""
+    ids, latencies = [], []
+    for query in queries:
+        started = time.perf_counter()
+        _, found = index.search(query[None], k, **params)
+        latencies.append(time.perf_counter() - started)
+        ids.append(found[0])
+    return np.array(ids), np.array(latencies)
+
+
+def recall(found: np.ndarray, truth: np.ndarray) -> float:
+    return float(np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth, strict=True)]))
+
+
+def echo_row(name: str, params: str, found: np.ndarray, truth: np.ndarray, latencies: np.ndarray) -> None:
+    p50, p99 = np.percentile(latencies * 1000, [50, 99])
+    click.echo(
+        f"{name:<8} {params:<20} {recall(found, truth):>9.3f} {len(latencies) / latencies.sum():>9.0f} "
+        f"{p50:>9.2f} {p99:>9.2f}"
+    )
+
+
+@click.command()
+@click.option("--size", type=int, default=200_000, help="Количество векторов в базе")
+@click.option("--dim", type=int, default=384, help="Размерность синтетических векторов")
+@click.option("--latent", type=int, default=32, help="Внутренняя размерность синтетических векторов")
+@click.option("--topics", type=int, default=1000, help="Число тем (кластеров) синтетических векторов")
+@click.option(
+    "--vectors", "vectors_path", type=click.Path(exists=True, path_type=Path), help="Векторы .npy вместо синтетики"
+)
+@click.option("--queries", type=int, default=300, help="Количество запросов")
+@click.option("-k", "k", type=int, default=10, help="Сколько соседей искать")
+@click.option("--nlist", type=int, default=None, help="Число списков IVF (по умолчанию ~sqrt(size))")
+@click.option("--nprobe", default="8,16,32,64", help="Значения nprobe через запятую")
+@click.option("--refine", default="0,4,16", help="Значения refine через запятую")
+@click.option("--added", type=float, default=0.1, help="Доля векторов, добавляемых после построения")
+@click.option("--seed", type=int, default=0)
+def main(
+    size: int,
+    dim: int,
+    latent: int,
+    topics: int,
+    vectors_path: Path | None,
+    queries: int,
+    k: int,
+    nlist: int | None,
+    nprobe: str,
+    refine: str,
+    added: float,
+    seed: int,
+) -> None:
+    """Recall@k и скорость IVF-PQ против точного поиска"""
+    if vectors_path is not None:
+        vectors = np.load(vectors_path).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    else:
+        vectors = make_vectors(size, dim, latent, topics, seed)
+    query_vectors = make_queries(vectors, queries, seed)
+    size, dim = vectors.shape
+    initial = int(size * (1 - added))
+    click.echo(f"🚀 {size} векторов × {dim}, {queries} запросов, k={k}")
+
+    started = time.perf_counter()
+    exact = ExactIndex(dim)
+    exact.add(vectors)
+    exact_build = time.perf_counter() - started
+
+    started = time.perf_counter()
+    ivf = IVFPQIndex(dim, nlist=nlist)
+    ivf.add(vectors[:initial])
+    ivf_build = time.perf_counter() - started
+    started = time.perf_counter()
+    ivf.add(vectors[initial:])
+    ivf_added = time.perf_counter() - started
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "index.npz"
+        started = time.perf_counter()
+        ivf.save(path)
+        saved = time.perf_counter() - started
+        file_size = path.stat().st_size
+        started = time.perf_counter()
+        ivf = VectorIndex.load(path)
+        loaded = time.perf_counter() - started
+
+    click.echo(f"   точный индекс: {exact_build:.2f} с, {vectors.nbytes / 2**20:.0f} МБ")
+    click.echo(
+        f"   IVF-PQ: обучение и {initial} векторов {ivf_build:.1f} с, "
+        f"еще {size - initial} векторов {ivf_added:.2f} с, nlist={ivf.nlist}, m={ivf.m}"
+    )
+    click.echo(f"   файл IVF-PQ {file_size / 2**20:.0f} МБ: сохранение {saved:.2f} с, загрузка {loaded:.2f} с\n")
+
+    truth, latencies = timed_search(exact, query_vectors, k)
+    click.echo(f"{'Индекс':<8} {'Параметры':<20} {'recall@' + str(k):>9} {'QPS':>9} {'p50, мс':>9} {'p99, мс':>9}")
+    click.echo("-" * 70)
+    echo_row("exact", "", truth, truth, latencies)
+    for probe in (int(v) for v in nprobe.split(",")):
+        for factor in (int(v) for v in refine.split(",")):
+            found, latencies = timed_search(ivf, query_vectors, k, nprobe=probe, refine=factor)
+            echo_row("ivfpq", f"nprobe={probe} refine={factor}", found, truth, latencies)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,10 @@
 Запрос считается пройденным, если сгенерированный вызов API
 полностью совпал с эталонным (и type, и request).
 
+Файлы читаются потоково (scan_submission из scripts.evaluate): память не
+зависит от их размера, ошибки пишутся в --save-errors по мере нахождения.
+load_csv и calculate_accuracy оставлены для совместимости.
+
 Использование:
     python scripts/calculate_metrics.py --pred submission.csv --true train.csv
     python scripts/calculate_metrics.py  # использует значения по умолчанию
@@ -24,11 +28,29 @@
 """
 
 import csv
+import sys
 from pathlib import Path
 from typing import Optional
 
 import click
 
+if not __package__:
+    # Запуск файлом (python scripts/calculate_metrics.py): корень репозитория в sys.path для импорта scripts.evaluate
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from scripts.evaluate import FileReadError, Row, scan_submission  # noqa: E402
+
+ERROR_FIELDS = [
+    "uid",
+    "error_type",
+    "true_type",
+    "pred_type",
+    "true_request",
+    "pred_request",
+    "type_match",
+    "request_match",
+]
+
 
 def load_csv(file_path: Path) -> dict[str, dict[str, str]]:
     """Загрузить CSV файл в словарь {uid: {type, request}}"""
@@ -145,6 +167,57 @@ def calculate_accuracy(
     }
 
 
+class ErrorCollector:
+    """Обработчик промахов scan_submission: первые примеры в памяти, все - потоком в CSV"""
+
+    def __init__(self, keep: int, save_path: Optional[Path]) -> None:
+        self.keep = keep
+        self.save_path = save_path
+        self.examples: list[dict] = []
+        self.count = 0
+        self._file = None
+        self._writer: Optional[csv.DictWriter] = None
+
+    def __call__(self, uid: str, kind: str, true_row: Row, predicted: Optional[Row]) -> None:
+        error = {"uid": uid, "error": kind, "true_type": true_row[1], "true_request": true_row[2]}
+        if predicted is None:
+            error.update(pred_type=None, pred_request=None)
+        else:
+            error.update(
+                pred_type=predicted[1],
+                pred_request=predicted[2],
+                type_match="yes" if predicted[1] == true_row[1] else "no",
+                request_match="yes" if predicted[2] == true_row[2] else "no",
+            )
+        self.count += 1
+        if len(self.examples) < self.keep:
+            self.examples.append(error)
+        if self.save_path:
+            self._write(error)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+
+    def _write(self, error: dict) -> None:
+        if self._writer is None:
+            # Файл создается только если есть ошибки
+            self.save_path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.save_path, "w", encoding="utf-8", newline="")  # noqa: SIM115
+            self._writer = csv.DictWriter(self._file, fieldnames=ERROR_FIELDS, delimiter=";")
+            self._writer.writeheader()
+        self._writer.writerow({
+            "uid": error["uid"],
+            "error_type": error["error"],
+            "true_type": error.get("true_type", ""),
+            "pred_type": error.get("pred_type", ""),
+            "true_request": error.get("true_request", ""),
+            "pred_request": error.get("pred_request", ""),
+            "type_match": error.get("type_match", ""),
+            "request_match": error.get("request_match", ""),
+        })
+
+
 @click.command()
 @click.option(
     "--pred",
@@ -180,16 +253,28 @@ def main(pred_file: Path, true_file: Path, show_errors: int, save_errors: Option
     click.echo(f"📖 Ground Truth: {true_file}")
     click.echo("=" * 70)
 
-    # Загружаем данные
+    # Один потоковый проход: соединение по uid, метрики и ошибки
+    collector = ErrorCollector(show_errors, save_errors)
     try:
-        predicted = load_csv(pred_file)
-        ground_truth = load_csv(true_file)
-    except Exception as e:
+        scan = scan_submission(pred_file, {"truth": true_file}, on_error=collector)
+    except (FileReadError, OSError) as e:
         click.echo(f"❌ Ошибка при чтении файлов: {e}", err=True)
         return
-
-    # Рассчитываем метрики
-    accuracy, stats = calculate_accuracy(predicted, ground_truth)
+    finally:
+        collector.close()
+
+    result = scan.accuracy["truth"]
+    accuracy = result.accuracy
+    stats = {
+        "total": result.total,
+        "correct": result.correct,
+        "correct_type": result.correct_type,
+        "correct_request": result.correct_request,
+        "type_accuracy": result.type_accuracy,
+        "request_accuracy": result.request_accuracy,
+        "errors": collector.examples,
+        "type_stats": result.type_stats(),
+    }
 
     # Выводим результаты
     click.echo("\n🎯 ОСНОВНАЯ МЕТРИКА (из evaluation.md):")
@@ -200,7 +285,7 @@ def main(pred_file: Path, true_file: Path, show_errors: int, save_errors: Option
     click.echo(f"   Полностью правильных:     {stats['correct']} ({accuracy * 100:.2f}%)")
     click.echo(f"   Правильный type:          {stats['correct_type']} ({stats['type_accuracy'] * 100:.2f}%)")
     click.echo(f"   Правильный request:       {stats['correct_request']} ({stats['request_accuracy'] * 100:.2f}%)")
-    click.echo(f"   Ошибок:                   {len(stats['errors'])}")
+    click.echo(f"   Ошибок:                   {collector.count}")
 
     # Статистика по типам запросов
     click.echo("\n📊 СТАТИСТИКА ПО ТИПАМ ЗАПРОСОВ:")
@@ -236,37 +321,7 @@ def main(pred_file: Path, true_file: Path, show_errors: int, save_errors: Option
                 else:
                     click.echo(f"   Request: ✓ {error['true_request']}")
 
-    # Сохраняем ошибки в файл
-    if save_errors and stats["errors"]:
-        save_errors = Path(save_errors)
-        save_errors.parent.mkdir(parents=True, exist_ok=True)
-
-        with open(save_errors, "w", encoding="utf-8", newline="") as f:
-            fieldnames = [
-                "uid",
-                "error_type",
-                "true_type",
-                "pred_type",
-                "true_request",
-                "pred_request",
-                "type_match",
-                "request_match",
-            ]
-            writer = csv.DictWriter(f, fieldnames=fieldnames, delimiter=";")
-            writer.writeheader()
-
-            for error in stats["errors"]:
-                writer.writerow({
-                    "uid": error["uid"],
-                    "error_type": error["error"],
-                    "true_type": error.get("true_type", ""),
-                    "pred_type": error.get("pred_type", ""),
-                    "true_request": error.get("true_request", ""),
-                    "pred_request": error.get("pred_request", ""),
-                    "type_match": error.get("type_match", ""),
-                    "request_match": error.get("request_match", ""),
-                })
-
+    if save_errors and collector.count:
         click.echo(f"\n💾 Ошибки сохранены в: {save_errors}")
 
     # Финальный вердикт
@@ -3,12 +3,333 @@
 Стандартный модуль оценки для хакатона
 
 Интерфейс совместим с платформой автоматической проверки.
-Оценка полностью основана на UID, порядок строк не важен.
+Оценка полностью основана на UID, порядок строк не важен. Модуль самодостаточен
+(только стандартная библиотека) и запускается отдельным файлом.
+
+evaluate проверяет и оценивает submission за один потоковый проход
+(scan_submission) - файлы не загружаются в память целиком, соединение по uid
+идет хэш-разбиением (Grace hash join):
+- строки читаются по одной и раскладываются по crc32(uid) во временные файлы-
+  разделы так, чтобы раздел всех файлов помещался в memory_mb; строки одного
+  uid из всех файлов попадают в один раздел
+- раздел за разделом эталоны и предсказания загружаются в словари по uid, и
+  считаются все проверки (пропущенные, лишние, повторные uid, пустые поля,
+  методы, пути) и точность по каждому эталону
+- если файлы помещаются в memory_mb целиком, раздел один и временных файлов нет
+
+Память ограничена memory_mb и не зависит от размера файлов. Повторный uid в
+одном файле учитывается по последней строке, как при загрузке в словарь.
+load_csv_data, validate_submission и calculate_accuracy работают со словарями
+в памяти и оставлены для совместимости.
 """
 
 import csv
+import math
+import os
+import pickle
+import tempfile
+import zlib
+from collections import Counter
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass, field
 from pathlib import Path
 
+DEFAULT_MEMORY_MB = 256
+# Во сколько раз строка в словаре Python больше строки в файле (ключ, кортеж, строки, множества uid)
+ROW_OVERHEAD = 10
+VALID_HTTP_METHODS = frozenset({"GET", "POST", "DELETE", "PUT", "PATCH", "HEAD", "OPTIONS"})
+SCORED_METHODS = ("GET", "POST", "DELETE")
+HEADER = ("uid", "type", "request")
+# Строк в пачке временного файла раздела
+SPILL_BATCH = 4096
+
+# (uid, type, request)
+Row = tuple[str, str, str]
+# Обработчик ошибки: (uid, "missing" или "mismatch", строка эталона, строка предсказания или None)
+ErrorHandler = Callable[[str, str, Row, Row | None], None]
+
+
+class FileReadError(ValueError):
+    """Файл не читается как CSV; name - имя файла в scan_submission ("" - submission)"""
+
+    def __init__(self, name: str, error: Exception) -> None:
+        super().__init__(f"Failed to load CSV file: {error}")
+        self.name = name
+
+
+# ============= ЧТЕНИЕ ==============================
+
+
+def read_header(path: str | Path) -> list[str]:
+    """Заголовок CSV (пустой список для пустого файла)"""
+    with open(path, encoding="utf-8", newline="") as f:
+        return [name.strip() for name in next(csv.reader(f, delimiter=";"), [])]
+
+
+def read_rows(path: str | Path) -> Iterator[Row]:
+    """Строки (uid, type, request) по одной; строки без uid пропускаются, нет колонки - пустое значение
+
+    Файл без колонки uid не дает строк (как пустой файл)
+    """
+    with open(path, encoding="utf-8", newline="") as f:
+        reader = csv.reader(f, delimiter=";")
+        header = [name.strip() for name in next(reader, [])]
+        if "uid" not in header:
+            return
+        if header[:3] == list(HEADER):
+            # Обычная раскладка uid;type;request: распаковка без индексов
+            for row in reader:
+                if len(row) != 3:
+                    row = (row + ["", ""])[:3]
+                key, method, request = row
+                if key := key.strip():
+                    yield key, method.strip(), request.strip()
+            return
+        uid = header.index("uid")
+        type_ = header.index("type") if "type" in header else None
+        request = header.index("request") if "request" in header else None
+        width = len(header)
+        for row in reader:
+            if len(row) < width:
+                row += [""] * (width - len(row))
+            if key := row[uid].strip():
+                yield (
+                    key,
+                    row[type_].strip() if type_ is not None else "",
+                    row[request].strip() if request is not None else "",
+                )
+
+
+def read_named(name: str, path: str | Path) -> Iterator[Row]:
+    """read_rows, ошибки чтения которого оборачиваются в FileReadError с именем файла"""
+    try:
+        yield from read_rows(path)
+    except (OSError, UnicodeDecodeError, csv.Error) as e:
+        raise FileReadError(name, e) from e
+
+
+def partition_file(rows: Iterator[Row], partitions: int, directory: Path) -> list[Path]:
+    """Разложить строки по crc32(uid) % partitions во временные файлы пачками pickle"""
+    paths = [directory / f"{i}.pkl" for i in range(partitions)]
+    files = [p.open("wb") for p in paths]
+    buffers: list[list[Row]] = [[] for _ in range(partitions)]
+    try:
+        for row in rows:
+            part = zlib.crc32(row[0].encode()) % partitions
+            buffer = buffers[part]
+            buffer.append(row)
+            if len(buffer) >= SPILL_BATCH:
+                pickle.dump(buffer, files[part], pickle.HIGHEST_PROTOCOL)
+                buffer.clear()
+        for f, buffer in zip(files, buffers, strict=True):
+            if buffer:
+                pickle.dump(buffer, f, pickle.HIGHEST_PROTOCOL)
+    finally:
+        for f in files:
+            f.close()
+    return paths
+
+
+def read_partition(path: Path) -> Iterator[Row]:
+    with path.open("rb") as f:
+        while True:
+            try:
+                yield from pickle.load(f)
+            except EOFError:
+                return
+
+
+def load_rows(rows: Iterator[Row]) -> tuple[dict[str, Row], int, int]:
+    """Словарь uid -> последняя строка, число строк и число повторов uid"""
+    loaded: dict[str, Row] = {}
+    count = 0
+    for row in rows:
+        loaded[row[0]] = row
+        count += 1
+    return loaded, count, count - len(loaded)
+
+
+def iter_partitions(paths: dict[str, str | Path], memory_mb: float) -> Iterator[dict[str, Iterator[Row]]]:
+    """Разделы файлов по очереди: {имя файла: строки раздела}"""
+    size = sum(os.path.getsize(p) for p in paths.values())
+    partitions = max(1, math.ceil(size * ROW_OVERHEAD / (memory_mb * 2**20)))
+    if partitions == 1:
+        yield {name: read_named(name, path) for name, path in paths.items()}
+        return
+    with tempfile.TemporaryDirectory(prefix="submission-scan-") as tmp:
+        parts = {}
+        for i, (name, path) in enumerate(paths.items()):
+            directory = Path(tmp) / str(i)
+            directory.mkdir()
+            parts[name] = partition_file(read_named(name, path), partitions, directory)
+        for i in range(partitions):
+            yield {name: read_partition(files[i]) for name, files in parts.items()}
+
+
+# ============= МЕТРИКИ ==============================
+
+
+@dataclass(slots=True)
+class AccuracyStats:
+    """Точность относительно одного эталона"""
+
+    total: int = 0
+    correct: int = 0
+    correct_type: int = 0
+    correct_request: int = 0
+    type_counts: dict[str, dict[str, int]] = field(
+        default_factory=lambda: {method: {"tp": 0, "fp": 0, "fn": 0} for method in SCORED_METHODS}
+    )
+
+    def add(self, true_type: str, true_request: str, predicted: Row | None) -> bool:
+        """Учесть вопрос; True - предсказание полностью совпало с эталоном"""
+        self.total += 1
+        counts = self.type_counts.setdefault(true_type, {"tp": 0, "fp": 0, "fn": 0})
+        if predicted is None:
+            counts["fn"] += 1
+            return False
+        type_match = predicted[1] == true_type
+        request_match = predicted[2] == true_request
+        self.correct_type += type_match
+        self.correct_request += request_match
+        if type_match and request_match:
+            self.correct += 1
+            counts["tp"] += 1
+            return True
+        if not type_match:
+            counts["fn"] += 1
+            if predicted[1] in self.type_counts:
+                self.type_counts[predicted[1]]["fp"] += 1
+        return False
+
+    def add_all(self, truth: dict[str, Row], predicted: dict[str, Row]) -> Iterator[tuple[Row, Row | None]]:
+        """Учесть все вопросы эталона; выдает промахи (строка эталона, предсказание или None)"""
+        hits = []
+        for uid, true_row in truth.items():
+            prediction = predicted.get(uid)
+            # Полное совпадение - частый случай, считается пачкой в конце
+            if prediction == true_row:
+                hits.append(true_row[1])
+            elif not self.add(true_row[1], true_row[2], prediction):
+                yield true_row, prediction
+        self.total += len(hits)
+        self.correct += len(hits)
+        self.correct_type += len(hits)
+        self.correct_request += len(hits)
+        for method, count in Counter(hits).items():
+            self.type_counts.setdefault(method, {"tp": 0, "fp": 0, "fn": 0})["tp"] += count
+
+    @property
+    def accuracy(self) -> float:
+        return self.correct / self.total if self.total else 0.0
+
+    @property
+    def type_accuracy(self) -> float:
+        return self.correct_type / self.total if self.total else 0.0
+
+    @property
+    def request_accuracy(self) -> float:
+        return self.correct_request / self.total if self.total else 0.0
+
+    def type_stats(self) -> dict[str, dict[str, float]]:
+        """tp, fp, fn, precision, recall и f1 по HTTP методам"""
+        stats = {}
+        for method, counts in self.type_counts.items():
+            tp, fp, fn = counts["tp"], counts["fp"], counts["fn"]
+            precision = tp / (tp + fp) if tp + fp else 0.0
+            recall = tp / (tp + fn) if tp + fn else 0.0
+            f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+            stats[method] = {"tp": tp, "fp": fp, "fn": fn, "precision": precision, "recall": recall, "f1": f1}
+        return stats
+
+
+@dataclass(slots=True)
+class SubmissionScan:
+    """Итоги прохода: проверки submission и точность по эталонам"""
+
+    rows: int = 0
+    uids: int = 0
+    required: int = 0
+    missing: int = 0
+    extra: int = 0
+    duplicates: int = 0
+    empty_type: int = 0
+    empty_request: int = 0
+    invalid_method: int = 0
+    invalid_path: int = 0
+    accuracy: dict[str, AccuracyStats] = field(default_factory=dict)
+
+    def validation_errors(self) -> list[str]:
+        """Ошибки валидации без подробностей о данных (пустой список - submission валиден)"""
+        checks = [
+            (self.missing, f"Missing {self.missing} required UIDs"),
+            (self.extra, f"Found {self.extra} extra UIDs not in test set"),
+            (self.empty_type, f"Empty 'type' field in {self.empty_type} predictions"),
+            (self.empty_request, f"Empty 'request' field in {self.empty_request} predictions"),
+            (
+                self.invalid_method,
+                f"Invalid HTTP method in {self.invalid_method} predictions (must be GET/POST/DELETE/etc)",
+            ),
+            (self.invalid_path, f"Invalid API path in {self.invalid_path} predictions (must start with /)"),
+        ]
+        return [message for count, message in checks if count]
+
+
+def scan_submission(
+    submission_path: str | Path,
+    truth_paths: dict[str, str | Path],
+    score: bool = True,
+    memory_mb: float = DEFAULT_MEMORY_MB,
+    on_error: ErrorHandler | None = None,
+) -> SubmissionScan:
+    """
+    Проверить submission и посчитать точность за один проход с соединением по uid
+
+    Args:
+        submission_path: CSV предсказаний (uid;type;request)
+        truth_paths: Эталоны по имени ({"public": ..., "private": ...}); обязательные uid - их объединение
+        score: Считать точность (эталоны с колонками type и request); иначе только проверки по uid
+        memory_mb: Бюджет памяти на раздел; файлы больше бюджета разбиваются на разделы на диске
+        on_error: Вызывается для каждого промаха (пропущенный uid или несовпадение); в пределах
+            раздела - в порядке строк эталона
+
+    Raises:
+        FileReadError: Один из файлов не читается
+    """
+    scan = SubmissionScan()
+    if score:
+        scan.accuracy = {name: AccuracyStats() for name in truth_paths}
+    for partition in iter_partitions({**truth_paths, "": submission_path}, memory_mb):
+        predicted, rows, duplicates = load_rows(partition.pop(""))
+        scan.rows += rows
+        scan.uids += len(predicted)
+        scan.duplicates += duplicates
+        truths = {name: load_rows(rows)[0] for name, rows in partition.items()}
+
+        # Обязательные uid - объединение эталонов; проверки submission - по предсказаниям для них
+        required = next(iter(truths.values())).keys() if len(truths) == 1 else set().union(*truths.values())
+        extra = predicted.keys() - required
+        scan.required += len(required)
+        scan.missing += len(required - predicted.keys())
+        scan.extra += len(extra)
+        checked = [row for row in predicted.values() if row[0] not in extra] if extra else predicted.values()
+        methods = Counter(row[1] for row in checked)
+        starts = Counter(row[2][:1] for row in checked)
+        scan.empty_type += methods.pop("", 0)
+        scan.invalid_method += sum(count for method, count in methods.items() if method not in VALID_HTTP_METHODS)
+        scan.empty_request += starts[""]
+        scan.invalid_path += sum(count for start, count in starts.items() if start not in ("", "/"))
+
+        if score:
+            for name, truth in truths.items():
+                for true_row, prediction in scan.accuracy[name].add_all(truth, predicted):
+                    if on_error is not None:
+                        on_error(true_row[0], "missing" if prediction is None else "mismatch", true_row, prediction)
+    return scan
+
+
+# ============= СЛОВАРИ В ПАМЯТИ ==============================
+
 
 def load_csv_data(file_path: str) -> dict[str, dict[str, str]]:
     """
@@ -165,20 +486,38 @@ def calculate_accuracy(submission: dict[str, dict], ground_truth: dict[str, dict
     return accuracy, metrics
 
 
-def evaluate(submission_path: str, private_test_path: str, public_test_path: str) -> dict:  # noqa: C901
+# ============= ОЦЕНКА ==============================
+
+
+def accuracy_metrics(stats: AccuracyStats) -> tuple[float, dict]:
+    """(accuracy в процентах, метрики) в формате calculate_accuracy; пустой эталон - (0.0, {})"""
+    if not stats.total:
+        return 0.0, {}
+    return stats.accuracy * 100.0, {
+        "total_samples": stats.total,
+        "correct_predictions": stats.correct,
+        "type_accuracy": round(stats.type_accuracy * 100.0, 2),
+        "request_accuracy": round(stats.request_accuracy * 100.0, 2),
+    }
+
+
+def evaluate(  # noqa: C901
+    submission_path: str, private_test_path: str, public_test_path: str, memory_mb: float = DEFAULT_MEMORY_MB
+) -> dict:
     """
     Standard evaluation interface with public/private leaderboard split.
 
-    ПРОЦЕСС ОЦЕНКИ:
-    1. Загрузка всех файлов
+    ПРОЦЕСС ОЦЕНКИ (один потоковый проход по всем файлам):
+    1. Чтение файлов и соединение по UID
     2. СТРОГАЯ валидация submission (наличие всех UID, заполненность полей)
     3. Если валидация провалена - возврат score=0.0 с ошибками
-    4. Если валидация прошла - подсчет accuracy отдельно для public и private
+    4. Если валидация прошла - accuracy отдельно для public и private
 
     Args:
         submission_path: Path to team's submission file
         private_test_path: Path to private test dataset (used for final ranking)
         public_test_path: Path to public test dataset (visible leaderboard during competition)
+        memory_mb: Бюджет памяти прохода (см. scan_submission); файлы больше него разбиваются на разделы на диске
 
     Returns:
         {
@@ -222,18 +561,19 @@ def evaluate(submission_path: str, private_test_path: str, public_test_path: str
         }
 
     try:
-        # ШАГ 2: Загрузка данных
+        # ШАГ 2: Один проход по всем трем файлам с соединением по UID
         try:
-            submission = load_csv_data(submission_path)
-        except Exception as e:
-            return {
-                "public_score": 0.0,
-                "private_score": 0.0,
-                "metrics": {},
-                "errors": [f"Failed to parse submission file: {e!s}"],
-            }
-
-        if not submission:
+            truth_paths = {"public": public_test_path, "private": private_test_path}
+            scan = scan_submission(submission_path, truth_paths, memory_mb=memory_mb)
+        except FileReadError as e:
+            message = {
+                "": f"Failed to parse submission file: {e!s}",
+                "public": f"Failed to load public test (internal error): {e!s}",
+                "private": f"Failed to load private test (internal error): {e!s}",
+            }[e.name]
+            return {"public_score": 0.0, "private_score": 0.0, "metrics": {}, "errors": [message]}
+
+        if not scan.uids:
             return {
                 "public_score": 0.0,
                 "private_score": 0.0,
@@ -241,61 +581,32 @@ def evaluate(submission_path: str, private_test_path: str, public_test_path: str
                 "errors": ["Submission file is empty"],
             }
 
-        try:
-            public_test = load_csv_data(public_test_path)
-        except Exception as e:
-            return {
-                "public_score": 0.0,
-                "private_score": 0.0,
-                "metrics": {},
-                "errors": [f"Failed to load public test (internal error): {e!s}"],
-            }
-
-        try:
-            private_test = load_csv_data(private_test_path)
-        except Exception as e:
-            return {
-                "public_score": 0.0,
-                "private_score": 0.0,
-                "metrics": {},
-                "errors": [f"Failed to load private test (internal error): {e!s}"],
-            }
-
         # ШАГ 3: СТРОГАЯ ВАЛИДАЦИЯ submission
         # Submission должен содержать ВСЕ UID из public + private
-        required_uids = set(public_test.keys()) | set(private_test.keys())
-
-        is_valid, validation_errors = validate_submission(submission, required_uids)
+        validation_errors = scan.validation_errors()
 
-        if not is_valid:
+        if validation_errors:
             # Валидация провалена - возвращаем 0.0 баллов
             return {
                 "public_score": 0.0,
                 "private_score": 0.0,
                 "metrics": {
                     "validation_failed": True,
-                    "submission_size": len(submission),
-                    "required_size": len(required_uids),
+                    "submission_size": scan.uids,
+                    "required_size": scan.required,
                 },
                 "errors": validation_errors,
             }
 
-        # ШАГ 4: Подсчет accuracy (только для валидных submission)
-        public_score = 0.0
-        public_metrics: dict = {}
-        if public_test:
-            public_score, public_metrics = calculate_accuracy(submission, public_test)
-
-        private_score = 0.0
-        private_metrics: dict = {}
-        if private_test:
-            private_score, private_metrics = calculate_accuracy(submission, private_test)
+        # ШАГ 4: Accuracy (только для валидных submission) - посчитана в том же проходе
+        public_score, public_metrics = accuracy_metrics(scan.accuracy["public"])
+        private_score, private_metrics = accuracy_metrics(scan.accuracy["private"])
 
         # Финальные метрики
         combined_metrics = {
             "public_metrics": public_metrics,
             "private_metrics": private_metrics,
-            "submission_size": len(submission),
+            "submission_size": scan.uids,
             "validation_passed": True,
         }
 
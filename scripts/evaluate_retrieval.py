@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Оценка поиска (RAG) на train.csv: качество, задержка и время построения
+
+Разметка релевантности берется из эталонных запросов train.csv: эндпоинт вопроса
+определяет find_endpoint по полю request. Вопросы, эталон которых не сопоставлен
+ни одному описанию, помечаются как несопоставленные (unmatched): в метриках они
+не участвуют и никому не релевантны.
+- Документация API: релевантно одно описание - эндпоинт вопроса; recall@k - доля
+  вопросов, у которых оно в top-k, MRR - по полному ранжированию описаний
+- Few-shot примеры (leave-one-out, вопрос исключается из выдачи): релевантны
+  остальные вопросы с тем же эндпоинтом; recall@k - найденные в top-k релевантные
+  из всех релевантных, precision@k - доля релевантных в top-k, MRR - по первому
+  релевантному в top-depth
+- задержка одиночных запросов (p50/p99, вопрос кодируется моделью без кэша) и
+  время построения индексов
+
+Каждая конфигурация (поиск × модель × бэкенд × индекс примеров) сохраняется в
+отдельный JSON-отчет одной структуры, поэтому отчеты разных запусков (другие
+модели, k, параметры индексов) сравниваются напрямую.
+
+Использование:
+    poetry run evaluate-retrieval --retriever bm25,dense,hybrid --backend torch,onnx-int8 -k 1,3,5,10
+"""
+
+import json
+import re
+import time
+from collections import Counter
+from collections.abc import Callable
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from itertools import product
+from pathlib import Path
+
+import click
+import numpy as np
+
+from src.app.interfaces.embeddings import DEFAULT_BACKEND, DEFAULT_MODEL, Encoder, load_sentence_transformer
+from src.app.interfaces.lexical import BM25Index
+from src.app.interfaces.rag import (
+    DEFAULT_TRAIN_PATH,
+    ApiDoc,
+    ApiDocRetriever,
+    Example,
+    ExampleRetriever,
+    find_endpoint,
+    load_examples,
+    split_api_docs,
+)
+
+DEFAULT_OUTPUT = "data/interim/retrieval_eval"
+RETRIEVERS = ("bm25", "dense", "hybrid")
+
+# Поиск: вопрос -> номера описаний или примеров, лучшие первыми
+Search = Callable[[str], list[int]]
+
+
+@dataclass(slots=True, frozen=True)
+class RetrievalConfig:
+    """Конфигурация поиска; для bm25 модель, бэкенд и индекс не используются"""
+
+    retriever: str
+    model: str = DEFAULT_MODEL
+    backend: str = DEFAULT_BACKEND
+    index: str = "exact"
+
+    @property
+    def name(self) -> str:
+        if self.retriever == "bm25":
+            return "bm25"
+        model = re.sub(r"[^\w.-]+", "_", self.model.rsplit("/", 1)[-1])
+        return f"{self.retriever}-{model}-{self.backend}-{self.index}"
+
+
+# ============= МЕТРИКИ ==============================
+
+
+def docs_metrics(ranks: list[int | None], ks: list[int]) -> dict[str, float]:
+    """recall@k и MRR по позициям (с 1) эталонного описания; None - не найдено"""
+    metrics = {f"recall@{k}": float(np.mean([r is not None and r <= k for r in ranks])) for k in ks}
+    metrics["mrr"] = float(np.mean([1 / r if r else 0.0 for r in ranks]))
+    return metrics
+
+
+def examples_metrics(found: list[list[str | None]], labels: list[str | None], ks: list[int]) -> dict[str, float]:
+    """recall@k, precision@k и MRR по эндпоинтам найденных примеров (без самого вопроса)"""
+    totals = Counter(label for label in labels if label is not None)
+    # Вопросы, у которых есть хотя бы один другой пример того же эндпоинта
+    scored = [(ranking, label) for ranking, label in zip(found, labels, strict=True) if totals[label] > 1]
+    metrics = {}
+    for k in ks:
+        hits = np.array([sum(item == label for item in ranking[:k]) for ranking, label in scored])
+        relevant = np.array([totals[label] - 1 for _, label in scored])
+        metrics[f"recall@{k}"] = float(np.mean(hits / relevant))
+        metrics[f"precision@{k}"] = float(np.mean(hits) / k)
+    reciprocal = []
+    for ranking, label in scored:
+        rank = next((i for i, item in enumerate(ranking, 1) if item == label), None)
+        reciprocal.append(1 / rank if rank else 0.0)
+    metrics["mrr"] = float(np.mean(reciprocal))
+    return metrics
+
+
+def latency_ms(latencies: list[float]) -> dict[str, float]:
+    p50, p99 = np.percentile(np.array(latencies) * 1000, [50, 99])
+    return {"p50": round(float(p50), 3), "p99": round(float(p99), 3)}
+
+
+# ============= ПОИСК ==============================
+
+
+def build_bm25(api_docs: list[ApiDoc], examples: list[Example], depth: int) -> tuple[Search, Search]:
+    docs_index = BM25Index()
+    docs_index.add([f"{d.summary}\n{d.text}" for d in api_docs])
+    examples_index = BM25Index()
+    examples_index.add([e.question for e in examples])
+    return (
+        lambda q: docs_index.search(q, len(api_docs))[1].tolist(),
+        lambda q: examples_index.search(q, depth + 1)[1].tolist(),
+    )
+
+
+def build_dense(
+    config: RetrievalConfig, encoder: Encoder, api_docs: list[ApiDoc], examples: list[Example], depth: int
+) -> tuple[Search, Search]:
+    hybrid = config.retriever == "hybrid"
+    docs_retriever = ApiDocRetriever(api_docs, encoder=encoder, hybrid=hybrid)
+    _ = docs_retriever.vectors
+    examples_retriever = ExampleRetriever(examples, encoder=encoder, index=config.index, hybrid=hybrid)
+    doc_positions = {id(d): i for i, d in enumerate(api_docs)}
+    example_positions = {id(e): i for i, e in enumerate(examples)}
+    return (
+        lambda q: [doc_positions[id(d)] for d, _ in docs_retriever.search(q, len(api_docs))],
+        lambda q: [example_positions[id(e)] for e, _ in examples_retriever.search(q, depth + 1)],
+    )
+
+
+def evaluate(
+    config: RetrievalConfig,
+    encoder: Encoder | None,
+    examples: list[Example],
+    api_docs: list[ApiDoc],
+    ks: list[int],
+    depth: int,
+) -> dict:
+    """JSON-отчет одной конфигурации"""
+    endpoints = [find_endpoint(e.type, e.request, api_docs) for e in examples]
+    labels = [endpoint.summary if endpoint is not None else None for endpoint in endpoints]
+    positions = {id(d): i for i, d in enumerate(api_docs)}
+    gold = [positions[id(endpoint)] if endpoint is not None else None for endpoint in endpoints]
+
+    started = time.perf_counter()
+    if config.retriever == "bm25":
+        search_docs, search_examples = build_bm25(api_docs, examples, depth)
+    else:
+        search_docs, search_examples = build_dense(config, encoder, api_docs, examples, depth)
+    build_seconds = time.perf_counter() - started
+
+    doc_ranks, found, docs_latencies, examples_latencies = [], [], [], []
+    for i, example in enumerate(examples):
+        started = time.perf_counter()
+        ranking = search_docs(example.question)
+        docs_latencies.append(time.perf_counter() - started)
+        if gold[i] is not None:
+            doc_ranks.append(ranking.index(gold[i]) + 1 if gold[i] in ranking else None)
+
+        started = time.perf_counter()
+        ranking = search_examples(example.question)
+        examples_latencies.append(time.perf_counter() - started)
+        found.append([labels[j] for j in ranking if j != i][:depth])
+
+    return {
+        "name": config.name,
+        "config": asdict(config),
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "questions": len(examples),
+        "endpoints": len(api_docs),
+        "unmatched": [e.request for e, label in zip(examples, labels, strict=True) if label is None],
+        "depth": depth,
+        "docs": docs_metrics(doc_ranks, ks),
+        "examples": examples_metrics(found, labels, ks),
+        "latency_ms": {"docs": latency_ms(docs_latencies), "examples": latency_ms(examples_latencies)},
+        "build_seconds": round(build_seconds, 3),
+    }
+
+
+@click.command()
+@click.option("--train", "train_path", type=click.Path(exists=True), default=DEFAULT_TRAIN_PATH)
+@click.option("--retriever", default="bm25,hybrid", help=f"Поиск через запятую: {', '.join(RETRIEVERS)}")
+@click.option("--model", "models", default=DEFAULT_MODEL, help="Модели sentence-transformers через запятую")
+@click.option("--backend", "backends", default=DEFAULT_BACKEND, help="Бэкенды модели через запятую")
+@click.option("--index", "indexes", default="exact", help="Индексы примеров через запятую: exact, ivfpq")
+@click.option("--threads", type=int, default=None, help="Потоков модели")
+@click.option("-k", "ks", default="1,3,5,10", help="Значения k для recall@k через запятую")
+@click.option("--depth", type=int, default=20, help="Глубина выдачи примеров для MRR")
+@click.option("--output", type=click.Path(path_type=Path), default=DEFAULT_OUTPUT, help="Каталог JSON-отчетов")
+def main(
+    train_path: str,
+    retriever: str,
+    models: str,
+    backends: str,
+    indexes: str,
+    threads: int | None,
+    ks: str,
+    depth: int,
+    output: Path,
+) -> None:
+    """Оценить конфигурации поиска на train.csv"""
+    examples = load_examples(train_path)
+    api_docs = split_api_docs()
+    k_values = sorted(int(k) for k in ks.split(","))
+    depth = max(depth, k_values[-1])
+    configs = list(
+        {
+            c.name: c
+            for c in (
+                RetrievalConfig(*values)
+                for values in product(retriever.split(","), models.split(","), backends.split(","), indexes.split(","))
+            )
+        }.values()
+    )
+    unknown = {c.retriever for c in configs} - set(RETRIEVERS)
+    if unknown:
+        raise click.BadParameter(f"Неизвестный поиск: {', '.join(sorted(unknown))}", param_hint="--retriever")
+
+    output.mkdir(parents=True, exist_ok=True)
+    unmatched = sum(find_endpoint(e.type, e.request, api_docs) is None for e in examples)
+    click.echo(f"🎯 {len(configs)} конфигураций, {len(examples)} вопросов, {len(api_docs)} эндпоинтов")
+    if unmatched:
+        click.echo(f"⚠️  {unmatched} вопросов без эндпоинта в документации: в метриках не участвуют")
+    click.echo()
+    recall_header = "/".join(str(k) for k in k_values)
+    click.echo(
+        f"{'Конфигурация':<52} {'Эндпоинты R@' + recall_header:>24} {'MRR':>6} {'Примеры R@' + recall_header:>24} "
+        f"{'MRR':>6} {'p50, мс':>8} {'Построение, с':>13}"
+    )
+    click.echo("-" * 142)
+
+    encoders: dict[tuple[str, str], Encoder] = {}
+    for config in configs:
+        encoder = None
+        try:
+            if config.retriever != "bm25":
+                key = (config.model, config.backend)
+                if key not in encoders:
+                    encoders[key] = load_sentence_transformer(config.model, backend=config.backend, threads=threads)
+                encoder = encoders[key]
+            report = evaluate(config, encoder, examples, api_docs, k_values, depth)
+        except Exception as e:  # нет модели эмбеддингов или ее бэкенда
+            click.echo(f"{config.name:<52} ⚠️  {e}")
+            continue
+        (output / f"{config.name}.json").write_text(json.dumps(report, ensure_ascii=False, indent=2))
+
+        docs, found = report["docs"], report["examples"]
+        docs_recall = "/".join(f"{docs['recall@' + str(k)]:.2f}" for k in k_values)
+        found_recall = "/".join(f"{found['recall@' + str(k)]:.2f}" for k in k_values)
+        latency = report["latency_ms"]["docs"]["p50"] + report["latency_ms"]["examples"]["p50"]
+        click.echo(
+            f"{config.name:<52} {docs_recall:>24} {docs['mrr']:>6.3f} {found_recall:>24} {found['mrr']:>6.3f} "
+            f"{latency:>8.2f} {report['build_seconds']:>13.2f}"
+        )
+    click.echo(f"\n💾 Отчеты: {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -23,6 +23,7 @@ from pathlib import Path
 import click
 from tqdm import tqdm  # type: ignore[import-untyped]
 
+from src.app.core.instruments import format_instrument_hint, get_instrument_resolver
 from src.app.core.llm import call_llm
 
 
@@ -111,6 +112,9 @@ TIME_FRAME_H1, TIME_FRAME_H4, TIME_FRAME_D, TIME_FRAME_W, TIME_FRAME_MN
         prompt += f"Ответ: {ex['type']} {ex['request']}\n\n"
 
     prompt += f'Вопрос: "{question}"\n'
+    hint = format_instrument_hint(get_instrument_resolver().resolve(question))
+    if hint:
+        prompt += f"Подсказка: {hint}\n"
     prompt += "Ответ (только HTTP метод и путь, без объяснений):"
 
     return prompt
@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+"""
+Параллельный перебор промптов и моделей на train.csv с кэшем ответов LLM
+
+Сетка конфигураций (модель × вариант промпта × число примеров × temperature)
+прогоняется на вопросах train.csv одновременно в пуле потоков:
+- вопросы идут в одном (перемешанном с seed) порядке для всех конфигураций, а
+  задачи ставятся в очередь по вопросам, поэтому конфигурации продвигаются вровень
+  и их accuracy сравнима на каждом шаге
+- ответы LLM кэшируются в SQLite по (модель, сообщения, temperature, max_tokens):
+  одинаковые запросы разных конфигураций и повторных запусков не оплачиваются
+  второй раз; при temperature > 0 кэш фиксирует первый полученный ответ
+- accuracy считается по мере прихода ответов по эталону без метода в начале request
+  (в части строк train.csv он записан как "DELETE /v1/..."); рядом печатается
+  accuracy по сырому эталону - так сравнивает scripts/evaluate.py
+- конфигурация останавливается, когда
+  после --min-questions ответов верхняя граница ее доверительного интервала
+  Уилсона ниже нижней границы лучшей - ее оставшиеся вопросы не отправляются
+- few-shot примеры берутся из train.csv без самого вопроса (leave-one-out):
+  static - сбалансированный набор (GET, 2 POST, 1 DELETE), как в generate_submission,
+  bm25 - самые похожие вопросы по BM25
+
+Итоги печатаются таблицей и сохраняются в JSON-отчет с предсказаниями.
+
+Использование:
+    poetry run run-experiments --model openai/gpt-4o-mini,openai/gpt-4o --prompt static,bm25 \\
+        --examples 5,10 --temperature 0,0.3 --workers 8
+"""
+
+import csv
+import hashlib
+import json
+import math
+import random
+import sqlite3
+import threading
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from itertools import product
+from pathlib import Path
+from statistics import NormalDist
+
+import click
+from tqdm import tqdm  # type: ignore[import-untyped]
+
+from scripts.generate_submission import calculate_cost, create_prompt, parse_llm_response
+from src.app.core.instruments import get_instrument_resolver
+from src.app.core.llm import call_llm
+from src.app.interfaces.lexical import BM25Index
+from src.app.interfaces.rag import DEFAULT_TRAIN_PATH
+
+DEFAULT_OUTPUT = "data/interim/experiments"
+DEFAULT_CACHE = "data/interim/experiments/llm_cache.sqlite3"
+MAX_TOKENS = 200
+HTTP_METHODS = ("GET", "POST", "DELETE", "PUT", "PATCH")
+# Ответ при ошибке LLM, как в generate_submission
+FALLBACK = ("GET", "/v1/assets")
+
+_CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    content TEXT NOT NULL,
+    usage TEXT NOT NULL
+);
+"""
+
+
+@dataclass(slots=True, frozen=True)
+class TrainRow:
+    """Вопрос train.csv с эталоном: request без метода в начале, gold - request как в файле"""
+
+    uid: str
+    question: str
+    type: str
+    request: str
+    gold: str
+
+
+@dataclass(slots=True, frozen=True)
+class ExperimentConfig:
+    """Одна точка сетки"""
+
+    model: str
+    prompt: str
+    examples: int
+    temperature: float
+
+    @property
+    def name(self) -> str:
+        return f"{self.model.rsplit('/', 1)[-1]}-{self.prompt}-{self.examples}-t{self.temperature:g}"
+
+
+def load_train(path: str | Path) -> list[TrainRow]:
+    """Строки train.csv; в части эталонов request начинается с метода ("DELETE /v1/...") - он отрезается"""
+    rows = []
+    with open(path, encoding="utf-8") as f:
+        for row in csv.DictReader(f, delimiter=";"):
+            method, _, rest = row["request"].partition(" ")
+            request = rest.strip() if method in HTTP_METHODS and rest else row["request"].strip()
+            rows.append(TrainRow(row["uid"], row["question"], row["type"].strip(), request, row["request"]))
+    return rows
+
+
+# ============= ПРИМЕРЫ ДЛЯ ПРОМПТА ==============================
+
+# Выбор примеров: (номер вопроса, число примеров) -> номера примеров без самого вопроса
+Selector = Callable[[int, int], list[int]]
+
+
+def static_selector(rows: list[TrainRow], seed: int) -> Selector:
+    """
+    Один сбалансированный набор на все вопросы: 1 DELETE, 2 POST, остальное GET
+
+    Вопрос исключается из пулов до выбора по квотам, а нехватку POST/DELETE
+    добирают примеры GET, поэтому в наборе всегда count примеров (если их хватает).
+    """
+    rng = random.Random(seed)
+    # Порядок каждого пула фиксирован: все вопросы получают один и тот же набор (кроме самого вопроса)
+    pools = {
+        method: rng.sample(ids, len(ids))
+        for method in ("GET", "POST", "DELETE")
+        for ids in [[i for i, r in enumerate(rows) if r.type == method]]
+    }
+
+    def take(method: str, index: int, quota: int) -> list[int]:
+        return [i for i in pools[method][: quota + 1] if i != index][:quota]
+
+    def select(index: int, count: int) -> list[int]:
+        delete = take("DELETE", index, min(1, count))
+        post = take("POST", index, min(2, count - len(delete)))
+        return take("GET", index, count - len(post) - len(delete)) + post + delete
+
+    return select
+
+
+def bm25_selector(rows: list[TrainRow]) -> Selector:
+    """Самые похожие по BM25 вопросы"""
+    index = BM25Index()
+    index.add([r.question for r in rows])
+
+    def select(position: int, count: int) -> list[int]:
+        _, ids = index.search(rows[position].question, count + 1)
+        return [i for i in ids.tolist() if i != position][:count]
+
+    return select
+
+
+# ============= КЭШ ОТВЕТОВ ==============================
+
+
+class ResponseCache:
+    """Ответы LLM (текст и usage) в SQLite по хэшу запроса; общий для потоков и запусков"""
+
+    def __init__(self, path: str | Path) -> None:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(_CACHE_SCHEMA)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(model: str, messages: list[dict[str, str]], temperature: float, max_tokens: int) -> str:
+        payload = json.dumps([model, messages, temperature, max_tokens], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key: str) -> tuple[str, dict] | None:
+        with self._lock:
+            row = self._db.execute("SELECT content, usage FROM responses WHERE key = ?", (key,)).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    def put(self, key: str, content: str, usage: dict) -> None:
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, content, usage) VALUES (?, ?, ?)",
+                (key, content, json.dumps(usage)),
+            )
+
+
+# ============= ПРОГОН ==============================
+
+
+@dataclass(slots=True)
+class Answer:
+    """Ответ конфигурации на вопрос"""
+
+    type: str
+    request: str
+    cost: float
+    cached: bool
+    failed: bool
+
+
+@dataclass(slots=True)
+class ConfigRun:
+    """Накопленные результаты конфигурации"""
+
+    config: ExperimentConfig
+    answered: int = 0
+    correct: int = 0
+    correct_raw: int = 0
+    cost: float = 0.0
+    saved: float = 0.0
+    cached: int = 0
+    failed: int = 0
+    stopped_at: int | None = None
+    predictions: dict[str, list[str]] = field(default_factory=dict)
+
+    @property
+    def accuracy(self) -> float:
+        return self.correct / self.answered if self.answered else 0.0
+
+    @property
+    def accuracy_raw(self) -> float:
+        """Accuracy по эталону как в файле (метод в начале request не отрезан), как в scripts/evaluate.py"""
+        return self.correct_raw / self.answered if self.answered else 0.0
+
+    def interval(self, z: float) -> tuple[float, float]:
+        """Доверительный интервал Уилсона для accuracy"""
+        n = self.answered
+        if not n:
+            return 0.0, 1.0
+        p = self.correct / n
+        center = (p + z * z / (2 * n)) / (1 + z * z / n)
+        half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+        return max(center - half, 0.0), min(center + half, 1.0)
+
+    def add(self, row: TrainRow, answer: Answer) -> None:
+        self.answered += 1
+        self.correct += (answer.type, answer.request) == (row.type, row.request)
+        self.correct_raw += (answer.type, answer.request) == (row.type, row.gold)
+        self.predictions[row.uid] = [answer.type, answer.request]
+        self.failed += answer.failed
+        if answer.cached:
+            self.cached += 1
+            self.saved += answer.cost
+        else:
+            self.cost += answer.cost
+
+
+def ask(config: ExperimentConfig, row: TrainRow, examples: list[TrainRow], cache: ResponseCache) -> Answer:
+    """Ответ LLM на вопрос через кэш; cost - стоимость запроса (для кэша - сэкономленная)"""
+    shots = [{"question": e.question, "type": e.type, "request": e.request} for e in examples]
+    prompt = create_prompt(row.question, shots)
+    messages = [{"role": "user", "content": prompt}]
+    key = ResponseCache.key(config.model, messages, config.temperature, MAX_TOKENS)
+    if (hit := cache.get(key)) is not None:
+        content, usage = hit
+        return Answer(*parse_llm_response(content), calculate_cost(usage, config.model), cached=True, failed=False)
+    try:
+        response = call_llm(messages, temperature=config.temperature, max_tokens=MAX_TOKENS, model=config.model)
+        content = response["choices"][0]["message"]["content"].strip()
+    except Exception as e:
+        tqdm.write(f"⚠️  {config.name}: ошибка LLM на '{row.question[:50]}...': {e}")
+        return Answer(*FALLBACK, 0.0, cached=False, failed=True)
+    usage = response.get("usage", {})
+    cache.put(key, content, usage)
+    return Answer(*parse_llm_response(content), calculate_cost(usage, config.model), cached=False, failed=False)
+
+
+def losing(runs: list[ConfigRun], z: float, min_questions: int) -> list[ConfigRun]:
+    """Конфигурации, которые с заданной уверенностью хуже лидера"""
+    active = [r for r in runs if r.answered >= min_questions]
+    if len(active) < 2:
+        return []
+    best_lower = max(r.interval(z)[0] for r in active)
+    return [r for r in active if r.stopped_at is None and r.interval(z)[1] < best_lower]
+
+
+def run_grid(
+    configs: list[ExperimentConfig],
+    rows: list[TrainRow],
+    selectors: dict[str, Selector],
+    cache: ResponseCache,
+    workers: int,
+    z: float,
+    min_questions: int,
+) -> list[ConfigRun]:
+    """Прогнать сетку: вопросы по очереди для всех конфигураций, проигрывающие останавливаются"""
+    runs = {config: ConfigRun(config) for config in configs}
+    pending: dict[ExperimentConfig, list[Future]] = {config: [] for config in configs}
+    tasks: dict[Future, tuple[ExperimentConfig, TrainRow]] = {}
+    progress = tqdm(total=len(configs) * len(rows), desc="Ответы")
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="experiment") as executor:
+        for position, row in enumerate(rows):
+            for config in configs:
+                examples = [rows[i] for i in selectors[config.prompt](position, config.examples)]
+                future = executor.submit(ask, config, row, examples, cache)
+                tasks[future] = (config, row)
+                pending[config].append(future)
+
+        for future in as_completed(tasks):
+            if future.cancelled():
+                continue
+            config, row = tasks[future]
+            runs[config].add(row, future.result())
+            progress.update()
+
+            for run in losing(list(runs.values()), z, min_questions):
+                run.stopped_at = run.answered
+                cancelled = sum(f.cancel() for f in pending[run.config])
+                progress.total -= cancelled
+                progress.refresh()
+                tqdm.write(
+                    f"⏹️  {run.config.name}: {run.accuracy:.1%} после {run.answered} вопросов - остановлена, "
+                    f"не отправлено {cancelled}"
+                )
+            best = max(runs.values(), key=lambda r: r.accuracy)
+            spent = sum(r.cost for r in runs.values())
+            progress.set_postfix({"лучшая": f"{best.accuracy:.1%}", "cost": f"${spent:.4f}"})
+    progress.close()
+    return sorted(runs.values(), key=lambda r: (-r.accuracy, r.cost))
+
+
+@click.command()
+@click.option("--train", "train_path", type=click.Path(exists=True), default=DEFAULT_TRAIN_PATH)
+@click.option("--model", "models", default="openai/gpt-4o-mini", help="Модели OpenRouter через запятую")
+@click.option("--prompt", "prompts", default="static,bm25", help="Варианты промпта через запятую: static, bm25")
+@click.option("--examples", default="5,10", help="Число few-shot примеров через запятую")
+@click.option("--temperature", "temperatures", default="0", help="Значения temperature через запятую")
+@click.option("--workers", type=int, default=8, help="Одновременных запросов к LLM")
+@click.option("--limit", type=int, default=None, help="Взять только первые N вопросов (после перемешивания)")
+@click.option("--min-questions", type=int, default=20, help="Ответов до первой проверки на остановку")
+@click.option("--confidence", type=float, default=0.95, help="Уверенность, с которой конфигурация хуже лидера")
+@click.option("--no-early-stop", is_flag=True, help="Прогнать все конфигурации до конца")
+@click.option("--seed", type=int, default=0)
+@click.option("--cache", "cache_path", type=click.Path(path_type=Path), default=DEFAULT_CACHE, help="Кэш ответов LLM")
+@click.option("--output", type=click.Path(path_type=Path), default=DEFAULT_OUTPUT, help="Каталог JSON-отчетов")
+def main(
+    train_path: str,
+    models: str,
+    prompts: str,
+    examples: str,
+    temperatures: str,
+    workers: int,
+    limit: int | None,
+    min_questions: int,
+    confidence: float,
+    no_early_stop: bool,
+    seed: int,
+    cache_path: Path,
+    output: Path,
+) -> None:
+    """Перебор моделей, промптов, числа примеров и temperature на train.csv"""
+    rows = load_train(train_path)
+    random.Random(seed).shuffle(rows)
+    rows = rows[:limit] if limit else rows
+    configs = [
+        ExperimentConfig(model, prompt, int(count), float(temperature))
+        for model, prompt, count, temperature in product(
+            models.split(","), prompts.split(","), examples.split(","), temperatures.split(",")
+        )
+    ]
+    selectors = {"static": static_selector(rows, seed), "bm25": bm25_selector(rows)}
+    unknown = {c.prompt for c in configs} - set(selectors)
+    if unknown:
+        raise click.BadParameter(f"Неизвестный вариант промпта: {', '.join(sorted(unknown))}", param_hint="--prompt")
+
+    # Индекс инструментов строится до запуска потоков (create_prompt берет его из общего кэша)
+    get_instrument_resolver()
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    click.echo(f"🧪 {len(configs)} конфигураций × {len(rows)} вопросов, потоков: {workers}, кэш: {cache_path}\n")
+    runs = run_grid(
+        configs,
+        rows,
+        selectors,
+        ResponseCache(cache_path),
+        workers,
+        z,
+        len(rows) + 1 if no_early_stop else min_questions,
+    )
+
+    click.echo(
+        f"\n{'Конфигурация':<40} {'Ответов':>8} {'Accuracy':>9} {'Интервал':>13} {'Сырой':>7} {'Стоимость':>10} "
+        f"{'Из кэша':>8} {'Ошибок':>7} {'Статус':>12}"
+    )
+    click.echo("-" * 122)
+    for run in runs:
+        lower, upper = run.interval(z)
+        status = "остановлена" if run.stopped_at is not None else "готово"
+        click.echo(
+            f"{run.config.name:<40} {run.answered:>8} {run.accuracy:>9.1%} {f'{lower:.0%}-{upper:.0%}':>13} "
+            f"{run.accuracy_raw:>7.1%} "
+            f"{'$' + format(run.cost, '.4f'):>10} {run.cached:>8} {run.failed:>7} {status:>12}"
+        )
+    total = sum(r.cost for r in runs)
+    saved = sum(r.saved for r in runs)
+    click.echo("Сырой - accuracy по request из train.csv как есть (метод в начале не отрезан), как в evaluate.py")
+    click.echo(f"\n💰 Потрачено ${total:.4f}, сэкономлено кэшем ${saved:.4f}")
+
+    output.mkdir(parents=True, exist_ok=True)
+    report_path = output / f"{datetime.now():%Y%m%d-%H%M%S}.json"
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "train": str(train_path),
+        "questions": len(rows),
+        "seed": seed,
+        "confidence": confidence,
+        "runs": [
+            {
+                "name": run.config.name,
+                "config": asdict(run.config),
+                "answered": run.answered,
+                "correct": run.correct,
+                "accuracy": run.accuracy,
+                "correct_raw": run.correct_raw,
+                "accuracy_raw": run.accuracy_raw,
+                "interval": run.interval(z),
+                "cost": run.cost,
+                "saved": run.saved,
+                "cached": run.cached,
+                "failed": run.failed,
+                "stopped_at": run.stopped_at,
+                "predictions": run.predictions,
+            }
+            for run in runs
+        ],
+    }
+    report_path.write_text(json.dumps(report, ensure_ascii=False, indent=2))
+    click.echo(f"💾 Отчет: {report_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,9 @@
 - Отсутствие пустых значений
 - Уникальность uid
 
+Файлы читаются потоково (scan_submission из scripts.evaluate) - память не
+зависит от их размера.
+
 Примеры:
     # Проверить data/processed/submission.csv (по умолчанию)
     python3 validate_submission.py
@@ -24,12 +27,54 @@
 
     # Проверить файл по абсолютному пути
     python3 validate_submission.py --file /path/to/submission.csv
+
+    # Сверить с другим набором вопросов
+    python3 validate_submission.py --file submission.csv --test data/interim/logged_questions.csv
 """
 
+import sys
+from pathlib import Path
 from typing import Optional
 
 import click
-from tests.test_submission_validator import SubmissionValidator
+
+if not __package__:
+    # Запуск файлом (python scripts/validate_submission.py): корень репозитория в sys.path для импорта scripts.evaluate
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from scripts.evaluate import HEADER, FileReadError, read_header, scan_submission  # noqa: E402
+
+DEFAULT_SUBMISSION = "data/processed/submission.csv"
+DEFAULT_TEST = "data/processed/test.csv"
+
+
+def run_all_validations(submission_path: Path, test_path: Path) -> list[tuple[str, bool, str]]:
+    """Проверки submission: (название, пройдена, ошибка) за один проход по файлам"""
+    header = read_header(submission_path)
+    scan = scan_submission(submission_path, {"test": test_path}, score=False)
+    checks = [
+        (
+            "Структура файла (uid;type;request)",
+            header == list(HEADER),
+            f"заголовок {';'.join(header) or 'пустой'}, ожидался {';'.join(HEADER)}",
+        ),
+        (
+            "Количество строк совпадает с test.csv",
+            scan.rows == scan.required,
+            f"{scan.rows} строк, в test.csv {scan.required}",
+        ),
+        ("Все uid из test.csv присутствуют", not scan.missing, f"нет {scan.missing} uid"),
+        ("Нет лишних uid", not scan.extra, f"{scan.extra} uid нет в test.csv"),
+        ("Уникальность uid", not scan.duplicates, f"{scan.duplicates} повторных строк"),
+        ("Валидность HTTP методов", not scan.invalid_method, f"{scan.invalid_method} неизвестных методов в type"),
+        ("Валидность API путей", not scan.invalid_path, f"{scan.invalid_path} путей не начинаются с /"),
+        (
+            "Отсутствие пустых значений",
+            not scan.empty_type and not scan.empty_request,
+            f"пустой type в {scan.empty_type}, пустой request в {scan.empty_request} строках",
+        ),
+    ]
+    return [(name, passed, "" if passed else error) for name, passed, error in checks]
 
 
 @click.command()
@@ -38,9 +83,16 @@ from tests.test_submission_validator import SubmissionValidator
     "-f",
     "submission_file",
     type=click.Path(exists=True),
-    help="Путь к файлу submission для проверки. По умолчанию: data/processed/submission.csv",
+    help=f"Путь к файлу submission для проверки. По умолчанию: {DEFAULT_SUBMISSION}",
+)
+@click.option(
+    "--test",
+    "test_file",
+    type=click.Path(exists=True),
+    default=DEFAULT_TEST,
+    help="Путь к test.csv со всеми uid",
 )
-def main(submission_file: Optional[str]) -> int:
+def main(submission_file: Optional[str], test_file: str) -> None:
     """Валидировать submission файл для хакатона"""
 
     print("🚀 Запуск валидации submission файла...")
@@ -48,19 +100,19 @@ def main(submission_file: Optional[str]) -> int:
     if submission_file:
         print(f"📁 Проверяемый файл: {submission_file}")
     else:
-        print("📁 Проверяемый файл: data/processed/submission.csv (по умолчанию)")
+        print(f"📁 Проверяемый файл: {DEFAULT_SUBMISSION} (по умолчанию)")
 
     print("=" * 50)
 
+    submission_path = Path(submission_file or DEFAULT_SUBMISSION)
+    if not submission_path.exists():
+        click.echo(f"❌ Ошибка: Файл submission не найден: {submission_path}", err=True)
+        sys.exit(1)
     try:
-        validator = SubmissionValidator(submission_file)
-        results = validator.run_all_validations()
-    except FileNotFoundError as e:
-        click.echo(f"❌ Ошибка: Файл test.csv не найден: {e}", err=True)
-        return 1
-    except Exception as e:
-        click.echo(f"❌ Ошибка инициализации: {e}", err=True)
-        return 1
+        results = run_all_validations(submission_path, Path(test_file))
+    except FileReadError as e:
+        click.echo(f"❌ Ошибка чтения {'submission' if not e.name else test_file}: {e}", err=True)
+        sys.exit(1)
 
     passed = 0
     failed = 0
@@ -79,10 +131,10 @@ def main(submission_file: Optional[str]) -> int:
 
     if failed == 0:
         click.echo("🎉 Поздравляем! Submission файл полностью валиден.")
-        return 0
+        return
     click.echo("⚠️  Найдены ошибки валидации. Исправьте их перед отправкой.")
-    return 1
+    sys.exit(1)
 
 
 if __name__ == "__main__":
-    exit(main())
+    main()
@@ -1,3 +1,19 @@
+from .conversation_store import ConversationStore, StoredMessage, StoredPayload
 from .finam_client import FinamAPIClient
+from .finam_session import FinamSessionManager, SessionError, get_session_manager
+from .finam_stream import GrpcTransport, LiveOrderBook, MarketDataStream, NdjsonTransport, StreamTransport
 
-__all__ = ["FinamAPIClient"]
+__all__ = [
+    "ConversationStore",
+    "FinamAPIClient",
+    "FinamSessionManager",
+    "GrpcTransport",
+    "LiveOrderBook",
+    "MarketDataStream",
+    "NdjsonTransport",
+    "SessionError",
+    "StoredMessage",
+    "StoredPayload",
+    "StreamTransport",
+    "get_session_manager",
+]
@@ -0,0 +1,307 @@
+"""
+Хранилище диалогов в SQLite
+
+Сообщения и полные ответы API хранятся в отдельных таблицах, поэтому история
+читается без тяжелых payload-ов: для LLM и отображения загружается только окно
+последних сообщений, а ответы API - по требованию. Крупные ответы (свечи,
+сделки) сжимаются и выносятся в файлы рядом с базой. База работает в режиме
+WAL: чтение не блокируется записью, несколько процессов (CLI, Streamlit,
+сервис) могут открывать одну базу и продолжать диалоги друг друга.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from src.app.models.finam_response import loads
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = "data/interim/chat.sqlite3"
+# Сколько последних сообщений загружать в историю
+DEFAULT_WINDOW = 40
+# Сжатые ответы API больше этого размера хранятся в файлах, байты
+SPILL_BYTES = 32 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    title TEXT,
+    meta TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    llm_content TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_session ON messages(session_id, id);
+CREATE TABLE IF NOT EXISTS payloads (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    message_id INTEGER NOT NULL REFERENCES messages(id) ON DELETE CASCADE,
+    method TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    body BLOB,
+    file TEXT
+);
+CREATE INDEX IF NOT EXISTS payloads_message ON payloads(message_id);
+"""
+
+
+@dataclass(slots=True)
+class StoredMessage:
+    """Сообщение диалога без ответов API (они загружаются через payloads())"""
+
+    id: int
+    role: str
+    content: str
+    llm_content: str | None
+    created_at: float
+    # Пути выполненных запросов (сами ответы API загружаются через payloads())
+    paths: list[str] = field(default_factory=list)
+
+    @property
+    def payload_count(self) -> int:
+        return len(self.paths)
+
+    def to_llm(self) -> dict[str, str]:
+        return {"role": self.role, "content": self.llm_content or self.content}
+
+
+@dataclass(slots=True)
+class StoredPayload:
+    """Запрос к API и его полный ответ"""
+
+    method: str
+    path: str
+    response: Any
+    size: int
+
+
+class ConversationStore:
+    """
+    Диалоги в SQLite (WAL) с вынесением крупных ответов API в файлы
+
+    Соединение открывается на каждый поток, поэтому один экземпляр можно
+    разделять между сессиями Streamlit и потоками сервиса.
+    """
+
+    def __init__(
+        self,
+        path: str | os.PathLike | None = None,
+        window: int = DEFAULT_WINDOW,
+        spill_bytes: int = SPILL_BYTES,
+    ) -> None:
+        """
+        Args:
+            path: Файл базы (по умолчанию CHAT_DB_PATH или data/interim/chat.sqlite3)
+            window: Сколько последних сообщений загружать в историю
+            spill_bytes: Порог размера сжатого ответа API для выноса в файл
+        """
+        self.path = Path(path or os.getenv("CHAT_DB_PATH", DEFAULT_DB_PATH))
+        self.payload_dir = self.path.with_name(self.path.name + ".payloads")
+        self.window = window
+        self.spill_bytes = spill_bytes
+        self._local = threading.local()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.payload_dir.mkdir(exist_ok=True)
+        self._connect().executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # В WAL режиме NORMAL не теряет согласованность, только последние транзакции при сбое ОС
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    # ============= СЕССИИ ==============================
+
+    def create_session(self, title: str | None = None, meta: dict[str, Any] | None = None) -> str:
+        session_id = uuid.uuid4().hex
+        now = time.time()
+        self._connect().execute(
+            "INSERT INTO sessions (id, title, meta, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (session_id, title, json.dumps(meta or {}, ensure_ascii=False), now, now),
+        )
+        return session_id
+
+    def has_session(self, session_id: str) -> bool:
+        row = self._connect().execute("SELECT 1 FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return row is not None
+
+    def list_sessions(self, limit: int = 20) -> list[dict[str, Any]]:
+        """Последние активные сессии"""
+        rows = self._connect().execute(
+            "SELECT id, title, updated_at, (SELECT COUNT(*) FROM messages m WHERE m.session_id = s.id) "
+            "FROM sessions s ORDER BY updated_at DESC LIMIT ?",
+            (limit,),
+        )
+        return [{"id": r[0], "title": r[1], "updated_at": r[2], "messages": r[3]} for r in rows]
+
+    def clear(self, session_id: str) -> None:
+        """Удалить сообщения и ответы API сессии (сама сессия остается)"""
+        self._delete(session_id, keep_session=True)
+
+    def delete_session(self, session_id: str) -> None:
+        self._delete(session_id, keep_session=False)
+
+    def _delete(self, session_id: str, keep_session: bool) -> None:
+        conn = self._connect()
+        with _transaction(conn):
+            # Список файлов и удаление строк в одной транзакции: параллельный append не потеряет свои файлы
+            files = conn.execute(
+                "SELECT p.file FROM payloads p JOIN messages m ON m.id = p.message_id "
+                "WHERE m.session_id = ? AND p.file IS NOT NULL",
+                (session_id,),
+            ).fetchall()
+            conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            if not keep_session:
+                conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+        # Файлы удаляются только после фиксации: при откате строки на них еще ссылаются
+        self._unlink([name for (name,) in files])
+
+    # ============= СООБЩЕНИЯ ==============================
+
+    def append(
+        self,
+        session_id: str,
+        role: str,
+        content: str,
+        llm_content: str | None = None,
+        api_requests: list[dict[str, Any]] | None = None,
+    ) -> int:
+        """
+        Добавить сообщение в сессию
+
+        Args:
+            session_id: ID сессии (создается, если ее нет)
+            role: Роль ("user" или "assistant")
+            content: Текст для отображения
+            llm_content: Текст для LLM, если отличается (например, вопрос с подсказками)
+            api_requests: Выполненные запросы [{"method", "path", "response"}]
+
+        Returns:
+            ID сообщения
+        """
+        now = time.time()
+        payloads: list[tuple[str, str, int, bytes | None, str | None]] = []
+        try:
+            # Файлы пишутся до транзакции, чтобы не держать блокировку базы на время записи;
+            # если сообщение не сохранится (ошибка, откат), они удаляются
+            for request in api_requests or []:
+                payloads.append(self._encode_payload(request))
+            conn = self._connect()
+            with _transaction(conn):
+                conn.execute(
+                    "INSERT INTO sessions (id, title, meta, created_at, updated_at) VALUES (?, ?, '{}', ?, ?) "
+                    "ON CONFLICT(id) DO UPDATE SET updated_at = excluded.updated_at, "
+                    "title = COALESCE(sessions.title, excluded.title)",
+                    (session_id, content[:80] if role == "user" else None, now, now),
+                )
+                message_id = conn.execute(
+                    "INSERT INTO messages (session_id, role, content, llm_content, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (session_id, role, content, llm_content if llm_content != content else None, now),
+                ).lastrowid
+                conn.executemany(
+                    "INSERT INTO payloads (message_id, method, path, size, body, file) VALUES (?, ?, ?, ?, ?, ?)",
+                    [(message_id, *p) for p in payloads],
+                )
+        except BaseException:
+            self._unlink([name for *_, name in payloads if name])
+            raise
+        return message_id
+
+    def recent(self, session_id: str, limit: int | None = None) -> list[StoredMessage]:
+        """Последние сообщения сессии в хронологическом порядке (без ответов API)"""
+        rows = self._connect().execute(
+            "SELECT m.id, m.role, m.content, m.llm_content, m.created_at, "
+            "(SELECT group_concat(p.path, char(10)) FROM payloads p WHERE p.message_id = m.id) "
+            "FROM messages m WHERE m.session_id = ? ORDER BY m.id DESC LIMIT ?",
+            (session_id, limit or self.window),
+        ).fetchall()
+        return [StoredMessage(*row[:-1], paths=row[-1].split("\n") if row[-1] else []) for row in reversed(rows)]
+
+    def history(self, session_id: str, system_prompt: str, limit: int | None = None) -> list[dict[str, str]]:
+        """История для LLM: системный промпт и окно последних сообщений"""
+        messages = self.recent(session_id, limit)
+        # Окно не должно начинаться с ответа ассистента без вопроса
+        while messages and messages[0].role != "user":
+            messages.pop(0)
+        return [{"role": "system", "content": system_prompt}, *(m.to_llm() for m in messages)]
+
+    def payloads(self, message_id: int) -> list[StoredPayload]:
+        """Полные ответы API, полученные при подготовке сообщения"""
+        rows = self._connect().execute(
+            "SELECT method, path, size, body, file FROM payloads WHERE message_id = ? ORDER BY id", (message_id,)
+        ).fetchall()
+        result = []
+        for method, path, size, body, name in rows:
+            if body is None:
+                try:
+                    body = (self.payload_dir / name).read_bytes()
+                except OSError as e:
+                    logger.warning("Ответ API %s недоступен: %s", name, e)
+                    result.append(StoredPayload(method, path, {"error": "Ответ API недоступен"}, size))
+                    continue
+            result.append(StoredPayload(method, path, loads(zlib.decompress(body)), size))
+        return result
+
+    def payload_raw(self, message_id: int, path: str) -> bytes | None:
+        """JSON ответа API на запрос path без декодирования (например, для Bars.from_json)"""
+        row = self._connect().execute(
+            "SELECT body, file FROM payloads WHERE message_id = ? AND path = ? ORDER BY id LIMIT 1", (message_id, path)
+        ).fetchone()
+        if row is None:
+            return None
+        body, name = row
+        if body is None:
+            try:
+                body = (self.payload_dir / name).read_bytes()
+            except OSError as e:
+                logger.warning("Ответ API %s недоступен: %s", name, e)
+                return None
+        return zlib.decompress(body)
+
+    def _unlink(self, names: list[str]) -> None:
+        for name in names:
+            (self.payload_dir / name).unlink(missing_ok=True)
+
+    def _encode_payload(self, request: dict[str, Any]) -> tuple[str, str, int, bytes | None, str | None]:
+        raw = json.dumps(request.get("response"), ensure_ascii=False, separators=(",", ":"), default=str).encode()
+        body = zlib.compress(raw, 6)
+        if len(body) <= self.spill_bytes:
+            return request["method"], request["path"], len(raw), body, None
+        name = f"{uuid.uuid4().hex}.json.z"
+        (self.payload_dir / name).write_bytes(body)
+        return request["method"], request["path"], len(raw), None, name
+
+
+@contextmanager
+def _transaction(conn: sqlite3.Connection) -> Iterator[None]:
+    """BEGIN IMMEDIATE ... COMMIT/ROLLBACK для соединения в режиме autocommit"""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
@@ -4,11 +4,25 @@ https://tradeapi.finam.ru/
 """
 import logging
 import os
-from typing import Any, List
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, List
+from urllib.parse import urlsplit
 
 import requests
+from requests.adapters import HTTPAdapter
 
-from src.app.models import FinamRequest
+from src.app.models import Bars, FinamRequest, Order, OrderBookLevel, Position, Quote, Trade
+from src.app.models.finam_response import loads
+
+from .finam_session import FinamSessionManager, get_session_manager
+
+if TYPE_CHECKING:
+    from .finam_stream import MarketDataStream
+
+logger = logging.getLogger(__name__)
+
+# Максимум одновременных запросов в пакетных методах (и размер пула соединений)
+MAX_CONCURRENT_REQUESTS = 16
 
 
 class FinamAPIClient:
@@ -18,23 +32,63 @@ class FinamAPIClient:
     Документация: https://tradeapi.finam.ru/
     """
 
-    def __init__(self, access_token: str | None = None, base_url: str | None = None) -> None:
+    def __init__(self, access_token: str | None = None, base_url: str | None = None, use_jwt: bool = True) -> None:
         """
         Инициализация клиента
 
         Args:
             access_token: Токен доступа к API (из переменной окружения FINAM_ACCESS_TOKEN)
             base_url: Базовый URL API (по умолчанию из документации)
+            use_jwt: Обменивать токен на JWT через /v1/sessions (иначе токен передается как есть)
         """
         self.access_token = access_token or os.getenv("FINAM_ACCESS_TOKEN", "")
         self.base_url = base_url or os.getenv("FINAM_API_BASE_URL", "https://api.finam.ru")
         self.session = requests.Session()
+        self.session.headers.update({"Content-Type": "application/json"})
+        # Пул соединений рассчитан на параллельные запросы из get_quotes()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=MAX_CONCURRENT_REQUESTS)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        # JWT и его фоновое обновление общие для всех клиентов с тем же токеном
+        self.session_manager: FinamSessionManager | None = None
+        if self.access_token and use_jwt:
+            self.session_manager = get_session_manager(self.access_token, self.base_url)
+
+        # Живые котировки и стаканы из подписок (см. subscribe)
+        self.market_data: MarketDataStream | None = None
+
+    def subscribe(self, symbols: List[str], orderbook: bool = True, stream_url: str | None = None) -> None:
+        """
+        Подписаться на котировки (и стаканы) инструментов
+
+        После подписки GET запросы котировок и стакана по этим символам отвечаются
+        из памяти без сетевых запросов, пока поток подключен и данные свежие.
+        С api.finam.ru подписки идут по gRPC, с симулятором - NDJSON по HTTP (см. finam_stream).
+
+        Raises:
+            ImportError: Для api.finam.ru не установлен gRPC SDK (poetry install -E grpc)
+        """
+        from .finam_stream import MarketDataStream
+
+        if self.market_data is None:
+            self.market_data = MarketDataStream(self, stream_url)
+        for symbol in symbols:
+            self.market_data.subscribe_quotes(symbol)
+            if orderbook:
+                self.market_data.subscribe_orderbook(symbol)
+
+    def _auth_headers(self) -> dict[str, str]:
+        """
+        Заголовок авторизации с актуальным JWT (исходный токен - только при use_jwt=False)
 
-        if self.access_token:
-            self.session.headers.update({
-                "Authorization": f"Bearer {self.access_token}",
-                "Content-Type": "application/json",
-            })
+        Raises:
+            SessionError: JWT получить не удалось; исходный secret вместо него не отправляется
+        """
+        if not self.access_token:
+            return {}
+        token = self.session_manager.get_token() if self.session_manager is not None else self.access_token
+        return {"Authorization": f"Bearer {token}"}
 
     def execute_finam_requests(self, requests: List[FinamRequest]) -> dict[str, Any]:
         """
@@ -42,19 +96,35 @@ class FinamAPIClient:
         """
         if not requests:
             return {"error": "No requests provided"}
-        
+
         # Выполняем первый запрос (для простоты)
-        request = requests[0]
-        
-        # Извлекаем путь из URL
+        return self.execute_finam_request(requests[0])
+
+    def execute_finam_request(self, request: FinamRequest) -> dict[str, Any]:
+        """Выполнить один запрос в формате ответа LLM (url может быть полным)"""
+        # Извлекаем путь из URL (LLM пишет https://api.finam.ru, а клиент может смотреть в другой base_url)
         if request.url.startswith(self.base_url):
             path = request.url[len(self.base_url):]
+        elif request.url.startswith(("http://", "https://")):
+            parts = urlsplit(request.url)
+            path = f"{parts.path}?{parts.query}" if parts.query else parts.path
         else:
             path = request.url
-        
+
         # Выполняем запрос
         return self.execute_request(request.method, path, json=request.body)
 
+    def _send(self, method: str, path: str, **kwargs: Any) -> requests.Response:  # noqa: ANN401
+        """Отправить запрос с авторизацией; при 401 обновить JWT и повторить один раз"""
+        url = f"{self.base_url}{path}"
+        response = self.session.request(method, url, headers=self._auth_headers(), timeout=30, **kwargs)
+        if response.status_code == 401 and self.session_manager is not None:
+            # JWT мог быть отозван раньше срока - получаем новый и повторяем один раз
+            self.session_manager.invalidate()
+            response = self.session.request(method, url, headers=self._auth_headers(), timeout=30, **kwargs)
+        response.raise_for_status()
+        return response
+
     def execute_request(self, method: str, path: str, **kwargs: Any) -> dict[str, Any]:  # noqa: ANN401
         """
         Выполнить HTTP запрос к Finam TradeAPI
@@ -70,27 +140,29 @@ class FinamAPIClient:
         Raises:
             requests.HTTPError: Если запрос завершился с ошибкой
         """
-        url = f"{self.base_url}{path}"
+        if self.market_data is not None:
+            live = self.market_data.lookup(method, path, kwargs.get("params"))
+            if live is not None:
+                return live
 
         try:
-            response = self.session.request(method, url, timeout=30, **kwargs)
-            response.raise_for_status()
+            response = self._send(method, path, **kwargs)
 
             # Если ответ пустой (например, для DELETE)
             if not response.content:
                 return {"status": "success", "message": "Operation completed"}
 
-            return response.json()
+            return loads(response.content)
 
         except requests.exceptions.HTTPError as e:
             # Пытаемся извлечь детали ошибки из ответа
-            error_detail = {"error": str(e), "status_code": e.response.status_code if e.response else None}
+            error_detail = {"error": str(e), "status_code": e.response.status_code if e.response is not None else None}
 
             try:
-                if e.response and e.response.content:
+                if e.response is not None and e.response.content:
                     error_detail["details"] = e.response.json()
             except Exception:
-                error_detail["details"] = e.response.text if e.response else None
+                error_detail["details"] = e.response.text if e.response is not None else None
 
             return error_detail
 
@@ -103,6 +175,31 @@ class FinamAPIClient:
         """Получить текущую котировку инструмента"""
         return self.execute_request("GET", f"/v1/instruments/{symbol}/quotes/latest")
 
+    def get_quotes(self, symbols: List[str], max_workers: int = MAX_CONCURRENT_REQUESTS) -> dict[str, Any]:
+        """
+        Получить котировки нескольких инструментов параллельно
+
+        Args:
+            symbols: Символы инструментов (дубликаты игнорируются)
+            max_workers: Максимум одновременных запросов
+
+        Returns:
+            {"quotes": {symbol: ответ quotes/latest}, "errors": {symbol: ошибка}}
+        """
+        unique = list(dict.fromkeys(symbols))
+        result: dict[str, Any] = {"quotes": {}, "errors": {}}
+        if not unique:
+            return result
+
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(unique))) as pool:
+            responses = pool.map(self.get_quote, unique)
+            for symbol, response in zip(unique, responses, strict=True):
+                if "error" in response:
+                    result["errors"][symbol] = response
+                else:
+                    result["quotes"][symbol] = response
+        return result
+
     def get_orderbook(self, symbol: str, depth: int = 10) -> dict[str, Any]:
         """Получить биржевой стакан"""
         return self.execute_request("GET", f"/v1/instruments/{symbol}/orderbook", params={"depth": depth})
@@ -118,6 +215,25 @@ class FinamAPIClient:
             params["interval.end_time"] = end
         return self.execute_request("GET", f"/v1/instruments/{symbol}/bars", params=params)
 
+    def get_bars(
+        self, symbol: str, timeframe: str = "D", start: str | None = None, end: str | None = None
+    ) -> Bars:
+        """
+        Получить исторические свечи сразу в виде массивов NumPy
+
+        В отличие от get_candles() ответ не превращается в список словарей.
+
+        Raises:
+            requests.HTTPError: Если запрос завершился с ошибкой
+        """
+        params = {"timeframe": timeframe}
+        if start:
+            params["interval.start_time"] = start
+        if end:
+            params["interval.end_time"] = end
+        response = self._send("GET", f"/v1/instruments/{symbol}/bars", params=params)
+        return Bars.from_json(response.content)
+
     def get_account(self, account_id: str) -> dict[str, Any]:
         """Получить информацию о счете"""
         return self.execute_request("GET", f"/v1/accounts/{account_id}")
@@ -152,6 +268,85 @@ class FinamAPIClient:
         # Позиции обычно включены в ответ get_account
         return self.execute_request("GET", f"/v1/accounts/{account_id}")
 
+    def get_portfolio(self, account_id: str) -> dict[str, Any]:
+        """
+        Получить счет с актуальными котировками по всем позициям
+
+        Котировки запрашиваются одним пакетом через get_quotes(), поэтому оценка
+        портфеля стоит примерно двух сетевых задержек независимо от числа позиций.
+        """
+        account = self.get_account(account_id)
+        if "error" in account:
+            return account
+        symbols = [p["symbol"] for p in account.get("positions", []) if p.get("symbol")]
+        quotes = self.get_quotes(symbols)
+        return {**account, "quotes": quotes["quotes"], "quote_errors": quotes["errors"]}
+
+    # Типизированные ответы: модели из src.app.models с десятичными полями в Decimal
+
+    def fetch_quote(self, symbol: str) -> Quote:
+        """
+        Получить текущую котировку инструмента в виде Quote
+
+        Raises:
+            requests.HTTPError: Если запрос завершился с ошибкой
+        """
+        response = self._send("GET", f"/v1/instruments/{symbol}/quotes/latest")
+        return Quote.from_response(loads(response.content))
+
+    def fetch_orderbook(self, symbol: str, depth: int = 10) -> list[OrderBookLevel]:
+        """
+        Получить строки биржевого стакана в виде OrderBookLevel
+
+        Raises:
+            requests.HTTPError: Если запрос завершился с ошибкой
+        """
+        response = self._send("GET", f"/v1/instruments/{symbol}/orderbook", params={"depth": depth})
+        rows = loads(response.content).get("orderbook", {}).get("rows", [])
+        return [OrderBookLevel.from_dict(row) for row in rows]
+
+    def fetch_positions(self, account_id: str) -> list[Position]:
+        """
+        Получить открытые позиции счета в виде Position
+
+        Raises:
+            requests.HTTPError: Если запрос завершился с ошибкой
+        """
+        response = self._send("GET", f"/v1/accounts/{account_id}")
+        return [Position.from_dict(position) for position in loads(response.content).get("positions", [])]
+
+    def fetch_orders(self, account_id: str) -> list[Order]:
+        """
+        Получить заявки счета в виде Order
+
+        Raises:
+            requests.HTTPError: Если запрос завершился с ошибкой
+        """
+        response = self._send("GET", f"/v1/accounts/{account_id}/orders")
+        return [Order.from_dict(order) for order in loads(response.content).get("orders", [])]
+
+    def fetch_trades(self, account_id: str, start: str | None = None, end: str | None = None) -> list[Trade]:
+        """
+        Получить историю сделок счета в виде Trade
+
+        Raises:
+            requests.HTTPError: Если запрос завершился с ошибкой
+        """
+        params = {}
+        if start:
+            params["interval.start_time"] = start
+        if end:
+            params["interval.end_time"] = end
+        response = self._send("GET", f"/v1/accounts/{account_id}/trades", params=params)
+        return [Trade.from_dict(trade) for trade in loads(response.content).get("trades", [])]
+
     def get_session_details(self) -> dict[str, Any]:
         """Получить детали текущей сессии"""
-        return self.execute_request("POST", "/v1/sessions/details")
+        if self.session_manager is None:
+            return self.execute_request("POST", "/v1/sessions/details", json={"token": self.access_token})
+        try:
+            return self.execute_request(
+                "POST", "/v1/sessions/details", json={"token": self.session_manager.get_token()}
+            )
+        except Exception as e:
+            return {"error": str(e), "type": type(e).__name__}
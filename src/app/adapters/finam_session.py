@@ -0,0 +1,218 @@
+"""
+Менеджер JWT-сессий Finam TradeAPI
+
+API токен (secret) обменивается на короткоживущий JWT через POST /v1/sessions,
+срок действия берется из POST /v1/sessions/details. JWT кэшируется и
+обновляется в фоновом потоке заранее, до истечения срока действия.
+
+Неудачный обмен запоминается: до повторной попытки (с растущей паузой) get_token
+сразу поднимает SessionError, не блокируя запросы сетевым обменом, а исходный
+secret в запросы к API не подставляется.
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Срок жизни JWT, если /v1/sessions/details не вернул expires_at
+DEFAULT_TOKEN_TTL = 15 * 60
+# За сколько секунд до истечения обновлять токен
+DEFAULT_REFRESH_MARGIN = 60.0
+# Пауза перед повторной попыткой обмена после ошибки (удваивается до MAX_RETRY_DELAY)
+RETRY_DELAY = 5.0
+MAX_RETRY_DELAY = 300.0
+# Таймаут запросов обмена токена: он выполняется под общей блокировкой менеджера
+EXCHANGE_TIMEOUT = 5.0
+
+
+class SessionError(requests.RequestException):
+    """JWT недоступен: обмен токена завершился ошибкой, повтор - после паузы"""
+
+
+def _parse_timestamp(value: Any) -> float | None:  # noqa: ANN401
+    """Преобразовать время из ответа API (ISO 8601 или Unix epoch) в epoch-секунды"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, int | float):
+        # Миллисекунды отличаем по порядку величины
+        return value / 1000 if value > 1e11 else float(value)
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+class FinamSessionManager:
+    """
+    Кэш JWT-токена с проактивным фоновым обновлением
+
+    Один экземпляр на пару (secret, base_url) разделяется всеми клиентами,
+    см. get_session_manager().
+    """
+
+    def __init__(
+        self,
+        secret: str,
+        base_url: str,
+        refresh_margin: float = DEFAULT_REFRESH_MARGIN,
+        timeout: float = EXCHANGE_TIMEOUT,
+    ) -> None:
+        """
+        Args:
+            secret: API токен, выданный для приложения
+            base_url: Базовый URL API
+            refresh_margin: За сколько секунд до истечения обновлять JWT
+            timeout: Таймаут HTTP запросов авторизации
+        """
+        self.secret = secret
+        self.base_url = base_url
+        self.refresh_margin = refresh_margin
+        self.timeout = timeout
+
+        self._http = requests.Session()
+        self._http.headers.update({"Content-Type": "application/json"})
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._refresher: threading.Thread | None = None
+
+        self._token: str | None = None
+        self._expires_at: float = 0.0
+        self._details: dict[str, Any] = {}
+        # Последняя ошибка обмена и время, до которого новый обмен не выполняется
+        self._failure: Exception | None = None
+        self._retry_at: float = 0.0
+        self._retry_delay = RETRY_DELAY
+
+    @property
+    def details(self) -> dict[str, Any]:
+        """Последний ответ /v1/sessions/details (счета, права на market data, срок действия)"""
+        return self._details
+
+    @property
+    def expires_at(self) -> float:
+        """Время истечения текущего JWT (epoch-секунды), 0 если токена нет"""
+        return self._expires_at
+
+    def get_token(self) -> str:
+        """
+        Получить действующий JWT
+
+        Синхронный обмен выполняется только при первом обращении или если фоновое
+        обновление не успело/не смогло обновить токен. В остальных случаях
+        возвращается закэшированное значение без сетевых запросов.
+
+        Raises:
+            SessionError: Обмен токена завершился ошибкой (сейчас или недавно, до повторной попытки)
+        """
+        token = self._token
+        if token and time.time() < self._expires_at:
+            return token
+        self._raise_if_failed()
+
+        with self._lock:
+            if not self._token or time.time() >= self._expires_at:
+                self._raise_if_failed()
+                self._exchange_locked()
+            self._ensure_refresher()
+            return self._token  # type: ignore[return-value]
+
+    def invalidate(self) -> None:
+        """Сбросить токен (например, после 401 от API) и разбудить фоновое обновление"""
+        with self._lock:
+            self._expires_at = 0.0
+        self._wakeup.set()
+
+    def close(self) -> None:
+        """Остановить фоновое обновление и закрыть HTTP сессию"""
+        self._stop.set()
+        self._wakeup.set()
+        if self._refresher and self._refresher.is_alive():
+            self._refresher.join(timeout=self.timeout)
+        self._http.close()
+
+    # ============= ВНУТРЕННЯЯ ЛОГИКА ==============================
+
+    def _raise_if_failed(self) -> None:
+        if self._failure is not None and time.time() < self._retry_at:
+            wait = self._retry_at - time.time()
+            raise SessionError(f"Не удалось получить JWT, повтор через {wait:.0f} с: {self._failure}")
+
+    def _exchange_locked(self) -> None:
+        """Обновить JWT, запомнив ошибку для паузы перед повтором. Вызывать под self._lock"""
+        try:
+            self._refresh_locked()
+        except (requests.RequestException, KeyError, ValueError) as e:
+            self._failure = e
+            self._retry_at = time.time() + self._retry_delay
+            self._retry_delay = min(self._retry_delay * 2, MAX_RETRY_DELAY)
+            raise SessionError(f"Не удалось получить JWT: {e}") from e
+        self._failure, self._retry_delay = None, RETRY_DELAY
+
+    def _refresh_locked(self) -> None:
+        """Обменять secret на новый JWT и запросить его срок действия. Вызывать под self._lock"""
+        response = self._http.post(f"{self.base_url}/v1/sessions", json={"secret": self.secret}, timeout=self.timeout)
+        response.raise_for_status()
+        token = response.json()["token"]
+
+        details: dict[str, Any] = {}
+        try:
+            response = self._http.post(
+                f"{self.base_url}/v1/sessions/details", json={"token": token}, timeout=self.timeout
+            )
+            response.raise_for_status()
+            details = response.json()
+        except requests.RequestException as e:
+            logger.warning("Не удалось получить детали сессии, используется TTL по умолчанию: %s", e)
+
+        expires_at = _parse_timestamp(details.get("expires_at")) or time.time() + DEFAULT_TOKEN_TTL
+
+        self._token = token
+        self._details = details
+        self._expires_at = expires_at
+        logger.debug("JWT обновлен, истекает через %.0f с", expires_at - time.time())
+
+    def _ensure_refresher(self) -> None:
+        if self._refresher is None or not self._refresher.is_alive():
+            self._refresher = threading.Thread(target=self._refresh_loop, name="finam-jwt-refresh", daemon=True)
+            self._refresher.start()
+
+    def _refresh_loop(self) -> None:
+        """Фоновый цикл: спит до момента (expires_at - refresh_margin) и обновляет токен"""
+        while not self._stop.is_set():
+            delay = max(self._expires_at - self.refresh_margin - time.time(), 1.0)
+            self._wakeup.wait(timeout=delay)
+            self._wakeup.clear()
+            if self._stop.is_set():
+                break
+            if time.time() < self._expires_at - self.refresh_margin:
+                continue
+
+            try:
+                with self._lock:
+                    # Токен мог быть уже обновлен синхронно в get_token()
+                    if time.time() >= self._expires_at - self.refresh_margin and time.time() >= self._retry_at:
+                        self._exchange_locked()
+            except Exception as e:
+                logger.error("Фоновое обновление JWT завершилось ошибкой: %s", e)
+                self._stop.wait(timeout=max(self._retry_at - time.time(), 1.0))
+
+
+_managers: dict[tuple[str, str], FinamSessionManager] = {}
+_managers_lock = threading.Lock()
+
+
+def get_session_manager(secret: str, base_url: str) -> FinamSessionManager:
+    """Получить общий для процесса менеджер сессии для пары (secret, base_url)"""
+    key = (secret, base_url)
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None:
+            manager = _managers[key] = FinamSessionManager(secret, base_url)
+        return manager
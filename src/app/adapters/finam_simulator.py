@@ -0,0 +1,831 @@
+#!/usr/bin/env python3
+"""
+Локальный симулятор Finam TradeAPI
+
+HTTP сервер, реализующий REST эндпоинты из API_PROMT и generate_submission:
+сессии, счета, заявки, сделки, транзакции, инструменты, расписания, опционы,
+котировки, стаканы, ленту сделок и свечи, а также потоки для MarketDataStream.
+Рыночные данные синтетические и детерминированные (seed). Задержка, доля ошибок
+и лимит запросов настраиваются, что позволяет гонять клиент, чат и бенчмарки
+без токена и доступа к api.finam.ru.
+
+Использование:
+    poetry run finam-simulator --port 8765 --latency-ms 20 --error-rate 0.01 --rate-limit 200
+
+    with FinamSimulator(SimulatorConfig(seed=42)) as sim:
+        client = FinamAPIClient(access_token="secret", base_url=sim.url)
+"""
+
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+import zlib
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+from urllib.parse import parse_qs, urlsplit
+
+import click
+import numpy as np
+
+from .finam_stream_server import STREAM_PATH, serve_stream, stream_events
+
+# (тикер, MIC, название, ISIN, тип, лот, decimals, min_step, базовая цена)
+ASSETS: list[tuple[str, str, str, str, str, int, int, int, float]] = [
+    ("SBER", "MISX", "Сбербанк России", "RU0009029540", "EQUITIES", 10, 2, 1, 300.0),
+    ("SBERP", "MISX", "Сбербанк России ап", "RU0009029557", "EQUITIES", 10, 2, 1, 300.0),
+    ("GAZP", "MISX", "ГАЗПРОМ ао", "RU0007661625", "EQUITIES", 10, 2, 1, 130.0),
+    ("LKOH", "MISX", "НК ЛУКОЙЛ", "RU0009024277", "EQUITIES", 1, 1, 5, 6500.0),
+    ("ROSN", "MISX", "Роснефть", "RU000A0J2Q06", "EQUITIES", 1, 2, 5, 450.0),
+    ("YNDX", "MISX", "Яндекс", "NL0009805522", "EQUITIES", 1, 1, 5, 4000.0),
+    ("GMKN", "MISX", "ГМК Норильский никель", "RU0007288411", "EQUITIES", 10, 2, 2, 130.0),
+    ("VTBR", "MISX", "Банк ВТБ", "RU000A0JP5V6", "EQUITIES", 1, 3, 5, 80.0),
+    ("AFLT", "MISX", "Аэрофлот", "RU0009062285", "EQUITIES", 10, 2, 1, 60.0),
+    ("MTLR", "MISX", "Мечел", "RU000A0DKXV5", "EQUITIES", 1, 2, 1, 100.0),
+    ("PHOR", "MISX", "ФосАгро", "RU000A0JRKT8", "EQUITIES", 1, 0, 1, 6800.0),
+    ("HYDR", "MISX", "РусГидро", "RU000A0JPKH7", "EQUITIES", 1000, 5, 5, 0.55),
+    ("MOEX", "MISX", "Московская Биржа", "RU000A0JR4A1", "EQUITIES", 10, 2, 1, 180.0),
+    ("PLZL", "MISX", "Полюс", "RU000A0JNAA8", "EQUITIES", 1, 1, 5, 12000.0),
+    ("RTKM", "MISX", "Ростелеком", "RU0008943394", "EQUITIES", 10, 2, 1, 65.0),
+    ("TATN", "MISX", "Татнефть", "RU0009033591", "EQUITIES", 1, 1, 1, 650.0),
+    ("NVTK", "MISX", "НОВАТЭК", "RU000A0DKVS5", "EQUITIES", 1, 1, 2, 1100.0),
+    ("MGNT", "MISX", "Магнит", "RU000A0JKQU8", "EQUITIES", 1, 1, 5, 5000.0),
+    ("CHMF", "MISX", "Северсталь", "RU0009046510", "EQUITIES", 1, 1, 2, 1200.0),
+    ("ALRS", "MISX", "АЛРОСА", "RU0007252813", "EQUITIES", 10, 2, 1, 55.0),
+    ("SNGS", "MISX", "Сургутнефтегаз", "RU0008926258", "EQUITIES", 100, 3, 5, 25.0),
+    ("RIZ5", "RTSX", "RTS-12.25 Индекс РТС", "", "FUTURES", 1, 0, 10, 100000.0),
+    ("SiZ5", "RTSX", "Si-12.25 Доллар США - Российский рубль", "", "FUTURES", 1, 0, 1, 85000.0),
+    ("GDM5", "RTSX", "GOLD-6.25 Золото", "", "FUTURES", 1, 1, 1, 3300.0),
+    ("SVM5", "RTSX", "SILV-6.25 Серебро", "", "FUTURES", 1, 2, 1, 33.0),
+    ("CRM5", "RTSX", "CNY-6.25 Китайский юань - Российский рубль", "", "FUTURES", 1, 3, 1, 11.5),
+    ("BRZ5", "RTSX", "BR-12.25 Нефть Brent", "", "FUTURES", 1, 2, 1, 65.0),
+]
+
+EXCHANGES = [
+    {"mic": "MISX", "name": "Московская Биржа"},
+    {"mic": "RTSX", "name": "Московская Биржа - Срочный рынок"},
+    {"mic": "SPBE", "name": "СПБ Биржа"},
+    {"mic": "XNGS", "name": "NASDAQ/NGS (Global Select Market)"},
+    {"mic": "XNYS", "name": "New York Stock Exchange"},
+]
+
+TIMEFRAME_SECONDS = {
+    "TIME_FRAME_M1": 60,
+    "TIME_FRAME_M5": 300,
+    "TIME_FRAME_M15": 900,
+    "TIME_FRAME_M30": 1800,
+    "TIME_FRAME_H1": 3600,
+    "TIME_FRAME_H2": 7200,
+    "TIME_FRAME_H4": 14400,
+    "TIME_FRAME_H8": 28800,
+    "TIME_FRAME_D": 86400,
+    "TIME_FRAME_W": 7 * 86400,
+    "TIME_FRAME_MN": 30 * 86400,
+    "TIME_FRAME_QR": 91 * 86400,
+}
+# Короткие синонимы из документации и вопросов пользователей
+TIMEFRAME_SECONDS |= {
+    "M1": 60, "M5": 300, "M15": 900, "M30": 1800, "H1": 3600, "H4": 14400, "D": 86400, "W": 7 * 86400,
+    "TF_1MIN": 60, "TF_5MIN": 300, "TF_15MIN": 900, "TF_1HOUR": 3600, "TF_1DAY": 86400,
+}  # fmt: skip
+
+# Коды ошибок gRPC, которые возвращает Finam TradeAPI
+GRPC_INVALID_ARGUMENT = 3
+GRPC_NOT_FOUND = 5
+GRPC_RESOURCE_EXHAUSTED = 8
+GRPC_INTERNAL = 13
+GRPC_UNAVAILABLE = 14
+GRPC_UNAUTHENTICATED = 16
+
+
+@dataclass
+class SimulatorConfig:
+    """Параметры симулятора"""
+
+    seed: int = 42
+    # Задержка ответа: среднее и стандартное отклонение, мс
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    # Доля запросов, завершающихся ошибкой 500/503
+    error_rate: float = 0.0
+    # Лимит запросов в секунду на токен (0 - без ограничения) и размер всплеска
+    rate_limit: float = 0.0
+    burst: int | None = None
+    # Срок жизни выдаваемых JWT, секунды
+    token_ttl: int = 15 * 60
+    # Требовать заголовок Authorization для всех запросов, кроме /v1/sessions
+    require_auth: bool = True
+    # Максимум свечей в одном ответе
+    max_bars: int = 1_000_000
+    # Пауза между событиями в потоковых эндпоинтах, секунды
+    stream_interval: float = 0.1
+
+
+class SimulatorError(Exception):
+    """Ошибка, возвращаемая клиенту в формате gRPC-gateway"""
+
+    def __init__(self, status: int, code: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+        self.code = code
+        self.message = message
+
+
+class TokenBucket:
+    """Ограничитель частоты запросов (token bucket)"""
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+def _value(x: float, decimals: int = 2) -> dict[str, str]:
+    return {"value": f"{x:.{decimals}f}"}
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _parse_time(value: str | None) -> float | None:
+    """ISO 8601 или Unix epoch (секунды/миллисекунды) в epoch-секунды"""
+    if not value:
+        return None
+    if re.fullmatch(r"\d+(\.\d+)?", value):
+        ts = float(value)
+        return ts / 1000 if ts > 1e11 else ts
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except ValueError as e:
+        raise SimulatorError(400, GRPC_INVALID_ARGUMENT, f"invalid time: {value}") from e
+
+
+def _parse_int(query: dict[str, str], name: str, default: int) -> int:
+    """Целый параметр запроса; нечисловое значение - ошибка 400, как у TradeAPI"""
+    value = query.get(name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError as e:
+        raise SimulatorError(400, GRPC_INVALID_ARGUMENT, f"invalid {name}: {value}") from e
+
+
+class FinamSimulator:
+    """HTTP сервер-симулятор Finam TradeAPI"""
+
+    def __init__(self, config: SimulatorConfig | None = None, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.config = config or SimulatorConfig()
+        self.assets = {f"{a[0]}@{a[1]}": a for a in ASSETS}
+        self.stats = {"requests": 0, "errors": 0, "throttled": 0, "unauthorized": 0}
+
+        self._tokens: dict[str, float] = {}
+        self._orders: dict[str, dict[str, dict[str, Any]]] = {}
+        self._buckets: dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+        self._rng = random.Random(self.config.seed)
+        self._stop = threading.Event()
+        self._routes = self._build_routes()
+
+        server_class = type("SimulatorHTTPServer", (ThreadingHTTPServer,), {"request_queue_size": 1024})
+        self._server = server_class((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    # ============= ЖИЗНЕННЫЙ ЦИКЛ ==============================
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FinamSimulator":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="finam-simulator", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FinamSimulator":
+        return self.start()
+
+    def __exit__(self, *exc: object) -> None:
+        self.stop()
+
+    # ============= ОБРАБОТКА ЗАПРОСА ==============================
+
+    def handle(
+        self, method: str, target: str, body: dict[str, Any] | None = None, headers: dict[str, str] | None = None
+    ) -> tuple[int, Any]:
+        """
+        Обработать запрос без сетевого слоя
+
+        Returns:
+            (HTTP статус, тело ответа: dict или уже сериализованные bytes)
+        """
+        headers = headers or {}
+        split = urlsplit(target)
+        query = {k: v[-1] for k, v in parse_qs(split.query).items()}
+        self._count("requests")
+
+        try:
+            self._emulate_network(headers)
+            for route_method, pattern, handler in self._routes:
+                if route_method != method.upper():
+                    continue
+                match = pattern.fullmatch(split.path)
+                if match:
+                    if self.config.require_auth and not split.path.startswith("/v1/sessions"):
+                        self._check_auth(headers)
+                    return 200, handler(match, query, body or {})
+            raise SimulatorError(404, GRPC_NOT_FOUND, f"unknown endpoint: {method} {split.path}")
+        except SimulatorError as e:
+            self._count("errors")
+            return e.status, {"code": e.code, "message": e.message, "details": []}
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    def _emulate_network(self, headers: dict[str, str]) -> None:
+        """Задержка, лимит запросов и случайные ошибки"""
+        config = self.config
+        if config.latency_ms or config.jitter_ms:
+            delay = max(self._rng.gauss(config.latency_ms, config.jitter_ms), 0.0)
+            time.sleep(delay / 1000)
+
+        if config.rate_limit > 0:
+            key = headers.get("Authorization", "")
+            with self._lock:
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    burst = config.burst or max(int(config.rate_limit), 1)
+                    bucket = self._buckets[key] = TokenBucket(config.rate_limit, burst)
+            if not bucket.acquire():
+                self._count("throttled")
+                raise SimulatorError(429, GRPC_RESOURCE_EXHAUSTED, "rate limit exceeded")
+
+        if config.error_rate and self._rng.random() < config.error_rate:
+            if self._rng.random() < 0.5:
+                raise SimulatorError(500, GRPC_INTERNAL, "internal error")
+            raise SimulatorError(503, GRPC_UNAVAILABLE, "service unavailable")
+
+    def _check_auth(self, headers: dict[str, str]) -> None:
+        token = headers.get("Authorization", "").removeprefix("Bearer ").strip()
+        expires_at = self._tokens.get(token)
+        # Выданный симулятором JWT должен быть действующим, прочие токены принимаются как API токены
+        if not token or (expires_at is not None and expires_at < time.time()):
+            self._count("unauthorized")
+            raise SimulatorError(401, GRPC_UNAUTHENTICATED, "token is missing or expired")
+
+    def _build_routes(self) -> list[tuple[str, re.Pattern[str], Callable[..., Any]]]:
+        symbol = r"(?P<symbol>[^/]+@[^/]+)"
+        account = r"(?P<account_id>[^/]+)"
+        routes = [
+            ("POST", r"/v1/sessions", self._create_session),
+            ("POST", r"/v1/sessions/details", self._session_details),
+            ("GET", rf"/v1/accounts/{account}", self._get_account),
+            ("GET", rf"/v1/accounts/{account}/orders", self._get_orders),
+            ("POST", rf"/v1/accounts/{account}/orders", self._place_order),
+            ("GET", rf"/v1/accounts/{account}/orders/(?P<order_id>[^/]+)", self._get_order),
+            ("DELETE", rf"/v1/accounts/{account}/orders/(?P<order_id>[^/]+)", self._cancel_order),
+            ("GET", rf"/v1/accounts/{account}/trades", self._get_account_trades),
+            ("GET", rf"/v1/accounts/{account}/transactions", self._get_transactions),
+            ("GET", r"/v1/assets", self._get_assets),
+            ("GET", r"/v1/assets/clock", self._get_clock),
+            ("GET", r"/v1/exchanges", self._get_exchanges),
+            ("GET", rf"/v1/assets/{symbol}", self._get_asset),
+            ("GET", rf"/v1/assets/{symbol}/params", self._get_asset_params),
+            ("GET", rf"/v1/assets/{symbol}/schedule", self._get_schedule),
+            ("GET", rf"/v1/assets/{symbol}/options", self._get_options),
+            ("GET", rf"/v1/instruments/{symbol}/quotes/latest", self._get_quote),
+            ("GET", rf"/v1/instruments/{symbol}/orderbook", self._get_orderbook),
+            ("GET", rf"/v1/instruments/{symbol}/trades/latest", self._get_latest_trades),
+            ("GET", rf"/v1/instruments/{symbol}/bars", self._get_bars),
+        ]
+        return [(method, re.compile(pattern), handler) for method, pattern, handler in routes]
+
+    # ============= РЫНОЧНАЯ МОДЕЛЬ ==============================
+
+    def _asset(self, symbol: str) -> tuple[str, str, str, str, str, int, int, int, float]:
+        asset = self.assets.get(symbol)
+        if asset is None:
+            raise SimulatorError(404, GRPC_NOT_FOUND, f"instrument {symbol} not found")
+        return asset
+
+    def _step(self, symbol: str) -> tuple[float, int]:
+        """(шаг цены, знаков после запятой)"""
+        *_, decimals, min_step, _ = self._asset(symbol)
+        return min_step / 10**decimals, decimals
+
+    def _price_curve(self, symbol: str, t: np.ndarray) -> np.ndarray:
+        """Детерминированная цена инструмента в моменты времени t (epoch-секунды)"""
+        base = self._asset(symbol)[8]
+        phase = (zlib.crc32(symbol.encode()) ^ self.config.seed) % 1000 / 1000 * 2 * math.pi
+        days = t / 86400
+        log_move = (
+            0.15 * np.sin(2 * np.pi * days / 365 + phase)
+            + 0.05 * np.sin(2 * np.pi * days / 30 + 2 * phase)
+            + 0.01 * np.sin(2 * np.pi * days + 3 * phase)
+            + 0.002 * np.sin(2 * np.pi * days * 288 + phase)
+        )
+        return base * np.exp(log_move)
+
+    def _round(self, symbol: str, price: float) -> float:
+        step, decimals = self._step(symbol)
+        return round(round(price / step) * step, decimals)
+
+    def _mid(self, symbol: str, ts: float | None = None) -> float:
+        return self._round(symbol, float(self._price_curve(symbol, np.array([ts or time.time()]))[0]))
+
+    def _rng_for(self, *parts: Any) -> random.Random:  # noqa: ANN401
+        return random.Random(":".join(map(str, (self.config.seed, *parts))))
+
+    # ============= СЕССИИ ==============================
+
+    def _create_session(self, match: re.Match[str], query: dict[str, str], body: dict[str, Any]) -> dict[str, Any]:
+        if not body.get("secret"):
+            raise SimulatorError(400, GRPC_INVALID_ARGUMENT, "secret is required")
+        token = f"sim.{uuid.uuid4().hex}"
+        with self._lock:
+            self._tokens[token] = time.time() + self.config.token_ttl
+        return {"token": token}
+
+    def _session_details(self, match: re.Match[str], query: dict[str, str], body: dict[str, Any]) -> dict[str, Any]:
+        token = body.get("token", "")
+        expires_at = self._tokens.get(token)
+        if expires_at is None:
+            raise SimulatorError(401, GRPC_UNAUTHENTICATED, "unknown token")
+        return {
+            "created_at": _iso(expires_at - self.config.token_ttl),
+            "expires_at": _iso(expires_at),
+            "md_permissions": [{"quote_level": "QUOTE_LEVEL_DEPTH_OF_MARKET", "mic": mic} for mic in ("MISX", "RTSX")],
+            "account_ids": ["1899011", "ACC-001-A"],
+            "readonly": False,
+        }
+
+    # ============= СЧЕТА И ЗАЯВКИ ==============================
+
+    def _get_account(self, match: re.Match[str], query: dict[str, str], body: dict[str, Any]) -> dict[str, Any]:
+        account_id = match["account_id"]
+        rng = self._rng_for("account", account_id)
+        positions = []
+        equity = cash = rng.randint(50_000, 5_000_000) / 1.0
+        unrealized = 0.0
+        for symbol in rng.sample(sorted(self.assets), rng.randint(3, 8)):
+            lot = self._asset(symbol)[5]
+            quantity = rng.randint(1, 50) * lot
+            current = self._mid(symbol)
+            average = self._round(symbol, current * rng.uniform(0.8, 1.2))
+            pnl = (current - average) * quantity
+            equity += current * quantity
+            unrealized += pnl
+            positions.append({
+                "symbol": symbol,
+                "quantity": _value(quantity, 0),
+                "average_price": _value(average, 4),
+                "current_price": _value(current, 4),
+                "daily_pnl": _value(pnl * rng.uniform(-0.2, 0.2)),
+                "unrealized_pnl": _value(pnl),
+            })
+        return {
+            "account_id": account_id,
+            "type": "UNION",
+            "status": "ACCOUNT_ACTIVE",
+            "equity": _value(equity),
+            "unrealized_profit": _value(unrealized),
+            "positions": positions,
+            "cash": [{"currency_code": "RUB", "units": str(int(cash)), "nanos": 0}],
+            "portfolio_mc": {
+                "available_cash": _value(cash),
+                "initial_margin": _value(equity * 0.25),
+                "maintenance_margin": _value(equity * 0.125),
+            },
+        }
+
+    def _orders_for(self, account_id: str) -> dict[str, dict[str, Any]]:
+        with self._lock:
+            return self._orders.setdefault(account_id, {})
+
+    def _get_orders(self, match: re.Match[str], query: dict[str, str], body: dict[str, Any]) -> dict[str, Any]:
+        return {"orders": list(self._orders_for(match["account_id"]).values())}
+
+    def _get_order(self, match: re.Match[str], query: dict[str, str], body: dict[str, Any]) -> dict[str, Any]:
+        order = self._orders_for(match["account_id"]).get(match["order_id"])
+        if order is None:
+            raise SimulatorError(404, GRPC_NOT_FOUND, f"order {match['order_id']} not found")
+        return order
+
+    def _place_order(self, match: re.Match[str], query: dict[str, str], body: dict[str, Any]) -> dict[str, Any]:
+        account_id = match["account_id"]
+        for field in ("symbol", "quantity", "side", "type"):
+            if not body.get(field):
+                raise SimulatorError(400, GRPC_INVALID_ARGUMENT, f"{field} is required")
+        symbol = body["symbol"]
+        step, _ = self._step(symbol)
+        if body["side"] not in ("SIDE_BUY", "SIDE_SELL"):
+            raise SimulatorError(400, GRPC_INVALID_ARGUMENT, f"invalid side: {body['side']}")
+
+        def _number(value: Any) -> float:  # noqa: ANN401
+            try:
+                return float(value["value"] if isinstance(value, dict) else value)
+            except (KeyError, TypeError, ValueError) as e:
+                raise SimulatorError(400, GRPC_INVALID_ARGUMENT, f"invalid number: {value}") from e
+
+        # Количество в штуках, кратное размеру лота
+        quantity, lot = _number(body["quantity"]), self._asset(symbol)[5]
+        if quantity <= 0 or quantity != int(quantity) or int(quantity) % lot:
+            raise SimulatorError(400, GRPC_INVALID_ARGUMENT, f"quantity must be a positive multiple of lot size {lot}")
+        if body["type"] in ("ORDER_TYPE_LIMIT", "ORDER_TYPE_STOP_LIMIT"):
+            if "limit_price" not in body:
+                raise SimulatorError(400, GRPC_INVALID_ARGUMENT, "limit_price is required")
+            price = _number(body["limit_price"])
+            if abs(round(price / step) * step - price) > step * 1e-6:
+                raise SimulatorError(400, GRPC_INVALID_ARGUMENT, f"limit_price must be a multiple of {step}")
+
+        order_id = str(self._rng.randint(10**8, 10**9 - 1))
+        order = {
+            "order_id": order_id,
+            "exec_id": f"trd.{order_id}",
+            "status": "ORDER_STATUS_FILLED" if body["type"] == "ORDER_TYPE_MARKET" else "ORDER_STATUS_NEW",
+            "order": {"account_id": account_id, **body},
+            "transact_at": _iso(time.time()),
+        }
+        self._orders_for(account_id)[order_id] = order
+        return order
+
+    def _cancel_order(self, match: re.Match[str], query: dict[str, str], body: dict[str, Any]) -> dict[str, Any]:
+        order = self._get_order(match, query, body)
+        if order["status"] in ("ORDER_STATUS_FILLED", "ORDER_STATUS_CANCELED"):
+            raise SimulatorError(400, GRPC_INVALID_ARGUMENT, f"order is {order['status']}")
+        order["status"] = "ORDER_STATUS_CANCELED"
+        order["transact_at"] = _iso(time.time())
+        return order
+
+    def _interval(self, query: dict[str, str], default_span: float) -> tuple[float, float]:
+        end = _parse_time(query.get("interval.end_time") or query.get("to")) or time.time()
+        start = _parse_time(query.get("interval.start_time") or query.get("from")) or end - default_span
+        if start > end:
+            raise SimulatorError(400, GRPC_INVALID_ARGUMENT, "start_time is after end_time")
+        return start, end
+
+    def _get_account_trades(
+        self, match: re.Match[str], query: dict[str, str], body: dict[str, Any]
+    ) -> dict[str, Any]:
+        account_id = match["account_id"]
+        start, end = self._interval(query, 30 * 86400)
+        limit = _parse_int(query, "limit", 50)
+        rng = self._rng_for("trades", account_id, int(start), int(end))
+        symbols = sorted(self.assets)
+        trades = []
+        for ts in sorted(rng.uniform(start, end) for _ in range(limit)):
+            symbol = rng.choice(symbols)
+            trades.append({
+                "trade_id": str(rng.randint(10**9, 10**10)),
+                "symbol": symbol,
+                "price": _value(self._mid(symbol, ts), 4),
+                "size": _value(rng.randint(1, 20) * self._asset(symbol)[5], 0),
+                "side": rng.choice(("SIDE_BUY", "SIDE_SELL")),
+                "timestamp": _iso(ts),
+                "order_id": str(rng.randint(10**8, 10**9)),
+                "account_id": account_id,
+            })
+        return {"trades": trades}
+
+    def _get_transactions(self, match: re.Match[str], query: dict[str, str], body: dict[str, Any]) -> dict[str, Any]:
+        account_id = match["account_id"]
+        start, end = self._interval(query, 30 * 86400)
+        limit = _parse_int(query, "limit", 50)
+        rng = self._rng_for("transactions", account_id, int(start), int(end))
+        categories = ("DEPOSIT", "WITHDRAW", "COMMISSION", "DIVIDEND", "TRADE", "COUPON")
+        transactions = []
+        for ts in sorted(rng.uniform(start, end) for _ in range(limit)):
+            category = rng.choice(categories)
+            amount = rng.uniform(10, 100_000) * (-1 if category in ("WITHDRAW", "COMMISSION") else 1)
+            transactions.append({
+                "id": str(rng.randint(10**9, 10**10)),
+                "category": category,
+                "timestamp": _iso(ts),
+                "symbol": rng.choice(sorted(self.assets)) if category in ("TRADE", "DIVIDEND") else "",
+                "change": {"currency_code": "RUB", "units": str(int(amount)), "nanos": 0},
+                "transaction_category": category,
+            })
+        return {"transactions": transactions}
+
+    # ============= ИНСТРУМЕНТЫ ==============================
+
+    def _get_assets(self, match: re.Match[str], query: dict[str, str], body: dict[str, Any]) -> dict[str, Any]:
+        return {
+            "assets": [
+                {"symbol": symbol, "id": str(zlib.crc32(symbol.encode())), "ticker": a[0], "mic": a[1], "isin": a[3],
+                 "type": a[4], "name": a[2]}
+                for symbol, a in self.assets.items()
+            ]
+        }  # fmt: skip
+
+    def _get_clock(self, match: re.Match[str], query: dict[str, str], body: dict[str, Any]) -> dict[str, Any]:
+        return {"timestamp": _iso(time.time())}
+
+    def _get_exchanges(self, match: re.Match[str], query: dict[str, str], body: dict[str, Any]) -> dict[str, Any]:
+        return {"exchanges": EXCHANGES}
+
+    def _get_asset(self, match: re.Match[str], query: dict[str, str], body: dict[str, Any]) -> dict[str, Any]:
+        symbol = match["symbol"]
+        ticker, mic, name, isin, kind, lot, decimals, min_step, _ = self._asset(symbol)
+        asset = {
+            "board": "TQBR" if mic == "MISX" else "RFUD",
+            "id": str(zlib.crc32(symbol.encode())),
+            "ticker": ticker,
+            "mic": mic,
+            "isin": isin,
+            "type": kind,
+            "name": name,
+            "lot_size": _value(lot, 0),
+            "decimals": decimals,
+            "min_step": str(min_step),
+        }
+        if kind == "FUTURES":
+            asset["expiration_date"] = {"year": 2025, "month": 12 if ticker.endswith("Z5") else 6, "day": 15}
+        return asset
+
+    def _get_asset_params(self, match: re.Match[str], query: dict[str, str], body: dict[str, Any]) -> dict[str, Any]:
+        symbol = match["symbol"]
+        self._asset(symbol)
+        rng = self._rng_for("params", symbol, query.get("account_id", ""))
+        long_rate = rng.uniform(0.1, 0.5)
+        short_rate = rng.uniform(0.15, 0.6)
+        price = self._mid(symbol)
+        return {
+            "symbol": symbol,
+            "account_id": query.get("account_id", ""),
+            "tradeable": True,
+            "longable": {"value": "AVAILABLE", "halted_days": 0},
+            "shortable": {"value": rng.choice(("AVAILABLE", "NOT_AVAILABLE")), "halted_days": 0},
+            "long_risk_rate": _value(long_rate * 100, 4),
+            "long_collateral": {"currency_code": "RUB", "units": str(int(price * long_rate)), "nanos": 0},
+            "short_risk_rate": _value(short_rate * 100, 4),
+            "short_collateral": {"currency_code": "RUB", "units": str(int(price * short_rate)), "nanos": 0},
+        }
+
+    def _get_schedule(self, match: re.Match[str], query: dict[str, str], body: dict[str, Any]) -> dict[str, Any]:
+        symbol = match["symbol"]
+        self._asset(symbol)
+        day = datetime.now(tz=timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+
+        def _session(kind: str, start: tuple[int, int], end: tuple[int, int]) -> dict[str, Any]:
+            return {
+                "type": kind,
+                "interval": {
+                    "start_time": _iso((day + timedelta(hours=start[0], minutes=start[1])).timestamp()),
+                    "end_time": _iso((day + timedelta(hours=end[0], minutes=end[1])).timestamp()),
+                },
+            }
+
+        if day.weekday() >= 5:
+            return {"symbol": symbol, "sessions": [_session("CLOSED", (0, 0), (24, 0))]}
+        # Время UTC, основная сессия Московской Биржи 10:00-18:40 МСК
+        return {
+            "symbol": symbol,
+            "sessions": [
+                _session("CLOSED", (0, 0), (6, 50)),
+                _session("OPENING_AUCTION", (6, 50), (7, 0)),
+                _session("CORE_TRADING", (7, 0), (15, 40)),
+                _session("CLOSING_AUCTION", (15, 40), (15, 50)),
+                _session("CLOSED", (15, 50), (16, 5)),
+                _session("EVENING_TRADING", (16, 5), (20, 50)),
+                _session("CLOSED", (20, 50), (24, 0)),
+            ],
+        }
+
+    def _get_options(self, match: re.Match[str], query: dict[str, str], body: dict[str, Any]) -> dict[str, Any]:
+        symbol = match["symbol"]
+        ticker, mic, *_ = self._asset(symbol)
+        price = self._mid(symbol)
+        magnitude = 10 ** max(int(math.log10(price)) - 1, 0)
+        center = round(price / magnitude) * magnitude
+        options = []
+        for i in range(-5, 6):
+            strike = center + i * magnitude
+            for kind, letter in (("TYPE_CALL", "C"), ("TYPE_PUT", "P")):
+                options.append({
+                    "symbol": f"{ticker}{strike:g}{letter}@{mic}",
+                    "type": kind,
+                    "contract_size": _value(1, 0),
+                    "strike": _value(strike),
+                    "expiration_first_day": {"year": 2025, "month": 12, "day": 1},
+                    "expiration_last_day": {"year": 2025, "month": 12, "day": 18},
+                })
+        return {"symbol": symbol, "options": options}
+
+    # ============= РЫНОЧНЫЕ ДАННЫЕ ==============================
+
+    def _get_quote(self, match: re.Match[str], query: dict[str, str], body: dict[str, Any]) -> dict[str, Any]:
+        symbol = match["symbol"]
+        step, decimals = self._step(symbol)
+        now = time.time()
+        bid = self._mid(symbol, now)
+        rng = self._rng_for("quote", symbol, int(now))
+        day = self._price_curve(symbol, np.array([now - 86400, now - 43200, now - 21600]))
+        return {
+            "symbol": symbol,
+            "quote": {
+                "symbol": symbol,
+                "timestamp": _iso(now),
+                "ask": _value(bid + step, decimals),
+                "ask_size": _value(rng.randint(1, 5000), 0),
+                "bid": _value(bid, decimals),
+                "bid_size": _value(rng.randint(1, 5000), 0),
+                "last": _value(bid, decimals),
+                "last_size": _value(rng.randint(1, 100), 0),
+                "volume": _value(rng.randint(10_000, 10_000_000), 0),
+                "open": _value(float(day[0]), decimals),
+                "high": _value(float(max(day.max(), bid)), decimals),
+                "low": _value(float(min(day.min(), bid)), decimals),
+                "close": _value(float(day[0]), decimals),
+                "change": _value(bid - float(day[0]), decimals),
+            },
+        }
+
+    def _get_orderbook(self, match: re.Match[str], query: dict[str, str], body: dict[str, Any]) -> dict[str, Any]:
+        symbol = match["symbol"]
+        step, decimals = self._step(symbol)
+        depth = min(_parse_int(query, "depth", 20), 100)
+        now = time.time()
+        bid = self._mid(symbol, now)
+        rng = self._rng_for("orderbook", symbol, int(now))
+        rows = [
+            {"price": _value(bid + (i + 1) * step, decimals), "sell_size": _value(rng.randint(1, 2000), 0),
+             "action": "ACTION_ADD", "timestamp": _iso(now)}
+            for i in reversed(range(depth))
+        ]
+        rows += [
+            {"price": _value(bid - i * step, decimals), "buy_size": _value(rng.randint(1, 2000), 0),
+             "action": "ACTION_ADD", "timestamp": _iso(now)}
+            for i in range(depth)
+        ]  # fmt: skip
+        return {"symbol": symbol, "orderbook": {"rows": rows}}
+
+    def _get_latest_trades(self, match: re.Match[str], query: dict[str, str], body: dict[str, Any]) -> dict[str, Any]:
+        symbol = match["symbol"]
+        step, decimals = self._step(symbol)
+        now = time.time()
+        rng = self._rng_for("tape", symbol, int(now))
+        trades = []
+        for i in range(50):
+            ts = now - i * rng.uniform(0.1, 2.0)
+            trades.append({
+                "trade_id": str(rng.randint(10**9, 10**10)),
+                "mpid": "",
+                "timestamp": _iso(ts),
+                "price": _value(self._mid(symbol, ts) + rng.choice((0, step)), decimals),
+                "size": _value(rng.randint(1, 100), 0),
+                "side": rng.choice(("SIDE_BUY", "SIDE_SELL")),
+            })
+        return {"symbol": symbol, "trades": trades}
+
+    def _get_bars(self, match: re.Match[str], query: dict[str, str], body: dict[str, Any]) -> bytes:
+        """Свечи сериализуются сразу в JSON: ответы на годы минуток слишком велики для словарей"""
+        symbol = match["symbol"]
+        step_price, decimals = self._step(symbol)
+        timeframe = query.get("timeframe", "TIME_FRAME_D")
+        step = TIMEFRAME_SECONDS.get(timeframe)
+        if step is None:
+            raise SimulatorError(400, GRPC_INVALID_ARGUMENT, f"unknown timeframe: {timeframe}")
+
+        start, end = self._interval(query, 100 * step)
+        first = math.ceil(start / step) * step
+        count = min(max(int((end - first) // step) + 1, 0), self.config.max_bars)
+        t = first + step * np.arange(count, dtype=np.float64)
+
+        open_ = self._price_curve(symbol, t)
+        close = self._price_curve(symbol, t + step)
+        rng = np.random.default_rng([self.config.seed, zlib.crc32(symbol.encode()), int(first), step])
+        high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.002, count)))
+        low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.002, count)))
+        volume = rng.integers(1, 100_000, count)
+
+        def _fmt(values: np.ndarray) -> list[str]:
+            return np.char.mod(f"%.{decimals}f", np.round(values / step_price) * step_price).tolist()
+
+        timestamps = np.datetime_as_string(t.astype("datetime64[s]"), unit="s").tolist()
+        columns = zip(timestamps, _fmt(open_), _fmt(high), _fmt(low), _fmt(close), volume.tolist(), strict=True)
+        bars = ",".join(
+            f'{{"timestamp":"{ts}Z","open":{{"value":"{o}"}},"high":{{"value":"{h}"}},'
+            f'"low":{{"value":"{lo}"}},"close":{{"value":"{c}"}},"volume":{{"value":"{v}"}}}}'
+            for ts, o, h, lo, c, v in columns
+        )
+        return f'{{"symbol":"{symbol}","bars":[{bars}]}}'.encode()
+
+    # ============= HTTP ==============================
+
+    def _make_handler(self) -> type[BaseHTTPRequestHandler]:
+        simulator = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format: str, *args: Any) -> None:  # noqa: A002, ANN401
+                pass
+
+            def _dispatch(self) -> None:
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                try:
+                    body = json.loads(raw) if raw else None
+                except ValueError:
+                    self._send(400, {"code": GRPC_INVALID_ARGUMENT, "message": "invalid JSON body", "details": []})
+                    return
+
+                if self.command == "GET" and (match := STREAM_PATH.match(self.path.split("?", 1)[0])):
+                    self._stream(match["symbol"], match["kind"])
+                    return
+
+                status, payload = simulator.handle(self.command, self.path, body, dict(self.headers))
+                self._send(status, payload)
+
+            def _send(self, status: int, payload: Any) -> None:  # noqa: ANN401
+                data = payload if isinstance(payload, bytes) else json.dumps(payload, ensure_ascii=False).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, symbol: str, kind: str) -> None:
+                if symbol not in simulator.assets:
+                    self._send(404, {"code": GRPC_NOT_FOUND, "message": f"instrument {symbol} not found"})
+                    return
+                step, _ = simulator._step(symbol)
+                events = stream_events(symbol, kind, tick=step, seed=simulator.config.seed)
+                serve_stream(self, events, simulator._stop, simulator.config.stream_interval)
+
+            do_GET = do_POST = do_DELETE = _dispatch  # noqa: N815
+
+        return Handler
+
+
+@click.command()
+@click.option("--host", default="127.0.0.1", help="Адрес для прослушивания")
+@click.option("--port", type=int, default=8765, help="Порт")
+@click.option("--seed", type=int, default=42, help="Зерно генератора синтетических данных")
+@click.option("--latency-ms", type=float, default=0.0, help="Средняя задержка ответа, мс")
+@click.option("--jitter-ms", type=float, default=0.0, help="Стандартное отклонение задержки, мс")
+@click.option("--error-rate", type=float, default=0.0, help="Доля ответов 500/503 (0..1)")
+@click.option("--rate-limit", type=float, default=0.0, help="Лимит запросов в секунду на токен (0 - без лимита)")
+@click.option("--no-auth", is_flag=True, help="Не требовать заголовок Authorization")
+def main(
+    host: str,
+    port: int,
+    seed: int,
+    latency_ms: float,
+    jitter_ms: float,
+    error_rate: float,
+    rate_limit: float,
+    no_auth: bool,
+) -> None:
+    """Запустить локальный симулятор Finam TradeAPI"""
+    config = SimulatorConfig(
+        seed=seed,
+        latency_ms=latency_ms,
+        jitter_ms=jitter_ms,
+        error_rate=error_rate,
+        rate_limit=rate_limit,
+        require_auth=not no_auth,
+    )
+    simulator = FinamSimulator(config, host=host, port=port)
+    click.echo(f"🧪 Симулятор Finam TradeAPI: {simulator.url}")
+    click.echo(f"   задержка {latency_ms}±{jitter_ms} мс, ошибки {error_rate:.1%}, лимит {rate_limit or '∞'} rps")
+    click.echo(f"   FINAM_API_BASE_URL={simulator.url}")
+    try:
+        simulator.serve_forever()
+    except KeyboardInterrupt:
+        click.echo("\n👋 Симулятор остановлен")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+"""
+Подписки на рыночные данные Finam TradeAPI
+
+Живое состояние котировок и стаканов по каждому символу (MarketDataStream) не
+зависит от транспорта: транспорт (StreamTransport) открывает подписку и отдает
+события в формате ответов gRPC-подписок MarketDataService SubscribeQuote /
+SubscribeOrderBook в JSON (имена полей proto, Decimal как {"value": "..."}):
+
+    {"quote": [{"symbol": "SBER@MISX", "bid": {"value": "..."}, ...}]}
+    {"order_book": [{"symbol": "SBER@MISX", "is_data_snapshot": true, "rows": [...]}]}
+    {"order_book": [{"symbol": "SBER@MISX", "rows": [{"price": {"value": "..."}, "buy_size": {...},
+                                                     "action": "ACTION_UPDATE"}]}]}
+
+Транспорты:
+    GrpcTransport - api.finam.ru по gRPC через официальный SDK finam-sdk (poetry install -E grpc)
+    NdjsonTransport - те же события построчно в HTTP-ответе /v1/instruments/{symbol}/{kind}/stream;
+                      их отдают FinamSimulator и LocalStreamServer
+
+Снимок отдается вместо REST запроса, только пока поток подключен и данные не старше
+max_age; иначе запрос уходит в REST API как обычно.
+"""
+
+import contextlib
+import json
+import logging
+import re
+import socket
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections.abc import Iterator
+from typing import TYPE_CHECKING, Any
+from urllib.parse import urlsplit
+
+import requests
+
+from src.app.models.order_book import OrderBook
+
+if TYPE_CHECKING:
+    from .finam_client import FinamAPIClient
+
+logger = logging.getLogger(__name__)
+
+RECONNECT_DELAY = 1.0
+MAX_RECONNECT_DELAY = 30.0
+# Данные потока старше этого (секунды) не подменяют REST запрос
+MAX_AGE = 5.0
+# Хосты Finam: подписки только по gRPC на том же хосте
+_GRPC_HOSTS = ("finam.ru",)
+GRPC_PORT = 443
+
+_QUOTE_PATH = re.compile(r"^/v1/instruments/(?P<symbol>[^/?]+)/quotes/latest$")
+_ORDERBOOK_PATH = re.compile(r"^/v1/instruments/(?P<symbol>[^/?]+)/orderbook$")
+
+
+class LiveOrderBook(OrderBook):
+    """Стакан, обновляемый из фонового потока: операции защищены блокировкой"""
+
+    __slots__ = ("_lock", "updated_at")
+
+    def __init__(self, symbol: str) -> None:
+        super().__init__(symbol)
+        self._lock = threading.Lock()
+        self.updated_at: float = 0.0
+
+    def apply(self, rows: list[dict[str, Any]], snapshot: bool = False) -> None:
+        with self._lock:
+            super().apply(rows, snapshot)
+            self.updated_at = time.time()
+
+    def summary(self, levels: int = 5, lots: tuple[float, ...] = (1, 10, 100)) -> dict[str, Any]:
+        with self._lock:
+            return super().summary(levels, lots)
+
+    def snapshot(self, depth: int = 10) -> dict[str, Any]:
+        """Снимок стакана в формате ответа GET /v1/instruments/{symbol}/orderbook"""
+        with self._lock:
+            levels = self.levels(depth)
+        rows = [{"price": {"value": str(p)}, "sell_size": {"value": str(s)}} for p, s in reversed(levels["asks"])]
+        rows += [{"price": {"value": str(p)}, "buy_size": {"value": str(s)}} for p, s in levels["bids"]]
+        return {"symbol": self.symbol, "orderbook": {"rows": rows}}
+
+
+# ============= ТРАНСПОРТЫ ==============================
+
+
+class StreamConnection(ABC):
+    """Открытая подписка: события по мере поступления"""
+
+    @abstractmethod
+    def __iter__(self) -> Iterator[dict[str, Any]]:
+        """События подписки; ошибка соединения - исключение, конец потока - конец итерации"""
+
+    @abstractmethod
+    def close(self) -> None:
+        """Прервать подписку (вызывается из другого потока, чтобы разблокировать чтение)"""
+
+
+class StreamTransport(ABC):
+    """Источник подписок на котировки и стаканы"""
+
+    @abstractmethod
+    def connect(self, symbol: str, kind: str) -> StreamConnection:
+        """Открыть подписку kind ("quotes" или "orderbook") на инструмент symbol"""
+
+    def close(self) -> None:
+        """Освободить ресурсы транспорта"""
+
+
+class _NdjsonConnection(StreamConnection):
+    def __init__(self, response: requests.Response) -> None:
+        self._response = response
+
+    def __iter__(self) -> Iterator[dict[str, Any]]:
+        try:
+            for line in self._response.iter_lines(chunk_size=None):
+                if line:
+                    yield json.loads(line)
+        finally:
+            self._response.close()
+
+    def close(self) -> None:
+        # response.close() из другого потока ждет завершения чтения; shutdown сокета его прерывает
+        sock = getattr(getattr(self._response.raw, "connection", None), "sock", None)
+        if sock is not None:
+            with contextlib.suppress(OSError):
+                sock.shutdown(socket.SHUT_RDWR)
+
+
+class NdjsonTransport(StreamTransport):
+    """События построчно в HTTP-ответе (FinamSimulator, LocalStreamServer) через сессию клиента"""
+
+    def __init__(self, client: "FinamAPIClient", stream_url: str | None = None) -> None:
+        self.client = client
+        self.stream_url = stream_url or client.base_url
+
+    def connect(self, symbol: str, kind: str) -> StreamConnection:
+        response = self.client.session.get(
+            f"{self.stream_url}/v1/instruments/{symbol}/{kind}/stream",
+            headers=self.client._auth_headers(),
+            stream=True,
+            timeout=(10, 60),
+        )
+        try:
+            response.raise_for_status()
+        except requests.HTTPError:
+            response.close()
+            raise
+        return _NdjsonConnection(response)
+
+
+class _GrpcConnection(StreamConnection):
+    def __init__(self, call: Any) -> None:  # noqa: ANN401
+        self._call = call
+
+    def __iter__(self) -> Iterator[dict[str, Any]]:
+        from google.protobuf.json_format import MessageToDict
+
+        for response in self._call:
+            yield MessageToDict(response, preserving_proto_field_name=True)
+
+    def close(self) -> None:
+        self._call.cancel()
+
+
+class GrpcTransport(StreamTransport):
+    """
+    Подписки api.finam.ru по gRPC (MarketDataService) через официальный SDK finam-sdk
+
+    SDK сам выпускает и обновляет JWT по секретному токену. Пакет ставится
+    дополнительно: poetry install -E grpc.
+    """
+
+    def __init__(self, secret: str, endpoint: str = f"api.finam.ru:{GRPC_PORT}") -> None:
+        """
+        Args:
+            secret: Токен Finam API (FINAM_ACCESS_TOKEN)
+            endpoint: Адрес gRPC API в виде host:port
+
+        Raises:
+            ImportError: SDK не установлен
+        """
+        try:
+            from finam_trade_api import FinamClient
+        except ImportError as e:
+            raise ImportError("подписки api.finam.ru идут по gRPC: установите poetry install -E grpc") from e
+        self._client = FinamClient(secret=secret, endpoint=endpoint)
+
+    def connect(self, symbol: str, kind: str) -> StreamConnection:
+        from finam_trade_api.market_data import SubscribeOrderBookRequest, SubscribeQuoteRequest
+
+        if kind == "quotes":
+            call = self._client.market_data.SubscribeQuote(SubscribeQuoteRequest(symbols=[symbol]))
+        else:
+            call = self._client.market_data.SubscribeOrderBook(SubscribeOrderBookRequest(symbol=symbol))
+        return _GrpcConnection(call)
+
+    def close(self) -> None:
+        self._client.close()
+
+
+def default_transport(client: "FinamAPIClient", stream_url: str | None = None) -> StreamTransport:
+    """gRPC для хостов Finam, иначе NDJSON по HTTP (симулятор и локальный сервер)"""
+    url = stream_url or client.base_url
+    host = urlsplit(url).hostname or ""
+    if any(host == h or host.endswith(f".{h}") for h in _GRPC_HOSTS):
+        return GrpcTransport(client.access_token, f"{host}:{GRPC_PORT}")
+    return NdjsonTransport(client, url)
+
+
+class MarketDataStream:
+    """
+    Менеджер подписок на котировки и стаканы
+
+    На каждую подписку транспорт открывает долгоживущий поток, который читается в
+    фоновом потоке и переоткрывается при обрывах. Чтение состояния (get_quote,
+    get_orderbook) не выполняет сетевых запросов.
+    """
+
+    def __init__(
+        self,
+        client: "FinamAPIClient",
+        stream_url: str | None = None,
+        max_age: float = MAX_AGE,
+        transport: StreamTransport | None = None,
+    ) -> None:
+        """
+        Args:
+            client: Клиент Finam API (сессия и авторизация)
+            stream_url: Базовый URL потокового API (по умолчанию base_url клиента)
+            max_age: Возраст данных (секунды), после которого lookup уступает REST запросу
+            transport: Транспорт подписок (по умолчанию default_transport())
+
+        Raises:
+            ImportError: Для api.finam.ru нужен gRPC SDK (poetry install -E grpc)
+        """
+        self.client = client
+        self.transport = transport or default_transport(client, stream_url)
+        self.max_age = max_age
+        self._quotes: dict[str, tuple[float, dict[str, Any]]] = {}
+        self._books: dict[str, LiveOrderBook] = {}
+        self._workers: dict[tuple[str, str], threading.Event] = {}
+        # Подключенные сейчас потоки
+        self._connections: dict[tuple[str, str], StreamConnection] = {}
+        self._lock = threading.Lock()
+
+    # ============= ПОДПИСКИ ==============================
+
+    def subscribe_quotes(self, symbol: str) -> None:
+        """Подписаться на котировки инструмента"""
+        self._start(symbol, "quotes")
+
+    def subscribe_orderbook(self, symbol: str) -> None:
+        """Подписаться на стакан инструмента"""
+        with self._lock:
+            self._books.setdefault(symbol, LiveOrderBook(symbol))
+        self._start(symbol, "orderbook")
+
+    def unsubscribe(self, symbol: str) -> None:
+        """Отписаться от всех потоков инструмента и забыть его состояние"""
+        with self._lock:
+            for key in [k for k in self._workers if k[0] == symbol]:
+                self._workers.pop(key).set()
+                self._disconnect(key)
+            self._quotes.pop(symbol, None)
+            self._books.pop(symbol, None)
+
+    def close(self) -> None:
+        """Закрыть все подписки"""
+        with self._lock:
+            for key, stop in self._workers.items():
+                stop.set()
+                self._disconnect(key)
+            self._workers.clear()
+        self.transport.close()
+
+    @property
+    def symbols(self) -> set[str]:
+        """Символы с активными подписками"""
+        return {symbol for symbol, _ in self._workers}
+
+    # ============= СНИМКИ СОСТОЯНИЯ ==============================
+
+    def get_quote(self, symbol: str) -> dict[str, Any] | None:
+        """Последняя котировка в формате GET /v1/instruments/{symbol}/quotes/latest или None"""
+        item = self._quotes.get(symbol)
+        return {"symbol": symbol, "quote": item[1]} if item is not None else None
+
+    def get_orderbook(self, symbol: str, depth: int = 10) -> dict[str, Any] | None:
+        """Текущий стакан или None, если данных по символу еще нет"""
+        book = self._books.get(symbol)
+        if book is None or not book.updated_at:
+            return None
+        return book.snapshot(depth)
+
+    def is_live(self, symbol: str, kind: str) -> bool:
+        """Поток подключен и данные по символу не старше max_age"""
+        if (symbol, kind) not in self._connections:
+            return False
+        if kind == "quotes":
+            updated_at = item[0] if (item := self._quotes.get(symbol)) is not None else 0.0
+        else:
+            updated_at = book.updated_at if (book := self._books.get(symbol)) is not None else 0.0
+        return time.time() - updated_at <= self.max_age
+
+    def lookup(self, method: str, path: str, params: dict[str, Any] | None = None) -> dict[str, Any] | None:
+        """Ответить на REST запрос из живого состояния, если он покрыт подпиской и данные свежие"""
+        if method.upper() != "GET":
+            return None
+        path = path.split("?", 1)[0]
+        if (match := _QUOTE_PATH.match(path)) and self.is_live(match["symbol"], "quotes"):
+            return self.get_quote(match["symbol"])
+        if (match := _ORDERBOOK_PATH.match(path)) and self.is_live(match["symbol"], "orderbook"):
+            depth = int((params or {}).get("depth", 10))
+            return self.get_orderbook(match["symbol"], depth)
+        return None
+
+    # ============= ОБРАБОТКА ПОТОКА ==============================
+
+    def handle_event(self, event: dict[str, Any]) -> None:
+        """Применить одно событие потока (ответ SubscribeQuote или SubscribeOrderBook) к состоянию"""
+        now = time.time()
+        for quote in event.get("quote", []):
+            symbol = quote.get("symbol")
+            if symbol and (symbol, "quotes") in self._workers:
+                # Поля, которых нет в событии, остаются от предыдущей котировки
+                previous = item[1] if (item := self._quotes.get(symbol)) is not None else {}
+                self._quotes[symbol] = (now, {**previous, **quote})
+        for update in event.get("order_book", []):
+            if (book := self._books.get(update.get("symbol", ""))) is not None:
+                book.apply(update.get("rows", []), snapshot=bool(update.get("is_data_snapshot")))
+        if error := event.get("error"):
+            logger.warning("Ошибка потока: %s", error)
+
+    def _start(self, symbol: str, kind: str) -> None:
+        with self._lock:
+            if (symbol, kind) in self._workers:
+                return
+            stop = self._workers[symbol, kind] = threading.Event()
+        threading.Thread(
+            target=self._run, args=((symbol, kind), stop), name=f"finam-stream-{symbol}-{kind}", daemon=True
+        ).start()
+
+    def _disconnect(self, key: tuple[str, str]) -> None:
+        if (connection := self._connections.pop(key, None)) is not None:
+            connection.close()
+
+    def _run(self, key: tuple[str, str], stop: threading.Event) -> None:
+        """Читать поток до отписки, переподключаясь с экспоненциальной задержкой"""
+        delay = RECONNECT_DELAY
+        while not stop.is_set():
+            connection: StreamConnection | None = None
+            try:
+                connection = self.transport.connect(*key)
+                with self._lock:
+                    if stop.is_set():
+                        connection.close()
+                        return
+                    self._connections[key] = connection
+                delay = RECONNECT_DELAY
+                for event in connection:
+                    if stop.is_set():
+                        return
+                    self.handle_event(event)
+            # Ошибки транспорта приходят из его библиотеки (requests, grpc)
+            except Exception as e:
+                if not stop.is_set():
+                    logger.warning("Поток %s %s прерван: %s", *key, e)
+            finally:
+                # Пока поток не подключен заново, запросы идут в REST
+                with self._lock:
+                    if connection is not None and self._connections.get(key) is connection:
+                        self._disconnect(key)
+            stop.wait(timeout=delay)
+            delay = min(delay * 2, MAX_RECONNECT_DELAY)
@@ -0,0 +1,206 @@
+"""
+Локальный сервер-заглушка потоковых рыночных данных
+
+Отдает NDJSON-потоки /v1/instruments/{symbol}/quotes/stream и /orderbook/stream
+с синтетическими данными (случайное блуждание цены). Каждая строка - ответ
+gRPC-подписки SubscribeQuote / SubscribeOrderBook в JSON (см. finam_stream), поэтому
+MarketDataStream читает их через NdjsonTransport так же, как api.finam.ru через gRPC.
+Используется для тестов и отладки подписок без доступа к api.finam.ru; те же потоки
+отдает FinamSimulator (общие STREAM_PATH, stream_events и serve_stream).
+
+Использование:
+    with LocalStreamServer(interval=0.05) as server:
+        client = FinamAPIClient(access_token="test", base_url=server.url, use_jwt=False)
+        client.subscribe(["SBER@MISX"])
+"""
+
+import json
+import random
+import re
+import threading
+import time
+from collections.abc import Iterator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+STREAM_PATH = re.compile(r"^/v1/instruments/(?P<symbol>[^/?]+)/(?P<kind>quotes|orderbook)/stream$")
+
+
+def _value(x: float) -> dict[str, str]:
+    return {"value": f"{x:.2f}"}
+
+
+def stream_events(
+    symbol: str, kind: str, depth: int = 10, tick: float = 0.01, seed: int | None = None
+) -> Iterator[dict[str, Any]]:
+    """
+    Бесконечный генератор синтетических событий потока
+
+    Args:
+        symbol: Символ инструмента
+        kind: "quotes" или "orderbook" (первое событие стакана - полный снимок)
+        depth: Глубина стакана в снимке
+        tick: Шаг цены
+        seed: Зерно генератора для воспроизводимых данных
+    """
+    rng = random.Random(f"{seed}:{symbol}" if seed is not None else None)
+    mid = round(rng.uniform(50, 500) / tick) * tick
+
+    if kind == "orderbook":
+        rows = [{"price": _value(mid + (i + 1) * tick), "sell_size": _value(rng.randint(1, 500))} for i in range(depth)]
+        rows += [{"price": _value(mid - i * tick), "buy_size": _value(rng.randint(1, 500))} for i in range(depth)]
+        yield {"order_book": [{"symbol": symbol, "rows": rows, "is_data_snapshot": True}]}
+
+    while True:
+        if kind == "quotes":
+            mid += rng.choice((-1, 0, 1)) * tick
+            yield {
+                "quote": [{
+                    "symbol": symbol,
+                    "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                    "ask": _value(mid + tick),
+                    "ask_size": _value(rng.randint(1, 500)),
+                    "bid": _value(mid),
+                    "bid_size": _value(rng.randint(1, 500)),
+                    "last": _value(mid),
+                    "last_size": _value(rng.randint(1, 50)),
+                }],
+            }
+        else:
+            level = rng.randint(0, depth - 1)
+            is_ask = rng.random() < 0.5
+            price = mid + (level + 1) * tick if is_ask else mid - level * tick
+            size = rng.randint(0, 500)
+            yield {
+                "order_book": [{
+                    "symbol": symbol,
+                    "rows": [{
+                        "price": _value(price),
+                        "sell_size" if is_ask else "buy_size": _value(size),
+                        "action": "ACTION_UPDATE" if size else "ACTION_REMOVE",
+                    }],
+                }],
+            }
+
+
+def serve_stream(
+    handler: BaseHTTPRequestHandler, events: Iterator[dict[str, Any]], stop: threading.Event, interval: float
+) -> None:
+    """
+    Отдать события построчно (NDJSON) в ответ на запрос handler
+
+    Каждое событие уходит отдельным блоком chunked-ответа (HTTP/1.1), чтобы клиент
+    получал его сразу. Поток идет, пока не установлен stop или клиент не разорвал
+    соединение; соединение после этого закрывается.
+    """
+    handler.close_connection = True
+    handler.send_response(200)
+    handler.send_header("Content-Type", "application/x-ndjson")
+    handler.send_header("Transfer-Encoding", "chunked")
+    handler.send_header("Connection", "close")
+    handler.end_headers()
+    try:
+        for event in events:
+            if stop.is_set():
+                break
+            data = json.dumps(event).encode() + b"\n"
+            handler.wfile.write(b"%X\r\n%s\r\n" % (len(data), data))
+            handler.wfile.flush()
+            if stop.wait(interval):
+                break
+        handler.wfile.write(b"0\r\n\r\n")
+    except (BrokenPipeError, ConnectionResetError):
+        pass
+
+
+class LocalStreamServer:
+    """HTTP сервер с синтетическими потоками котировок и стаканов"""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        interval: float = 0.1,
+        depth: int = 10,
+        tick: float = 0.01,
+        seed: int | None = None,
+    ) -> None:
+        """
+        Args:
+            host: Адрес для прослушивания
+            port: Порт (0 - выбрать свободный)
+            interval: Пауза между событиями потока в секундах
+            depth: Глубина стакана в снимке
+            tick: Шаг цены
+            seed: Зерно генератора для воспроизводимых данных
+        """
+        self.interval = interval
+        self.depth = depth
+        self.tick = tick
+        self.seed = seed
+        # Количество открытых потоков за все время (переподключения видны как рост)
+        self.connections = 0
+        self._streams: set[threading.Event] = set()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "LocalStreamServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="local-stream-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.disconnect()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "LocalStreamServer":
+        return self.start()
+
+    def __exit__(self, *exc: object) -> None:
+        self.stop()
+
+    def disconnect(self) -> None:
+        """Оборвать все открытые потоки (клиенты переподключатся сами)"""
+        with self._lock:
+            for stop in self._streams:
+                stop.set()
+            self._streams.clear()
+
+    def events(self, symbol: str, kind: str) -> Iterator[dict[str, Any]]:
+        """Бесконечный генератор событий потока для символа"""
+        return stream_events(symbol, kind, depth=self.depth, tick=self.tick, seed=self.seed)
+
+    def _make_handler(self) -> type[BaseHTTPRequestHandler]:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format: str, *args: Any) -> None:  # noqa: A002, ANN401
+                pass
+
+            def do_GET(self) -> None:  # noqa: N802
+                match = STREAM_PATH.match(self.path.split("?", 1)[0])
+                if not match:
+                    self.send_error(404)
+                    return
+
+                stop = threading.Event()
+                with server._lock:
+                    server._streams.add(stop)
+                    server.connections += 1
+                try:
+                    serve_stream(self, server.events(match["symbol"], match["kind"]), stop, server.interval)
+                finally:
+                    with server._lock:
+                        server._streams.discard(stop)
+
+        return Handler
@@ -1,6 +1,18 @@
 """Основная логика приложения"""
 
 from .config import Settings, get_settings
-from .llm import call_llm
+from .instruments import InstrumentCandidate, InstrumentResolver, get_instrument_resolver
+from .llm import call_llm, stream_llm
+from .pretrade import OrderCheck, PreTradeValidator
 
-__all__ = ["Settings", "call_llm", "get_settings"]
+__all__ = [
+    "InstrumentCandidate",
+    "InstrumentResolver",
+    "OrderCheck",
+    "PreTradeValidator",
+    "Settings",
+    "call_llm",
+    "get_instrument_resolver",
+    "get_settings",
+    "stream_llm",
+]
@@ -0,0 +1,345 @@
+"""
+Поиск инструментов по названиям компаний и тикерам
+
+Вопросы пользователей содержат "Сбербанк", "Роснефти", "Газпрому", а API ждет
+символ вида SBER@MISX. Индекс строится заранее из таблицы алиасов и снимка
+/v1/assets: пословный trie по основам слов (lexical_terms и стеммер Snowball из
+lexical.py) для точных совпадений и индекс триграмм для нечеткого поиска опечаток.
+
+Названия из справочника /v1/assets и названия, совпадающие с обычными словами
+(PROPER_NAMES: "ПИК"), находятся, только если слово в вопросе написано как имя
+собственное: с заглавной буквы не в начале предложения, прописными или в кавычках.
+Слова, написанные строчными, сопоставляются только с таблицей алиасов ALIASES,
+поэтому "Пик активности" не дает PIKK@MISX.
+"""
+
+import logging
+import re
+from collections import defaultdict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any
+
+from src.app.interfaces.lexical import lexical_terms, stem
+
+if TYPE_CHECKING:
+    from src.app.adapters import FinamAPIClient
+
+logger = logging.getLogger(__name__)
+
+# Символ -> разговорные названия (строчными; совпадают при любом написании). Дополняется названиями из /v1/assets
+ALIASES: dict[str, list[str]] = {
+    "SBER@MISX": ["сбербанк", "сбер", "сбербанк россии"],
+    "SBERP@MISX": ["сбербанк префы", "сбер преф", "привилегированные акции сбербанка"],
+    "GAZP@MISX": ["газпром"],
+    "SIBN@MISX": ["газпром нефть", "газпромнефть"],
+    "LKOH@MISX": ["лукойл"],
+    "ROSN@MISX": ["роснефть"],
+    "YNDX@MISX": ["яндекс", "yandex"],
+    "GMKN@MISX": ["норникель", "норильский никель", "гмк"],
+    "VTBR@MISX": ["втб", "банк втб"],
+    "AFLT@MISX": ["аэрофлот"],
+    "MTLR@MISX": ["мечел"],
+    "PHOR@MISX": ["фосагро"],
+    "HYDR@MISX": ["русгидро"],
+    "MOEX@MISX": ["мосбиржа", "московская биржа"],
+    "PLZL@MISX": ["полюс", "полюс золото"],
+    "RTKM@MISX": ["ростелеком"],
+    "TATN@MISX": ["татнефть"],
+    "NVTK@MISX": ["новатэк"],
+    "MGNT@MISX": ["магнит"],
+    "CHMF@MISX": ["северсталь"],
+    "ALRS@MISX": ["алроса"],
+    "SNGS@MISX": ["сургутнефтегаз", "сургут"],
+    "NLMK@MISX": ["нлмк", "новолипецкий металлургический комбинат"],
+    "TRNFP@MISX": ["транснефть"],
+    "RUAL@MISX": ["русал"],
+    "IRAO@MISX": ["интер рао"],
+    "POLY@MISX": ["полиметалл"],
+    "FEES@MISX": ["фск еэс", "россети"],
+    "VKCO@MISX": ["vk", "вк", "вконтакте"],
+    "UPRO@MISX": ["юнипро"],
+    "FIVE@MISX": ["x5", "икс 5", "пятерочка"],
+    "MTSS@MISX": ["мтс"],
+    "AAPL@XNGS": ["apple", "эппл", "эпл"],
+    "MSFT@XNGS": ["microsoft", "майкрософт"],
+    "AMZN@XNGS": ["amazon", "амазон"],
+    "RIZ5@RTSX": ["фьючерс ртс", "индекс ртс", "ртс"],
+    "SiZ5@RTSX": ["фьючерс на доллар", "доллар рубль", "доллар-рубль", "si"],
+    "CRM5@RTSX": ["фьючерс на юань", "юань"],
+    "GDM5@RTSX": ["фьючерс на золото", "золото"],
+    "SVM5@RTSX": ["фьючерс на серебро", "серебро"],
+    "BRZ5@RTSX": ["фьючерс на нефть", "нефть brent", "брент"],
+}
+
+# Названия, которые совпадают с обычными словами: только если в вопросе они написаны как имя собственное
+PROPER_NAMES: dict[str, list[str]] = {
+    "PIKK@MISX": ["ПИК"],
+}
+
+# Окончания падежей, с которыми в индекс добавляются основы названия: стеммер не всегда
+# сводит формы имени собственного к одной основе ("газпром" -> "газпр", "газпрома" -> "газпром")
+_CASE_ENDINGS = (
+    "", "а", "я", "у", "ю", "е", "и", "ы", "ом", "ем", "ой", "ей", "ью", "ов", "ев", "ам", "ям", "ах", "ях",
+)  # fmt: skip
+_FINAL_VOWELS = "аяоеиыйь"
+# Слова, которые не несут названия инструмента (сравниваются по основам)
+_STOPWORDS = frozenset(
+    "акции акций акциям акциями акция по на для в во и или у о об про за с со от до мой моих мои моя "
+    "цена цену котировка стакан свечи покажи какая какой какие дай купи купить продай продать".split()
+)
+_STOP_TERMS = frozenset(term for word in _STOPWORDS for term in lexical_terms(word))
+
+_TOKEN_RE = re.compile(r"[0-9A-Za-zА-Яа-яЁё]+(?:[-@][0-9A-Za-zА-Яа-яЁё]+)*")
+_SYMBOL_RE = re.compile(r"\b([A-Za-z0-9]{1,12})@([A-Z]{2,6})\b")
+_TICKER_RE = re.compile(r"\b[A-Z][A-Z0-9]{1,5}\b")
+_CYRILLIC_RE = re.compile(r"[а-я]+")
+# Знаки конца предложения: заглавная буква следующего слова не говорит об имени собственном
+_SENTENCE_END = ".!?"
+
+_EXACT_SCORE = 1.0
+_TICKER_SCORE = 0.95
+_FUZZY_THRESHOLD = 0.5
+
+
+@dataclass(slots=True)
+class Token:
+    """Слово вопроса или названия"""
+
+    text: str
+    # Термины lexical_terms: основа русского слова или идентификатор и его части
+    terms: tuple[str, ...]
+    # Написано как имя собственное: с заглавной не в начале предложения, прописными или в кавычках
+    proper: bool
+
+
+def tokenize(text: str) -> list[Token]:
+    """Слова текста без стоп-слов"""
+    tokens = []
+    for match in _TOKEN_RE.finditer(text.replace("ё", "е").replace("Ё", "Е")):
+        word = match.group()
+        terms = tuple(dict.fromkeys(t for t in lexical_terms(word) if t not in _STOP_TERMS))
+        if terms:
+            tokens.append(Token(word.lower(), terms, _written_as_name(text, match.start(), word)))
+    return tokens
+
+
+def _written_as_name(text: str, start: int, word: str) -> bool:
+    if not word[0].isupper():
+        return False
+    if len(word) > 1 and word.isupper():
+        return True
+    i = start - 1
+    while i >= 0 and text[i].isspace():
+        i -= 1
+    # Открывающая кавычка («Пик») тоже не конец предложения
+    return i >= 0 and text[i] not in _SENTENCE_END
+
+
+@lru_cache(maxsize=65536)
+def name_forms(word: str) -> tuple[str, ...]:
+    """
+    Ключи индекса для слова названия: основы его падежных форм
+
+    Форма из вопроса находится, если ее основа (lexical_terms) совпадает с одной из них.
+    """
+    terms = lexical_terms(word)
+    if not _CYRILLIC_RE.fullmatch(word):
+        return tuple(terms[:1])
+    base = word[:-1] if len(word) > 3 and word[-1] in _FINAL_VOWELS else word
+    return tuple(dict.fromkeys([word, *terms, *(stem(base + ending) for ending in _CASE_ENDINGS)]))
+
+
+def _trigrams(word: str) -> set[str]:
+    padded = f"#{word}#"
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+@dataclass(slots=True)
+class InstrumentCandidate:
+    """Кандидат в инструменты для фрагмента вопроса"""
+
+    symbol: str
+    name: str
+    score: float
+    matched: str
+
+
+class InstrumentResolver:
+    """Индекс названий инструментов: пословный trie + триграммы для нечеткого поиска"""
+
+    def __init__(
+        self, aliases: dict[str, list[str]] | None = None, proper_names: dict[str, list[str]] | None = None
+    ) -> None:
+        """
+        Args:
+            aliases: Названия, совпадающие при любом написании (по умолчанию ALIASES)
+            proper_names: Названия, совпадающие только с именем собственным в вопросе (по умолчанию PROPER_NAMES)
+        """
+        self._trie: dict[str, Any] = {}
+        self._names: dict[str, str] = {}
+        self._tickers: dict[str, str] = {}
+        # Слово однословного названия -> {символ: нужно ли имя собственное в вопросе}
+        self._words: dict[str, dict[str, bool]] = defaultdict(dict)
+        self._trigram_index: dict[str, set[str]] = defaultdict(set)
+        self._word_trigrams: dict[str, int] = {}
+
+        for symbol, names in (aliases if aliases is not None else ALIASES).items():
+            for name in names:
+                self.add(symbol, name)
+        for symbol, names in (proper_names if proper_names is not None else PROPER_NAMES).items():
+            for name in names:
+                self.add(symbol, name, proper=True)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    # ============= ПОСТРОЕНИЕ ИНДЕКСА ==============================
+
+    def add(self, symbol: str, name: str, proper: bool = False) -> None:
+        """
+        Добавить название инструмента в индекс
+
+        Args:
+            proper: Название совпадает, только если в вопросе оно написано как имя собственное
+        """
+        words = [token.text for token in tokenize(name)]
+        if not words:
+            return
+        self._names.setdefault(symbol, name)
+        self._tickers.setdefault(symbol.split("@", 1)[0].upper(), symbol)
+
+        nodes = [self._trie]
+        for word in words:
+            nodes = [node.setdefault(form, {}) for node in nodes for form in name_forms(word)]
+        for node in nodes:
+            # Если название есть и среди алиасов, строчное написание тоже находит инструмент
+            symbols = node.setdefault("", {})
+            symbols[symbol] = symbols.get(symbol, True) and proper
+
+        # Для нечеткого поиска индексируются только однословные названия
+        if len(words) == 1 and len(words[0]) >= 4:
+            for form in dict.fromkeys([words[0], *lexical_terms(words[0])]):
+                self._words[form][symbol] = self._words[form].get(symbol, True) and proper
+                grams = _trigrams(form)
+                self._word_trigrams[form] = len(grams)
+                for gram in grams:
+                    self._trigram_index[gram].add(form)
+
+    def add_assets(self, assets: list[dict[str, Any]]) -> int:
+        """Добавить инструменты из ответа GET /v1/assets (symbol, ticker, name)"""
+        added = 0
+        for asset in assets:
+            symbol = asset.get("symbol")
+            if not symbol:
+                continue
+            self._tickers.setdefault(asset.get("ticker", symbol.split("@", 1)[0]).upper(), symbol)
+            if asset.get("name"):
+                # Официальные названия ("Самолет", "Магнит") - обычные слова: строчными их находят только алиасы
+                self.add(symbol, asset["name"], proper=True)
+                # Официальное название из справочника точнее разговорного
+                self._names[symbol] = asset["name"]
+                added += 1
+        return added
+
+    def load_assets(self, client: "FinamAPIClient") -> int:
+        """Загрузить снимок /v1/assets через клиент; при ошибке индекс остается на алиасах"""
+        response = client.execute_request("GET", "/v1/assets")
+        if "error" in response:
+            logger.warning("Не удалось загрузить справочник инструментов: %s", response.get("error"))
+            return 0
+        return self.add_assets(response.get("assets", []))
+
+    # ============= ПОИСК ==============================
+
+    def resolve(self, text: str, limit: int = 5) -> list[InstrumentCandidate]:
+        """
+        Найти упомянутые в тексте инструменты
+
+        Returns:
+            Кандидаты, отсортированные по убыванию уверенности (не более limit)
+        """
+        found: dict[str, InstrumentCandidate] = {}
+
+        def _offer(symbol: str, score: float, matched: str) -> None:
+            current = found.get(symbol)
+            if current is None or current.score < score:
+                found[symbol] = InstrumentCandidate(symbol, self._names.get(symbol, symbol), score, matched)
+
+        # Явные символы и тикеры в тексте
+        for ticker, mic in _SYMBOL_RE.findall(text):
+            _offer(f"{ticker}@{mic}", _EXACT_SCORE, f"{ticker}@{mic}")
+        for ticker in _TICKER_RE.findall(text):
+            if ticker in self._tickers:
+                _offer(self._tickers[ticker], _TICKER_SCORE, ticker)
+
+        tokens = tokenize(text)
+        words = [token.text for token in tokens]
+        matched_positions: set[int] = set()
+        for start in range(len(tokens)):
+            nodes = [self._trie]
+            for end in range(start, len(tokens)):
+                forms = (words[end], *tokens[end].terms)
+                nodes = [child for node in nodes for form in forms if (child := node.get(form))]
+                if not nodes:
+                    break
+                span = end - start + 1
+                proper = all(token.proper for token in tokens[start : end + 1])
+                for node in nodes:
+                    for symbol, needs_proper in node.get("", {}).items():
+                        if needs_proper and not proper:
+                            continue
+                        # Длинные совпадения ("газпром нефть") надежнее коротких ("газпром")
+                        _offer(symbol, _EXACT_SCORE - 0.01 * (len(words) - span) / len(words),
+                               " ".join(words[start : end + 1]))  # fmt: skip
+                        matched_positions.update(range(start, end + 1))
+
+        for i, token in enumerate(tokens):
+            if i in matched_positions or len(token.text) < 5:
+                continue
+            for candidate, score in self._fuzzy(token):
+                for symbol, needs_proper in self._words[candidate].items():
+                    if token.proper or not needs_proper:
+                        _offer(symbol, score * 0.9, token.text)
+
+        # Если многословное название покрывает однословное ("газпром нефть" и "газпром"), оставляем длинное
+        ranked = sorted(found.values(), key=lambda c: (-c.score, -len(c.matched)))
+        result: list[InstrumentCandidate] = []
+        for candidate in ranked:
+            if any(candidate.matched != r.matched and candidate.matched in r.matched for r in result):
+                continue
+            result.append(candidate)
+        return result[:limit]
+
+    def _fuzzy(self, token: Token) -> list[tuple[str, float]]:
+        """Похожие слова из индекса по коэффициенту Дайса на триграммах"""
+        best: dict[str, float] = {}
+        for form in dict.fromkeys((token.text, *token.terms)):
+            grams = _trigrams(form)
+            overlap: dict[str, int] = defaultdict(int)
+            for gram in grams:
+                for candidate in self._trigram_index.get(gram, ()):
+                    overlap[candidate] += 1
+            for candidate, common in overlap.items():
+                # Часть длинного названия ("биржи" в "мосбиржа") - не опечатка; в первой букве опечаток почти
+                # не бывает, а обычные слова с общим хвостом ("спроса" и "алроса") так отсекаются
+                if abs(len(candidate) - len(form)) > 2 or candidate[0] != form[0]:
+                    continue
+                score = 2 * common / (len(grams) + self._word_trigrams[candidate])
+                if score >= _FUZZY_THRESHOLD and score > best.get(candidate, 0.0):
+                    best[candidate] = score
+        return sorted(best.items(), key=lambda x: -x[1])[:3]
+
+
+def format_instrument_hint(candidates: list[InstrumentCandidate]) -> str:
+    """Подсказка для LLM: найденные в вопросе инструменты и их символы"""
+    if not candidates:
+        return ""
+    items = ", ".join(f"{c.matched} → {c.symbol} ({c.name})" for c in candidates)
+    return f"Инструменты: {items}"
+
+
+@lru_cache
+def get_instrument_resolver() -> InstrumentResolver:
+    """Общий для процесса индекс инструментов (строится один раз)"""
+    return InstrumentResolver()
@@ -1,29 +1,85 @@
+import json
+import time
+from collections.abc import Iterator
 from typing import Any
 
 import requests
 
 from .config import get_settings
 
+# Таймаут запроса к LLM по умолчанию, секунды
+DEFAULT_TIMEOUT = 60.0
 
-def call_llm(messages: list[dict[str, str]], temperature: float = 0.2, max_tokens: int | None = None) -> dict[str, Any]:
-    """Простой вызов LLM без tools"""
+
+def _request_kwargs(
+    messages: list[dict[str, str]],
+    temperature: float,
+    max_tokens: int | None,
+    model: str | None = None,
+    timeout: float = DEFAULT_TIMEOUT,
+) -> dict[str, Any]:
     s = get_settings()
     payload: dict[str, Any] = {
-        "model": s.openrouter_model,
+        "model": model or s.openrouter_model,
         "messages": messages,
         "temperature": temperature,
     }
     if max_tokens:
         payload["max_tokens"] = max_tokens
 
-    r = requests.post(
-        f"{s.openrouter_base}/chat/completions",
-        headers={
+    return {
+        "url": f"{s.openrouter_base}/chat/completions",
+        "headers": {
             "Authorization": f"Bearer {s.openrouter_api_key}",
             "Content-Type": "application/json",
         },
-        json=payload,
-        timeout=60,
-    )
+        "json": payload,
+        "timeout": timeout,
+    }
+
+
+def call_llm(
+    messages: list[dict[str, str]],
+    temperature: float = 0.2,
+    max_tokens: int | None = None,
+    model: str | None = None,
+    timeout: float = DEFAULT_TIMEOUT,
+) -> dict[str, Any]:
+    """Простой вызов LLM без tools; model - вместо OPENROUTER_MODEL"""
+    r = requests.post(**_request_kwargs(messages, temperature, max_tokens, model, timeout))
     r.raise_for_status()
     return r.json()
+
+
+def stream_llm(
+    messages: list[dict[str, str]],
+    temperature: float = 0.2,
+    max_tokens: int | None = None,
+    timeout: float = DEFAULT_TIMEOUT,
+) -> Iterator[str]:
+    """
+    Потоковый вызов LLM: отдает фрагменты текста ответа по мере генерации (SSE)
+
+    timeout ограничивает весь ответ, а не только паузу между фрагментами:
+    keepalive-комментарии не продлевают ожидание.
+    """
+    deadline = time.monotonic() + timeout
+    kwargs = _request_kwargs(messages, temperature, max_tokens, timeout=timeout)
+    kwargs["json"]["stream"] = True
+    with requests.post(**kwargs, stream=True) as r:
+        r.raise_for_status()
+        r.encoding = "utf-8"
+        # chunk_size=None: строки отдаются по мере прихода, без накопления блока в 512 байт
+        for line in r.iter_lines(chunk_size=None, decode_unicode=True):
+            if time.monotonic() > deadline:
+                raise requests.Timeout(f"Ответ LLM не получен за {timeout:.1f} с")
+            # Пропускаем пустые строки и комментарии-keepalive (": OPENROUTER PROCESSING")
+            if not line or not line.startswith("data: "):
+                continue
+            data = line[len("data: ") :]
+            if data == "[DONE]":
+                break
+            choices = json.loads(data).get("choices") or [{}]
+            delta = choices[0].get("delta", {}).get("content")
+            if delta:
+                yield delta
@@ -7,8 +7,8 @@ MODEL_NAME = "deepseek-v2:16b-lite-chat-fp16"
 OLLAMA_URL = "http://localhost:11434"
 
 
-def call_llm(messages: list[dict[str, str]], temperature: float = 0.2, max_tokens: Optional[int] = None) -> dict[
-    str, Any]:
+def call_llm(messages: list[dict[str, str]], temperature: float = 0.2, max_tokens: Optional[int] = None,
+             timeout: float = 60) -> dict[str, Any]:
     """Простой вызов локальной LLM через Ollama"""
 
     # Базовые настройки для Ollama
@@ -37,7 +37,7 @@ def call_llm(messages: list[dict[str, str]], temperature: float = 0.2, max_token
                 "Content-Type": "application/json",
             },
             json=payload,
-            timeout=60,
+            timeout=timeout,
         )
         r.raise_for_status()
         return r.json()
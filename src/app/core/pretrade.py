@@ -0,0 +1,352 @@
+"""
+Локальная проверка заявок перед отправкой в Finam TradeAPI
+
+Заявка, собранная LLM, может не пройти проверку брокера: количество не кратно лоту,
+цена не кратна шагу, не хватает денег, торги закрыты. Брокер отклонит ее только
+после полного сетевого круга, а пользователь перед этим еще и подтверждает ее.
+Здесь тело заявки проверяется по закэшированным справочным данным:
+- GET /v1/assets/{symbol}: лот, шаг цены, число знаков
+- GET /v1/assets/{symbol}/params: доступность торгов, лонг/шорт, обеспечение
+- GET /v1/assets/{symbol}/schedule: торговые сессии
+- GET /v1/accounts/{account_id}: свободные средства (portfolio_mc) и позиции
+
+Количество в заявке - в штуках (единицах инструмента) и должно быть кратно lot_size.
+Исправимые ошибки (количество не кратно лоту, цена вне шага, числа без обертки {"value"})
+исправляются, неисправимые - отклоняют заявку без обращения к API заявок.
+"""
+
+import logging
+import re
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from datetime import datetime
+from decimal import ROUND_CEILING, ROUND_DOWN, ROUND_FLOOR, Decimal, InvalidOperation
+from typing import TYPE_CHECKING, Any
+
+from src.app.models import FinamRequest
+from src.app.models.finam_response import to_decimal
+
+if TYPE_CHECKING:
+    from src.app.adapters import FinamAPIClient
+
+logger = logging.getLogger(__name__)
+
+# Время жизни кэша, секунды: справочник инструмента, параметры и расписание, счет
+ASSET_TTL = 24 * 3600
+PARAMS_TTL = 3600
+ACCOUNT_TTL = 10.0
+
+ORDER_PATH_RE = re.compile(r"^(?:https?://[^/]+)?/v1/accounts/([^/?]+)/orders/?(?:\?.*)?$")
+_PRICED_TYPES = {"ORDER_TYPE_LIMIT": "limit_price", "ORDER_TYPE_STOP_LIMIT": "limit_price"}
+_STOP_TYPES = ("ORDER_TYPE_STOP", "ORDER_TYPE_STOP_LIMIT")
+_SIDES = ("SIDE_BUY", "SIDE_SELL")
+
+
+@dataclass(slots=True)
+class OrderCheck:
+    """Результат проверки заявки: исправленное тело, ошибки и внесенные исправления"""
+
+    body: dict[str, Any]
+    errors: list[str] = field(default_factory=list)
+    corrections: list[str] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+
+def is_order_request(request: FinamRequest) -> bool:
+    """POST /v1/accounts/{account_id}/orders - создание заявки"""
+    return request.method.upper() == "POST" and ORDER_PATH_RE.match(request.url) is not None
+
+
+class _TTLCache:
+    """Кэш с временем жизни; одновременные промахи по ключу загружают значение один раз"""
+
+    def __init__(self) -> None:
+        self._items: dict[tuple, tuple[float, Any]] = {}
+        self._loading: dict[tuple, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _fresh(self, key: tuple) -> tuple[bool, Any]:
+        with self._lock:
+            item = self._items.get(key)
+        return (True, item[1]) if item is not None and item[0] > time.monotonic() else (False, None)
+
+    def get(self, key: tuple, ttl: float, load: Callable[[], Any]) -> Any:  # noqa: ANN401
+        hit, value = self._fresh(key)
+        if hit:
+            return value
+        with self._lock:
+            loading = self._loading.setdefault(key, threading.Lock())
+        with loading:
+            # Пока ждали, значение мог загрузить другой поток (например, prefetch)
+            hit, value = self._fresh(key)
+            if hit:
+                return value
+            value = load()
+            # Ошибки API не кэшируем: следующая проверка попробует снова
+            if not (isinstance(value, dict) and "error" in value):
+                with self._lock:
+                    self._items[key] = (time.monotonic() + ttl, value)
+        return value
+
+    def invalidate(self, key: tuple) -> None:
+        with self._lock:
+            self._items.pop(key, None)
+
+
+class PreTradeValidator:
+    """
+    Проверка тела заявки по кэшу справочных данных и состояния счета
+
+    Справочные данные загружаются через тот же клиент (GET запросы) и кэшируются;
+    prefetch() позволяет загрузить их заранее, пока LLM дописывает ответ.
+    """
+
+    def __init__(
+        self,
+        client: "FinamAPIClient",
+        asset_ttl: float = ASSET_TTL,
+        params_ttl: float = PARAMS_TTL,
+        account_ttl: float = ACCOUNT_TTL,
+        clock: Callable[[], datetime] | None = None,
+    ) -> None:
+        """
+        Args:
+            client: Клиент Finam API (нужен только execute_finam_request)
+            asset_ttl: Время жизни кэша справочника инструмента, секунды
+            params_ttl: Время жизни кэша параметров и расписания, секунды
+            account_ttl: Время жизни кэша состояния счета, секунды
+            clock: Текущее время с часовым поясом (для проверки расписания)
+        """
+        self.client = client
+        self.asset_ttl = asset_ttl
+        self.params_ttl = params_ttl
+        self.account_ttl = account_ttl
+        self.clock = clock or (lambda: datetime.now().astimezone())
+        self._cache = _TTLCache()
+
+    # ============= СПРАВОЧНЫЕ ДАННЫЕ ==============================
+
+    def _get(self, path: str) -> dict[str, Any]:
+        response = self.client.execute_finam_request(FinamRequest(method="GET", url=path, body=None))
+        return response if isinstance(response, dict) else {"error": "Некорректный ответ API"}
+
+    def asset(self, symbol: str) -> dict[str, Any]:
+        return self._cache.get(("asset", symbol), self.asset_ttl, lambda: self._get(f"/v1/assets/{symbol}"))
+
+    def params(self, symbol: str, account_id: str) -> dict[str, Any]:
+        return self._cache.get(
+            ("params", symbol, account_id),
+            self.params_ttl,
+            lambda: self._get(f"/v1/assets/{symbol}/params?account_id={account_id}"),
+        )
+
+    def schedule(self, symbol: str) -> dict[str, Any]:
+        return self._cache.get(
+            ("schedule", symbol), self.params_ttl, lambda: self._get(f"/v1/assets/{symbol}/schedule")
+        )
+
+    def account(self, account_id: str) -> dict[str, Any]:
+        return self._cache.get(
+            ("account", account_id), self.account_ttl, lambda: self._get(f"/v1/accounts/{account_id}")
+        )
+
+    def prefetch(self, request: FinamRequest) -> None:
+        """Загрузить в кэш все, что понадобится для проверки заявки"""
+        match = ORDER_PATH_RE.match(request.url)
+        symbol = (request.body or {}).get("symbol")
+        if not match or not isinstance(symbol, str):
+            return
+        self.asset(symbol)
+        self.params(symbol, match.group(1))
+        self.schedule(symbol)
+        self.account(match.group(1))
+
+    def order_sent(self, request: FinamRequest) -> None:
+        """Заявка отправлена: свободные средства изменились, состояние счета нужно перечитать"""
+        match = ORDER_PATH_RE.match(request.url)
+        if match:
+            self._cache.invalidate(("account", match.group(1)))
+
+    # ============= ПРОВЕРКА ==============================
+
+    def check(self, request: FinamRequest) -> OrderCheck:
+        """Проверить и по возможности исправить тело заявки"""
+        match = ORDER_PATH_RE.match(request.url)
+        body = dict(request.body or {})
+        result = OrderCheck(body)
+        if not match:
+            return result
+        account_id = match.group(1)
+
+        for name in ("symbol", "quantity", "side", "type"):
+            if body.get(name) in (None, "", {}):
+                result.errors.append(f"Не указано обязательное поле {name}")
+        if result.errors:
+            return result
+        symbol, side, order_type = str(body["symbol"]), body["side"], body["type"]
+        if side not in _SIDES:
+            result.errors.append(f"Недопустимое направление {side}: ожидается SIDE_BUY или SIDE_SELL")
+            return result
+
+        asset = self.asset(symbol)
+        if "error" in asset:
+            if asset.get("status_code") == 404:
+                result.errors.append(f"Инструмент {symbol} не найден")
+            # Справочник недоступен - решение остается за брокером
+            return result
+
+        quantity = self._check_quantity(body, _lot_size(asset), result)
+        price = self._check_prices(body, order_type, side, asset, result)
+        if result.errors:
+            return result
+
+        self._check_schedule(symbol, result)
+        self._check_funds(symbol, account_id, side, quantity, price, asset, result)
+        if result.corrections:
+            logger.info("Заявка %s исправлена: %s", symbol, "; ".join(result.corrections))
+        return result
+
+    @staticmethod
+    def _check_quantity(body: dict[str, Any], lot_size: Decimal, result: OrderCheck) -> Decimal:
+        """Количество в штуках, кратное размеру лота (округляется вниз)"""
+        quantity = to_decimal(body["quantity"])
+        if quantity is None or quantity <= 0:
+            result.errors.append(f"Некорректное количество: {body['quantity']}")
+            return Decimal(0)
+        aligned = (quantity / lot_size).to_integral_value(rounding=ROUND_DOWN) * lot_size
+        if aligned <= 0:
+            result.errors.append(f"Количество {quantity} меньше одного лота ({lot_size} шт.)")
+        elif aligned != quantity:
+            result.corrections.append(f"количество {quantity} округлено до кратного лоту {lot_size}: {aligned}")
+        body["quantity"] = {"value": format(aligned.normalize(), "f")}
+        return aligned
+
+    @staticmethod
+    def _check_prices(
+        body: dict[str, Any], order_type: str, side: str, asset: dict[str, Any], result: OrderCheck
+    ) -> Decimal | None:
+        """Цены обязательны по типу заявки и кратны шагу цены; возвращает лимитную цену"""
+        required = [_PRICED_TYPES[order_type]] if order_type in _PRICED_TYPES else []
+        if order_type in _STOP_TYPES:
+            required.append("stop_price")
+        step = _price_step(asset)
+        price = None
+        for name in required:
+            value = to_decimal(body.get(name))
+            if value is None or value <= 0:
+                result.errors.append(f"Для {order_type} нужна положительная цена {name}")
+                continue
+            if step:
+                # Округляем в сторону, не ухудшающую цену для клиента
+                rounding = ROUND_FLOOR if side == "SIDE_BUY" else ROUND_CEILING
+                aligned = (value / step).to_integral_value(rounding=rounding) * step
+                if aligned != value:
+                    result.corrections.append(f"{name} {value} приведена к шагу цены {step}: {aligned}")
+                    value = aligned
+            body[name] = {"value": format(value.normalize(), "f")}
+            if name == "limit_price":
+                price = value
+        return price
+
+    def _check_schedule(self, symbol: str, result: OrderCheck) -> None:
+        schedule = self.schedule(symbol)
+        if "error" in schedule:
+            # Без расписания решение остается за брокером
+            return
+        now = self.clock()
+        for session in schedule.get("sessions", []):
+            interval = session.get("interval") or {}
+            start, end = _parse_time(interval.get("start_time")), _parse_time(interval.get("end_time"))
+            if start and end and start <= now < end:
+                if session.get("type") == "CLOSED":
+                    result.errors.append(f"Торги по {symbol} сейчас закрыты (до {end:%H:%M %Z})")
+                return
+
+    def _check_funds(
+        self,
+        symbol: str,
+        account_id: str,
+        side: str,
+        quantity: Decimal,
+        price: Decimal | None,
+        asset: dict[str, Any],
+        result: OrderCheck,
+    ) -> None:
+        params = self.params(symbol, account_id)
+        account = self.account(account_id)
+        if "error" not in params:
+            if params.get("tradeable") is False:
+                result.errors.append(f"Инструмент {symbol} недоступен для торговли")
+                return
+            held = _position(account, symbol)
+            # Продажа в пределах позиции - закрытие лонга, шорт проверяем только сверх нее
+            opening_short = side == "SIDE_SELL" and quantity > held
+            availability = params.get("shortable" if opening_short else "longable") or {}
+            if side == "SIDE_BUY" or opening_short:
+                value = availability.get("value") if isinstance(availability, dict) else availability
+                if value not in (None, "AVAILABLE"):
+                    kind = "Короткая продажа" if opening_short else "Покупка"
+                    result.errors.append(f"{kind} {symbol} недоступна ({value})")
+                    return
+        if side != "SIDE_BUY" or "error" in account:
+            return
+
+        # Требуемое обеспечение: ставка брокера, иначе полная стоимость по лимитной цене
+        per_unit = _money(params.get("long_collateral")) if "error" not in params else None
+        per_unit = per_unit or price
+        cash = to_decimal((account.get("portfolio_mc") or {}).get("available_cash"))
+        if cash is None:
+            cash = sum((_money(c) or Decimal(0) for c in account.get("cash", [])), Decimal(0))
+        if per_unit is None or cash is None:
+            return
+        if per_unit > 0 and quantity * per_unit > cash:
+            lot_size = _lot_size(asset)
+            affordable = int(cash // (per_unit * lot_size)) * lot_size
+            result.errors.append(
+                f"Недостаточно средств: нужно ≈{quantity * per_unit:.2f}, доступно {cash:.2f} "
+                f"(можно купить не больше {affordable} шт.)"
+            )
+
+
+# ============= ВСПОМОГАТЕЛЬНЫЕ ==============================
+
+
+def _price_step(asset: dict[str, Any]) -> Decimal | None:
+    """Шаг цены: min_step в единицах последнего знака (decimals)"""
+    try:
+        min_step = Decimal(str(asset.get("min_step") or 0))
+        decimals = int(asset.get("decimals") or 0)
+    except (InvalidOperation, ValueError):
+        return None
+    return min_step.scaleb(-decimals) if min_step > 0 else None
+
+
+def _lot_size(asset: dict[str, Any]) -> Decimal:
+    return to_decimal(asset.get("lot_size")) or Decimal(1)
+
+
+def _money(value: Any) -> Decimal | None:  # noqa: ANN401
+    if not isinstance(value, dict) or "units" not in value:
+        return to_decimal(value)
+    return Decimal(int(value.get("units") or 0)) + Decimal(int(value.get("nanos") or 0)).scaleb(-9)
+
+
+def _position(account: dict[str, Any], symbol: str) -> Decimal:
+    for position in account.get("positions", []) if "error" not in account else []:
+        if position.get("symbol") == symbol:
+            return to_decimal(position.get("quantity")) or Decimal(0)
+    return Decimal(0)
+
+
+def _parse_time(value: Any) -> datetime | None:  # noqa: ANN401
+    if not isinstance(value, str) or not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
@@ -0,0 +1,294 @@
+"""
+Цикл агента: LLM -> разбор ответа -> запросы к Finam API -> результаты обратно в LLM
+
+Общий для chat_cli и chat_app. Цикл продолжается, пока модель не вернет "last": 1
+(или ответ без запросов), но не дольше max_steps шагов и time_budget секунд:
+остаток бюджета передается в LLM как таймаут запроса.
+Все запросы одного шага выполняются параллельно.
+
+При потоковом LLM (stream_llm) безопасные GET запросы отправляются, как только
+в генерируемом ответе закрывается их объект, и выполняются параллельно с
+генерацией остатка ответа. POST/DELETE ждут конца ответа и подтверждения.
+
+Заявки перед подтверждением проверяются локально (PreTradeValidator): неверные
+отклоняются без обращения к API, исправимые исправляются. Нужные для проверки
+справочные данные загружаются, пока LLM дописывает ответ.
+"""
+
+import logging
+import time
+from collections.abc import Callable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any
+
+import requests
+
+from src.app.adapters import FinamAPIClient
+from src.app.core import PreTradeValidator, call_llm
+from src.app.core.pretrade import is_order_request
+from src.app.interfaces.chat import AssistantResponse, StreamingRequestParser, parse_assistant_response
+from src.app.interfaces.compaction import MAX_RESULT_TOKENS, CompactResult, compact_api_result, estimate_tokens
+from src.app.models import FinamRequest
+
+logger = logging.getLogger(__name__)
+
+# Методы, которые меняют состояние счета и требуют подтверждения пользователя
+MUTATING_METHODS = frozenset({"POST", "PUT", "PATCH", "DELETE"})
+# Методы, которые можно отправлять до окончания ответа LLM
+SPECULATIVE_METHODS = frozenset({"GET"})
+
+STOP_LAST = "last"
+STOP_NO_REQUESTS = "no_requests"
+STOP_MAX_STEPS = "max_steps"
+STOP_TIMEOUT = "timeout"
+
+
+@dataclass(slots=True)
+class AgentStep:
+    """Один шаг цикла: ответ LLM и выполненные по нему запросы"""
+
+    index: int
+    assistant_message: str
+    parsed: AssistantResponse = field(default_factory=AssistantResponse)
+    requests: list[FinamRequest] = field(default_factory=list)
+    responses: list[dict[str, Any]] = field(default_factory=list)
+    llm_seconds: float = 0.0
+    api_seconds: float = 0.0
+    # Запросы, отправленные во время генерации ответа (их задержка перекрыта LLM)
+    speculative: int = 0
+    # Размер результатов API в истории: как есть и после сжатия, токены
+    raw_tokens: int = 0
+    result_tokens: int = 0
+
+    @property
+    def saved_tokens(self) -> int:
+        return self.raw_tokens - self.result_tokens
+
+
+@dataclass(slots=True)
+class AgentResult:
+    """Итог цикла агента"""
+
+    message: str | None
+    steps: list[AgentStep]
+    stop_reason: str
+    elapsed: float
+
+    @property
+    def assistant_message(self) -> str:
+        """Сырой последний ответ LLM"""
+        return self.steps[-1].assistant_message if self.steps else ""
+
+    @property
+    def api_requests(self) -> list[dict[str, Any]]:
+        """Выполненные запросы всех шагов с полными ответами API (для хранения и отображения)"""
+        return [
+            {"method": r.method, "path": r.url, "response": response}
+            for step in self.steps
+            for r, response in zip(step.requests, step.responses, strict=True)
+        ]
+
+
+class AgentLoop:
+    """Многошаговый цикл агента с ограничением по шагам и времени"""
+
+    def __init__(
+        self,
+        client: FinamAPIClient,
+        llm: Callable[..., dict[str, Any]] = call_llm,
+        max_steps: int = 5,
+        time_budget: float = 90.0,
+        max_workers: int = 8,
+        temperature: float = 0.3,
+        approve: Callable[[FinamRequest], bool] | None = None,
+        on_step: Callable[[AgentStep], None] | None = None,
+        stream_llm: Callable[..., Iterator[str]] | None = None,
+        on_token: Callable[[str], None] | None = None,
+        validator: PreTradeValidator | None = None,
+    ) -> None:
+        """
+        Args:
+            client: Клиент Finam API
+            llm: Функция вызова LLM (messages, temperature, timeout) -> ответ в формате OpenAI
+            max_steps: Максимум вызовов LLM за один вопрос
+            time_budget: Ограничение времени на весь цикл, секунды
+            max_workers: Максимум параллельных запросов к API на шаге
+            temperature: Температура LLM
+            approve: Подтверждение модифицирующих запросов (None - выполнять без подтверждения)
+            on_step: Вызывается после каждого шага (для отображения прогресса)
+            stream_llm: Потоковый вызов LLM; если задан, GET запросы выполняются во время генерации
+            on_token: Вызывается с каждым фрагментом потокового ответа LLM (для вывода по мере генерации)
+            validator: Локальная проверка заявок перед подтверждением и отправкой
+        """
+        self.client = client
+        self.llm = llm
+        self.max_steps = max_steps
+        self.time_budget = time_budget
+        self.max_workers = max_workers
+        self.temperature = temperature
+        self.approve = approve
+        self.on_step = on_step
+        self.stream_llm = stream_llm
+        self.on_token = on_token
+        self.validator = validator
+
+    def run(self, history: list[dict[str, str]]) -> AgentResult:
+        """
+        Прогнать цикл для истории, заканчивающейся вопросом пользователя
+
+        История дополняется ответами ассистента и результатами API на месте.
+        """
+        started = time.perf_counter()
+        deadline = started + self.time_budget
+        steps: list[AgentStep] = []
+        stop_reason = STOP_MAX_STEPS
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="agent")
+
+        try:
+            for index in range(1, self.max_steps + 1):
+                if time.perf_counter() >= deadline:
+                    stop_reason = STOP_TIMEOUT
+                    break
+
+                speculative: dict[tuple[str, str], Future] = {}
+                t0 = time.perf_counter()
+                try:
+                    assistant_message = self._generate(history, executor, speculative, deadline - t0)
+                except requests.Timeout:
+                    logger.warning("Шаг %d: LLM не ответила до конца бюджета времени", index)
+                    stop_reason = STOP_TIMEOUT
+                    break
+                step = AgentStep(
+                    index=index,
+                    assistant_message=assistant_message,
+                    parsed=parse_assistant_response(assistant_message),
+                    llm_seconds=time.perf_counter() - t0,
+                )
+                step.requests = step.parsed.requests
+                steps.append(step)
+                history.append({"role": "assistant", "content": assistant_message})
+
+                if not step.requests:
+                    stop_reason = STOP_LAST if step.parsed.last else STOP_NO_REQUESTS
+                    self._notify(step)
+                    break
+
+                t0 = time.perf_counter()
+                step.speculative = sum(self._key(r) in speculative for r in step.requests)
+                step.responses = self.execute(step.requests, deadline, executor, speculative)
+                step.api_seconds = time.perf_counter() - t0
+                history.append({"role": "user", "content": self.format_results(step)})
+                self._notify(step)
+                logger.info(
+                    "Шаг %d: LLM %.2f с, %d запросов (%d заранее) за %.2f с, результаты %d -> %d токенов",
+                    index, step.llm_seconds, len(step.requests), step.speculative, step.api_seconds,
+                    step.raw_tokens, step.result_tokens,
+                )  # fmt: skip
+        finally:
+            # Не ждем зависшие запросы: их результат уже не попадет в ответ
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        message = steps[-1].parsed.message if steps else None
+        return AgentResult(message, steps, stop_reason, time.perf_counter() - started)
+
+    def _generate(
+        self,
+        history: list[dict[str, str]],
+        executor: ThreadPoolExecutor,
+        speculative: dict[tuple[str, str], Future],
+        timeout: float,
+    ) -> str:
+        """Получить ответ LLM не дольше timeout секунд; при потоковой генерации сразу отправить готовые GET запросы"""
+        if self.stream_llm is None:
+            response = self.llm(history, temperature=self.temperature, timeout=timeout)
+            return response["choices"][0]["message"]["content"]
+
+        parser = StreamingRequestParser()
+        for chunk in self.stream_llm(history, temperature=self.temperature, timeout=timeout):
+            if self.on_token is not None:
+                self.on_token(chunk)
+            for request in parser.feed(chunk):
+                key = self._key(request)
+                if key[0] in SPECULATIVE_METHODS and key not in speculative:
+                    speculative[key] = executor.submit(self.client.execute_finam_request, request)
+                elif self.validator is not None and is_order_request(request):
+                    # Справочные данные для проверки заявки - пока модель дописывает ответ
+                    executor.submit(self.validator.prefetch, request)
+        return parser.text
+
+    def execute(
+        self,
+        requests: list[FinamRequest],
+        deadline: float,
+        executor: ThreadPoolExecutor,
+        speculative: dict[tuple[str, str], Future] | None = None,
+    ) -> list[dict[str, Any]]:
+        """
+        Выполнить запросы шага параллельно
+
+        Уже отправленные во время генерации GET запросы не повторяются. Заявки сначала
+        проходят локальную проверку. Не уложившиеся в бюджет времени запросы получают ошибку.
+        """
+        speculative = speculative or {}
+        responses: list[dict[str, Any] | None] = [None] * len(requests)
+        futures: dict[Future, list[int]] = {}
+        corrections: dict[int, list[str]] = {}
+        for i, request in enumerate(requests):
+            key = self._key(request)
+            if key in speculative:
+                futures.setdefault(speculative[key], []).append(i)
+                continue
+            if self.validator is not None and is_order_request(request):
+                check = self.validator.check(request)
+                if not check.ok:
+                    responses[i] = {"error": "Заявка не прошла проверку", "details": check.errors, "status_code": None}
+                    continue
+                if check.corrections:
+                    # Дальше (подтверждение, отправка, история) идет исправленная заявка
+                    request = requests[i] = FinamRequest(method=request.method, url=request.url, body=check.body)
+                    corrections[i] = check.corrections
+            if key[0] in MUTATING_METHODS and self.approve is not None and not self.approve(request):
+                responses[i] = {"error": "Отклонено пользователем", "status_code": None}
+            else:
+                futures[executor.submit(self.client.execute_finam_request, request)] = [i]
+
+        done, not_done = wait(futures, timeout=max(deadline - time.perf_counter(), 0.0))
+        for future in done:
+            for i in futures[future]:
+                responses[i] = future.result()
+                if self.validator is not None and is_order_request(requests[i]):
+                    self.validator.order_sent(requests[i])
+                if i in corrections and isinstance(responses[i], dict):
+                    responses[i] = {**responses[i], "pretrade_corrections": corrections[i]}
+        for future in not_done:
+            future.cancel()
+            for i in futures[future]:
+                responses[i] = {"error": "Превышен лимит времени", "status_code": None}
+
+        return [r if r is not None else {"error": "Нет ответа"} for r in responses]
+
+    @staticmethod
+    def format_results(step: AgentStep) -> str:
+        """Сообщение со сжатыми результатами запросов шага для LLM; учитывает экономию токенов"""
+        lines = []
+        for request, response in zip(step.requests, step.responses, strict=True):
+            try:
+                compact = compact_api_result(response, request.url)
+            except Exception:
+                # Неожиданная форма ответа не должна обрывать диалог: отдаем LLM ответ без сжатия
+                logger.exception("Не удалось сжать ответ %s %s", request.method, request.url)
+                text = str(response)[: MAX_RESULT_TOKENS * 4]
+                compact = CompactResult(text, estimate_tokens(str(response)), estimate_tokens(text))
+            step.raw_tokens += compact.original_tokens
+            step.result_tokens += compact.tokens
+            lines.append(f"Результат API запроса {request.method} {request.url}:\n{compact.text}")
+        return "\n\n".join(lines) + "\n\nПроанализируй это."
+
+    @staticmethod
+    def _key(request: FinamRequest) -> tuple[str, str]:
+        return request.method.upper(), request.url
+
+    def _notify(self, step: AgentStep) -> None:
+        if self.on_step is not None:
+            self.on_step(step)
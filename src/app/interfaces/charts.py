@@ -0,0 +1,196 @@
+"""
+Графики свечей для веб-интерфейса
+
+Ответ GET /v1/instruments/{symbol}/bars за годы минутных свечей - это сотни
+тысяч точек, которые браузер не отрисует быстро, а экран все равно не покажет.
+Перед построением графика свечи переводятся в массивы (Bars) и прореживаются
+под ширину графика в пикселях:
+- свечи объединяются в группы min-max агрегацией (open первой, close последней,
+  максимум high, минимум low, сумма объема), поэтому экстремумы не теряются
+- линия цены закрытия прореживается алгоритмом LTTB
+  (Largest-Triangle-Three-Buckets), сохраняющим форму ряда
+
+Готовые фигуры кэшируются по (symbol, timeframe, интервал, ширина, хэш свечей):
+одинаковый запрос к другому base_url или в другое время дает другие свечи и не
+должен получить чужой график. Веб-интерфейс строит фигуры в фоновом потоке сразу
+после ответа API (warm_chart), поэтому на странице остается только отдать готовую
+фигуру из кэша.
+"""
+
+import hashlib
+import logging
+import re
+import threading
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Any
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+from src.app.models import Bars
+
+logger = logging.getLogger(__name__)
+
+# Ширина графика по умолчанию и ширина одной свечи, пиксели
+DEFAULT_WIDTH = 1000
+CANDLE_PIXELS = 4
+# Сколько фигур хранить в кэше процесса
+FIGURE_CACHE_SIZE = 64
+
+_BARS_PATH_RE = re.compile(r"/v1/instruments/([^/?]+)/bars")
+
+ChartKey = tuple[str, str, str, str]
+
+
+def chart_key(path: str) -> ChartKey | None:
+    """(symbol, timeframe, начало, конец) для пути запроса свечей или None для прочих запросов"""
+    parts = urlsplit(path)
+    match = _BARS_PATH_RE.search(parts.path)
+    if not match:
+        return None
+    query = parse_qs(parts.query)
+
+    def param(name: str) -> str:
+        return query.get(name, [""])[0]
+
+    return match.group(1), param("timeframe"), param("interval.start_time"), param("interval.end_time")
+
+
+def bars_digest(bars: Bars) -> str:
+    """Хэш содержимого свечей (время и OHLCV)"""
+    digest = hashlib.blake2b(digest_size=16)
+    for column in (bars.timestamp, bars.open, bars.high, bars.low, bars.close, bars.volume):
+        digest.update(np.ascontiguousarray(column).tobytes())
+    return digest.hexdigest()
+
+
+def figure_key(key: ChartKey, bars: Bars, width: int) -> tuple:
+    """Ключ фигуры в кэше: запрос, ширина и содержимое свечей"""
+    return (*key, width, bars_digest(bars))
+
+
+# ============= ПРОРЕЖИВАНИЕ ==============================
+
+
+def resample_ohlc(bars: Bars, buckets: int) -> Bars:
+    """Объединить свечи в не более чем buckets групп подряд идущих свечей (min-max агрегация)"""
+    n = len(bars)
+    if n <= buckets:
+        return bars
+    starts = np.unique(np.linspace(0, n, buckets, endpoint=False).astype(np.int64))
+    ends = np.append(starts[1:], n) - 1
+    return Bars(
+        symbol=bars.symbol,
+        timestamp=bars.timestamp[starts],
+        open=bars.open[starts],
+        high=np.fmax.reduceat(bars.high, starts),
+        low=np.fmin.reduceat(bars.low, starts),
+        close=bars.close[ends],
+        volume=np.add.reduceat(np.nan_to_num(bars.volume), starts),
+    )
+
+
+def lttb(y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Индексы точек ряда y, выбранные алгоритмом LTTB
+
+    Первая и последняя точки сохраняются; из каждой из threshold - 2 групп берется
+    точка, образующая наибольший треугольник с выбранной точкой предыдущей группы
+    и средним следующей. Ось x - номер точки (свечи идут с равным шагом).
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    x = np.arange(n, dtype=np.float64)
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Среднее следующей группы (для последней группы - последняя точка)
+        nxt_lo, nxt_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x, avg_y = x[nxt_lo:nxt_hi].mean(), y[nxt_lo:nxt_hi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.nanargmax(area)) if hi > lo else lo
+        indices[i + 1] = a
+    return indices
+
+
+# ============= ФИГУРЫ ==============================
+
+
+def candle_figure(bars: Bars, width: int = DEFAULT_WIDTH, title: str | None = None) -> go.Figure:
+    """График свечей с объемом, прореженный под ширину width пикселей"""
+    candles = resample_ohlc(bars, max(width // CANDLE_PIXELS, 2))
+    fig = make_subplots(rows=2, cols=1, shared_xaxes=True, row_heights=[0.78, 0.22], vertical_spacing=0.02)
+    fig.add_trace(
+        go.Candlestick(
+            x=candles.timestamp,
+            open=candles.open,
+            high=candles.high,
+            low=candles.low,
+            close=candles.close,
+            name=bars.symbol or "OHLC",
+        ),
+        row=1,
+        col=1,
+    )
+    if len(candles) < len(bars):
+        # Линия закрытия в разрешении экрана - детали внутри объединенных свечей
+        points = lttb(bars.close, width)
+        fig.add_trace(
+            go.Scattergl(
+                x=bars.timestamp[points], y=bars.close[points], name="close", mode="lines", visible="legendonly"
+            ),
+            row=1,
+            col=1,
+        )
+    fig.add_trace(go.Bar(x=candles.timestamp, y=candles.volume, name="volume", showlegend=False), row=2, col=1)
+
+    subtitle = f"{len(bars)} свечей"
+    if len(candles) < len(bars):
+        subtitle += f", по {len(bars) // len(candles)} в одной"
+    fig.update_layout(
+        title=f"{title or bars.symbol} ({subtitle})",
+        xaxis_rangeslider_visible=False,
+        height=480,
+        margin={"l": 10, "r": 10, "t": 40, "b": 10},
+    )
+    return fig
+
+
+class FigureCache:
+    """LRU кэш готовых фигур, общий для всех сессий процесса"""
+
+    def __init__(self, maxsize: int = FIGURE_CACHE_SIZE) -> None:
+        self.maxsize = maxsize
+        self._figures: OrderedDict[tuple, go.Figure] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple, build: Callable[[], go.Figure | None]) -> go.Figure | None:
+        """Фигура из кэша или построенная build() (None не кэшируется)"""
+        with self._lock:
+            if key in self._figures:
+                self._figures.move_to_end(key)
+                return self._figures[key]
+        figure = build()
+        if figure is None:
+            return None
+        with self._lock:
+            self._figures[key] = figure
+            while len(self._figures) > self.maxsize:
+                self._figures.popitem(last=False)
+        return figure
+
+
+def warm_chart(cache: FigureCache, path: str, response: Any, width: int = DEFAULT_WIDTH) -> None:  # noqa: ANN401
+    """Построить фигуру по уже декодированному ответу запроса свечей и положить ее в кэш"""
+    key = chart_key(path)
+    if key is None or not isinstance(response, dict) or not response.get("bars"):
+        return
+    bars = Bars.from_response(response)
+    cache.get(figure_key(key, bars, width), lambda: candle_figure(bars, width))
@@ -1,132 +1,220 @@
 import re
 import json
 import logging
+from dataclasses import dataclass, field
+from functools import lru_cache
 from typing import List, Optional, Dict, Any
 
-from urllib3 import request
-
+from src.app.core.instruments import format_instrument_hint, get_instrument_resolver
+from src.app.interfaces.compaction import compact_api_result
 from src.app.interfaces.promt import SYSTEM_PROMT, API_PROMT
 from src.app.models import FinamRequest
+from src.app.models.finam_response import loads
 
 
+@lru_cache(maxsize=1)
 def create_system_prompt() -> str:
     """Создать системный промпт для AI ассистента"""
     return SYSTEM_PROMT + API_PROMT
 
+def format_api_result(api_response: Dict[str, Any], path: Optional[str] = None) -> str:
+    """Представить ответ API для передачи в LLM в сжатом виде (см. compaction)"""
+    return compact_api_result(api_response, path).text
+
+def annotate_user_input(text: str) -> str:
+    """Дописать к вопросу пользователя найденные в нем инструменты (до вызова LLM)"""
+    hint = format_instrument_hint(get_instrument_resolver().resolve(text))
+    return f"{text}\n\nИнфо: {hint}" if hint else text
+
+@dataclass(slots=True)
+class AssistantResponse:
+    """Разобранный ответ ассистента (формат из <format_of_outputs>)"""
+
+    message: Optional[str] = None
+    requests: List[FinamRequest] = field(default_factory=list)
+    instructions: Optional[str] = None
+    last: bool = False
+
+
+def parse_assistant_response(text: str) -> AssistantResponse:
+    """
+    Разобрать ответ ассистента за одно декодирование JSON
+
+    Если ответ не является корректным JSON (обернут в ```json, окружен текстом,
+    оборван), из него вырезается внешний объект с учетом вложенных скобок и строк,
+    а при неудаче поля извлекаются по отдельности.
+    """
+    data = _decode(text)
+    if data is None:
+        logging.error("chat.parse_assistant_response: The model doesn't answer correctly!")
+        return _parse_tolerant(text)
+
+    message = data.get("message")
+    instructions = data.get("instructions")
+    return AssistantResponse(
+        message=message if isinstance(message, str) and message else None,
+        requests=_create_finam_requests(data.get("requests")),
+        instructions=instructions if isinstance(instructions, str) and instructions else None,
+        last=_is_last(data.get("last")),
+    )
+
 def extract_api_request(text: str) -> List[FinamRequest]:
     """ Извлечь запросы List[FinamRequest] из ответа ассистента"""
-    try:
-        requests = _parse_requests(text)
-    except ValueError:
-        logging.error("chat.extract_api_request: The model doesn't answer correctly!")
-        data = _extract_requests_manually(text)
-        requests = _create_finam_requests(data)
-    
-    # Возвращаем пустой список если requests None
-    return requests if requests is not None else []
+    return parse_assistant_response(text).requests
 
 def extract_message(text: str) -> Optional[str]:
-    try:
-        message = _parse_message_text(text)
-    except ValueError:
-        logging.error("chat.extract_message: The model doesn't answer correctly!")
-        message = _manual_parse_message(text)
-    
-    # Возвращаем None если message пустой
-    return message if message else None
+    return parse_assistant_response(text).message
 
 def extract_is_last_message(text: str) -> bool:
-    is_last = _parse_last_field(text)
-    return is_last == 1
+    return parse_assistant_response(text).last
 
 
-# ============= FOR API REQUESTS ==============================
+# ============= DECODING ==============================
 
-def _parse_requests(json_str: str) -> List[FinamRequest]:
-    try:
-        data = json.loads(json_str)
-    except json.JSONDecodeError as e:
-        raise ValueError("Invalid JSON format") from e
+# Строка JSON целиком (с экранированием) или одна из скобок - для прохода по структуре
+_STRUCTURE_RE = re.compile(r'"(?:[^"\\]|\\.)*"|[{}\[\]]', re.DOTALL)
+_CLOSER = {"{": "}", "[": "]"}
+_FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL | re.IGNORECASE)
+_STRING_FIELD_RE = {
+    name: re.compile(rf'"{name}"\s*:\s*("(?:[^"\\]|\\.)*")', re.DOTALL) for name in ("message", "instructions")
+}
+_LAST_RE = re.compile(r"""["']last["']\s*:\s*["']?(0|1|true|false)\b""", re.IGNORECASE)
+_REQUESTS_RE = re.compile(r'"requests"\s*:\s*\[')
+_METHOD_RE = re.compile(r'"method"\s*:\s*"([^"]*)"')
+_URL_RE = re.compile(r'"url"\s*:\s*"([^"]*)"')
+_BODY_RE = re.compile(r'"body"\s*:\s*(?=\{)')
 
-    if "requests" not in data:
-        return []
 
-    requests = []
-    for item in data["requests"]:
-        if not all(key in item for key in ("method", "url")):
+def _decode(text: str) -> Optional[Dict[str, Any]]:
+    """Декодировать JSON-объект ответа: сначала как есть, затем вырезав его из текста"""
+    for candidate in (text, _unfence(text)):
+        if candidate is None:
             continue
+        try:
+            data = loads(candidate)
+        except ValueError:
+            obj = _balanced(candidate, candidate.find("{"))
+            if obj is None:
+                continue
+            try:
+                data = loads(obj)
+            except ValueError:
+                continue
+        if isinstance(data, dict):
+            return data
+    return None
 
-        request = FinamRequest(
-            method=item["method"],
-            url=item["url"],
-            body=item.get("body")  # Может быть None или dict
-        )
-        requests.append(request)
 
-    return requests
+def _unfence(text: str) -> Optional[str]:
+    match = _FENCE_RE.search(text)
+    return match.group(1) if match else None
 
 
-def _extract_requests_manually(requests_str: str) -> List[Dict[str, Any]]:
+def _balanced(text: str, start: int) -> Optional[str]:
     """
-    Ручное извлечение объектов requests из строки с помощью регулярных выражений.
+    Фрагмент от открывающей скобки в позиции start до парной закрывающей
+
+    Закрывающая скобка должна соответствовать типу последней открытой ({ - }, [ - ]);
+    при несовпадении фрагмент некорректен и возвращается None.
     """
-    requests = []
+    if start < 0:
+        return None
+    closers: List[str] = []
+    for match in _STRUCTURE_RE.finditer(text, start):
+        token = match.group()
+        if token in _CLOSER:
+            closers.append(_CLOSER[token])
+        elif token in "}]":
+            if not closers or closers.pop() != token:
+                return None
+            if not closers:
+                return text[start : match.end()]
+    return None
 
-    # Паттерн для поиска отдельных объектов в массиве requests
-    object_pattern = r'\{[^{}]*"method"[^{}]*"url"[^{}]*\}'
-    matches = re.finditer(object_pattern, requests_str, re.DOTALL)
 
-    for match in matches:
-        obj_str = match.group(0)
-        try:
-            # Пытаемся распарсить отдельный объект
-            obj = __parse_single_object(obj_str)
-            if obj and 'method' in obj and 'url' in obj:
-                requests.append(obj)
-        except:
-            continue
+def _parse_tolerant(text: str) -> AssistantResponse:
+    """Извлечь поля из некорректного JSON по отдельности"""
+    response = AssistantResponse()
+    for name, pattern in _STRING_FIELD_RE.items():
+        match = pattern.search(text)
+        if match:
+            try:
+                value = json.loads(match.group(1))
+            except ValueError:
+                value = match.group(1)[1:-1]
+            setattr(response, name, value or None)
 
-    return requests
+    match = _LAST_RE.search(text)
+    response.last = bool(match) and match.group(1).lower() in ("1", "true")
 
+    # Объекты массива requests по одному: оборванный хвост не мешает уже закрытым объектам
+    match = _REQUESTS_RE.search(text)
+    if match:
+        items = []
+        pos = match.end()
+        while True:
+            start = text.find("{", pos)
+            closing = text.find("]", pos)
+            if start < 0 or 0 <= closing < start:
+                break
+            obj = _balanced(text, start)
+            if obj is None:
+                break
+            items.append(_loads_or_none(obj) or _request_fields(obj))
+            pos = start + len(obj)
+        response.requests = _create_finam_requests(items)
+    return response
+
+
+def _request_fields(obj: str) -> Optional[Dict[str, Any]]:
+    """Поля запроса из объекта с синтаксическими ошибками (лишние запятые и т.п.)"""
+    method = _METHOD_RE.search(obj)
+    url = _URL_RE.search(obj)
+    if not method or not url:
+        return None
+    body_match = _BODY_RE.search(obj)
+    body = _balanced(obj, body_match.end()) if body_match else None
+    return {"method": method.group(1), "url": url.group(1), "body": _loads_or_none(body) if body else None}
 
-def __parse_single_object(obj_str: str) -> Optional[Dict[str, Any]]:
-    """
-    Парсит отдельный объект запроса из строки.
-    """
-    result = {}
-
-    # Извлекаем method
-    method_match = re.search(r'"method"\s*:\s*"([^"]*)"', obj_str)
-    if method_match:
-        result['method'] = method_match.group(1)
-
-    # Извлекаем url
-    url_match = re.search(r'"url"\s*:\s*"([^"]*)"', obj_str)
-    if url_match:
-        result['url'] = url_match.group(1)
-
-    # Извлекаем body (может быть null или объектом)
-    body_match = re.search(r'"body"\s*:\s*(null|\{[^{}]*\})', obj_str, re.DOTALL)
-    if body_match:
-        body_str = body_match.group(1)
-        if body_str == 'null':
-            result['body'] = None
-        else:
-            try:
-                result['body'] = json.loads(body_str)
-            except:
-                # Если не получается распарсить body, оставляем None
-                result['body'] = None
 
-    return result if result else None
+def _is_last(value: Any) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true")
+    return value is True or value == 1
+
+
+def _loads_or_none(text: str) -> Optional[Any]:
+    try:
+        return loads(text)
+    except ValueError:
+        return None
+
+
+_PARTIAL_MESSAGE_RE = re.compile(r'"message"\s*:\s*"((?:[^"\\]|\\.)*)', re.DOTALL)
+
+
+def preview_message(partial_text: str) -> Optional[str]:
+    """Уже сгенерированная часть поля message из недописанного ответа (для потокового вывода)"""
+    match = _PARTIAL_MESSAGE_RE.search(partial_text)
+    if not match:
+        return None
+    value = match.group(1)
+    # Отрезаем незаконченную escape-последовательность в конце фрагмента
+    for cut in range(min(len(value), 6) + 1):
+        try:
+            return json.loads(f'"{value[: len(value) - cut]}"')
+        except ValueError:
+            continue
+    return value
 
 
-def _create_finam_requests(requests_data: List[Dict[str, Any]]) -> List[FinamRequest]:
+def _create_finam_requests(requests_data: Any) -> List[FinamRequest]:
     """
     Создает список объектов FinamRequest из данных.
     """
     requests = []
 
+    # В финальном ответе модель пишет "requests": null
     if not isinstance(requests_data, list):
         return requests
 
@@ -135,81 +223,75 @@ def _create_finam_requests(requests_data: List[Dict[str, Any]]) -> List[FinamReq
             continue
 
         if 'method' in item and 'url' in item:
+            body = item.get('body')
             request = FinamRequest(
-                method=item['method'],
+                method=str(item['method']).upper(),
                 url=item['url'],
-                body=item.get('body')
+                body=body if isinstance(body, dict) else None
             )
             requests.append(request)
 
     return requests
 
 
-## ===================== FOR EXTRACT message =============
+# ============= STREAMING REQUESTS ==============================
 
-def _parse_message_text(text: str) -> Optional[str]:
+class StreamingRequestParser:
     """
-    Извлекает текстовое содержимое поля message из текста.
-    Возвращает только строку с текстом или None, если поле не найдено или содержит не текст.
-    """
-    # Пытаемся сначала распарсить как корректный JSON
-    try:
-        data = json.loads(text)
-        if "message" in data and isinstance(data["message"], str):
-            return data["message"]
-        return None
-    except json.JSONDecodeError:
-        # Если JSON некорректный, ищем поле через регулярные выражения
-        raise ValueError("Invalid JSON format")
-
+    Инкрементальный разбор ответа LLM по мере генерации
 
-def _manual_parse_message(text: str) -> Optional[str]:
-    # Паттерн для поиска поля message со строковым значением
-    pattern = r'"message"\s*:\s*"([^"]*)"'
-    match = re.search(pattern, text, re.DOTALL)
-
-    if match:
-        return match.group(1)
-
-    return None
-
-
-# ========== FOR LAST ===========
-
-def _parse_last_field(text: str) -> Optional[int]:
-    """
-    Извлекает значение поля last из текста.
-    Возвращает 0, 1 или None, если поле не найдено или содержит недопустимое значение.
+    Отдает объекты массива "requests", как только закрывается их фигурная скобка,
+    не дожидаясь конца ответа. Полный текст накапливается в text.
     """
-    # Пытаемся сначала распарсить как корректный JSON
-    try:
-        data = json.loads(text)
-        if "last" in data:
-            value = data["last"]
-            # Преобразуем в int, если это строка
-            if isinstance(value, str) and value.isdigit():
-                value = int(value)
-            # Проверяем, что значение 0 или 1
-            if value in (0, 1):
-                return value
-        return None
-    except json.JSONDecodeError:
-        # Если JSON некорректный, ищем поле через регулярные выражения
-        pass
-
-    # Паттерны для поиска поля last с числовыми значениями 0 или 1
-    patterns = [
-        r'"last"\s*:\s*(0|1)',  # Число без кавычек
-        r'"last"\s*:\s*"(0|1)"',  # Число в кавычках
-        r"'last'\s*:\s*(0|1)",  # С одинарными кавычками для ключа
-        r"'last'\s*:\s*'(0|1)'",  # С одинарными кавычками для ключа и значения
-    ]
-
-    for pattern in patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            value = match.group(1)
-            # Всегда возвращаем как целое число
-            return int(value)
 
-    return None
\ No newline at end of file
+    _KEY_RE = re.compile(r'"requests"\s*:\s*\[')
+
+    def __init__(self) -> None:
+        self.text = ""
+        self._pos: Optional[int] = None  # позиция сканирования внутри массива requests
+        self._depth = 0
+        self._start = 0
+        self._in_string = False
+        self._escape = False
+        self._done = False
+
+    def feed(self, chunk: str) -> List[FinamRequest]:
+        """Добавить фрагмент ответа; вернуть запросы, объекты которых закрылись в нем"""
+        search_from = max(len(self.text) - 16, 0)
+        self.text += chunk
+        if self._done:
+            return []
+        if self._pos is None:
+            match = self._KEY_RE.search(self.text, search_from)
+            if not match:
+                return []
+            self._pos = match.end()
+
+        found = []
+        text = self.text
+        i = self._pos
+        while i < len(text):
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                if self._depth == 0:
+                    self._start = i
+                self._depth += 1
+            elif ch == "}" and self._depth > 0:
+                self._depth -= 1
+                if self._depth == 0:
+                    found.extend(_create_finam_requests([_loads_or_none(text[self._start : i + 1])]))
+            elif ch == "]" and self._depth == 0:
+                self._done = True
+                break
+            i += 1
+        self._pos = i
+        return found
@@ -3,21 +3,236 @@
 Streamlit веб-интерфейс для AI ассистента трейдера
 
 Использование:
-    poetry run streamlit run src/app/chat_app.py
-    streamlit run src/app/chat_app.py
+    poetry run streamlit run src/app/interfaces/chat_app.py
+    streamlit run src/app/interfaces/chat_app.py
+
+Клиенты Finam API (с пулом соединений и JWT), системный промпт и индексы общие
+для всех сессий браузера процесса (st.cache_resource). Цикл агента выполняется
+в фоновом пуле потоков: скрипт только отрисовывает события из очереди, поэтому
+ответ выводится по мере генерации, а перезапуск скрипта не прерывает запрос.
+
+История диалога хранится в SQLite (ConversationStore): на странице и в LLM
+используется окно последних сообщений, ответы API загружаются по запросу.
+Диалог продолжается после перезапуска по ссылке с параметром ?session=<id>.
+
+Свечи из ответов API показываются графиком, прореженным на сервере под ширину
+графика; готовые фигуры общие для всех сессий (см. charts).
 """
 
-import json
+import logging
+import queue
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any
 
 import streamlit as st
 
-from src.app.adapters import FinamAPIClient
+from src.app.adapters import ConversationStore, FinamAPIClient
 from src.app.core import get_settings
-from src.app.core import call_llm
+from src.app.core import PreTradeValidator, call_llm, stream_llm
+from src.app.core.instruments import InstrumentResolver, get_instrument_resolver
+from src.app.interfaces.agent import STOP_MAX_STEPS, STOP_TIMEOUT, AgentLoop, AgentResult, AgentStep
+from src.app.interfaces.charts import DEFAULT_WIDTH, FigureCache, candle_figure, chart_key, figure_key, warm_chart
+from src.app.interfaces.chat import annotate_user_input, preview_message
+from src.app.interfaces.rag import create_rag_system_prompt
+from src.app.models import Bars
 # from src.app.core.local_llm import call_llm
-from src.app.interfaces.promt import SYSTEM_PROMT, API_PROMT
 
-from chat import create_system_prompt, extract_message, extract_api_request, extract_is_last_message
+logger = logging.getLogger(__name__)
+
+# Пауза между опросами очереди событий фоновой задачи, секунды
+POLL_INTERVAL = 0.05
+# Одновременных ответов ассистента на процесс (по всем сессиям)
+MAX_BACKGROUND_JOBS = 32
+# Сколько последних сообщений диалога показывать на странице
+HISTORY_WINDOW = 50
+
+
+# ============= ОБЩИЕ РЕСУРСЫ ПРОЦЕССА ==============================
+
+@st.cache_resource(show_spinner=False)
+def get_finam_client(api_token: str | None, api_base_url: str | None) -> FinamAPIClient:
+    """Клиент Finam API, общий для всех сессий с тем же токеном и URL"""
+    return FinamAPIClient(access_token=api_token, base_url=api_base_url)
+
+
+@st.cache_resource(show_spinner=False)
+def get_resolver(api_token: str | None, api_base_url: str | None) -> InstrumentResolver:
+    """Индекс инструментов, дополненный справочником /v1/assets (загружается один раз)"""
+    resolver = get_instrument_resolver()
+    client = get_finam_client(api_token, api_base_url)
+    if client.access_token:
+        resolver.load_assets(client)
+    return resolver
+
+
+@st.cache_resource(show_spinner=False)
+def get_validator(api_token: str | None, api_base_url: str | None) -> PreTradeValidator:
+    """Проверка заявок с кэшем справочных данных, общим для сессий с тем же клиентом"""
+    return PreTradeValidator(get_finam_client(api_token, api_base_url))
+
+
+@st.cache_resource(show_spinner=False)
+def get_store() -> ConversationStore:
+    """Хранилище диалогов (соединение SQLite на поток)"""
+    return ConversationStore()
+
+
+def get_session_id(store: ConversationStore) -> str:
+    """ID диалога из ссылки (?session=) или новый; сохраняется в ссылке для продолжения"""
+    if "session_id" not in st.session_state:
+        session_id = st.query_params.get("session")
+        if not session_id or not store.has_session(session_id):
+            session_id = store.create_session(meta={"interface": "web"})
+        st.session_state.session_id = session_id
+    st.query_params["session"] = st.session_state.session_id
+    return st.session_state.session_id
+
+
+@st.cache_resource(show_spinner=False)
+def get_figure_cache() -> FigureCache:
+    """Кэш графиков свечей по (symbol, timeframe, интервал, ширина)"""
+    return FigureCache()
+
+
+@st.cache_resource(show_spinner=False)
+def get_executor() -> ThreadPoolExecutor:
+    """Пул потоков для циклов агента всех сессий"""
+    return ThreadPoolExecutor(max_workers=MAX_BACKGROUND_JOBS, thread_name_prefix="chat-app")
+
+
+# ============= ФОНОВЫЙ ОТВЕТ ==============================
+
+@dataclass
+class ChatJob:
+    """Ответ ассистента, выполняющийся в фоне; переживает перезапуски скрипта"""
+
+    events: queue.Queue = field(default_factory=queue.Queue)
+    future: Future | None = None
+    text: str = ""
+    steps: list[AgentStep] = field(default_factory=list)
+
+
+def start_job(
+    client: FinamAPIClient,
+    validator: PreTradeValidator,
+    history: list[dict[str, str]],
+    max_steps: int,
+    allow_orders: bool,
+) -> ChatJob:
+    """Запустить цикл агента в фоне; события (фрагменты ответа, шаги) идут в очередь задачи"""
+    job = ChatJob()
+    figures = get_figure_cache()
+
+    def on_step(step: AgentStep) -> None:
+        # Графики свечей строятся здесь, в фоне, пока ответ еще генерируется
+        for request, response in zip(step.requests, step.responses, strict=True):
+            try:
+                warm_chart(figures, request.url, response, DEFAULT_WIDTH)
+            except Exception:
+                # График не должен прерывать ответ: на странице он построится из сохраненного ответа
+                logger.exception("Не удалось построить график для %s", request.url)
+        job.events.put(("step", step))
+
+    agent = AgentLoop(
+        client,
+        llm=call_llm,
+        max_steps=max_steps,
+        # Модифицирующие запросы выполняются только с разрешения в настройках
+        approve=lambda _request: allow_orders,
+        on_step=on_step,
+        # GET запросы уходят в API, пока LLM дописывает ответ
+        stream_llm=stream_llm,
+        on_token=lambda chunk: job.events.put(("token", chunk)),
+        validator=validator,
+    )
+    job.future = get_executor().submit(agent.run, history)
+    return job
+
+
+def render_chart(store: ConversationStore, message_id: int, path: str) -> None:
+    """График свечей из ответа на запрос path (строится один раз, дальше берется из кэша)"""
+    key = chart_key(path)
+    if key is None:
+        return
+
+    figures = get_figure_cache()
+
+    def build() -> Any:  # noqa: ANN401
+        raw = store.payload_raw(message_id, path)
+        bars = Bars.from_json(raw) if raw else None
+        if bars is None or not len(bars):
+            return None
+        # Фигура, построенная warm_chart по этим же свечам, берется из кэша
+        return figures.get(figure_key(key, bars, DEFAULT_WIDTH), lambda: candle_figure(bars, DEFAULT_WIDTH))
+
+    # При перерисовке страницы сообщение находит фигуру без чтения ответа из базы
+    figure = figures.get((message_id, path, DEFAULT_WIDTH), build)
+    if figure is not None:
+        st.plotly_chart(figure, use_container_width=True, key=f"chart-{message_id}-{path}")
+
+
+def render_step(step: AgentStep) -> None:
+    """Промежуточное сообщение модели и выполненные запросы шага"""
+    if step.requests and (message := step.parsed.message):
+        st.info(message)
+    for finam_request, api_response in zip(step.requests, step.responses, strict=True):
+        st.info(f"🔍 Выполнен запрос: `{finam_request.method} {finam_request.url}`")
+        if "error" in api_response:
+            st.error(f"⚠️ Ошибка API: {api_response.get('error')}")
+            if "details" in api_response:
+                st.error(f"Детали: {api_response['details']}")
+    if step.requests:
+        st.caption(
+            f"⏱️ Шаг {step.index}: LLM {step.llm_seconds:.1f} с, API {step.api_seconds:.1f} с, "
+            f"результаты {step.raw_tokens} → {step.result_tokens} токенов (−{step.saved_tokens})"
+        )
+
+
+def follow_job(job: ChatJob) -> dict[str, Any] | None:
+    """
+    Отрисовывать события фоновой задачи до ее завершения
+
+    Returns:
+        Сообщение ассистента для истории или None, если задача завершилась ошибкой
+    """
+    for step in job.steps:
+        render_step(step)
+    steps_area = st.container()
+    placeholder = st.empty()
+
+    while True:
+        finished = job.future.done()
+        while True:
+            try:
+                kind, payload = job.events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "token":
+                job.text += payload
+            else:
+                job.steps.append(payload)
+                job.text = ""
+                with steps_area:
+                    render_step(payload)
+        placeholder.markdown(preview_message(job.text) or "⏳ Думаю...")
+        if finished:
+            break
+        time.sleep(POLL_INTERVAL)
+
+    try:
+        result: AgentResult = job.future.result()
+    except Exception as e:
+        placeholder.error(f"❌ Ошибка: {e}")
+        return None
+
+    assistant_message = result.message or result.assistant_message
+    placeholder.markdown(assistant_message)
+    if result.stop_reason in (STOP_MAX_STEPS, STOP_TIMEOUT):
+        st.warning(f"⏱️ Ответ прерван ({result.stop_reason}) за {result.elapsed:.1f} с")
+
+    return {"role": "assistant", "content": assistant_message, "api_requests": result.api_requests}
 
 
 def main() -> None:  # noqa: C901
@@ -44,9 +259,17 @@ def main() -> None:  # noqa: C901
             api_base_url = st.text_input("API Base URL", value="https://api.finam.ru", help="Базовый URL API")
 
         account_id = st.text_input("ID счета", value="", help="Оставьте пустым если не требуется")
+        allow_orders = st.checkbox(
+            "Разрешить заявки", value=False, help="Разрешить ассистенту создавать и отменять заявки (POST/DELETE)"
+        )
+        max_steps = st.slider("Максимум шагов агента", min_value=1, max_value=10, value=5)
 
+        store = get_store()
+        session_id = get_session_id(store)
+        st.caption(f"Диалог: `{session_id}`")
         if st.button("🔄 Очистить историю"):
-            st.session_state.messages = []
+            store.clear(session_id)
+            st.session_state.pop("job", None)
             st.rerun()
 
         st.markdown("---")
@@ -60,12 +283,8 @@ def main() -> None:  # noqa: C901
         - Детали моей сессии
         """)
 
-    # Инициализация состояния
-    if "messages" not in st.session_state:
-        st.session_state.messages = []
-
-    # Инициализация Finam API клиента
-    finam_client = FinamAPIClient(access_token=api_token or None, base_url=api_base_url if api_base_url else None)
+    # Клиент Finam API общий для всех сессий с теми же настройками (пул соединений, JWT)
+    finam_client = get_finam_client(api_token or None, api_base_url or None)
 
     # Проверка токена
     if not finam_client.access_token:
@@ -74,87 +293,54 @@ def main() -> None:  # noqa: C901
         )
     else:
         st.sidebar.success("✅ Finam API токен установлен")
-
-    # Отображение истории сообщений
-    for message in st.session_state.messages:
-        with st.chat_message(message["role"]):
-            st.markdown(message["content"])
-
-            # Показываем API запросы
-            if "api_request" in message:
-                with st.expander("🔍 API запрос"):
-                    st.code(f"{message['api_request']['method']} {message['api_request']['path']}", language="http")
-                    st.json(message["api_request"]["response"])
-
-    # Поле ввода
-    if prompt := st.chat_input("Напишите ваш вопрос..."):
-        # TODO: где-то здесь надо добавить RAG
-
+    # Справочник инструментов загружается один раз на процесс
+    get_resolver(api_token or None, api_base_url or None)
+
+    # Отображение истории сообщений (окно последних)
+    for message in store.recent(session_id, HISTORY_WINDOW):
+        with st.chat_message(message.role):
+            st.markdown(message.content)
+            for path in message.paths:
+                render_chart(store, message.id, path)
+
+            # Ответы API читаются из хранилища, только если их раскрыли
+            if message.payload_count and st.toggle(
+                f"🔍 API запросы ({message.payload_count})", key=f"payloads-{message.id}"
+            ):
+                for payload in store.payloads(message.id):
+                    st.code(f"{payload.method} {payload.path}", language="http")
+                    st.json(payload.response, expanded=False)
+
+    # Поле ввода (пока идет ответ, новый вопрос не принимается)
+    job: ChatJob | None = st.session_state.get("job")
+    if (prompt := st.chat_input("Напишите ваш вопрос...", disabled=job is not None)) and job is None:
         # Добавляем сообщение пользователя
-        st.session_state.messages.append({"role": "user", "content": prompt})
+        # В LLM уходит вопрос с подсказкой по найденным инструментам
+        question = annotate_user_input(prompt)
+        store.append(session_id, "user", prompt, llm_content=question)
         with st.chat_message("user"):
             st.markdown(prompt)
 
-        # Формируем историю для LLM
-        conversation_history = [{"role": "system", "content": create_system_prompt()}]
-        for msg in st.session_state.messages:
-            conversation_history.append({"role": msg["role"], "content": msg["content"]})
+        # Формируем историю для LLM: системный промпт с подходящими к вопросу эндпоинтами
+        # и окно последних сообщений
+        conversation_history = store.history(session_id, create_rag_system_prompt(question))
 
-        # Получаем ответ от ассистента
-        with st.chat_message("assistant"), st.spinner("Думаю..."):
-            try:
-                response = call_llm(conversation_history, temperature=0.3)
-                assistant_message = response["choices"][0]["message"]["content"]
-
-                # ЗДЕСЬ надо отправить еще пользователю тот текст, что засунут в message в ответе LLM
-                message = extract_message(assistant_message) # вот его
-                st.info(message)
-
-
-                # Проверяем, есть ли API запрос
-                finam_requests = extract_api_request(assistant_message)
-
-                if finam_requests:
-                    # TODO: Сделать получение апрува пользователя на каждый модифицирующий запрос!!!
-                    for finam_request in finam_requests:
-                        # Показываем что делаем запрос
-                        st.info(f"🔍 Выполняю запрос: `{finam_request.method} {finam_request.url}`")
-                        api_response = finam_client.execute_finam_requests(finam_requests)
-
-                        # Проверяем на ошибки
-                        if "error" in api_response:
-                            st.error(f"⚠️ Ошибка API: {api_response.get('error')}")
-                            if "details" in api_response:
-                                st.error(f"Детали: {api_response['details']}")
-                        else:
-                            st.info(f"   📡 Ответ API: {api_response}\n")
-
-                        # Добавляем результат API в контекст
-                        conversation_history.append({"role": "assistant", "content": assistant_message})
-                        conversation_history.append({
-                            "role": "user",
-                            "content": f"Результат API запроса: {api_response}\n\nПроанализируй это.",
-                        })
-
-                    # TODO: Надо исправить, чтобы в цикле проходилось до тех пор, пока ллмка extract_is_last_message от ответа ассистента не будет равна true
-                    # Последнее ли это сообщение extract_is_last_message(llm_response: str) -> is_last: bool
-                    # True, если последнее
-                    # Доставать message для пользователя из json надо функцией extract_message(llm_response: str) -> message: str
-
-                    # Получаем финальный ответ
-                    response = call_llm(conversation_history, temperature=0.3)
-                    assistant_message = response["choices"][0]["message"]["content"]
-
-                st.markdown(assistant_message)
-
-                # Сохраняем сообщение ассистента
-                message_data = {"role": "assistant", "content": assistant_message}
-                if api_response:
-                    message_data["api_request"] = api_response
-                st.session_state.messages.append(message_data)
-
-            except Exception as e:
-                st.error(f"❌ Ошибка: {e}")
+        job = st.session_state.job = start_job(
+            finam_client,
+            get_validator(api_token or None, api_base_url or None),
+            conversation_history,
+            max_steps,
+            allow_orders,
+        )
+
+    # Ответ ассистента: отрисовываем события фоновой задачи (в том числе после перезапуска скрипта)
+    if job is not None:
+        with st.chat_message("assistant"):
+            message_data = follow_job(job)
+        del st.session_state.job
+        if message_data is not None:
+            store.append(session_id, **message_data)
+        st.rerun()
 
 
 if __name__ == "__main__":
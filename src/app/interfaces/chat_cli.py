@@ -4,6 +4,7 @@
 
 Использование:
     poetry run chat-cli
+    poetry run chat-cli --session <id>   # продолжить сохраненный диалог
     python -m src.app.chat_cli
 """
 
@@ -11,28 +12,82 @@ import sys
 
 import click
 
-from src.app.adapters import FinamAPIClient
-from src.app.core import call_llm, get_settings
-from src.app.interfaces.promt import SYSTEM_PROMT, API_PROMT
+from src.app.adapters import ConversationStore, FinamAPIClient
+from src.app.core import PreTradeValidator, get_settings, stream_llm
+from src.app.core.instruments import get_instrument_resolver
+from src.app.models import FinamRequest
 
 
-from .chat import create_system_prompt, extract_message, extract_api_request, extract_is_last_message
+from .agent import STOP_MAX_STEPS, STOP_TIMEOUT, AgentLoop, AgentStep
+from .chat import annotate_user_input
+from .rag import create_rag_system_prompt
 
 
+def confirm_request(request: FinamRequest) -> bool:
+    """Спросить подтверждение на модифицирующий запрос"""
+    body = f" {request.body}" if request.body else ""
+    return click.confirm(f"\n   ⚠️  Выполнить {request.method} {request.url}{body}?", default=False)
+
+
+def print_step(step: AgentStep) -> None:
+    """Показать запросы и ответы API шага агента"""
+    if step.requests and (message := step.parsed.message):
+        click.echo(f"🤖 Ассистент: {message}")
+    for request, api_response in zip(step.requests, step.responses, strict=True):
+        click.echo(f"\n   🔍 Выполняю запрос: {request.method} {request.url}")
+        if "error" in api_response:
+            click.echo(f"   ⚠️  Ошибка API: {api_response.get('error')}", err=True)
+            if "details" in api_response:
+                click.echo(f"   Детали: {api_response['details']}", err=True)
+        else:
+            click.echo(f"   📡 Ответ API: {api_response}")
+    if step.requests:
+        click.echo(
+            f"   ⏱️  Шаг {step.index}: LLM {step.llm_seconds:.1f} с, API {step.api_seconds:.1f} с, "
+            f"результаты {step.raw_tokens} → {step.result_tokens} токенов (−{step.saved_tokens})"
+        )
+
 
 @click.command()
 @click.option("--account-id", default=None, help="ID счета для работы (опционально)")
 @click.option("--api-token", default=None, help="Finam API токен (или используйте FINAM_ACCESS_TOKEN)")
-def main(account_id: str | None, api_token: str | None) -> None:  # noqa: C901
+@click.option(
+    "--subscribe",
+    default=None,
+    help="Символы для потоковых котировок и стаканов через запятую (например, SBER@MISX)",
+)
+@click.option("--max-steps", type=int, default=5, help="Максимум обращений к LLM на один вопрос")
+@click.option("--time-budget", type=float, default=90.0, help="Ограничение времени ответа на вопрос, секунды")
+@click.option("--session", "session_id", default=None, help="ID сохраненного диалога, чтобы продолжить его")
+@click.option("--db", default=None, help="Файл базы диалогов (или CHAT_DB_PATH)")
+def main(  # noqa: C901
+    account_id: str | None,
+    api_token: str | None,
+    subscribe: str | None,
+    max_steps: int,
+    time_budget: float,
+    session_id: str | None,
+    db: str | None,
+) -> None:
     """Запустить интерактивный CLI чат с AI ассистентом"""
     settings = get_settings()
 
     # Инициализируем клиент Finam API
     finam_client = FinamAPIClient(access_token=api_token)
+    if subscribe:
+        # Котировки и стаканы по этим символам будут отвечаться из памяти
+        try:
+            finam_client.subscribe([symbol.strip() for symbol in subscribe.split(",") if symbol.strip()])
+        except ImportError as e:
+            click.echo(f"⚠️  Подписки отключены: {e}")
 
     # Проверяем подключение
     if finam_client.access_token:
         click.echo("✅ Finam API токен установлен")
+        # Справочник инструментов дополняет встроенную таблицу названий
+        loaded = get_instrument_resolver().load_assets(finam_client)
+        if loaded:
+            click.echo(f"📚 Загружено инструментов: {loaded}")
     else:
         click.echo("⚠️  Внимание: Finam API токен не установлен!")
         click.echo("   Установите переменную окружения FINAM_ACCESS_TOKEN")
@@ -41,17 +96,37 @@ def main(account_id: str | None, api_token: str | None) -> None:  # noqa: C901
     click.echo("=" * 70)
     click.echo("🤖 AI Ассистент Трейдера (Finam TradeAPI)")
     click.echo("=" * 70)
+    # История диалога хранится в SQLite: в память загружается только окно последних сообщений
+    store = ConversationStore(db)
+    if session_id and not store.has_session(session_id):
+        click.echo(f"⚠️  Диалог {session_id} не найден, начинаю новый")
+        session_id = None
+    session_id = session_id or store.create_session(meta={"interface": "cli", "account_id": account_id})
+
     click.echo(f"Модель: {settings.openrouter_model}")
     click.echo(f"API URL: {finam_client.base_url}")
     if account_id:
         click.echo(f"Счет: {account_id}")
+    if finam_client.market_data:
+        click.echo(f"Подписки: {', '.join(sorted(finam_client.market_data.symbols))}")
+    click.echo(f"Диалог: {session_id} (продолжить: --session {session_id})")
     click.echo("\nКоманды:")
     click.echo("  - Просто пишите свои вопросы на русском")
     click.echo("  - 'exit' или 'quit' - выход")
     click.echo("  - 'clear' - очистить историю")
     click.echo("=" * 70)
 
-    conversation_history = [{"role": "system", "content": create_system_prompt()}]
+    # Потоковая генерация: GET запросы уходят в API, пока LLM дописывает ответ
+    agent = AgentLoop(
+        finam_client,
+        max_steps=max_steps,
+        time_budget=time_budget,
+        approve=confirm_request,
+        on_step=print_step,
+        stream_llm=stream_llm,
+        # Заявки проверяются по лоту, шагу цены, расписанию и средствам до подтверждения
+        validator=PreTradeValidator(finam_client),
+    )
 
     while True:
         try:
@@ -63,60 +138,26 @@ def main(account_id: str | None, api_token: str | None) -> None:  # noqa: C901
                 break
 
             if user_input.lower() in ["clear", "очистить"]:
-                conversation_history = [{"role": "system", "content": create_system_prompt()}]
+                store.clear(session_id)
                 click.echo("🔄 История очищена")
                 continue
 
 
-            # TODO: где-то здесь надо добавить RAG
-
             # Добавляем вопрос в историю
-            conversation_history.append({"role": "user", "content": user_input})
-
-            # Получаем ответ от LLM
-            response = call_llm(conversation_history, temperature=0.3)
-            assistant_message = response["choices"][0]["message"]["content"]
-
-            # Проверяем, есть ли API запрос
-            finam_requests = extract_api_request(assistant_message)
-
-            if finam_requests:
-                click.echo("🤖 Ассистент: ", nl=False)
-                for finam_request in finam_requests:
-                    # Выполняем API запрос
-                    click.echo(f"\n   🔍 Выполняю запрос: {finam_request.method} {finam_request.url}")
-                    api_response = finam_client.execute_finam_requests([finam_request])
-
-                    # Проверяем на ошибки
-                    if "error" in api_response:
-                        click.echo(f"   ⚠️  Ошибка API: {api_response.get('error')}", err=True)
-                        if "details" in api_response:
-                            click.echo(f"   Детали: {api_response['details']}", err=True)
-                    else:
-                        click.echo(f"   📡 Ответ API: {api_response}\n")
-
-                    # Добавляем результат API в контекст
-                    conversation_history.append({"role": "assistant", "content": assistant_message})
-                    conversation_history.append({
-                        "role": "user",
-                        "content": f"Результат API запроса: {api_response}\n\nПроанализируй это.",
-                    })
-
-                # Получаем финальный ответ
-                response = call_llm(conversation_history, temperature=0.3)
-                assistant_message = response["choices"][0]["message"]["content"]
-
-            # Извлекаем сообщение для пользователя
-            user_message = extract_message(assistant_message)
-            if user_message:
-                click.echo("🤖 Ассистент: ", nl=False)
-                click.echo(f"{user_message}\n")
-            else:
-                click.echo("🤖 Ассистент: ", nl=False)
-                click.echo(f"{assistant_message}\n")
-            
-            conversation_history.append({"role": "assistant", "content": assistant_message})
-
+            question = annotate_user_input(user_input)
+            store.append(session_id, "user", user_input, llm_content=question)
+
+            # Цикл агента: LLM -> запросы к API -> LLM, пока модель не даст финальный ответ
+            # В системном промпте - только описания эндпоинтов, подходящих к вопросу
+            result = agent.run(store.history(session_id, create_rag_system_prompt(question)))
+            assistant_message = result.message or result.assistant_message
+            # Промежуточные шаги не сохраняются: в историю идет итоговый ответ, ответы API - отдельно
+            store.append(session_id, "assistant", assistant_message, api_requests=result.api_requests)
+
+            click.echo("🤖 Ассистент: ", nl=False)
+            click.echo(f"{assistant_message}\n")
+            if result.stop_reason in (STOP_MAX_STEPS, STOP_TIMEOUT):
+                click.echo(f"   ⏱️  Ответ прерван ({result.stop_reason}) за {result.elapsed:.1f} с", err=True)
 
         except KeyboardInterrupt:
             click.echo("\n\n👋 До свидания!")
@@ -0,0 +1,451 @@
+#!/usr/bin/env python3
+"""
+Асинхронный HTTP/WebSocket сервис чата для многих одновременных пользователей
+
+Каждая сессия хранит свою историю диалога; клиенты Finam API (пулы соединений,
+JWT) общие для сессий с одинаковым токеном и URL и закрываются вместе с последней
+из них (удаление или истечение неактивной сессии). Цикл агента (AgentLoop)
+выполняется в пуле потоков, а ответы передаются клиенту потоком событий:
+фрагменты ответа LLM, выполненные шаги, итог с замерами времени. Число
+одновременных обращений к каждому внешнему сервису (LLM, каждый Finam API)
+ограничено семафорами.
+
+Безопасность:
+- создание сессии требует ключа сервиса (Authorization: Bearer <CHAT_SERVICE_API_KEY>):
+  сессия без своего токена работает от имени FINAM_ACCESS_TOKEN сервера
+- токен сервера используется только с его же FINAM_API_BASE_URL: сессия со своим
+  base_url обязана передать свой токен, иначе секрет сервера ушел бы на чужой хост
+- разрешение на выставление заявок - настройка сервиса (--allow-orders), а не поле запроса
+
+API:
+    POST   /v1/chat/sessions                      создать сессию (ключ сервиса) -> {"session_id"}
+    POST   /v1/chat/sessions/{session_id}/messages  вопрос -> поток событий NDJSON
+    WS     /v1/chat/sessions/{session_id}/ws       {"text": ...} -> события JSON
+    DELETE /v1/chat/sessions/{session_id}          удалить сессию
+    GET    /v1/chat/stats                          сессии, нагрузка, перцентили задержек
+
+Использование:
+    CHAT_SERVICE_API_KEY=... poetry run chat-service --port 8000 [--allow-orders]
+"""
+
+import asyncio
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+import uuid
+from collections import deque
+from collections.abc import AsyncIterator, Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any
+
+import click
+import numpy as np
+import uvicorn
+from fastapi import Depends, FastAPI, Header, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ConfigDict, Field
+
+from src.app.adapters import FinamAPIClient
+from src.app.core import PreTradeValidator, call_llm, stream_llm
+from src.app.interfaces.agent import AgentLoop, AgentResult, AgentStep
+from src.app.interfaces.chat import annotate_user_input
+from src.app.interfaces.rag import create_rag_system_prompt, warmup_rag
+from src.app.models import FinamRequest
+
+logger = logging.getLogger(__name__)
+
+# Одновременных ответов (циклов агента) на процесс
+MAX_ACTIVE_TURNS = 256
+# Одновременных обращений к LLM и к каждому Finam API
+LLM_CONCURRENCY = 64
+FINAM_CONCURRENCY = 16
+# Неактивная сессия удаляется через, секунд
+SESSION_TTL = 3600
+# Предел max_steps, который может запросить сессия (каждый шаг - вызов LLM)
+MAX_STEPS = 10
+# Сколько последних замеров хранить для перцентилей
+LATENCY_WINDOW = 10_000
+
+
+# ============= ОГРАНИЧЕНИЕ НАГРУЗКИ НА ВНЕШНИЕ СЕРВИСЫ ==============================
+
+
+class LimitedFinamClient:
+    """Обертка клиента Finam API, ограничивающая число одновременных запросов"""
+
+    def __init__(self, client: FinamAPIClient, limit: threading.BoundedSemaphore) -> None:
+        self.client = client
+        self.limit = limit
+        # Кэш справочных данных для проверки заявок общий для сессий этого клиента
+        self.validator = PreTradeValidator(self)  # type: ignore[arg-type]
+
+    def execute_finam_request(self, request: FinamRequest) -> dict[str, Any]:
+        with self.limit:
+            return self.client.execute_finam_request(request)
+
+
+def limit_llm(
+    llm: Callable[..., dict[str, Any]], stream: Callable[..., Iterator[str]], limit: threading.BoundedSemaphore
+) -> tuple[Callable[..., dict[str, Any]], Callable[..., Iterator[str]]]:
+    """Обернуть вызовы LLM семафором (потоковый держит слот до конца генерации)"""
+
+    def limited_llm(*args: Any, **kwargs: Any) -> dict[str, Any]:  # noqa: ANN401
+        with limit:
+            return llm(*args, **kwargs)
+
+    def limited_stream(*args: Any, **kwargs: Any) -> Iterator[str]:  # noqa: ANN401
+        with limit:
+            yield from stream(*args, **kwargs)
+
+    return limited_llm, limited_stream
+
+
+# ============= СЕССИИ ==============================
+
+
+@dataclass
+class ChatSession:
+    """Состояние диалога одного пользователя"""
+
+    session_id: str
+    client_key: tuple[str | None, str | None]
+    max_steps: int = 5
+    # Дополнение системного промпта (account_id), сам промпт собирается под каждый вопрос
+    info: str = ""
+    # Сообщения диалога без системного промпта
+    history: list[dict[str, str]] = field(default_factory=list)
+    last_active: float = field(default_factory=time.monotonic)
+    # Вопросы одной сессии обрабатываются по очереди
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+
+class LatencyStats:
+    """Скользящее окно замеров задержки"""
+
+    def __init__(self, window: int = LATENCY_WINDOW) -> None:
+        self._samples: dict[str, deque[float]] = {}
+        self._window = window
+
+    def add(self, name: str, seconds: float) -> None:
+        self._samples.setdefault(name, deque(maxlen=self._window)).append(seconds)
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        result = {}
+        for name, samples in self._samples.items():
+            if not samples:
+                continue
+            p50, p95, p99 = np.percentile(np.fromiter(samples, float), [50, 95, 99]) * 1000
+            result[name] = {
+                "count": len(samples),
+                "p50_ms": round(float(p50), 1),
+                "p95_ms": round(float(p95), 1),
+                "p99_ms": round(float(p99), 1),
+            }
+        return result
+
+
+class ChatService:
+    """Сессии, общие клиенты и выполнение циклов агента"""
+
+    def __init__(
+        self,
+        llm: Callable[..., dict[str, Any]] = call_llm,
+        stream: Callable[..., Iterator[str]] | None = stream_llm,
+        max_active_turns: int = MAX_ACTIVE_TURNS,
+        llm_concurrency: int = LLM_CONCURRENCY,
+        finam_concurrency: int = FINAM_CONCURRENCY,
+        session_ttl: float = SESSION_TTL,
+        system_prompt: Callable[[str], str] = create_rag_system_prompt,
+        api_key: str | None = None,
+        allow_orders: bool = False,
+    ) -> None:
+        """
+        Args:
+            api_key: Ключ для создания сессий (по умолчанию CHAT_SERVICE_API_KEY)
+            allow_orders: Выполнять заявки без подтверждения во всех сессиях (иначе заявки отклоняются)
+        """
+        self.api_key = api_key or os.getenv("CHAT_SERVICE_API_KEY") or None
+        self.allow_orders = allow_orders
+        self.llm, self.stream = limit_llm(llm, stream or _no_stream, threading.BoundedSemaphore(llm_concurrency))
+        self.streaming = stream is not None
+        self.executor = ThreadPoolExecutor(max_workers=max_active_turns, thread_name_prefix="chat-turn")
+        self.finam_concurrency = finam_concurrency
+        self.session_ttl = session_ttl
+        self.system_prompt = system_prompt
+        self.sessions: dict[str, ChatSession] = {}
+        self.stats = LatencyStats()
+        self.active_turns = 0
+        self._clients: dict[tuple[str | None, str | None], LimitedFinamClient] = {}
+        self._clients_lock = threading.Lock()
+
+    def client(self, key: tuple[str | None, str | None]) -> LimitedFinamClient:
+        """Общий клиент Finam API (и лимит запросов) для пары (токен, base_url)"""
+        with self._clients_lock:
+            if key not in self._clients:
+                token, base_url = key
+                self._clients[key] = LimitedFinamClient(
+                    FinamAPIClient(access_token=token, base_url=base_url),
+                    threading.BoundedSemaphore(self.finam_concurrency),
+                )
+            return self._clients[key]
+
+    def create_session(
+        self,
+        token: str | None = None,
+        base_url: str | None = None,
+        account_id: str | None = None,
+        max_steps: int = 5,
+    ) -> ChatSession:
+        """
+        Новая сессия
+
+        Raises:
+            ValueError: base_url передан без token - токен сервера на чужой хост не отправляется
+        """
+        if base_url and not token:
+            raise ValueError("base_url requires token: server credentials are used only with the server's API URL")
+        self._evict_idle()
+        session = ChatSession(
+            session_id=uuid.uuid4().hex,
+            client_key=(token, base_url),
+            max_steps=max_steps,
+            info=f"\nИнфо: account_id: {account_id}" if account_id else "",
+        )
+        self.sessions[session.session_id] = session
+        return session
+
+    def delete_session(self, session_id: str) -> bool:
+        deleted = self.sessions.pop(session_id, None) is not None
+        self._release_clients()
+        return deleted
+
+    def get_session(self, session_id: str) -> ChatSession:
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise HTTPException(status_code=404, detail="Session not found")
+        session.last_active = time.monotonic()
+        return session
+
+    async def ask(self, session: ChatSession, text: str) -> AsyncIterator[dict[str, Any]]:
+        """
+        Ответить на вопрос в сессии потоком событий
+
+        События: {"type": "token", "text"}, {"type": "step", ...}, {"type": "done", ...}
+        или {"type": "error", "error"}.
+        """
+        async with session.lock:
+            loop = asyncio.get_running_loop()
+            events: asyncio.Queue[dict[str, Any] | None] = asyncio.Queue()
+
+            def emit(event: dict[str, Any] | None) -> None:
+                loop.call_soon_threadsafe(events.put_nowait, event)
+
+            started = time.perf_counter()
+            first_token: list[float] = []
+
+            def on_token(chunk: str) -> None:
+                if not first_token:
+                    first_token.append(time.perf_counter() - started)
+                emit({"type": "token", "text": chunk})
+
+            client = self.client(session.client_key)
+            agent = AgentLoop(
+                client,  # type: ignore[arg-type]
+                llm=self.llm,
+                max_steps=session.max_steps,
+                approve=lambda _request: self.allow_orders,
+                on_step=lambda step: emit(_step_event(step)),
+                stream_llm=self.stream if self.streaming else None,
+                on_token=on_token,
+                validator=client.validator,
+            )
+            history: list[dict[str, str]] = []
+
+            def run() -> AgentResult:
+                try:
+                    # Системный промпт с описаниями эндпоинтов под вопрос (поиск - в потоке, не в event loop)
+                    question = annotate_user_input(text)
+                    system = {"role": "system", "content": self.system_prompt(question) + session.info}
+                    history.extend([system, *session.history, {"role": "user", "content": question}])
+                    return agent.run(history)
+                finally:
+                    emit(None)
+
+            self.active_turns += 1
+            future = loop.run_in_executor(self.executor, run)
+            try:
+                while (event := await events.get()) is not None:
+                    yield event
+                result = await future
+            except Exception as e:
+                logger.exception("Ошибка обработки вопроса в сессии %s", session.session_id)
+                yield {"type": "error", "error": str(e)}
+                return
+            finally:
+                self.active_turns -= 1
+
+            session.history = history[1:]
+            elapsed = time.perf_counter() - started
+            self.stats.add("turn", elapsed)
+            if first_token:
+                self.stats.add("first_token", first_token[0])
+            for step in result.steps:
+                self.stats.add("llm_step", step.llm_seconds)
+                if step.requests:
+                    self.stats.add("api_step", step.api_seconds)
+            yield {
+                "type": "done",
+                "message": result.message or result.assistant_message,
+                "stop_reason": result.stop_reason,
+                "steps": len(result.steps),
+                "elapsed_ms": round(elapsed * 1000, 1),
+                "first_token_ms": round(first_token[0] * 1000, 1) if first_token else None,
+            }
+
+    def summary(self) -> dict[str, Any]:
+        return {
+            "sessions": len(self.sessions),
+            "active_turns": self.active_turns,
+            "finam_clients": len(self._clients),
+            "latency": self.stats.summary(),
+        }
+
+    def _evict_idle(self) -> None:
+        deadline = time.monotonic() - self.session_ttl
+        for session_id in [s.session_id for s in self.sessions.values() if s.last_active < deadline]:
+            del self.sessions[session_id]
+        self._release_clients()
+
+    def _release_clients(self) -> None:
+        """Закрыть клиентов, токены которых больше не нужны ни одной сессии (иначе они копятся)"""
+        in_use = {s.client_key for s in self.sessions.values()}
+        with self._clients_lock:
+            unused = [key for key in self._clients if key not in in_use]
+            released = [self._clients.pop(key) for key in unused]
+        for limited in released:
+            limited.client.session.close()
+
+
+def _no_stream(*_args: Any, **_kwargs: Any) -> Iterator[str]:  # noqa: ANN401
+    raise RuntimeError("Потоковый LLM не настроен")
+
+
+def _step_event(step: AgentStep) -> dict[str, Any]:
+    return {
+        "type": "step",
+        "index": step.index,
+        "message": step.parsed.message,
+        "requests": [
+            {"method": r.method, "url": r.url, "error": response.get("error")}
+            for r, response in zip(step.requests, step.responses, strict=True)
+        ],
+        "llm_ms": round(step.llm_seconds * 1000, 1),
+        "api_ms": round(step.api_seconds * 1000, 1),
+        "speculative": step.speculative,
+        "saved_tokens": step.saved_tokens,
+    }
+
+
+# ============= HTTP / WEBSOCKET ==============================
+
+
+class SessionCreate(BaseModel):
+    # Лишние поля (в том числе прежний allow_orders) - ошибка 422, а не молчаливое игнорирование
+    model_config = ConfigDict(extra="forbid")
+
+    token: str | None = None
+    base_url: str | None = None
+    account_id: str | None = None
+    max_steps: int = Field(5, ge=1, le=MAX_STEPS)
+
+
+class MessageCreate(BaseModel):
+    text: str
+
+
+def create_app(service: ChatService | None = None) -> FastAPI:
+    """
+    ASGI приложение сервиса чата
+
+    Raises:
+        RuntimeError: У сервиса нет ключа (api_key / CHAT_SERVICE_API_KEY)
+    """
+    service = service or ChatService()
+    if not service.api_key:
+        raise RuntimeError("CHAT_SERVICE_API_KEY is not set")
+    api_key = service.api_key
+    app = FastAPI(title="Trader AI Assistant chat service")
+    app.state.service = service
+
+    def require_api_key(authorization: str = Header(default="")) -> None:
+        scheme, _, key = authorization.partition(" ")
+        if scheme.lower() != "bearer" or not secrets.compare_digest(key.encode(), api_key.encode()):
+            raise HTTPException(status_code=401, detail="Invalid API key", headers={"WWW-Authenticate": "Bearer"})
+
+    @app.post("/v1/chat/sessions", dependencies=[Depends(require_api_key)])
+    async def create_session(body: SessionCreate) -> dict[str, str]:
+        try:
+            session = service.create_session(body.token, body.base_url, body.account_id, body.max_steps)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e)) from e
+        return {"session_id": session.session_id}
+
+    @app.delete("/v1/chat/sessions/{session_id}")
+    async def delete_session(session_id: str) -> dict[str, bool]:
+        return {"deleted": service.delete_session(session_id)}
+
+    @app.post("/v1/chat/sessions/{session_id}/messages")
+    async def post_message(session_id: str, body: MessageCreate) -> StreamingResponse:
+        session = service.get_session(session_id)
+
+        async def ndjson() -> AsyncIterator[bytes]:
+            async for event in service.ask(session, body.text):
+                yield json.dumps(event, ensure_ascii=False).encode() + b"\n"
+
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+    @app.websocket("/v1/chat/sessions/{session_id}/ws")
+    async def chat_ws(websocket: WebSocket, session_id: str) -> None:
+        if session_id not in service.sessions:
+            await websocket.close(code=4404)
+            return
+        await websocket.accept()
+        try:
+            while True:
+                data = await websocket.receive_json()
+                session = service.get_session(session_id)
+                async for event in service.ask(session, str(data.get("text", ""))):
+                    await websocket.send_json(event)
+        except WebSocketDisconnect:
+            pass
+
+    @app.get("/v1/chat/stats")
+    async def stats() -> dict[str, Any]:
+        return service.summary()
+
+    return app
+
+
+@click.command()
+@click.option("--host", default="127.0.0.1", help="Адрес для прослушивания")
+@click.option("--port", type=int, default=8000, help="Порт")
+@click.option("--no-stream", is_flag=True, help="Не использовать потоковую генерацию LLM")
+@click.option("--allow-orders", is_flag=True, help="Выполнять заявки без подтверждения во всех сессиях")
+def main(host: str, port: int, no_stream: bool, allow_orders: bool) -> None:
+    """Запустить сервис чата"""
+    api_key = os.getenv("CHAT_SERVICE_API_KEY") or secrets.token_urlsafe(24)
+    if not os.getenv("CHAT_SERVICE_API_KEY"):
+        click.echo(f"🔑 CHAT_SERVICE_API_KEY не задан, ключ этого запуска: {api_key}")
+    service = ChatService(stream=None if no_stream else stream_llm, api_key=api_key, allow_orders=allow_orders)
+    # Модель эмбеддингов загружается в фоне, пока сервис принимает подключения
+    service.executor.submit(warmup_rag)
+    click.echo(f"🚀 Сервис чата на http://{host}:{port}")
+    uvicorn.run(create_app(service), host=host, port=port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""
+Сжатие ответов Finam API перед передачей в LLM
+
+Полный ответ API (особенно свечи, сделки, транзакции) занимает десятки тысяч
+токенов и отправляется повторно на каждом следующем шаге диалога. Здесь ответ
+приводится к компактному виду:
+- десятичные {"value": "7013.5000"} -> 7013.5, деньги -> "44330 RUB", даты -> "2025-12-18"
+- служебные и пустые поля отбрасываются (проекция по эндпоинту)
+- массивы объектов кодируются таблицей CSV
+- длинные ряды свечей заменяются статистикой и последними свечами
+- итог ограничивается по числу токенов (tiktoken)
+"""
+
+import csv
+import io
+import json
+import logging
+import re
+import statistics
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any
+
+import tiktoken
+
+from src.app.models import OrderBook
+
+logger = logging.getLogger(__name__)
+
+# Кодировка токенизатора моделей семейства gpt-4o
+TOKEN_ENCODING = "o200k_base"
+# Оценка для случая, когда словарь tiktoken недоступен (нет сети): символов на токен
+_CHARS_PER_TOKEN = 3
+# Ограничение размера одного результата в токенах
+MAX_RESULT_TOKENS = 1500
+# Исходный ответ длиннее (символов) не токенизируется: для статистики экономии хватает оценки по длине
+EXACT_COUNT_CHARS = 8000
+# Длинный ряд свечей заменяется статистикой и последними свечами
+SERIES_THRESHOLD = 40
+SERIES_TAIL = 10
+# Максимум строк таблицы для прочих массивов (дальше режется по лимиту токенов)
+MAX_TABLE_ROWS = 100
+
+# Поля, которые не нужны LLM для ответа (по шаблону пути)
+_PROJECTIONS: list[tuple[re.Pattern[str], frozenset[str]]] = [
+    (re.compile(r"/v1/accounts/[^/]+/trades"), frozenset({"account_id"})),
+    (re.compile(r"/v1/accounts/[^/]+/transactions"), frozenset({"transaction_category"})),
+    (re.compile(r"/v1/accounts/[^/]+/orders"), frozenset({"account_id", "client_order_id"})),
+    (re.compile(r"/v1/instruments/[^/]+/trades"), frozenset({"trade_id", "mpid"})),
+    (re.compile(r"/v1/assets$"), frozenset({"id", "isin"})),
+]
+
+
+@dataclass(slots=True)
+class CompactResult:
+    """Сжатый результат API и его размер до и после сжатия в токенах"""
+
+    text: str
+    original_tokens: int
+    tokens: int
+
+    @property
+    def saved_tokens(self) -> int:
+        return self.original_tokens - self.tokens
+
+
+_encoding_lock = threading.Lock()
+
+
+def _encoding() -> "tiktoken.Encoding | None":
+    # Параллельные ответы (chat_app, chat_service) не должны загружать словарь одновременно
+    with _encoding_lock:
+        return _load_encoding()
+
+
+@lru_cache(maxsize=1)
+def _load_encoding() -> "tiktoken.Encoding | None":
+    try:
+        return tiktoken.get_encoding(TOKEN_ENCODING)
+    except Exception as e:
+        # Словарь скачивается при первом использовании; без сети считаем приблизительно
+        logger.warning("Токенизатор %s недоступен, используется оценка по длине: %s", TOKEN_ENCODING, e)
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Число токенов текста для LLM"""
+    encoding = _encoding()
+    if encoding is None:
+        return len(text) // _CHARS_PER_TOKEN + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def estimate_tokens(text: str) -> int:
+    """Число токенов: точно для коротких текстов, по длине для длинных"""
+    if len(text) > EXACT_COUNT_CHARS:
+        return len(text) // _CHARS_PER_TOKEN + 1
+    return count_tokens(text)
+
+
+def compact_api_result(
+    api_response: Any,  # noqa: ANN401
+    path: str | None = None,
+    max_tokens: int = MAX_RESULT_TOKENS,
+) -> CompactResult:
+    """
+    Сжать ответ API для передачи в LLM
+
+    Args:
+        api_response: Ответ FinamAPIClient
+        path: Путь или URL запроса (для выбора проекции полей)
+        max_tokens: Ограничение размера результата в токенах
+    """
+    original_tokens = estimate_tokens(str(api_response))
+    if not isinstance(api_response, dict) or "error" in api_response:
+        text = json.dumps(api_response, ensure_ascii=False, separators=(",", ":"), default=str)
+        return CompactResult(text, original_tokens, count_tokens(text))
+
+    if isinstance(api_response.get("orderbook"), dict):
+        summary = OrderBook.from_response(api_response).summary()
+        text = json.dumps({"orderbook_summary": summary}, ensure_ascii=False, separators=(",", ":"))
+        return CompactResult(text, original_tokens, count_tokens(text))
+
+    drop = _projection(path)
+    data = _simplify(api_response, drop)
+    scalars = {k: v for k, v in data.items() if not _is_table(v)}
+    tables = {k: v for k, v in data.items() if _is_table(v)}
+
+    limit = None
+    while True:
+        text = _render(scalars, tables, limit)
+        tokens = count_tokens(text)
+        longest = max((len(rows) for rows in tables.values()), default=0)
+        if tokens <= max_tokens or not tables or (limit is not None and limit <= 2):
+            break
+        # Не помещается - уменьшаем число строк таблиц вдвое
+        limit = max((limit or min(longest, MAX_TABLE_ROWS)) // 2, 2)
+
+    if tokens > max_tokens:
+        text = text[: max_tokens * len(text) // tokens] + "\n…(обрезано)"
+        tokens = count_tokens(text)
+    return CompactResult(text, original_tokens, tokens)
+
+
+# ============= ПРЕОБРАЗОВАНИЕ ЗНАЧЕНИЙ ==============================
+
+
+def _projection(path: str | None) -> frozenset[str]:
+    if not path:
+        return frozenset()
+    path = re.sub(r"^https?://[^/]+", "", path).split("?", 1)[0]
+    return next((fields for pattern, fields in _PROJECTIONS if pattern.search(path)), frozenset())
+
+
+def _number(text: str) -> int | float | str:
+    try:
+        x = float(text)
+    except ValueError:
+        return text
+    if x.is_integer() and abs(x) < 1e15:
+        return int(x)
+    return round(x, 4) if abs(x) >= 1 else float(f"{x:.4g}")
+
+
+def _simplify(value: Any, drop: frozenset[str] = frozenset()) -> Any:  # noqa: ANN401
+    """Свернуть обертки Finam и выбросить пустые и ненужные поля"""
+    if isinstance(value, dict):
+        keys = value.keys()
+        if keys == {"value"} and isinstance(value["value"], str):
+            return _number(value["value"])
+        if "units" in keys and "currency_code" in keys:
+            amount = int(value.get("units") or 0) + int(value.get("nanos") or 0) / 1e9
+            return f"{_number(str(amount))} {value['currency_code']}"
+        if keys == {"year", "month", "day"}:
+            return f"{value['year']:04d}-{value['month']:02d}-{value['day']:02d}"
+        result = {}
+        for k, v in value.items():
+            if k in drop:
+                continue
+            v = _simplify(v, drop)
+            if v in ("", None, [], {}):
+                continue
+            result[k] = v
+        return result
+    if isinstance(value, list):
+        return [_simplify(v, drop) for v in value]
+    return value
+
+
+def _is_table(value: Any) -> bool:  # noqa: ANN401
+    return isinstance(value, list) and len(value) > 1 and all(isinstance(v, dict) for v in value)
+
+
+def _flatten(row: dict[str, Any], prefix: str = "") -> dict[str, Any]:
+    flat = {}
+    for k, v in row.items():
+        key = f"{prefix}{k}"
+        if isinstance(v, dict):
+            flat.update(_flatten(v, f"{key}."))
+        elif isinstance(v, list):
+            flat[key] = json.dumps(v, ensure_ascii=False, separators=(",", ":"))
+        else:
+            flat[key] = v
+    return flat
+
+
+# ============= ТАБЛИЦЫ И РЯДЫ ==============================
+
+
+def _csv(rows: list[dict[str, Any]]) -> str:
+    columns: dict[str, None] = {}
+    for row in rows:
+        columns.update(dict.fromkeys(row))
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=list(columns), lineterminator="\n")
+    writer.writeheader()
+    writer.writerows(rows)
+    return buffer.getvalue().rstrip("\n")
+
+
+def _series_summary(rows: list[dict[str, Any]]) -> dict[str, Any]:
+    """Статистика по длинному ряду свечей"""
+    summary: dict[str, Any] = {"rows": len(rows)}
+    if "timestamp" in rows[0]:
+        summary["from"] = rows[0]["timestamp"]
+        summary["to"] = rows[-1]["timestamp"]
+    if "close" in rows[0]:
+        # Свечи: OHLC за весь период
+        closes = [r["close"] for r in rows if isinstance(r.get("close"), int | float)]
+        highs = [r["high"] for r in rows if isinstance(r.get("high"), int | float)]
+        lows = [r["low"] for r in rows if isinstance(r.get("low"), int | float)]
+        summary["open"] = rows[0].get("open")
+        summary["close"] = rows[-1].get("close")
+        if highs:
+            summary["high"] = max(highs)
+        if lows:
+            summary["low"] = min(lows)
+        if closes and isinstance(summary["open"], int | float) and summary["open"]:
+            summary["change_pct"] = round((closes[-1] / summary["open"] - 1) * 100, 2)
+        if len(closes) > 1:
+            summary["mean_close"] = round(statistics.fmean(closes), 4)
+            summary["stdev_close"] = round(statistics.stdev(closes), 4)
+    for column in rows[0]:
+        if column in ("open", "high", "low", "close"):
+            continue
+        values = [r[column] for r in rows if isinstance(r.get(column), int | float) and not isinstance(r[column], bool)]
+        if len(values) == len(rows) and column != "timestamp":
+            summary[column] = {"min": min(values), "max": max(values), "sum": round(sum(values), 4)}
+    return summary
+
+
+def _render(scalars: dict[str, Any], tables: dict[str, list[dict[str, Any]]], limit: int | None) -> str:
+    parts = []
+    if scalars:
+        parts.append(json.dumps(scalars, ensure_ascii=False, separators=(",", ":")))
+    for name, rows in tables.items():
+        flat = [_flatten(r) for r in rows]
+        if len(flat) > SERIES_THRESHOLD and "close" in flat[0]:
+            tail = min(SERIES_TAIL, limit or SERIES_TAIL)
+            summary = json.dumps(_series_summary(flat), ensure_ascii=False, separators=(",", ":"))
+            parts.append(f"{name} (сводка по {len(flat)} строкам): {summary}")
+            parts.append(f"{name} (последние {tail} строк, CSV):\n{_csv(flat[-tail:])}")
+        else:
+            # Из хронологических списков оставляем самые свежие строки
+            count = limit or MAX_TABLE_ROWS
+            shown = flat[-count:] if "timestamp" in flat[0] else flat[:count]
+            note = f", показано {len(shown)}" if len(shown) < len(flat) else ""
+            parts.append(f"{name} ({len(flat)} строк{note}, CSV):\n{_csv(shown)}")
+    return "\n".join(parts)
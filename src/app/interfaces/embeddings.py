@@ -0,0 +1,346 @@
+"""
+Эмбеддинги текстов с постоянным кэшем
+
+Кодирование моделью sentence-transformers на CPU занимает секунды на каждый
+запуск процесса, хотя тексты (описания API, примеры, вопросы) почти не меняются.
+EmbeddingService кодирует только тексты, которых нет в кэше, пачками по
+batch_size, и сохраняет векторы на диск:
+- ключ - хэш содержимого текста (blake2b), отдельный каталог на каждую модель
+- векторы float16 дописываются в файл vectors.f16 и читаются через memmap,
+  поэтому при запуске в память не загружается ничего, кроме индекса ключей
+- ключи дописываются в keys.bin после векторов: запись с ключом всегда полная;
+  хвост, оставшийся от прерванной записи (векторы без ключей, неполный ключ),
+  обрезается при открытии и перед каждой дозаписью
+- вопросы из чата (encode_queries) в кэш не пишутся: они почти не повторяются,
+  и файл не растет без ограничений
+
+Повторный запуск находит все векторы в кэше и не загружает модель вовсе.
+Несколько процессов могут дописывать один кэш: запись идет под блокировкой файла.
+
+Новые вопросы кодируются на каждом ходе чата, поэтому бэкенд модели выбирается
+(RAG_EMBEDDING_BACKEND, по умолчанию torch):
+- torch - исходная модель float32
+- onnx - та же модель в ONNX Runtime
+- onnx-int8 - ONNX Runtime с весами, динамически квантованными в int8 под
+  набор инструкций процессора (arm64, avx2, avx512, avx512_vnni); если в
+  репозитории модели нет квантованного файла, он создается локально один раз
+Число потоков задается RAG_EMBEDDING_THREADS, после загрузки модель прогревается
+на нескольких текстах, чтобы первый вопрос не платил за инициализацию. Векторы
+разных бэкендов немного отличаются, поэтому кэш у каждого свой.
+
+ONNX-бэкенды включаются только явно (нужен extra onnx: poetry install -E onnx):
+перед включением сравните их с torch на своей машине через
+scripts/benchmark_embeddings.py - задержку и совпадение соседей.
+"""
+
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import platform
+import re
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+logger = logging.getLogger(__name__)
+
+# Многоязычная модель: вопросы на русском, описания на русском и английском
+DEFAULT_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+DEFAULT_CACHE_DIR = "data/interim/embeddings"
+DEFAULT_BATCH_SIZE = 64
+BACKENDS = ("torch", "onnx", "onnx-int8")
+DEFAULT_BACKEND = "torch"
+WARMUP_TEXTS = ["Какая цена акций Сбербанка?", "Покажи мой портфель и открытые заявки по счету"]
+
+KEY_BYTES = 16
+
+Encoder = Callable[[list[str]], np.ndarray]
+
+
+# ============= МОДЕЛИ ==============================
+
+
+def quantization_config() -> str:
+    """Конфигурация int8-квантования ONNX под текущий процессор"""
+    if platform.machine().lower() in ("arm64", "aarch64"):
+        return "arm64"
+    try:
+        flags = set(Path("/proc/cpuinfo").read_text().split())
+    except OSError:
+        return "avx2"
+    if "avx512_vnni" in flags:
+        return "avx512_vnni"
+    return "avx512" if "avx512f" in flags else "avx2"
+
+
+def _model_dir_name(model_name: str) -> str:
+    return re.sub(r"[^\w.-]+", "__", model_name)
+
+
+def _load_quantized(model_name: str, model_kwargs: dict) -> "SentenceTransformer":
+    """Модель ONNX int8 из репозитория модели, иначе квантованная локально (один раз)"""
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+    config = quantization_config()
+    # Для avx2 веса квантуются в беззнаковый int8 (так называет файлы sentence-transformers)
+    file_name = f"onnx/model_{'quint8' if config == 'avx2' else 'qint8'}_{config}.onnx"
+    try:
+        return SentenceTransformer(
+            model_name, device="cpu", backend="onnx", model_kwargs={**model_kwargs, "file_name": file_name}
+        )
+    except Exception as e:
+        logger.info("В %s нет %s (%s), квантование локально", model_name, file_name, e)
+
+    local = Path(os.getenv("EMBEDDING_CACHE_DIR", DEFAULT_CACHE_DIR)) / "onnx" / _model_dir_name(model_name)
+    if not (local / file_name).exists():
+        model = SentenceTransformer(model_name, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+        model.save(str(local))
+        export_dynamic_quantized_onnx_model(model, config, str(local))
+    return SentenceTransformer(
+        str(local), device="cpu", backend="onnx", model_kwargs={**model_kwargs, "file_name": file_name}
+    )
+
+
+def load_sentence_transformer(
+    model_name: str,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    backend: str = DEFAULT_BACKEND,
+    threads: int | None = None,
+    warmup: bool = True,
+) -> Encoder:
+    """
+    Кодировщик sentence-transformers на CPU: тексты -> нормированные векторы float32
+
+    Args:
+        model_name: Модель sentence-transformers
+        batch_size: Сколько текстов кодировать за один проход модели
+        backend: "torch", "onnx" или "onnx-int8" (см. BACKENDS)
+        threads: Потоков для вычислений модели (по умолчанию решает библиотека)
+        warmup: Прогнать модель на WARMUP_TEXTS сразу после загрузки
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Неизвестный бэкенд эмбеддингов {backend!r}, доступны: {', '.join(BACKENDS)}")
+    from sentence_transformers import SentenceTransformer
+
+    started = time.perf_counter()
+    if backend == "torch":
+        if threads:
+            import torch
+
+            torch.set_num_threads(threads)
+        model = SentenceTransformer(model_name, device="cpu")
+    else:
+        model_kwargs: dict = {"provider": "CPUExecutionProvider"}
+        if threads:
+            import onnxruntime
+
+            options = onnxruntime.SessionOptions()
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+            model_kwargs["session_options"] = options
+        if backend == "onnx-int8":
+            model = _load_quantized(model_name, model_kwargs)
+        else:
+            model = SentenceTransformer(model_name, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+
+    def encode(texts: list[str]) -> np.ndarray:
+        vectors = model.encode(texts, batch_size=batch_size, normalize_embeddings=True, convert_to_numpy=True)
+        return vectors.astype(np.float32)
+
+    if warmup:
+        encode(WARMUP_TEXTS)
+    logger.info("Модель эмбеддингов %s (%s) загружена за %.1f с", model_name, backend, time.perf_counter() - started)
+    return encode
+
+
+# ============= КЭШ ==============================
+
+
+def text_key(text: str) -> bytes:
+    return hashlib.blake2b(text.encode(), digest_size=KEY_BYTES).digest()
+
+
+class EmbeddingCache:
+    """Векторы float16 по хэшу текста: keys.bin + vectors.f16 (memmap) в каталоге модели"""
+
+    def __init__(self, path: str | os.PathLike) -> None:
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.keys_path = self.path / "keys.bin"
+        self.vectors_path = self.path / "vectors.f16"
+        self.meta_path = self.path / "meta.json"
+        self.dim: int | None = None
+        self.rows: dict[bytes, int] = {}
+        self._keys_read = 0
+        self._vectors: np.ndarray | None = None
+        self._lock = threading.Lock()
+        if self.meta_path.exists():
+            self.dim = json.loads(self.meta_path.read_text())["dim"]
+            with self._file_lock():
+                self._truncate()
+        self._refresh()
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def lookup(self, keys: list[bytes]) -> list[int | None]:
+        """Номера строк для ключей (None - нет в кэше); подхватывает записи других процессов"""
+        if any(key not in self.rows for key in keys):
+            with self._lock:
+                self._refresh()
+        return [self.rows.get(key) for key in keys]
+
+    def vectors(self, rows: list[int]) -> np.ndarray:
+        """Векторы строк в float32"""
+        return np.asarray(self._vectors[rows], dtype=np.float32) if rows else np.empty((0, self.dim or 0), np.float32)
+
+    def add(self, keys: list[bytes], vectors: np.ndarray) -> None:
+        """Дописать векторы (ключи, уже записанные другим процессом, пропускаются)"""
+        with self._lock, self._file_lock():
+            self._refresh()
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                self.meta_path.write_text(json.dumps({"dim": self.dim}))
+            fresh = [i for i, key in enumerate(keys) if key not in self.rows]
+            if not fresh:
+                return
+            self._truncate()
+            # Сначала векторы, потом ключи: ключ появляется только у полностью записанной строки
+            with self.vectors_path.open("ab") as f:
+                f.write(np.ascontiguousarray(vectors[fresh], dtype=np.float16).tobytes())
+            with self.keys_path.open("ab") as f:
+                f.write(b"".join(keys[i] for i in fresh))
+            self._refresh()
+
+    def _truncate(self) -> None:
+        """Обрезать хвост прерванной записи: номер строки вектора должен совпадать с номером ключа"""
+        keys_size = self.keys_path.stat().st_size if self.keys_path.exists() else 0
+        count = keys_size // KEY_BYTES
+        if keys_size != count * KEY_BYTES:
+            os.truncate(self.keys_path, count * KEY_BYTES)
+        vectors_size = count * (self.dim or 0) * 2
+        if self.vectors_path.exists() and self.vectors_path.stat().st_size > vectors_size:
+            logger.warning("Кэш эмбеддингов %s: обрезан хвост прерванной записи", self.path)
+            os.truncate(self.vectors_path, vectors_size)
+
+    def _refresh(self) -> None:
+        """Дочитать новые ключи и переоткрыть memmap, если файл вырос"""
+        if not self.keys_path.exists() or self.dim is None:
+            return
+        with self.keys_path.open("rb") as f:
+            f.seek(self._keys_read * KEY_BYTES)
+            data = f.read()
+        count = len(data) // KEY_BYTES
+        for i in range(count):
+            self.rows.setdefault(data[i * KEY_BYTES : (i + 1) * KEY_BYTES], self._keys_read + i)
+        self._keys_read += count
+        if self._keys_read and (self._vectors is None or len(self._vectors) < self._keys_read):
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float16, mode="r", shape=(self._keys_read, self.dim))
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        with (self.path / ".lock").open("w") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class EmbeddingService:
+    """Кодирование текстов с кэшем: модель вызывается только для новых текстов, пачками"""
+
+    def __init__(
+        self,
+        model_name: str | None = None,
+        cache_dir: str | os.PathLike | None = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        encoder: Encoder | None = None,
+        backend: str | None = None,
+        threads: int | None = None,
+    ) -> None:
+        """
+        Args:
+            model_name: Модель sentence-transformers (по умолчанию RAG_EMBEDDING_MODEL)
+            cache_dir: Каталог кэша (по умолчанию EMBEDDING_CACHE_DIR или data/interim/embeddings)
+            batch_size: Сколько текстов кодировать за один вызов модели
+            encoder: Готовый кодировщик вместо загрузки модели (кэш ведется под model_name и backend)
+            backend: Бэкенд модели (по умолчанию RAG_EMBEDDING_BACKEND или torch)
+            threads: Потоков модели (по умолчанию RAG_EMBEDDING_THREADS)
+        """
+        self.model_name = model_name or os.getenv("RAG_EMBEDDING_MODEL", DEFAULT_MODEL)
+        self.backend = backend or os.getenv("RAG_EMBEDDING_BACKEND", DEFAULT_BACKEND)
+        self.threads = threads or int(os.getenv("RAG_EMBEDDING_THREADS", "0")) or None
+        root = Path(cache_dir or os.getenv("EMBEDDING_CACHE_DIR", DEFAULT_CACHE_DIR))
+        suffix = "" if self.backend == DEFAULT_BACKEND else f"__{self.backend}"
+        self.cache = EmbeddingCache(root / f"{_model_dir_name(self.model_name)}{suffix}")
+        self.batch_size = batch_size
+        self.hits = 0
+        self.misses = 0
+        self._encoder = encoder
+        self._lock = threading.Lock()
+
+    @property
+    def encoder(self) -> Encoder:
+        """Модель загружается при первом тексте, которого нет в кэше"""
+        if self._encoder is None:
+            with self._lock:
+                if self._encoder is None:
+                    self._encoder = load_sentence_transformer(
+                        self.model_name, self.batch_size, self.backend, self.threads
+                    )
+        return self._encoder
+
+    def warmup(self) -> None:
+        """Загрузить и прогреть модель заранее, не дожидаясь первого нового вопроса"""
+        self.encoder  # noqa: B018 - загрузка при обращении
+
+    def encode(self, texts: list[str], persist: bool = True) -> np.ndarray:
+        """
+        Нормированные векторы float32 для texts (в том же порядке)
+
+        Args:
+            texts: Тексты
+            persist: Сохранять новые векторы в кэш (False - только читать из кэша)
+        """
+        keys = [text_key(t) for t in texts]
+        rows = self.cache.lookup(keys)
+        missing = list({key: t for key, t, row in zip(keys, texts, rows, strict=True) if row is None}.items())
+        self.hits += len(texts) - sum(row is None for row in rows)
+        self.misses += len(missing)
+        if missing and not persist:
+            encoded = self.encoder([t for _, t in missing])
+            position = {key: i for i, (key, _) in enumerate(missing)}
+            result = np.empty((len(texts), encoded.shape[1]), np.float32)
+            for i, (key, row) in enumerate(zip(keys, rows, strict=True)):
+                result[i] = self.cache.vectors([row])[0] if row is not None else encoded[position[key]]
+            return result
+
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start : start + self.batch_size]
+            self.cache.add([key for key, _ in batch], self.encoder([t for _, t in batch]))
+        if missing:
+            rows = self.cache.lookup(keys)
+            logger.info("Закодировано %d новых текстов, из кэша %d", len(missing), len(texts) - len(missing))
+        return self.cache.vectors(rows)  # type: ignore[arg-type]
+
+    def encode_queries(self, texts: list[str]) -> np.ndarray:
+        """Векторы разовых текстов (вопросов пользователя): из кэша, если есть, но без записи в него"""
+        return self.encode(texts, persist=False)
+
+
+@lru_cache(maxsize=1)
+def get_embedding_service() -> EmbeddingService:
+    """Общий сервис эмбеддингов процесса"""
+    return EmbeddingService()
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Загрузка документов базы знаний (PDF, DOCX, TXT, MD) в индекс документов RAG
+
+Конвейер:
+- файлы, у которых не изменились размер и mtime, пропускаются без чтения;
+  у остальных считается хэш содержимого, и файлы с прежним хэшем тоже пропускаются
+- текст извлекается по страницам в пуле процессов (pypdf, python-docx), страницы
+  читаются по одной, поэтому память процесса не зависит от размера документа
+- страницы режутся на фрагменты по границам абзацев и предложений с учетом
+  числа токенов (tiktoken) и перекрытием соседних фрагментов
+- фрагменты кодируются пачками (EmbeddingService с кэшем) и заменяют прежние
+  фрагменты файла в DocumentIndex; файлы, исчезнувшие с диска, удаляются
+- индекс сохраняется каждые save_every файлов: прерванная загрузка продолжается
+  с последнего сохранения, а запущенный чат подхватывает уже готовую часть
+
+Описания эндпоинтов (RAG_DATA) уже есть в поиске по документации API, загружать
+их сюда не нужно.
+
+Повторный запуск на тех же документах только сверяет stat файлов.
+
+Использование:
+    poetry run rag-ingest docs/knowledge [--workers 4] [--max-tokens 400] [--save-every 50]
+"""
+
+import hashlib
+import logging
+import os
+import re
+import time
+from collections import deque
+from collections.abc import Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+import click
+
+from src.app.interfaces.compaction import count_tokens
+from src.app.interfaces.rag import DocumentIndex, FileState
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_SUFFIXES = frozenset({".pdf", ".docx", ".txt", ".md"})
+DEFAULT_MAX_TOKENS = 400
+DEFAULT_OVERLAP_TOKENS = 50
+# Абзацев DOCX на одну условную страницу (в DOCX нет страниц)
+DOCX_PARAGRAPHS_PER_PAGE = 40
+HASH_BLOCK = 1 << 20
+# Файлов между промежуточными сохранениями индекса
+DEFAULT_SAVE_EVERY = 50
+
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+_SENTENCE_RE = re.compile(r"(?<=[.!?;:])\s+")
+
+
+@dataclass(slots=True)
+class IngestStats:
+    """Итоги загрузки"""
+
+    files: int = 0
+    unchanged: int = 0
+    indexed: int = 0
+    removed: int = 0
+    failed: int = 0
+    chunks: int = 0
+    seconds: float = 0.0
+
+
+# ============= ИЗВЛЕЧЕНИЕ ТЕКСТА ==============================
+
+
+def iter_pages(path: str | os.PathLike) -> Iterator[tuple[int, str]]:
+    """Страницы документа по одной: (номер с 1, текст)"""
+    path = Path(path)
+    suffix = path.suffix.lower()
+    if suffix == ".pdf":
+        from pypdf import PdfReader
+
+        for number, page in enumerate(PdfReader(path).pages, 1):
+            yield number, page.extract_text() or ""
+    elif suffix == ".docx":
+        import docx
+
+        paragraphs: list[str] = []
+        number = 1
+        for paragraph in docx.Document(str(path)).paragraphs:
+            paragraphs.append(paragraph.text)
+            if len(paragraphs) >= DOCX_PARAGRAPHS_PER_PAGE:
+                yield number, "\n\n".join(paragraphs)
+                paragraphs, number = [], number + 1
+        if paragraphs:
+            yield number, "\n\n".join(paragraphs)
+    else:
+        yield 1, path.read_text(encoding="utf-8", errors="replace")
+
+
+def chunk_text(
+    text: str, max_tokens: int = DEFAULT_MAX_TOKENS, overlap: int = DEFAULT_OVERLAP_TOKENS
+) -> list[str]:
+    """
+    Разбить текст на фрагменты не длиннее max_tokens токенов
+
+    Фрагменты собираются из абзацев, длинные абзацы - из предложений, слишком
+    длинные предложения режутся по словам. Следующий фрагмент начинается с
+    последних предложений предыдущего общим объемом до overlap токенов.
+    """
+    pieces: list[tuple[str, int]] = []
+    for paragraph in _PARAGRAPH_RE.split(text):
+        paragraph = " ".join(paragraph.split())
+        if not paragraph:
+            continue
+        tokens = count_tokens(paragraph)
+        if tokens <= max_tokens:
+            pieces.append((paragraph, tokens))
+            continue
+        for sentence in _SENTENCE_RE.split(paragraph):
+            pieces.extend(_split_words(sentence, max_tokens))
+
+    chunks: list[str] = []
+    current: list[tuple[str, int]] = []
+    size = 0
+    for piece, tokens in pieces:
+        if current and size + tokens > max_tokens:
+            chunks.append(" ".join(p for p, _ in current))
+            # Перекрытие: хвост предыдущего фрагмента в начале следующего
+            tail: list[tuple[str, int]] = []
+            for previous in reversed(current):
+                if sum(t for _, t in tail) + previous[1] > overlap or previous[1] + tokens > max_tokens:
+                    break
+                tail.insert(0, previous)
+            current, size = tail, sum(t for _, t in tail)
+        current.append((piece, tokens))
+        size += tokens
+    if current:
+        chunks.append(" ".join(p for p, _ in current))
+    return chunks
+
+
+def _split_words(sentence: str, max_tokens: int) -> list[tuple[str, int]]:
+    tokens = count_tokens(sentence)
+    if tokens <= max_tokens:
+        return [(sentence, tokens)]
+    words = sentence.split()
+    # Слов на часть - пропорционально превышению (оценка, части затем пересчитываются)
+    step = max(len(words) * max_tokens // tokens, 1)
+    parts = [" ".join(words[i : i + step]) for i in range(0, len(words), step)]
+    return [(part, count_tokens(part)) for part in parts]
+
+
+def extract_chunks(path: str, max_tokens: int, overlap: int) -> list[tuple[int, str]]:
+    """Фрагменты документа [(страница, текст)] - выполняется в процессе пула"""
+    return [
+        (number, chunk) for number, page in iter_pages(path) for chunk in chunk_text(page, max_tokens, overlap)
+    ]
+
+
+# ============= КОНВЕЙЕР ==============================
+
+
+def file_hash(path: str | os.PathLike) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        while block := f.read(HASH_BLOCK):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def find_documents(paths: list[str | os.PathLike]) -> list[Path]:
+    """Поддерживаемые документы в файлах и каталогах (рекурсивно)"""
+    found = []
+    for path in map(Path, paths):
+        candidates = sorted(path.rglob("*")) if path.is_dir() else [path]
+        found += [p.resolve() for p in candidates if p.is_file() and p.suffix.lower() in SUPPORTED_SUFFIXES]
+    return found
+
+
+def ingest(
+    paths: list[str | os.PathLike],
+    index: DocumentIndex,
+    workers: int | None = None,
+    max_tokens: int = DEFAULT_MAX_TOKENS,
+    overlap: int = DEFAULT_OVERLAP_TOKENS,
+    save_every: int = DEFAULT_SAVE_EVERY,
+) -> IngestStats:
+    """Проиндексировать новые и измененные документы, удалить исчезнувшие"""
+    started = time.perf_counter()
+    stats = IngestStats()
+    known = index.files()
+    documents = find_documents(paths)
+    stats.files = len(documents)
+
+    changed: list[tuple[str, FileState]] = []
+    for document in documents:
+        path, stat = str(document), document.stat()
+        state = known.get(path)
+        if state is not None and (state.size, state.mtime_ns) == (stat.st_size, stat.st_mtime_ns):
+            stats.unchanged += 1
+            continue
+        current = FileState(file_hash(document), stat.st_size, stat.st_mtime_ns)
+        if state is not None and state.hash == current.hash:
+            index.touch_file(path, current)
+            stats.unchanged += 1
+        else:
+            changed.append((path, current))
+
+    for path in known:
+        if not Path(path).exists():
+            index.remove_file(path)
+            stats.removed += 1
+
+    def collect(path: str, state: FileState, future: Future) -> None:
+        try:
+            chunks = future.result()
+        except Exception as e:
+            logger.warning("Не удалось извлечь текст из %s: %s", path, e)
+            stats.failed += 1
+            return
+        index.replace_file(path, state, chunks)
+        stats.indexed += 1
+        stats.chunks += len(chunks)
+        if save_every > 0 and stats.indexed % save_every == 0:
+            index.save()
+
+    if changed:
+        # Кодирование идет, пока пул извлекает следующие файлы; в работе не больше window файлов
+        window = 2 * (workers or os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending: deque[tuple[str, FileState, Future]] = deque()
+            for path, state in changed:
+                pending.append((path, state, pool.submit(extract_chunks, path, max_tokens, overlap)))
+                if len(pending) >= window:
+                    collect(*pending.popleft())
+            while pending:
+                collect(*pending.popleft())
+    index.save()
+    stats.seconds = time.perf_counter() - started
+    return stats
+
+
+@click.command()
+@click.argument("paths", nargs=-1, required=True, type=click.Path(exists=True))
+@click.option("--index-dir", type=click.Path(), default=None, help="Каталог индекса (по умолчанию RAG_INDEX_DIR)")
+@click.option("--workers", type=int, default=None, help="Процессов для извлечения текста (по умолчанию - число CPU)")
+@click.option("--max-tokens", type=int, default=DEFAULT_MAX_TOKENS, help="Максимум токенов во фрагменте")
+@click.option("--overlap", type=int, default=DEFAULT_OVERLAP_TOKENS, help="Перекрытие соседних фрагментов, токены")
+@click.option("--save-every", type=int, default=DEFAULT_SAVE_EVERY, help="Сохранять индекс раз в N файлов")
+def main(
+    paths: tuple[str, ...], index_dir: str | None, workers: int | None, max_tokens: int, overlap: int, save_every: int
+) -> None:
+    """Загрузить документы в индекс RAG"""
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    index = DocumentIndex(index_dir)
+    click.echo(f"📚 Индекс документов: {index.path}")
+    stats = ingest(list(paths), index, workers, max_tokens, overlap, save_every)
+    click.echo(
+        f"✅ Файлов: {stats.files}, без изменений: {stats.unchanged}, проиндексировано: {stats.indexed} "
+        f"({stats.chunks} фрагментов), удалено: {stats.removed}, ошибок: {stats.failed} за {stats.seconds:.1f} с"
+    )
+
+
+if __name__ == "__main__":
+    main()
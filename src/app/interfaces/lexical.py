@@ -0,0 +1,257 @@
+"""
+Лексический поиск BM25 с учетом русской морфологии и точных идентификаторов
+
+Плотные эмбеддинги хорошо ловят смысл, но плохо различают точные токены
+("RIZ5@RTSX", "ORD789789", "USR-305-C") и редкие слова. Здесь:
+- lexical_terms: русские слова приводятся к основе стеммером Snowball
+  ("Газпрому" и "Газпром", "заявку" и "заявка" дают одну основу), а тикеры,
+  символы и идентификаторы сохраняются целиком, по частям ("riz5@rtsx",
+  "riz5", "rtsx") и как шаблон с цифрами "#" ("ord#"), чтобы ORD789789
+  совпадал с примерами про другие номера заявок
+- BM25Index - компактный инвертированный индекс: списки документов и частот
+  термина хранятся в array (4 и 2 байта на вхождение), поиск затрагивает
+  только списки терминов запроса
+- rrf_fuse объединяет ранжирования (BM25 и плотный поиск) по сумме 1 / (c + ранг)
+"""
+
+import json
+import math
+import os
+import re
+from array import array
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+# Константа RRF: сглаживает вклад первых позиций
+RRF_C = 60
+
+_VOWELS = frozenset("аеиоуыэюя")
+_TOKEN_RE = re.compile(r"[0-9A-Za-zА-Яа-яЁё]+(?:[-@._/][0-9A-Za-zА-Яа-яЁё]+)*")
+_PART_RE = re.compile(r"[-@._/]")
+_DIGITS_RE = re.compile(r"\d+")
+_CYRILLIC_RE = re.compile(r"[а-я]+")
+_TICKER_RE = re.compile(r"[A-Z][A-Z0-9]{1,11}")
+_STOPWORDS = frozenset(
+    "а и в во на по с со к ко у о об от до за из из-за для при про над под без через же ли бы не ни "
+    "это этот эта эти то та те тот мой моя мое мои моих мне меня я мы ты вы он она они его ее их "
+    "как что какой какая какие каков где когда все всех весь или но да".split()
+)
+
+
+# ============= СТЕММЕР ==============================
+
+
+def _endings(after_a: str, other: str = "") -> tuple[tuple[str, bool], ...]:
+    """Окончания группы от длинных к коротким; True - окончание должно следовать за "а" или "я" """
+    items = [(e, True) for e in after_a.split()] + [(e, False) for e in other.split()]
+    return tuple(sorted(items, key=lambda item: -len(item[0])))
+
+
+_PERFECTIVE_GERUND = _endings("в вши вшись", "ив ивши ившись ыв ывши ывшись")
+_ADJECTIVE = _endings("", "ее ие ые ое ими ыми ей ий ый ой ем им ым ом его ого ему ому их ых ую юю ая яя ою ею")
+_PARTICIPLE = _endings("ем нн вш ющ щ", "ивш ывш ующ")
+_REFLEXIVE = _endings("", "ся сь")
+_VERB = _endings(
+    "ла на ете йте ли й л ем н ло но ет ют ны ть ешь нно",
+    "ила ыла ена ейте уйте ите или ыли ей уй ил ыл им ым ен ило ыло ено ят ует уют ит ыт ены ить ыть ишь ую ю",
+)
+_NOUN = _endings(
+    "", "а ев ов ие ье е иями ями ами еи ии и ией ей ой ий й иям ям ием ем ам ом о у ах иях ях ы ь ию ью ю ия ья я"
+)
+_DERIVATIONAL = _endings("", "ост ость")
+_SUPERLATIVE = _endings("", "ейш ейше")
+
+
+def _region(word: str, start: int) -> int:
+    """Начало области после первой согласной, следующей за гласной (R1/R2 Snowball)"""
+    for i in range(start + 1, len(word)):
+        if word[i] not in _VOWELS and word[i - 1] in _VOWELS:
+            return i + 1
+    return len(word)
+
+
+def _remove(word: str, start: int, endings: tuple[tuple[str, bool], ...]) -> str | None:
+    """Удалить самое длинное окончание группы, целиком лежащее в области от start; None - не найдено"""
+    for ending, after_a in endings:
+        cut = len(word) - len(ending)
+        if cut < start or not word.endswith(ending):
+            continue
+        if after_a and (cut - 1 < start or word[cut - 1] not in "ая"):
+            return None
+        return word[:cut]
+    return None
+
+
+@lru_cache(maxsize=65536)
+def stem(word: str) -> str:
+    """Основа русского слова (алгоритм Snowball); слово в нижнем регистре"""
+    word = word.replace("ё", "е")
+    rv = next((i + 1 for i, c in enumerate(word) if c in _VOWELS), len(word))
+    r2 = _region(word, _region(word, 0))
+
+    if (removed := _remove(word, rv, _PERFECTIVE_GERUND)) is not None:
+        word = removed
+    else:
+        if (removed := _remove(word, rv, _REFLEXIVE)) is not None:
+            word = removed
+        if (removed := _remove(word, rv, _ADJECTIVE)) is not None:
+            word = _remove(removed, rv, _PARTICIPLE) or removed
+        elif (removed := _remove(word, rv, _VERB)) is not None:
+            word = removed
+        elif (removed := _remove(word, rv, _NOUN)) is not None:
+            word = removed
+
+    if word.endswith("и") and len(word) - 1 >= rv:
+        word = word[:-1]
+    if (removed := _remove(word, r2, _DERIVATIONAL)) is not None:
+        word = removed
+    if (removed := _remove(word, rv, _SUPERLATIVE)) is not None:
+        word = removed
+    if word.endswith("нн") and len(word) - 1 >= rv:
+        word = word[:-1]
+    elif word.endswith("ь") and len(word) - 1 >= rv:
+        word = word[:-1]
+    return word
+
+
+def lexical_terms(text: str) -> list[str]:
+    """Термины текста для BM25: основы русских слов и точные идентификаторы"""
+    terms = []
+    for token in _TOKEN_RE.findall(text):
+        low = token.lower().replace("ё", "е")
+        if _CYRILLIC_RE.fullmatch(low):
+            if low not in _STOPWORDS:
+                terms.append(stem(low))
+        elif _PART_RE.search(low) or _DIGITS_RE.search(low) or _TICKER_RE.fullmatch(token):
+            # Идентификатор: целиком, по частям и шаблоном без конкретных цифр
+            terms.append(low)
+            parts = [p for p in _PART_RE.split(low) if p]
+            if len(parts) > 1:
+                terms += parts
+            if (shape := _DIGITS_RE.sub("#", low)) != low:
+                terms.append(shape)
+        elif low not in _STOPWORDS:
+            terms.append(low)
+    return terms
+
+
+# ============= ИНДЕКС ==============================
+
+
+class BM25Index:
+    """Инвертированный индекс BM25 с добавлением документов"""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75) -> None:
+        self.k1 = k1
+        self.b = b
+        self.vocabulary: dict[str, int] = {}
+        self._docs: list[array] = []
+        self._freqs: list[array] = []
+        self._lengths = array("I")
+        self._total_length = 0
+        self._norm: np.ndarray | None = None
+        # Вес вхождений термина tf * (k1 + 1) / (tf + норма длины) - считается при первом запросе
+        self._weights: dict[int, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    @property
+    def postings(self) -> int:
+        """Число вхождений (документ, термин) в индексе"""
+        return sum(len(docs) for docs in self._docs)
+
+    def add(self, texts: list[str]) -> range:
+        """Добавить документы; ID - порядковые номера"""
+        start = len(self)
+        for doc_id, text in enumerate(texts, start):
+            terms = lexical_terms(text)
+            counts: dict[str, int] = {}
+            for term in terms:
+                counts[term] = counts.get(term, 0) + 1
+            for term, count in counts.items():
+                term_id = self.vocabulary.setdefault(term, len(self.vocabulary))
+                if term_id == len(self._docs):
+                    self._docs.append(array("i"))
+                    self._freqs.append(array("H"))
+                self._docs[term_id].append(doc_id)
+                self._freqs[term_id].append(min(count, 65535))
+            self._lengths.append(len(terms))
+            self._total_length += len(terms)
+        self._norm = None
+        self._weights = {}
+        return range(start, len(self))
+
+    def search(self, query: str, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """(оценки, ID) до k документов с ненулевой оценкой по убыванию"""
+        term_ids = {self.vocabulary[t] for t in lexical_terms(query) if t in self.vocabulary}
+        if not term_ids:
+            return np.empty(0, np.float32), np.empty(0, np.int64)
+        # Плотный накопитель оценок: без сортировки списков, память - 4 байта на документ на время запроса
+        accumulator = np.zeros(len(self), dtype=np.float32)
+        for term_id in term_ids:
+            docs = np.frombuffer(self._docs[term_id], dtype=np.int32)
+            idf = math.log(1 + (len(self) - len(docs) + 0.5) / (len(docs) + 0.5))
+            # В списке термина каждый документ один раз - индексное сложение корректно
+            accumulator[docs] += idf * self._term_weights(term_id)
+        # Сравнение с нулем и nonzero по bool в разы быстрее nonzero по float
+        candidates = np.flatnonzero(accumulator > 0)
+        scores = accumulator[candidates]
+        best = np.argpartition(-scores, k - 1)[:k] if len(scores) > k else np.arange(len(scores))
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return scores[best], candidates[best].astype(np.int64)
+
+    def save(self, path: str | os.PathLike) -> None:
+        sizes = np.array([len(d) for d in self._docs], dtype=np.int64)
+        vocabulary = json.dumps(list(self.vocabulary), ensure_ascii=False).encode()
+        np.savez(
+            Path(path),
+            vocabulary=np.frombuffer(vocabulary, dtype=np.uint8),
+            params=np.array([self.k1, self.b]),
+            sizes=sizes,
+            docs=np.concatenate([np.frombuffer(d, np.int32) for d in self._docs]) if self._docs else np.empty(0),
+            freqs=np.concatenate([np.frombuffer(f, np.uint16) for f in self._freqs]) if self._freqs else np.empty(0),
+            lengths=np.frombuffer(self._lengths, dtype=np.uint32),
+        )
+
+    @classmethod
+    def load(cls, path: str | os.PathLike) -> "BM25Index":
+        with np.load(Path(path)) as data:
+            index = cls(*data["params"].tolist())
+            terms = json.loads(data["vocabulary"].tobytes())
+            bounds = np.concatenate([[0], np.cumsum(data["sizes"])])
+            docs, freqs = data["docs"].astype(np.int32), data["freqs"].astype(np.uint16)
+            index.vocabulary = {term: i for i, term in enumerate(terms)}
+            index._docs = [array("i", docs[a:b].tobytes()) for a, b in zip(bounds[:-1], bounds[1:], strict=True)]
+            index._freqs = [array("H", freqs[a:b].tobytes()) for a, b in zip(bounds[:-1], bounds[1:], strict=True)]
+            index._lengths = array("I", data["lengths"].astype(np.uint32).tobytes())
+        index._total_length = sum(index._lengths)
+        return index
+
+    def _term_weights(self, term_id: int) -> np.ndarray:
+        weights = self._weights.get(term_id)
+        if weights is None:
+            docs = np.frombuffer(self._docs[term_id], dtype=np.int32)
+            tf = np.frombuffer(self._freqs[term_id], dtype=np.uint16).astype(np.float32)
+            weights = self._weights[term_id] = tf * (self.k1 + 1) / (tf + self._length_norm()[docs])
+        return weights
+
+    def _length_norm(self) -> np.ndarray:
+        """k1 * (1 - b + b * длина / средняя длина) для всех документов (пересчитывается после add)"""
+        if self._norm is None:
+            lengths = np.frombuffer(self._lengths, dtype=np.uint32).astype(np.float32)
+            average = self._total_length / max(len(self), 1) or 1.0
+            self._norm = self.k1 * (1 - self.b + self.b * lengths / average)
+        return self._norm
+
+
+def rrf_fuse(rankings: list[list[int]], weights: list[float] | None = None, c: int = RRF_C) -> list[tuple[int, float]]:
+    """Объединить ранжирования ID (лучшие первыми): оценка ID - сумма weight / (c + ранг)"""
+    weights = weights or [1.0] * len(rankings)
+    scores: dict[int, float] = {}
+    for ranking, weight in zip(rankings, weights, strict=True):
+        for rank, item in enumerate(ranking, 1):
+            scores[item] = scores.get(item, 0.0) + weight / (c + rank)
+    return sorted(scores.items(), key=lambda item: -item[1])
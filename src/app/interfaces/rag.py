@@ -0,0 +1,573 @@
+"""
+Поиск по документации API (RAG)
+
+Вместо всего API_PROMT (~28 КБ, тысячи токенов) в системный промпт попадают
+только описания эндпоинтов, подходящих к вопросу:
+- API_PROMT разбивается на описания отдельных эндпоинтов (ApiDoc)
+- описания и вопрос кодируются моделью sentence-transformers (EmbeddingService:
+  векторы описаний берутся из постоянного кэша и не пересчитываются при запуске)
+- на каждый вопрос выбираются top-k описаний: ранжирование по косинусной
+  близости объединяется (RRF) с лексическим BM25 (lexical), который точно
+  сопоставляет тикеры, идентификаторы и словоформы
+
+Краткий перечень всех эндпоинтов (метод, путь, название) остается в промпте
+всегда, поэтому модель знает обо всех методах, а подробности получает только о
+нужных. Эндпоинтов два десятка, поэтому поиск - одно матричное умножение.
+
+Если модель эмбеддингов недоступна (нет пакета или весов), используется полный
+системный промпт (create_system_prompt).
+
+ExampleRetriever подбирает похожие вопросы с готовыми запросами (few-shot) из
+train.csv и журналов вопросов; RAG_EXAMPLES_K ближайших к вопросу добавляются в
+промпт. Примеров могут быть сотни тысяч, поэтому поиск идет через индекс из
+vector_index: точный до EXACT_LIMIT примеров, дальше приближенный IVF-PQ (точный
+индекс переводится на IVF-PQ, когда примеров становится достаточно). Рядом
+ведется индекс BM25, и результаты объединяются так же, как для эндпоинтов.
+Индексы дополняются новыми примерами и сохраняются на диск.
+
+DocumentIndex хранит фрагменты документов базы знаний (правила брокера,
+спецификации, документация), которые загружает ingest. Если индекс документов
+построен, к промпту добавляются самые близкие к вопросу фрагменты.
+"""
+
+import csv
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from src.app.interfaces.chat import create_system_prompt
+from src.app.interfaces.embeddings import Encoder, get_embedding_service
+from src.app.interfaces.lexical import BM25Index, rrf_fuse
+from src.app.interfaces.promt import API_PROMT, SYSTEM_PROMT
+from src.app.interfaces.vector_index import PQ_CENTROIDS, ExactIndex, VectorIndex, create_index
+
+logger = logging.getLogger(__name__)
+
+# Сколько описаний эндпоинтов и похожих примеров добавлять в промпт
+DEFAULT_TOP_K = 4
+EXAMPLES_TOP_K = 3
+# До скольких примеров использовать точный поиск вместо IVF-PQ
+EXACT_LIMIT = 20_000
+DEFAULT_TRAIN_PATH = "data/processed/train.csv"
+DEFAULT_INDEX_DIR = "data/interim/rag"
+# Сколько фрагментов документов добавлять в промпт и минимальная близость к вопросу
+DOC_TOP_K = 3
+DOC_MIN_SCORE = 0.4
+# Сколько кандидатов каждого ранжирования (плотного и BM25) объединять на один результат
+FUSION_DEPTH = 5
+
+_SEPARATOR_RE = re.compile(r"\n-{5,}\n")
+# Начало описания в формате "Название\n\nМетод: GET"
+_SECTION_RE = re.compile(r"^[^\n]+\n\s*\nМетод:", re.MULTILINE)
+_METHOD_RE = re.compile(r"^Метод:\s*([A-Z]+)", re.MULTILINE)
+_PATH_RE = re.compile(r"^Путь:\s*(\S+)", re.MULTILINE)
+# Описание в одну строку: "GET https://... - Название"
+_INLINE_RE = re.compile(r"^(GET|POST|PUT|PATCH|DELETE)\s+(\S+)\s+-\s+(.+)$", re.MULTILINE)
+
+
+# ============= ДОКУМЕНТАЦИЯ API ==============================
+
+
+@dataclass(slots=True, frozen=True)
+class ApiDoc:
+    """Описание одного эндпоинта из API_PROMT"""
+
+    title: str
+    method: str
+    path: str
+    text: str
+
+    @property
+    def summary(self) -> str:
+        return f"{self.method} {self.path} - {self.title}"
+
+
+def split_api_docs(api_prompt: str = API_PROMT) -> list[ApiDoc]:
+    """Разбить документацию API на описания эндпоинтов (описания одного эндпоинта объединяются)"""
+    body = api_prompt.replace("<api>", "").replace("</api>", "")
+    sections = []
+    for block in _SEPARATOR_RE.split(body):
+        starts = [m.start() for m in _SECTION_RE.finditer(block)]
+        bounds = [0, *starts] if not starts or starts[0] > 0 else starts
+        sections += [block[a:b] for a, b in zip(bounds, [*bounds[1:], len(block)], strict=True)]
+
+    docs: dict[tuple[str, str], ApiDoc] = {}
+    for section in sections:
+        text = section.strip(" \\\n")
+        if not text:
+            continue
+        if inline := _INLINE_RE.search(text):
+            method, url, title = inline.groups()
+        else:
+            method_match, path_match = _METHOD_RE.search(text), _PATH_RE.search(text)
+            if method_match is None or path_match is None:
+                logger.warning("Не удалось разобрать описание эндпоинта: %s", text[:80])
+                continue
+            method, url, title = method_match.group(1), path_match.group(1), text.split("\n", 1)[0]
+        key = (method, urlsplit(url).path or url)
+        if key in docs:
+            docs[key] = ApiDoc(docs[key].title, *key, f"{docs[key].text}\n\n{text}")
+        else:
+            docs[key] = ApiDoc(title.strip().rstrip("."), *key, text)
+    return list(docs.values())
+
+
+@lru_cache(maxsize=256)
+def _path_pattern(path: str) -> re.Pattern[str]:
+    return re.compile(re.sub(r"\\\{[^/]+?\\\}", "[^/]+", re.escape(path)) + "/?")
+
+
+def find_endpoint(method: str, request: str, docs: list[ApiDoc]) -> ApiDoc | None:
+    """Эндпоинт запроса ("GET /v1/assets/SBER@MISX?..." или путь без метода); точные пути важнее шаблонов"""
+    parts = request.split(maxsplit=1)
+    if len(parts) == 2 and parts[0].isupper():
+        method, request = parts
+    path = urlsplit(request).path
+    candidates = [d for d in docs if d.method == method.upper() and _path_pattern(d.path).fullmatch(path)]
+    return min(candidates, key=lambda d: d.path.count("{"), default=None)
+
+
+class ApiDocRetriever:
+    """Выбор описаний эндпоинтов под вопрос и сборка системного промпта"""
+
+    def __init__(
+        self,
+        docs: list[ApiDoc] | None = None,
+        encoder: Encoder | None = None,
+        top_k: int = DEFAULT_TOP_K,
+        hybrid: bool = True,
+    ) -> None:
+        """
+        Args:
+            docs: Описания эндпоинтов (по умолчанию из API_PROMT)
+            encoder: Функция кодирования текстов в нормированные векторы (по умолчанию общий EmbeddingService)
+            top_k: Сколько описаний добавлять в промпт
+            hybrid: Объединять плотный поиск с BM25
+        """
+        self.docs = docs if docs is not None else split_api_docs()
+        self.encoder = encoder or get_embedding_service().encode
+        # Вопросы не сохраняются в постоянный кэш эмбеддингов
+        self.query_encoder = encoder or get_embedding_service().encode_queries
+        self.top_k = top_k
+        self.lexical: BM25Index | None = None
+        if hybrid:
+            self.lexical = BM25Index()
+            self.lexical.add([f"{d.summary}\n{d.text}" for d in self.docs])
+        self._vectors: np.ndarray | None = None
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """Векторы описаний (кодируются один раз)"""
+        if self._vectors is None:
+            self._vectors = self.encoder([f"{d.summary}\n{d.text}" for d in self.docs])
+        return self._vectors
+
+    def search(self, query: str, k: int | None = None) -> list[tuple[ApiDoc, float]]:
+        """Описания, ближайшие к запросу, с оценкой RRF (без BM25 - с косинусной близостью)"""
+        k = min(k or self.top_k, len(self.docs))
+        scores = self.vectors @ self.query_encoder([query])[0]
+        if self.lexical is None:
+            best = np.argpartition(-scores, k - 1)[:k]
+            best = best[np.argsort(-scores[best])]
+            return [(self.docs[i], float(scores[i])) for i in best]
+        # Описаний немного - объединяются полные ранжирования
+        _, lexical = self.lexical.search(query, len(self.docs))
+        fused = rrf_fuse([np.argsort(-scores).tolist(), lexical.tolist()])
+        return [(self.docs[i], score) for i, score in fused[:k]]
+
+    def system_prompt(self, query: str, k: int | None = None) -> str:
+        """Системный промпт с перечнем всех эндпоинтов и описаниями подходящих к запросу"""
+        index = "\n".join(d.summary for d in self.docs)
+        details = "\n\n-----------------------------\n\n".join(d.text for d, _ in self.search(query, k))
+        return (
+            f"{SYSTEM_PROMT} <api>\n"
+            f"Все доступные эндпоинты (базовый URL https://api.finam.ru):\n{index}\n\n"
+            f"Подробное описание эндпоинтов, подходящих к вопросу:\n\n{details}\n</api>\n"
+        )
+
+
+# ============= ПРИМЕРЫ ==============================
+
+
+@dataclass(slots=True, frozen=True)
+class Example:
+    """Вопрос с эталонным запросом (строка train.csv)"""
+
+    question: str
+    type: str
+    request: str
+
+
+def load_examples(path: str | os.PathLike = DEFAULT_TRAIN_PATH) -> list[Example]:
+    with open(path, encoding="utf-8") as f:
+        return [Example(row["question"], row["type"], row["request"]) for row in csv.DictReader(f, delimiter=";")]
+
+
+def _upgrade_index(index: VectorIndex, kind: str | None, **params: int) -> VectorIndex:
+    """
+    Перевести точный индекс на IVF-PQ, когда векторов стало достаточно
+
+    Для "auto" - от EXACT_LIMIT векторов, для "ivfpq" - как только их хватает для
+    обучения (до этого векторы копятся в точном индексе). Векторы берутся из точного индекса.
+    """
+    if not isinstance(index, ExactIndex) or kind not in ("auto", "ivfpq"):
+        return index
+    threshold = max(EXACT_LIMIT if kind == "auto" else 0, PQ_CENTROIDS, params.get("nlist") or 0)
+    if len(index) < threshold:
+        return index
+    vectors, ids = index.vectors
+    upgraded = create_index("ivfpq", index.dim, **params)
+    upgraded.add(vectors, ids)
+    return upgraded
+
+
+class ExampleRetriever:
+    """Похожие примеры для few-shot через индекс векторов вопросов и BM25"""
+
+    def __init__(
+        self,
+        examples: list[Example] | None = None,
+        encoder: Encoder | None = None,
+        index: str | VectorIndex = "auto",
+        lexical: BM25Index | None = None,
+        hybrid: bool = True,
+        **index_params: int,
+    ) -> None:
+        """
+        Args:
+            examples: Начальные примеры
+            encoder: Функция кодирования текстов (по умолчанию общий EmbeddingService)
+            index: "exact", "ivfpq" (пока примеров мало для обучения - точный), "auto" (IVF-PQ
+                от EXACT_LIMIT примеров) или готовый индекс
+            lexical: Готовый индекс BM25 (вместе с готовым index)
+            hybrid: Объединять плотный поиск с BM25
+            index_params: Параметры IVFPQIndex (nlist, m, nprobe, refine)
+        """
+        self.encoder = encoder or get_embedding_service().encode
+        # Вопросы не сохраняются в постоянный кэш эмбеддингов
+        self.query_encoder = encoder or get_embedding_service().encode_queries
+        self.examples: list[Example] = []
+        self.index = index if isinstance(index, VectorIndex) else None
+        self.lexical = lexical if lexical is not None else BM25Index() if hybrid else None
+        self._kind = index if isinstance(index, str) else None
+        self._index_params = index_params
+        if examples:
+            self.add(examples)
+
+    def __len__(self) -> int:
+        return len(self.examples)
+
+    def add(self, examples: list[Example]) -> None:
+        """Добавить примеры в индекс (ID в индексе - номер примера)"""
+        if not examples:
+            return
+        vectors = self.encoder([e.question for e in examples])
+        if self.index is None:
+            # Векторы сначала копятся в точном индексе (см. _upgrade_index)
+            self.index = create_index("exact" if self._kind in ("auto", "ivfpq") else self._kind, vectors.shape[1])
+        ids = np.arange(len(self.examples), len(self.examples) + len(examples))
+        self.index.add(vectors, ids)
+        self.index = _upgrade_index(self.index, self._kind, **self._index_params)
+        if self.lexical is not None:
+            self.lexical.add([e.question for e in examples])
+        self.examples.extend(examples)
+
+    def search(self, question: str, k: int = 5) -> list[tuple[Example, float]]:
+        """k ближайших примеров с оценкой RRF (без BM25 - с косинусной близостью)"""
+        if self.index is None:
+            return []
+        if self.lexical is None:
+            scores, ids = self.index.search(self.query_encoder([question]), k)
+            return [(self.examples[i], float(s)) for s, i in zip(scores[0], ids[0], strict=True) if i >= 0]
+        depth = k * FUSION_DEPTH
+        _, dense = self.index.search(self.query_encoder([question]), depth)
+        _, lexical = self.lexical.search(question, depth)
+        fused = rrf_fuse([[i for i in dense[0].tolist() if i >= 0], lexical.tolist()])
+        return [(self.examples[i], score) for i, score in fused[:k]]
+
+    def save(self, path: str | os.PathLike) -> None:
+        """Сохранить в каталог: index.npz, lexical.npz (BM25) и examples.jsonl"""
+        if self.index is None:
+            raise ValueError("Нет примеров для сохранения")
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        with (path / "examples.jsonl").open("w", encoding="utf-8") as f:
+            f.writelines(json.dumps(asdict(e), ensure_ascii=False) + "\n" for e in self.examples)
+        self.index.save(path / "index.npz")
+        if self.lexical is not None:
+            self.lexical.save(path / "lexical.npz")
+
+    @classmethod
+    def load(cls, path: str | os.PathLike, encoder: Encoder | None = None) -> "ExampleRetriever":
+        path = Path(path)
+        lexical = BM25Index.load(path / "lexical.npz") if (path / "lexical.npz").exists() else None
+        retriever = cls(encoder=encoder, index=VectorIndex.load(path / "index.npz"), lexical=lexical, hybrid=False)
+        with (path / "examples.jsonl").open(encoding="utf-8") as f:
+            retriever.examples = [Example(**json.loads(line)) for line in f]
+        return retriever
+
+
+# ============= ДОКУМЕНТЫ ==============================
+
+_DOC_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    hash TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chunks_path ON chunks(path);
+"""
+
+
+@dataclass(slots=True, frozen=True)
+class DocChunk:
+    """Фрагмент документа: файл, номер страницы (с 1) и текст"""
+
+    source: str
+    page: int
+    text: str
+
+
+@dataclass(slots=True, frozen=True)
+class FileState:
+    """Состояние проиндексированного файла: хэш содержимого и данные stat для быстрой проверки"""
+
+    hash: str
+    size: int
+    mtime_ns: int
+
+
+class DocumentIndex:
+    """
+    Фрагменты документов в каталоге: тексты и состояние файлов в SQLite, векторы в index.npz
+
+    Состояние файла записывается только в save() после сохранения векторов: если
+    загрузка прервется, при следующем запуске файл будет обработан заново.
+    """
+
+    def __init__(
+        self,
+        path: str | os.PathLike | None = None,
+        encoder: Encoder | None = None,
+        index: str = "auto",
+    ) -> None:
+        """
+        Args:
+            path: Каталог индекса (по умолчанию RAG_INDEX_DIR или data/interim/rag)
+            encoder: Функция кодирования текстов (по умолчанию общий EmbeddingService)
+            index: Тип нового индекса векторов: "exact", "ivfpq" или "auto" (IVF-PQ от EXACT_LIMIT фрагментов)
+        """
+        self.path = Path(path or os.getenv("RAG_INDEX_DIR", DEFAULT_INDEX_DIR))
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.encoder = encoder or get_embedding_service().encode
+        # Вопросы не сохраняются в постоянный кэш эмбеддингов
+        self.query_encoder = encoder or get_embedding_service().encode_queries
+        self._kind = index
+        self._db = sqlite3.connect(self.path / "chunks.sqlite3", check_same_thread=False)
+        self._db.executescript(_DOC_SCHEMA)
+        self._lock = threading.Lock()
+        self._pending: dict[str, FileState | None] = {}
+        index_path = self.path / "index.npz"
+        self.index = VectorIndex.load(index_path) if index_path.exists() else None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def files(self) -> dict[str, FileState]:
+        """Проиндексированные файлы (с учетом еще не сохраненных изменений)"""
+        with self._lock:
+            rows = self._db.execute("SELECT path, hash, size, mtime_ns FROM files").fetchall()
+        files = {path: FileState(*state) for path, *state in rows}
+        for path, state in self._pending.items():
+            if state is None:
+                files.pop(path, None)
+            else:
+                files[path] = state
+        return files
+
+    def replace_file(self, path: str, state: FileState, chunks: list[tuple[int, str]]) -> None:
+        """Заменить фрагменты файла: chunks - [(страница, текст)]"""
+        self._drop_chunks(path)
+        if chunks:
+            with self._lock, self._db:
+                start = self._db.execute("SELECT COALESCE(MAX(id), -1) + 1 FROM chunks").fetchone()[0]
+                ids = np.arange(start, start + len(chunks), dtype=np.int64)
+                self._db.executemany(
+                    "INSERT INTO chunks (id, path, page, text) VALUES (?, ?, ?, ?)",
+                    [(int(i), path, page, text) for i, (page, text) in zip(ids, chunks, strict=True)],
+                )
+            vectors = self.encoder([text for _, text in chunks])
+            if self.index is None:
+                kind = "exact" if self._kind in ("auto", "ivfpq") else self._kind
+                self.index = create_index(kind, vectors.shape[1])
+            self.index.add(vectors, ids)
+        self._pending[path] = state
+
+    def touch_file(self, path: str, state: FileState) -> None:
+        """Содержимое не изменилось, обновить данные stat"""
+        self._pending[path] = state
+
+    def remove_file(self, path: str) -> None:
+        self._drop_chunks(path)
+        self._pending[path] = None
+
+    def save(self) -> None:
+        """Сохранить векторы, затем состояние файлов"""
+        if self.index is not None:
+            self.index = _upgrade_index(self.index, self._kind)
+            self.index.save(self.path / "index.npz")
+        with self._lock, self._db:
+            for path, state in self._pending.items():
+                if state is None:
+                    self._db.execute("DELETE FROM files WHERE path = ?", (path,))
+                else:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO files (path, hash, size, mtime_ns) VALUES (?, ?, ?, ?)",
+                        (path, state.hash, state.size, state.mtime_ns),
+                    )
+        self._pending.clear()
+
+    def search(self, query: str, k: int = DOC_TOP_K, min_score: float = -1.0) -> list[tuple[DocChunk, float]]:
+        """k ближайших фрагментов с близостью не ниже min_score"""
+        if self.index is None or not len(self.index):
+            return []
+        scores, ids = self.index.search(self.query_encoder([query]), k)
+        found = [(int(i), float(s)) for s, i in zip(scores[0], ids[0], strict=True) if i >= 0 and s >= min_score]
+        if not found:
+            return []
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT id, path, page, text FROM chunks WHERE id IN ({','.join('?' * len(found))})",
+                [i for i, _ in found],
+            ).fetchall()
+        chunks = {row[0]: DocChunk(*row[1:]) for row in rows}
+        return [(chunks[i], score) for i, score in found if i in chunks]
+
+    def _drop_chunks(self, path: str) -> None:
+        with self._lock, self._db:
+            ids = [row[0] for row in self._db.execute("SELECT id FROM chunks WHERE path = ?", (path,))]
+            self._db.execute("DELETE FROM chunks WHERE path = ?", (path,))
+        if ids and self.index is not None:
+            self.index.remove(np.array(ids, dtype=np.int64))
+
+
+def format_examples(examples: list[tuple[Example, float]]) -> str:
+    """Раздел промпта с похожими вопросами и запросами к API для них"""
+    if not examples:
+        return ""
+    parts = []
+    for example, _ in examples:
+        # В части эталонов метод уже записан в начале request
+        request = example.request.removeprefix(f"{example.type} ")
+        parts.append(f"Вопрос: {example.question}\nЗапрос: {example.type} {request}")
+    body = "\n\n".join(parts)
+    return f"\n<similar_examples>\nПохожие вопросы и запросы к API для них:\n\n{body}\n</similar_examples>\n"
+
+
+def format_knowledge(chunks: list[tuple[DocChunk, float]]) -> str:
+    """Раздел промпта с фрагментами документов"""
+    if not chunks:
+        return ""
+    parts = [f"[{Path(chunk.source).name}, стр. {chunk.page}]\n{chunk.text}" for chunk, _ in chunks]
+    return "\n<knowledge>\nФрагменты справочных документов:\n\n" + "\n\n".join(parts) + "\n</knowledge>\n"
+
+
+# ============= ОБЩИЕ ЭКЗЕМПЛЯРЫ ==============================
+
+
+@lru_cache(maxsize=1)
+def get_api_doc_retriever() -> ApiDocRetriever | None:
+    """Общий экземпляр с закодированными описаниями или None, если поиск выключен (RAG_TOP_K=0) или недоступен"""
+    top_k = int(os.getenv("RAG_TOP_K", DEFAULT_TOP_K))
+    if top_k <= 0:
+        return None
+    retriever = ApiDocRetriever(top_k=top_k)
+    try:
+        _ = retriever.vectors
+    except Exception as e:  # нет sentence-transformers, весов модели или сети для загрузки
+        logger.warning("Поиск по документации API недоступен, используется полный промпт: %s", e)
+        return None
+    return retriever
+
+
+@lru_cache(maxsize=1)
+def get_example_retriever() -> ExampleRetriever | None:
+    """Общий индекс примеров train.csv (RAG_EXAMPLES_PATH) или None, если примеры выключены (RAG_EXAMPLES_K=0)"""
+    path = Path(os.getenv("RAG_EXAMPLES_PATH", DEFAULT_TRAIN_PATH))
+    if int(os.getenv("RAG_EXAMPLES_K", EXAMPLES_TOP_K)) <= 0 or not path.exists():
+        return None
+    try:
+        return ExampleRetriever(load_examples(path))
+    except Exception as e:  # нет модели эмбеддингов
+        logger.warning("Поиск похожих примеров недоступен: %s", e)
+        return None
+
+
+_document_index: tuple[Path, int, DocumentIndex] | None = None
+_document_index_lock = threading.Lock()
+
+
+def get_document_index() -> DocumentIndex | None:
+    """
+    Индекс документов, если он построен (см. ingest), иначе None
+
+    Индекс перечитывается, когда меняется mtime index.npz: повторная загрузка
+    документов видна без перезапуска чата.
+    """
+    global _document_index
+    path = Path(os.getenv("RAG_INDEX_DIR", DEFAULT_INDEX_DIR))
+    try:
+        mtime = (path / "index.npz").stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+    with _document_index_lock:
+        if _document_index is None or _document_index[:2] != (path, mtime):
+            _document_index = (path, mtime, DocumentIndex(path))
+        return _document_index[2]
+
+
+def create_rag_system_prompt(question: str) -> str:
+    """Системный промпт для вопроса: подходящие эндпоинты или полный промпт, если поиск недоступен"""
+    retriever = get_api_doc_retriever()
+    if retriever is None:
+        return create_system_prompt()
+    try:
+        prompt = retriever.system_prompt(question)
+        examples = get_example_retriever()
+        if examples is not None:
+            prompt += format_examples(examples.search(question, int(os.getenv("RAG_EXAMPLES_K", EXAMPLES_TOP_K))))
+        documents = get_document_index()
+        if documents is not None:
+            prompt += format_knowledge(documents.search(question, DOC_TOP_K, DOC_MIN_SCORE))
+        return prompt
+    except Exception as e:  # описания взяты из кэша, а модель для вопроса не загрузилась
+        logger.warning("Поиск по документации API не удался, используется полный промпт: %s", e)
+        return create_system_prompt()
+
+
+def warmup_rag() -> None:
+    """Загрузить описания API и прогреть модель эмбеддингов до первого вопроса (вопросы в кэше не бывают)"""
+    if get_api_doc_retriever() is None:
+        return
+    get_example_retriever()
+    try:
+        get_embedding_service().warmup()
+    except Exception as e:
+        logger.warning("Не удалось прогреть модель эмбеддингов: %s", e)
@@ -0,0 +1,374 @@
+"""
+Индексы векторов для поиска ближайших соседей (скалярное произведение нормированных векторов)
+
+- ExactIndex - полный перебор одним матричным умножением; точный, подходит до
+  десятков тысяч векторов
+- IVFPQIndex - приближенный поиск для сотен тысяч и миллионов векторов:
+  векторы разбиваются k-means на nlist списков (IVF), остаток от центра списка
+  сжимается произведением квантователей (PQ, m байт на вектор). Запрос
+  просматривает nprobe ближайших списков, оценки считаются по таблицам
+  (m × 256) без распаковки векторов, а refine * k лучших кандидатов
+  переоцениваются точно по векторам float16
+
+Оба индекса поддерживают добавление и удаление векторов после построения и
+сохранение в один файл .npz. Точность и скорость IVFPQIndex настраиваются
+параметрами nprobe и refine при поиске (см. scripts/benchmark_vector_index.py).
+"""
+
+import json
+import os
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+import numpy as np
+
+# Размер пачки при назначении векторов центрам (ограничивает память на матрицу расстояний)
+ASSIGN_BATCH = 16384
+# Центров на подпространство PQ: код помещается в один байт
+PQ_CENTROIDS = 256
+# Сколько векторов на центр брать для обучения k-means
+TRAIN_PER_CENTROID = 64
+DEFAULT_NPROBE = 16
+DEFAULT_REFINE = 16
+
+
+def kmeans(x: np.ndarray, k: int, iterations: int = 15, seed: int = 0) -> np.ndarray:
+    """Центры k-means (евклидово расстояние); пустые кластеры переинициализируются случайными точками"""
+    rng = np.random.default_rng(seed)
+    centroids = x[rng.choice(len(x), k, replace=False)].astype(np.float32)
+    for _ in range(iterations):
+        labels = assign(x, centroids)
+        order = np.argsort(labels, kind="stable")
+        counts = np.bincount(labels, minlength=k)
+        nonempty = np.flatnonzero(counts)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[nonempty]
+        centroids[nonempty] = np.add.reduceat(x[order], starts, axis=0) / counts[nonempty, None]
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            centroids[empty] = x[rng.choice(len(x), len(empty), replace=False)]
+    return centroids
+
+
+def assign(x: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Номер ближайшего центра для каждого вектора: argmax(x·c - |c|²/2) пачками"""
+    half_norms = 0.5 * np.einsum("ij,ij->i", centroids, centroids)
+    labels = np.empty(len(x), dtype=np.int64)
+    for start in range(0, len(x), ASSIGN_BATCH):
+        batch = x[start : start + ASSIGN_BATCH]
+        labels[start : start + len(batch)] = np.argmax(batch @ centroids.T - half_norms, axis=1)
+    return labels
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Индексы k наибольших оценок по убыванию"""
+    if len(scores) > k:
+        best = np.argpartition(-scores, k - 1)[:k]
+    else:
+        best = np.arange(len(scores))
+    return best[np.argsort(-scores[best], kind="stable")]
+
+
+class VectorIndex(ABC):
+    """Общий интерфейс индексов: добавление, поиск top-k, сохранение"""
+
+    kind = ""
+
+    def __init__(self, dim: int) -> None:
+        self.dim = dim
+        self._next_id = 0
+
+    @abstractmethod
+    def __len__(self) -> int: ...
+
+    @abstractmethod
+    def add(self, vectors: np.ndarray, ids: np.ndarray | None = None) -> np.ndarray:
+        """Добавить векторы; возвращает их ID (по умолчанию - порядковые номера)"""
+
+    @abstractmethod
+    def remove(self, ids: np.ndarray) -> None:
+        """Удалить векторы с данными ID"""
+
+    @abstractmethod
+    def search(self, queries: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """(оценки, ID) размера (запросы × k) по убыванию оценки; недостающие позиции - ID -1"""
+
+    @abstractmethod
+    def save(self, path: str | os.PathLike) -> None:
+        """Сохранить индекс в один файл .npz"""
+
+    @classmethod
+    @abstractmethod
+    def from_arrays(cls, meta: dict, arrays: dict[str, np.ndarray]) -> "VectorIndex":
+        """Индекс из метаданных и массивов, записанных save()"""
+
+    @staticmethod
+    def load(path: str | os.PathLike) -> "VectorIndex":
+        """Загрузить индекс, сохраненный save() (тип определяется по файлу)"""
+        with np.load(Path(path)) as data:
+            arrays = {name: data[name] for name in data.files}
+        meta = json.loads(arrays.pop("meta").tobytes())
+        index_class = {cls.kind: cls for cls in (ExactIndex, IVFPQIndex)}[meta.pop("kind")]
+        return index_class.from_arrays(meta, arrays)
+
+    def _new_ids(self, count: int, ids: np.ndarray | None) -> np.ndarray:
+        if ids is None:
+            ids = np.arange(self._next_id, self._next_id + count, dtype=np.int64)
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(ids):
+            self._next_id = max(self._next_id, int(ids.max()) + 1)
+        return ids
+
+    def _save_arrays(self, path: str | os.PathLike, meta: dict, **arrays: np.ndarray) -> None:
+        header = json.dumps({"kind": self.kind, "dim": self.dim, "next_id": self._next_id, **meta})
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Запись во временный файл и переименование: читатели не увидят недописанный индекс
+        tmp = path.with_name(path.name + ".tmp")
+        with tmp.open("wb") as f:
+            np.savez(f, meta=np.frombuffer(header.encode(), dtype=np.uint8), **arrays)
+        tmp.replace(path)
+
+
+class ExactIndex(VectorIndex):
+    """Точный поиск полным перебором"""
+
+    kind = "exact"
+
+    def __init__(self, dim: int) -> None:
+        super().__init__(dim)
+        self._chunks: list[np.ndarray] = []
+        self._id_chunks: list[np.ndarray] = []
+
+    def __len__(self) -> int:
+        return sum(len(c) for c in self._id_chunks)
+
+    def add(self, vectors: np.ndarray, ids: np.ndarray | None = None) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        ids = self._new_ids(len(vectors), ids)
+        self._chunks.append(vectors)
+        self._id_chunks.append(ids)
+        return ids
+
+    def remove(self, ids: np.ndarray) -> None:
+        vectors, current = self._consolidate()
+        keep = ~np.isin(current, ids)
+        self._chunks, self._id_chunks = [vectors[keep]], [current[keep]]
+
+    @property
+    def vectors(self) -> tuple[np.ndarray, np.ndarray]:
+        """(векторы, ID) всех добавленных векторов"""
+        return self._consolidate()
+
+    def search(self, queries: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        vectors, ids = self._consolidate()
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        out_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        out_ids = np.full((len(queries), k), -1, dtype=np.int64)
+        for start in range(0, len(queries), 256):
+            scores = queries[start : start + 256] @ vectors.T
+            for row, query_scores in enumerate(scores, start):
+                best = _top_k(query_scores, k)
+                out_scores[row, : len(best)] = query_scores[best]
+                out_ids[row, : len(best)] = ids[best]
+        return out_scores, out_ids
+
+    def save(self, path: str | os.PathLike) -> None:
+        vectors, ids = self._consolidate()
+        self._save_arrays(path, {}, vectors=vectors, ids=ids)
+
+    @classmethod
+    def from_arrays(cls, meta: dict, arrays: dict[str, np.ndarray]) -> "ExactIndex":
+        index = cls(meta["dim"])
+        index._chunks, index._id_chunks = [arrays["vectors"]], [arrays["ids"]]
+        index._next_id = meta["next_id"]
+        return index
+
+    def _consolidate(self) -> tuple[np.ndarray, np.ndarray]:
+        """Склеить добавленные пачки в один массив (один раз после серии добавлений)"""
+        if len(self._chunks) != 1:
+            vectors = np.concatenate(self._chunks) if self._chunks else np.empty((0, self.dim), np.float32)
+            ids = np.concatenate(self._id_chunks) if self._id_chunks else np.empty(0, np.int64)
+            self._chunks, self._id_chunks = [vectors], [ids]
+        return self._chunks[0], self._id_chunks[0]
+
+
+class IVFPQIndex(VectorIndex):
+    """Инвертированные списки с PQ-кодами остатков и точной переоценкой лучших кандидатов"""
+
+    kind = "ivfpq"
+
+    def __init__(
+        self,
+        dim: int,
+        nlist: int | None = None,
+        m: int | None = None,
+        nprobe: int = DEFAULT_NPROBE,
+        refine: int = DEFAULT_REFINE,
+        keep_vectors: bool = True,
+    ) -> None:
+        """
+        Args:
+            dim: Размерность векторов
+            nlist: Число списков (по умолчанию ~sqrt(n) при обучении)
+            m: Число подпространств PQ, делитель dim (по умолчанию dim / 8, т.е. байт на 8 измерений)
+            nprobe: Сколько ближайших списков просматривать при поиске
+            refine: Сколько кандидатов на один результат переоценивать точно (0 - только PQ)
+            keep_vectors: Хранить векторы float16 для точной переоценки (2 * dim байт на вектор)
+        """
+        super().__init__(dim)
+        self.nlist = nlist
+        self.m = m or next(d for d in range(max(dim // 8, 1), 0, -1) if dim % d == 0)
+        if dim % self.m:
+            raise ValueError(f"m={self.m} не делит размерность {dim}")
+        self.nprobe = nprobe
+        self.refine = refine
+        self.keep_vectors = keep_vectors
+        self.centroids: np.ndarray | None = None
+        self.codebooks: np.ndarray | None = None
+        self._codes: list[np.ndarray] = []
+        self._ids: list[np.ndarray] = []
+        self._vectors: list[np.ndarray] = []
+
+    def __len__(self) -> int:
+        return sum(len(ids) for ids in self._ids)
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def train(self, vectors: np.ndarray, seed: int = 0) -> None:
+        """Обучить центры списков и кодовые книги PQ на выборке векторов"""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        nlist = self.nlist or max(1, min(int(np.sqrt(len(vectors))), len(vectors) // 39))
+        if len(vectors) < max(nlist, PQ_CENTROIDS):
+            raise ValueError(f"Для обучения нужно не меньше {max(nlist, PQ_CENTROIDS)} векторов, есть {len(vectors)}")
+        # Одна случайная выборка на оба k-means: центрам списков нужно nlist * TRAIN_PER_CENTROID векторов,
+        # кодовым книгам PQ - PQ_CENTROIDS * TRAIN_PER_CENTROID, сколько бы ни было списков
+        rng = np.random.default_rng(seed)
+        size = min(len(vectors), max(nlist, PQ_CENTROIDS) * TRAIN_PER_CENTROID)
+        sample = vectors[rng.choice(len(vectors), size, replace=False)]
+        self.nlist = nlist
+        self.centroids = kmeans(sample[: nlist * TRAIN_PER_CENTROID], nlist, seed=seed)
+
+        pq_sample = sample[: PQ_CENTROIDS * TRAIN_PER_CENTROID]
+        residuals = self._split(pq_sample - self.centroids[assign(pq_sample, self.centroids)])
+        self.codebooks = np.stack([kmeans(sub, PQ_CENTROIDS, seed=seed + j) for j, sub in enumerate(residuals)])
+        self._codes = [np.empty((0, self.m), np.uint8) for _ in range(nlist)]
+        self._ids = [np.empty(0, np.int64) for _ in range(nlist)]
+        self._vectors = [np.empty((0, self.dim), np.float16) for _ in range(nlist)]
+
+    def add(self, vectors: np.ndarray, ids: np.ndarray | None = None) -> np.ndarray:
+        """Добавить векторы (если индекс не обучен, он обучается на них)"""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        if not self.is_trained:
+            self.train(vectors)
+        ids = self._new_ids(len(vectors), ids)
+        lists = assign(vectors, self.centroids)
+        codes = self._encode(vectors - self.centroids[lists])
+        order = np.argsort(lists, kind="stable")
+        bounds = np.searchsorted(lists[order], np.arange(self.nlist + 1))
+        for list_no in np.flatnonzero(np.diff(bounds)):
+            rows = order[bounds[list_no] : bounds[list_no + 1]]
+            self._codes[list_no] = np.concatenate([self._codes[list_no], codes[rows]])
+            self._ids[list_no] = np.concatenate([self._ids[list_no], ids[rows]])
+            if self.keep_vectors:
+                self._vectors[list_no] = np.concatenate([self._vectors[list_no], vectors[rows].astype(np.float16)])
+        return ids
+
+    def remove(self, ids: np.ndarray) -> None:
+        for list_no, list_ids in enumerate(self._ids):
+            keep = ~np.isin(list_ids, ids)
+            if keep.all():
+                continue
+            self._ids[list_no], self._codes[list_no] = list_ids[keep], self._codes[list_no][keep]
+            if self.keep_vectors:
+                self._vectors[list_no] = self._vectors[list_no][keep]
+
+    def search(
+        self, queries: np.ndarray, k: int, nprobe: int | None = None, refine: int | None = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        out_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        out_ids = np.full((len(queries), k), -1, dtype=np.int64)
+        if not self.is_trained:
+            return out_scores, out_ids
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        refine = self.refine if refine is None else refine
+        refine = refine if self.keep_vectors else 0
+        offsets = np.arange(self.m) * PQ_CENTROIDS
+
+        coarse = queries @ self.centroids.T
+        for row, query in enumerate(queries):
+            probe = _top_k(coarse[row], nprobe)
+            # Таблица вкладов подпространств: оценка кода = сумма m значений из таблицы
+            lut = np.einsum("md,mkd->mk", query.reshape(self.m, -1), self.codebooks).ravel()
+            lists = [p for p in probe if len(self._ids[p])]
+            if not lists:
+                continue
+            scores = np.concatenate([coarse[row, p] + lut[self._codes[p] + offsets].sum(axis=1) for p in lists])
+            best = _top_k(scores, k * refine if refine else k)
+            if refine:
+                # Точная переоценка кандидатов: номер списка и строка в нем по позиции в scores
+                sizes = np.cumsum([len(self._ids[p]) for p in lists])
+                owner = np.searchsorted(sizes, best, side="right")
+                local = best - np.concatenate([[0], sizes[:-1]])[owner]
+                candidates = np.stack([self._vectors[lists[o]][i] for o, i in zip(owner, local, strict=True)])
+                exact = candidates.astype(np.float32) @ query
+                order = _top_k(exact, k)
+                best_ids = np.array([self._ids[lists[owner[i]]][local[i]] for i in order])
+                best_scores = exact[order]
+            else:
+                ids = np.concatenate([self._ids[p] for p in lists])
+                best_ids, best_scores = ids[best], scores[best]
+            out_scores[row, : len(best_ids)] = best_scores
+            out_ids[row, : len(best_ids)] = best_ids
+        return out_scores, out_ids
+
+    def save(self, path: str | os.PathLike) -> None:
+        if not self.is_trained:
+            raise ValueError("Индекс не обучен")
+        sizes = np.array([len(ids) for ids in self._ids], dtype=np.int64)
+        arrays = {
+            "centroids": self.centroids,
+            "codebooks": self.codebooks,
+            "sizes": sizes,
+            "codes": np.concatenate(self._codes),
+            "ids": np.concatenate(self._ids),
+        }
+        if self.keep_vectors:
+            arrays["vectors"] = np.concatenate(self._vectors)
+        meta = {"nlist": self.nlist, "m": self.m, "nprobe": self.nprobe, "refine": self.refine}
+        self._save_arrays(path, {**meta, "keep_vectors": self.keep_vectors}, **arrays)
+
+    @classmethod
+    def from_arrays(cls, meta: dict, arrays: dict[str, np.ndarray]) -> "IVFPQIndex":
+        index = cls(
+            meta["dim"], meta["nlist"], meta["m"], meta["nprobe"], meta["refine"], keep_vectors=meta["keep_vectors"]
+        )
+        index._next_id = meta["next_id"]
+        index.centroids, index.codebooks = arrays["centroids"], arrays["codebooks"]
+        splits = np.cumsum(arrays["sizes"])[:-1]
+        index._codes = np.split(arrays["codes"], splits)
+        index._ids = np.split(arrays["ids"], splits)
+        if index.keep_vectors:
+            index._vectors = np.split(arrays["vectors"], splits)
+        return index
+
+    def _split(self, vectors: np.ndarray) -> np.ndarray:
+        """(n, dim) -> (m, n, dim / m): подвекторы по подпространствам"""
+        return vectors.reshape(len(vectors), self.m, -1).transpose(1, 0, 2)
+
+    def _encode(self, residuals: np.ndarray) -> np.ndarray:
+        codes = np.empty((len(residuals), self.m), dtype=np.uint8)
+        for j, sub in enumerate(self._split(residuals)):
+            codes[:, j] = assign(np.ascontiguousarray(sub), self.codebooks[j])
+        return codes
+
+
+def create_index(kind: str, dim: int, **params: int) -> VectorIndex:
+    """Индекс по названию: "exact" или "ivfpq" (params - параметры IVFPQIndex)"""
+    if kind == ExactIndex.kind:
+        return ExactIndex(dim)
+    if kind == IVFPQIndex.kind:
+        return IVFPQIndex(dim, **params)
+    raise ValueError(f"Неизвестный тип индекса: {kind}")
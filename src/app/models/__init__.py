@@ -1,3 +1,5 @@
 from .finam_request import FinamRequest
+from .finam_response import Bar, Bars, Order, OrderBookLevel, Position, Quote, Trade
+from .order_book import OrderBook
 
-__all__ = ["FinamRequest"]
\ No newline at end of file
+__all__ = ["Bar", "Bars", "FinamRequest", "Order", "OrderBook", "OrderBookLevel", "Position", "Quote", "Trade"]
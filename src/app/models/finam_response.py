@@ -0,0 +1,331 @@
+"""
+Типизированные модели ответов Finam TradeAPI
+
+Десятичные поля Finam ({"value": "123.45"}) декодируются в decimal.Decimal без потери
+точности. Свечи декодируются сразу в колоночные массивы NumPy (Bars), минуя создание
+словаря на каждую свечу.
+"""
+
+import json
+import re
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+from typing import Any
+
+import numpy as np
+
+try:
+    import orjson
+
+    def loads(data: bytes | str) -> Any:  # noqa: ANN401
+        """Быстрое декодирование JSON (orjson)"""
+        return orjson.loads(data)
+
+except ImportError:  # pragma: no cover - orjson приходит транзитивно через chromadb
+
+    def loads(data: bytes | str) -> Any:  # noqa: ANN401
+        """Декодирование JSON стандартной библиотекой"""
+        return json.loads(data)
+
+
+def to_decimal(value: Any) -> Decimal | None:  # noqa: ANN401
+    """Значение google.type.Decimal ({"value": "123.45"}), строка или число в Decimal"""
+    if isinstance(value, dict):
+        value = value.get("value")
+    if value is None or value == "":
+        return None
+    try:
+        return Decimal(str(value))
+    except InvalidOperation:
+        return None
+
+
+@dataclass(slots=True)
+class Quote:
+    """Последняя котировка инструмента (GET /v1/instruments/{symbol}/quotes/latest)"""
+
+    symbol: str
+    timestamp: str | None = None
+    bid: Decimal | None = None
+    bid_size: Decimal | None = None
+    ask: Decimal | None = None
+    ask_size: Decimal | None = None
+    last: Decimal | None = None
+    last_size: Decimal | None = None
+    volume: Decimal | None = None
+    open: Decimal | None = None
+    high: Decimal | None = None
+    low: Decimal | None = None
+    close: Decimal | None = None
+
+    @classmethod
+    def from_response(cls, data: dict[str, Any]) -> "Quote":
+        quote = data.get("quote", data)
+        return cls(
+            symbol=data.get("symbol") or quote.get("symbol", ""),
+            timestamp=quote.get("timestamp"),
+            bid=to_decimal(quote.get("bid")),
+            bid_size=to_decimal(quote.get("bid_size")),
+            ask=to_decimal(quote.get("ask")),
+            ask_size=to_decimal(quote.get("ask_size")),
+            last=to_decimal(quote.get("last")),
+            last_size=to_decimal(quote.get("last_size")),
+            volume=to_decimal(quote.get("volume")),
+            open=to_decimal(quote.get("open")),
+            high=to_decimal(quote.get("high")),
+            low=to_decimal(quote.get("low")),
+            close=to_decimal(quote.get("close")),
+        )
+
+
+@dataclass(slots=True)
+class Bar:
+    """Одна свеча"""
+
+    timestamp: str
+    open: Decimal | None
+    high: Decimal | None
+    low: Decimal | None
+    close: Decimal | None
+    volume: Decimal | None
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "Bar":
+        return cls(
+            timestamp=data.get("timestamp", ""),
+            open=to_decimal(data.get("open")),
+            high=to_decimal(data.get("high")),
+            low=to_decimal(data.get("low")),
+            close=to_decimal(data.get("close")),
+            volume=to_decimal(data.get("volume")),
+        )
+
+
+@dataclass(slots=True)
+class OrderBookLevel:
+    """Уровень стакана"""
+
+    price: Decimal | None
+    buy_size: Decimal | None = None
+    sell_size: Decimal | None = None
+    action: str | None = None
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "OrderBookLevel":
+        return cls(
+            price=to_decimal(data.get("price")),
+            buy_size=to_decimal(data.get("buy_size")),
+            sell_size=to_decimal(data.get("sell_size")),
+            action=data.get("action"),
+        )
+
+
+@dataclass(slots=True)
+class Position:
+    """Позиция на счете (элемент positions из GET /v1/accounts/{account_id})"""
+
+    symbol: str
+    quantity: Decimal | None = None
+    average_price: Decimal | None = None
+    current_price: Decimal | None = None
+    maintenance_margin: Decimal | None = None
+    daily_pnl: Decimal | None = None
+    unrealized_pnl: Decimal | None = None
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "Position":
+        return cls(
+            symbol=data.get("symbol", ""),
+            quantity=to_decimal(data.get("quantity")),
+            average_price=to_decimal(data.get("average_price")),
+            current_price=to_decimal(data.get("current_price")),
+            maintenance_margin=to_decimal(data.get("maintenance_margin")),
+            daily_pnl=to_decimal(data.get("daily_pnl")),
+            unrealized_pnl=to_decimal(data.get("unrealized_pnl")),
+        )
+
+
+@dataclass(slots=True)
+class Order:
+    """Заявка (GET /v1/accounts/{account_id}/orders/{order_id})"""
+
+    order_id: str
+    status: str | None = None
+    symbol: str = ""
+    side: str | None = None
+    type: str | None = None
+    quantity: Decimal | None = None
+    limit_price: Decimal | None = None
+    stop_price: Decimal | None = None
+    time_in_force: str | None = None
+    transact_at: str | None = None
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "Order":
+        order = data.get("order", {})
+        return cls(
+            order_id=data.get("order_id", ""),
+            status=data.get("status"),
+            symbol=order.get("symbol", ""),
+            side=order.get("side"),
+            type=order.get("type"),
+            quantity=to_decimal(order.get("quantity")),
+            limit_price=to_decimal(order.get("limit_price")),
+            stop_price=to_decimal(order.get("stop_price")),
+            time_in_force=order.get("time_in_force"),
+            transact_at=data.get("transact_at"),
+        )
+
+
+@dataclass(slots=True)
+class Trade:
+    """Сделка (элемент trades из GET /v1/accounts/{account_id}/trades или trades/latest)"""
+
+    trade_id: str
+    symbol: str = ""
+    price: Decimal | None = None
+    size: Decimal | None = None
+    side: str | None = None
+    timestamp: str | None = None
+    order_id: str | None = None
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "Trade":
+        return cls(
+            trade_id=data.get("trade_id", ""),
+            symbol=data.get("symbol", ""),
+            price=to_decimal(data.get("price")),
+            size=to_decimal(data.get("size")),
+            side=data.get("side"),
+            timestamp=data.get("timestamp"),
+            order_id=data.get("order_id"),
+        )
+
+
+# ============= СВЕЧИ В МАССИВАХ ==============================
+
+_BAR_FIELDS = ("open", "high", "low", "close", "volume")
+# Ответ в каноническом виде Finam: {"symbol": ..., "bars": [{"timestamp": ..., "open": {"value": ...}, ...}, ...]}
+_STRING = rb'"([^"\\]*)"'
+_BAR = rb'\{\s*"timestamp"\s*:\s*' + _STRING + b"".join(
+    rb'\s*,\s*"' + name.encode() + rb'"\s*:\s*\{\s*"value"\s*:\s*' + _STRING + rb"\s*\}" for name in _BAR_FIELDS
+) + rb"\s*\}"
+_BAR_RE = re.compile(_BAR)
+_BARS_RE = re.compile(rb'\s*\{\s*"symbol"\s*:\s*' + _STRING + rb'\s*,\s*"bars"\s*:\s*\[(.*)\]\s*\}\s*', re.DOTALL)
+# Кавычек и открывающих скобок в одной канонической свече
+_BAR_QUOTES = 4 + 6 * len(_BAR_FIELDS)
+_BAR_BRACES = 1 + len(_BAR_FIELDS)
+# Разрядность цен и объемов Finam не превышает 9 знаков (nanos в google.type.Money)
+MAX_DECIMAL_PLACES = 9
+_TZ_RE = re.compile(r"([+-])(\d{2}):?(\d{2})$")
+
+
+def _utc_timestamps(values: list[bytes] | list[str]) -> np.ndarray:
+    """Метки времени ISO 8601 в datetime64[s] UTC: суффикс Z отбрасывается, смещение (+03:00) вычитается"""
+    texts = [value.decode() if isinstance(value, bytes) else value for value in values]
+    naive = [text[:-1] if text.endswith("Z") else text for text in texts]
+    offsets = np.zeros(len(texts), dtype="timedelta64[s]")
+    for i, text in enumerate(naive):
+        if text is texts[i] and "T" in text and (match := _TZ_RE.search(text)) is not None:
+            sign = 1 if match[1] == "+" else -1
+            offsets[i] = sign * (int(match[2]) * 3600 + int(match[3]) * 60)
+            naive[i] = text[: match.start()]
+    return np.array(naive, dtype="datetime64[s]") - offsets
+
+
+def decimal_places(values: np.ndarray) -> int:
+    """Наименьшее число знаков после запятой (до MAX_DECIMAL_PLACES), которым записываются все значения"""
+    finite = values[np.isfinite(values)]
+    for places in range(MAX_DECIMAL_PLACES):
+        scaled = finite * 10.0**places
+        if np.all(np.abs(scaled - np.round(scaled)) <= 1e-9 * np.maximum(1.0, np.abs(scaled))):
+            return places
+    return MAX_DECIMAL_PLACES
+
+
+def _fixed_point(values: np.ndarray) -> list[str]:
+    """Колонка в строки одинаковой разрядности: [250.1, 250.05] -> ["250.10", "250.05"]"""
+    return np.char.mod(f"%.{decimal_places(values)}f", values).tolist()
+
+
+@dataclass(slots=True)
+class Bars:
+    """
+    Свечи в колоночном представлении: по массиву NumPy на каждое поле
+
+    Колонки хранятся в float64 - на них считаются графики и агрегаты. Цены биржи
+    (до 15 значащих цифр) переживают такое хранение без потерь: Bars[i] отдает
+    ту же величину в Decimal, а to_response() восстанавливает запись в
+    фиксированной точке по разрядности колонки (decimal_places()).
+    """
+
+    symbol: str
+    timestamp: np.ndarray = field(default_factory=lambda: np.empty(0, dtype="datetime64[s]"))
+    open: np.ndarray = field(default_factory=lambda: np.empty(0))
+    high: np.ndarray = field(default_factory=lambda: np.empty(0))
+    low: np.ndarray = field(default_factory=lambda: np.empty(0))
+    close: np.ndarray = field(default_factory=lambda: np.empty(0))
+    volume: np.ndarray = field(default_factory=lambda: np.empty(0))
+
+    def __len__(self) -> int:
+        return len(self.timestamp)
+
+    def __getitem__(self, i: int) -> Bar:
+        return Bar(
+            timestamp=f"{self.timestamp[i]}Z",
+            open=to_decimal(self.open[i]),
+            high=to_decimal(self.high[i]),
+            low=to_decimal(self.low[i]),
+            close=to_decimal(self.close[i]),
+            volume=to_decimal(self.volume[i]),
+        )
+
+    @classmethod
+    def from_response(cls, data: dict[str, Any]) -> "Bars":
+        """Из уже декодированного ответа GET /v1/instruments/{symbol}/bars"""
+        bars = data.get("bars", [])
+        columns = {
+            name: np.fromiter(
+                (float((b.get(name) or {}).get("value") or "nan") for b in bars), dtype=np.float64, count=len(bars)
+            )
+            for name in _BAR_FIELDS
+        }
+        timestamp = _utc_timestamps([b.get("timestamp", "") for b in bars])
+        return cls(symbol=data.get("symbol", ""), timestamp=timestamp, **columns)
+
+    @classmethod
+    def from_json(cls, raw: bytes | str) -> "Bars":
+        """
+        Декодировать сырой JSON ответа сразу в массивы
+
+        Ответ в каноническом виде (symbol, затем bars; у каждой свечи timestamp и
+        OHLCV по порядку, без других ключей) разбирается прекомпилированными
+        регулярными выражениями без построения словаря на каждую свечу. Любой
+        другой ответ (иной порядок или лишние ключи, экранирование в строках)
+        разбирается обычным JSON через from_response().
+        """
+        data = raw.encode() if isinstance(raw, str) else raw
+        document = _BARS_RE.fullmatch(data)
+        if document is not None:
+            body = document[2]
+            rows = _BAR_RE.findall(body)
+            # Все кавычки и скобки массива принадлежат найденным свечам: других ключей и объектов нет
+            if body.count(b'"') == _BAR_QUOTES * len(rows) and body.count(b"{") == _BAR_BRACES * len(rows):
+                columns = list(zip(*rows, strict=True)) if rows else [()] * (len(_BAR_FIELDS) + 1)
+                return cls(
+                    symbol=document[1].decode(),
+                    timestamp=_utc_timestamps(list(columns[0])),
+                    **{name: np.array(v, dtype=np.float64) for name, v in zip(_BAR_FIELDS, columns[1:], strict=True)},
+                )
+        return cls.from_response(loads(data))
+
+    def to_response(self) -> dict[str, Any]:
+        """Обратно в формат ответа API: значения в фиксированной точке с разрядностью колонки"""
+        columns = {name: _fixed_point(getattr(self, name)) for name in _BAR_FIELDS}
+        bars = []
+        for i, timestamp in enumerate(self.timestamp.astype(str).tolist()):
+            bar: dict[str, Any] = {"timestamp": f"{timestamp}Z"}
+            for name in _BAR_FIELDS:
+                bar[name] = {"value": columns[name][i]}
+            bars.append(bar)
+        return {"symbol": self.symbol, "bars": bars}
@@ -0,0 +1,226 @@
+"""
+Компактное представление биржевого стакана на массивах NumPy
+
+Каждая сторона хранится как пара параллельных массивов цен и объемов,
+отсортированных по возрастанию цены. Для bid-стороны лучшая цена находится
+в конце массива, для ask - в начале; аналитика работает с представлениями
+"от лучшей цены" без копирования.
+"""
+
+from typing import Any
+
+import numpy as np
+
+BUY = "buy"
+SELL = "sell"
+
+
+def _decimal(value: Any) -> float:  # noqa: ANN401
+    """Значение google.type.Decimal ({"value": "123.45"}) или числа/строки в float"""
+    if isinstance(value, dict):
+        value = value.get("value")
+    if value in (None, ""):
+        return 0.0
+    return float(value)
+
+
+class OrderBook:
+    """Стакан одного инструмента с инкрементальными обновлениями и векторной аналитикой"""
+
+    __slots__ = ("_ask_prices", "_ask_sizes", "_bid_prices", "_bid_sizes", "symbol")
+
+    def __init__(
+        self,
+        symbol: str = "",
+        bid_prices: np.ndarray | None = None,
+        bid_sizes: np.ndarray | None = None,
+        ask_prices: np.ndarray | None = None,
+        ask_sizes: np.ndarray | None = None,
+    ) -> None:
+        self.symbol = symbol
+        self._bid_prices, self._bid_sizes = self._sorted(bid_prices, bid_sizes)
+        self._ask_prices, self._ask_sizes = self._sorted(ask_prices, ask_sizes)
+
+    @staticmethod
+    def _sorted(prices: np.ndarray | None, sizes: np.ndarray | None) -> tuple[np.ndarray, np.ndarray]:
+        if prices is None or sizes is None or len(prices) == 0:
+            return np.empty(0), np.empty(0)
+        prices = np.asarray(prices, dtype=np.float64)
+        sizes = np.asarray(sizes, dtype=np.float64)
+        order = np.argsort(prices, kind="stable")
+        prices, sizes = prices[order], sizes[order]
+        # Повторы цены: остается последняя строка уровня (как при update), пустые уровни отбрасываются
+        keep = np.append(prices[1:] != prices[:-1], True) & (sizes > 0)
+        return prices[keep], sizes[keep]
+
+    @classmethod
+    def from_response(cls, response: dict[str, Any]) -> "OrderBook":
+        """Построить стакан из ответа GET /v1/instruments/{symbol}/orderbook"""
+        book = cls(response.get("symbol", ""))
+        book.apply(response.get("orderbook", {}).get("rows", []), snapshot=True)
+        return book
+
+    # ============= ОБНОВЛЕНИЯ ==============================
+
+    def apply(self, rows: list[dict[str, Any]], snapshot: bool = False) -> None:
+        """
+        Применить строки стакана
+
+        Args:
+            rows: Строки в формате Finam (price, buy_size/sell_size, action)
+            snapshot: True - строки заменяют стакан целиком, иначе это изменения уровней
+        """
+        if snapshot:
+            bids = [(_decimal(r.get("price")), _decimal(r["buy_size"])) for r in rows if "buy_size" in r]
+            asks = [(_decimal(r.get("price")), _decimal(r["sell_size"])) for r in rows if "sell_size" in r]
+            bid_arr = np.array(bids, dtype=np.float64).reshape(-1, 2)
+            ask_arr = np.array(asks, dtype=np.float64).reshape(-1, 2)
+            self._bid_prices, self._bid_sizes = self._sorted(bid_arr[:, 0], bid_arr[:, 1])
+            self._ask_prices, self._ask_sizes = self._sorted(ask_arr[:, 0], ask_arr[:, 1])
+            return
+
+        for row in rows:
+            price = _decimal(row.get("price"))
+            remove = row.get("action") == "ACTION_REMOVE"
+            if "buy_size" in row:
+                self.update(BUY, price, 0.0 if remove else _decimal(row["buy_size"]))
+            if "sell_size" in row:
+                self.update(SELL, price, 0.0 if remove else _decimal(row["sell_size"]))
+
+    def update(self, side: str, price: float, size: float) -> None:
+        """Установить объем уровня (size <= 0 удаляет уровень)"""
+        if side == BUY:
+            self._bid_prices, self._bid_sizes = self._set_level(self._bid_prices, self._bid_sizes, price, size)
+        else:
+            self._ask_prices, self._ask_sizes = self._set_level(self._ask_prices, self._ask_sizes, price, size)
+
+    @staticmethod
+    def _set_level(prices: np.ndarray, sizes: np.ndarray, price: float, size: float) -> tuple[np.ndarray, np.ndarray]:
+        i = int(np.searchsorted(prices, price))
+        exists = i < len(prices) and prices[i] == price
+        if size <= 0:
+            if exists:
+                return np.delete(prices, i), np.delete(sizes, i)
+            return prices, sizes
+        if exists:
+            sizes[i] = size
+            return prices, sizes
+        return np.insert(prices, i, price), np.insert(sizes, i, size)
+
+    # ============= ДОСТУП ==============================
+
+    @property
+    def bid_prices(self) -> np.ndarray:
+        """Цены покупки от лучшей (наибольшей)"""
+        return self._bid_prices[::-1]
+
+    @property
+    def bid_sizes(self) -> np.ndarray:
+        return self._bid_sizes[::-1]
+
+    @property
+    def ask_prices(self) -> np.ndarray:
+        """Цены продажи от лучшей (наименьшей)"""
+        return self._ask_prices
+
+    @property
+    def ask_sizes(self) -> np.ndarray:
+        return self._ask_sizes
+
+    def side(self, side: str) -> tuple[np.ndarray, np.ndarray]:
+        """(цены, объемы) стороны от лучшей цены"""
+        if side == BUY:
+            return self.bid_prices, self.bid_sizes
+        return self.ask_prices, self.ask_sizes
+
+    def levels(self, depth: int = 10) -> dict[str, list[tuple[float, float]]]:
+        """Верхние уровни стакана в виде списков (цена, объем)"""
+        return {
+            "bids": list(zip(self.bid_prices[:depth].tolist(), self.bid_sizes[:depth].tolist(), strict=True)),
+            "asks": list(zip(self.ask_prices[:depth].tolist(), self.ask_sizes[:depth].tolist(), strict=True)),
+        }
+
+    # ============= АНАЛИТИКА ==============================
+
+    @property
+    def best_bid(self) -> float:
+        return float(self._bid_prices[-1]) if len(self._bid_prices) else float("nan")
+
+    @property
+    def best_ask(self) -> float:
+        return float(self._ask_prices[0]) if len(self._ask_prices) else float("nan")
+
+    def spread(self) -> float:
+        """Разница между лучшими ценами продажи и покупки"""
+        return self.best_ask - self.best_bid
+
+    def mid(self) -> float:
+        """Средняя цена между лучшими bid и ask"""
+        return (self.best_ask + self.best_bid) / 2
+
+    def cumulative_depth(self, side: str, levels: int | None = None) -> np.ndarray:
+        """Накопленный объем стороны по уровням от лучшей цены"""
+        return np.cumsum(self.side(side)[1][:levels])
+
+    def imbalance(self, levels: int = 5) -> float:
+        """Дисбаланс объемов (bid - ask) / (bid + ask) на верхних уровнях, от -1 до 1"""
+        bid = float(self.bid_sizes[:levels].sum())
+        ask = float(self.ask_sizes[:levels].sum())
+        total = bid + ask
+        return (bid - ask) / total if total else 0.0
+
+    def vwap(self, side: str, lots: float) -> float:
+        """
+        Средняя цена исполнения рыночной заявки объемом lots
+
+        Args:
+            side: BUY - заявка на покупку (забирает ask), SELL - на продажу (забирает bid)
+            lots: Объем заявки
+
+        Returns:
+            Средневзвешенная цена или nan, если ликвидности в стакане недостаточно
+        """
+        prices, sizes = self.side(SELL if side == BUY else BUY)
+        if lots <= 0 or sizes.sum() < lots:
+            return float("nan")
+        filled_before = np.cumsum(sizes) - sizes
+        take = np.clip(lots - filled_before, 0.0, sizes)
+        return float(np.dot(take, prices) / lots)
+
+    def _vwaps(self, side: str, lots: np.ndarray) -> np.ndarray:
+        """vwap() сразу для нескольких объемов: одна матрица (объемы x уровни) вместо прохода на объем"""
+        prices, sizes = self.side(SELL if side == BUY else BUY)
+        filled = np.cumsum(sizes)
+        take = np.clip(lots[:, None] - (filled - sizes), 0.0, sizes)
+        available = filled[-1] if len(filled) else 0.0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where((lots > 0) & (lots <= available), take @ prices / lots, np.nan)
+
+    def summary(self, levels: int = 5, lots: tuple[float, ...] = (1, 10, 100)) -> dict[str, Any]:
+        """Краткая сводка стакана для передачи в LLM вместо полного ответа API"""
+        ndigits = 6
+        amounts = np.array(lots, dtype=np.float64)
+
+        def _round(x: float) -> float | None:
+            return None if np.isnan(x) else round(x, ndigits)
+
+        return {
+            "symbol": self.symbol,
+            "best_bid": _round(self.best_bid),
+            "best_ask": _round(self.best_ask),
+            "spread": _round(self.spread()),
+            "mid": _round(self.mid()),
+            "bid_levels": len(self._bid_prices),
+            "ask_levels": len(self._ask_prices),
+            f"bid_depth_{levels}": float(self.bid_sizes[:levels].sum()),
+            f"ask_depth_{levels}": float(self.ask_sizes[:levels].sum()),
+            f"imbalance_{levels}": round(self.imbalance(levels), 4),
+            "vwap_buy": {str(n): _round(x) for n, x in zip(lots, self._vwaps(BUY, amounts).tolist(), strict=True)},
+            "vwap_sell": {str(n): _round(x) for n, x in zip(lots, self._vwaps(SELL, amounts).tolist(), strict=True)},
+        }
+
+    def __len__(self) -> int:
+        return len(self._bid_prices) + len(self._ask_prices)
+
+    def __repr__(self) -> str:
+        return f"OrderBook({self.symbol!r}, bid={self.best_bid}, ask={self.best_ask}, levels={len(self)})"
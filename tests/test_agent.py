@@ -0,0 +1,158 @@
+"""Цикл агента с поддельными LLM и клиентом: бюджеты шагов и времени, параллельность, подтверждение, GET заранее"""
+
+import json
+import threading
+import time
+from collections.abc import Iterator
+from typing import Any
+
+import requests
+
+from src.app.interfaces.agent import STOP_LAST, STOP_MAX_STEPS, STOP_TIMEOUT, AgentLoop
+from src.app.models import FinamRequest
+
+QUOTE = "/v1/instruments/SBER@MISX/quotes/latest"
+ORDERS = "/v1/accounts/ACC1/orders"
+
+
+def answer(*requests: tuple[str, str], last: bool = False, message: str = "ok") -> str:
+    items = [{"method": method, "url": url, "body": None} for method, url in requests]
+    return json.dumps({"message": message, "requests": items, "last": int(last)})
+
+
+class FakeLLM:
+    """Отдает заготовленные ответы по очереди (последний повторяется), запоминает таймауты"""
+
+    def __init__(self, *answers: str, delay: float = 0.0) -> None:
+        self.answers = list(answers)
+        self.delay = delay
+        self.timeouts: list[float] = []
+
+    def __call__(self, messages: list[dict[str, str]], temperature: float, timeout: float) -> dict[str, Any]:
+        self.timeouts.append(timeout)
+        time.sleep(self.delay)
+        content = self.answers[min(len(self.timeouts), len(self.answers)) - 1]
+        return {"choices": [{"message": {"content": content}}]}
+
+
+class FakeClient:
+    """Ответ на любой запрос - его метод и путь; barrier задерживает запросы, пока не придут все"""
+
+    def __init__(self, delay: float = 0.0, barrier: threading.Barrier | None = None) -> None:
+        self.delay = delay
+        self.barrier = barrier
+        self.requests: list[tuple[str, str]] = []
+        self.received = threading.Event()
+        self._lock = threading.Lock()
+
+    def execute_finam_request(self, request: FinamRequest) -> dict[str, Any]:
+        with self._lock:
+            self.requests.append((request.method, request.url))
+        self.received.set()
+        if self.barrier is not None:
+            self.barrier.wait()
+        time.sleep(self.delay)
+        return {"method": request.method, "url": request.url}
+
+
+def loop(client: FakeClient, llm: FakeLLM, **kwargs: Any) -> AgentLoop:  # noqa: ANN401
+    return AgentLoop(client, llm=llm, **kwargs)  # type: ignore[arg-type]
+
+
+def ask() -> list[dict[str, str]]:
+    return [{"role": "user", "content": "Цена SBER?"}]
+
+
+def test_stops_at_last_answer() -> None:
+    client = FakeClient()
+    result = loop(client, FakeLLM(answer(("GET", QUOTE)), answer(last=True, message="300"))).run(ask())
+    assert result.stop_reason == STOP_LAST
+    assert result.message == "300"
+    assert client.requests == [("GET", QUOTE)]
+    assert result.api_requests == [{"method": "GET", "path": QUOTE, "response": {"method": "GET", "url": QUOTE}}]
+
+
+def test_step_budget() -> None:
+    client = FakeClient()
+    history = ask()
+    result = loop(client, FakeLLM(answer(("GET", QUOTE))), max_steps=3).run(history)
+    assert result.stop_reason == STOP_MAX_STEPS
+    assert [step.index for step in result.steps] == [1, 2, 3]
+    assert len(client.requests) == 3
+    # Вопрос + по ответу ассистента и результатам API на каждый шаг
+    assert len(history) == 1 + 2 * 3
+
+
+def test_time_budget_between_steps() -> None:
+    llm = FakeLLM(answer(("GET", QUOTE)), delay=0.15)
+    result = loop(FakeClient(), llm, max_steps=10, time_budget=0.2).run(ask())
+    assert result.stop_reason == STOP_TIMEOUT
+    assert len(result.steps) == 2
+    # Остаток бюджета уходит в LLM как таймаут
+    assert llm.timeouts[0] <= 0.2 and llm.timeouts[1] < llm.timeouts[0]
+
+
+def test_llm_timeout_stops_loop() -> None:
+    def llm(*_args: Any, **_kwargs: Any) -> dict[str, Any]:
+        raise requests.Timeout
+
+    result = AgentLoop(FakeClient(), llm=llm).run(ask())  # type: ignore[arg-type]
+    assert result.stop_reason == STOP_TIMEOUT
+    assert result.steps == [] and result.message is None
+
+
+def test_slow_request_gets_timeout_error() -> None:
+    llm = FakeLLM(answer(("GET", QUOTE)))
+    started = time.perf_counter()
+    result = loop(FakeClient(delay=1.0), llm, time_budget=0.2).run(ask())
+    assert time.perf_counter() - started < 0.9
+    assert result.stop_reason == STOP_TIMEOUT
+    assert result.steps[0].responses == [{"error": "Превышен лимит времени", "status_code": None}]
+
+
+def test_requests_of_a_step_run_in_parallel() -> None:
+    urls = [f"/v1/instruments/{s}@MISX/quotes/latest" for s in ("SBER", "GAZP", "LKOH", "YNDX")]
+    # Каждый запрос ждет остальные: последовательное выполнение упало бы по таймауту барьера
+    client = FakeClient(delay=0.1, barrier=threading.Barrier(len(urls), timeout=2))
+    llm = FakeLLM(answer(*(("GET", url) for url in urls)), answer(last=True))
+    result = loop(client, llm, max_workers=len(urls)).run(ask())
+    step = result.steps[0]
+    assert [r["url"] for r in step.responses] == urls
+    assert step.api_seconds < 0.1 * len(urls)
+
+
+def test_approve_denies_mutating_requests() -> None:
+    approved: list[FinamRequest] = []
+
+    def approve(request: FinamRequest) -> bool:
+        approved.append(request)
+        return False
+
+    client = FakeClient()
+    llm = FakeLLM(answer(("GET", QUOTE), ("POST", ORDERS), ("DELETE", f"{ORDERS}/1")), answer(last=True))
+    result = loop(client, llm, approve=approve).run(ask())
+    assert [r.method for r in approved] == ["POST", "DELETE"]
+    assert client.requests == [("GET", QUOTE)]
+    assert result.steps[0].responses[1:] == [{"error": "Отклонено пользователем", "status_code": None}] * 2
+
+
+def test_speculative_get_is_reused_by_method_and_url() -> None:
+    client = FakeClient()
+    text = answer(("GET", QUOTE), ("GET", QUOTE), ("POST", QUOTE))
+    first_closed = text.index("}") + 1
+    sent_during_generation: list[bool] = []
+
+    def stream_llm(*_args: Any, **_kwargs: Any) -> Iterator[str]:
+        yield text[:first_closed]
+        # Объект первого запроса закрылся: GET уже отправлен, ответ еще генерируется
+        sent_during_generation.append(client.received.wait(2))
+        yield text[first_closed:]
+
+    llm = FakeLLM(answer(last=True))
+    result = loop(client, llm, stream_llm=stream_llm, max_steps=1).run(ask())
+    assert sent_during_generation == [True]
+    step = result.steps[0]
+    # Оба GET получили один и тот же ответ; POST на тот же путь - отдельный запрос
+    assert sorted(client.requests) == [("GET", QUOTE), ("POST", QUOTE)]
+    assert step.speculative == 2
+    assert step.responses == [{"method": "GET", "url": QUOTE}] * 2 + [{"method": "POST", "url": QUOTE}]
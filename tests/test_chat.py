@@ -0,0 +1,80 @@
+"""Разбор ответов ассистента: JSON как есть, в ```json, внутри текста, с ошибками и по частям потока"""
+
+import json
+
+import pytest
+
+from src.app.interfaces.chat import StreamingRequestParser, _balanced, parse_assistant_response
+from src.app.models import FinamRequest
+
+ANSWER = {
+    "message": "Получаю котировку",
+    "requests": [
+        {"method": "get", "url": "/v1/instruments/SBER@MISX/quotes/latest", "body": None},
+        {"method": "POST", "url": "/v1/accounts/A1/orders", "body": {"symbol": "SBER@MISX", "legs": [{"q": 1}]}},
+    ],
+    "instructions": None,
+    "last": 0,
+}
+REQUESTS = [
+    FinamRequest(method="GET", url="/v1/instruments/SBER@MISX/quotes/latest", body=None),
+    FinamRequest(method="POST", url="/v1/accounts/A1/orders", body={"symbol": "SBER@MISX", "legs": [{"q": 1}]}),
+]
+RAW = json.dumps(ANSWER, ensure_ascii=False)
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        RAW,
+        f"```json\n{RAW}\n```",
+        f"Вот ответ:\n{RAW}\nНадеюсь, помог {{не JSON}}",
+    ],
+    ids=["raw", "fenced", "prose"],
+)
+def test_parses_answer(text: str) -> None:
+    response = parse_assistant_response(text)
+    assert response.message == "Получаю котировку"
+    assert response.requests == REQUESTS
+    assert response.instructions is None
+    assert not response.last
+
+
+def test_malformed_json_keeps_closed_requests() -> None:
+    text = (
+        '{"message": "Ищу \\"SBER\\"", "last": true, "requests": ['
+        '{"method": "GET", "url": "/v1/assets/SBER@MISX",},'
+        '{"method": "GET", "url": "/v1/assets/GAZP@MISX", "body": {"a": [1, 2}}'
+    )
+    response = parse_assistant_response(text)
+    assert response.message == 'Ищу "SBER"'
+    assert response.last
+    # Запрос с лишней запятой восстановлен по полям; у второго скобки не парные, он отброшен
+    assert response.requests == [FinamRequest(method="GET", url="/v1/assets/SBER@MISX", body=None)]
+
+
+def test_balanced_tracks_bracket_type() -> None:
+    assert _balanced('x {"a": [1, {"b": "}]"}]} y', 2) == '{"a": [1, {"b": "}]"}]}'
+    assert _balanced('{"a": [1}]', 0) is None
+    assert _balanced('{"a": 1', 0) is None
+    assert _balanced("нет скобок", -1) is None
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 64])
+def test_streaming_parser_across_chunks(size: int) -> None:
+    parser = StreamingRequestParser()
+    found = []
+    for i in range(0, len(RAW), size):
+        found.extend(parser.feed(RAW[i : i + size]))
+    assert found == REQUESTS
+    assert parser.text == RAW
+    # После закрытия массива requests новые фрагменты запросов не дают
+    assert parser.feed('{"method": "GET", "url": "/x"}') == []
+
+
+def test_streaming_parser_emits_request_when_its_object_closes() -> None:
+    parser = StreamingRequestParser()
+    head, tail = RAW.split('}, {"method": "POST"', 1)
+    assert parser.feed(head) == []
+    assert parser.feed("}") == REQUESTS[:1]
+    assert parser.feed(', {"method": "POST"' + tail) == REQUESTS[1:]
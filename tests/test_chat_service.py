@@ -0,0 +1,85 @@
+"""Безопасность создания сессий сервиса чата"""
+
+from typing import Any
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.app.interfaces.chat_service import ChatService, create_app
+
+API_KEY = "test-key"
+AUTH = {"Authorization": f"Bearer {API_KEY}"}
+
+
+def fake_llm(*_args: Any, **_kwargs: Any) -> dict[str, Any]:
+    return {"choices": [{"message": {"content": "ответ"}}]}
+
+
+@pytest.fixture
+def service(monkeypatch: pytest.MonkeyPatch) -> ChatService:
+    monkeypatch.setenv("FINAM_ACCESS_TOKEN", "server-secret")
+    monkeypatch.delenv("CHAT_SERVICE_API_KEY", raising=False)
+    return ChatService(llm=fake_llm, stream=None, api_key=API_KEY)
+
+
+@pytest.fixture
+def http(service: ChatService) -> TestClient:
+    return TestClient(create_app(service))
+
+
+def test_create_session_requires_api_key(http: TestClient) -> None:
+    assert http.post("/v1/chat/sessions", json={}).status_code == 401
+    assert http.post("/v1/chat/sessions", json={}, headers={"Authorization": "Bearer wrong"}).status_code == 401
+    assert http.post("/v1/chat/sessions", json={}, headers=AUTH).status_code == 200
+
+
+def test_create_app_without_api_key_fails(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.delenv("CHAT_SERVICE_API_KEY", raising=False)
+    with pytest.raises(RuntimeError):
+        create_app(ChatService(llm=fake_llm, stream=None))
+
+
+def test_custom_base_url_requires_token(http: TestClient, service: ChatService) -> None:
+    response = http.post("/v1/chat/sessions", json={"base_url": "https://attacker.example"}, headers=AUTH)
+    assert response.status_code == 400
+    assert not service.sessions
+
+    response = http.post(
+        "/v1/chat/sessions", json={"base_url": "https://attacker.example", "token": "own-token"}, headers=AUTH
+    )
+    assert response.status_code == 200
+    session = service.sessions[response.json()["session_id"]]
+    assert service.client(session.client_key).client.access_token == "own-token"
+
+
+def test_allow_orders_is_server_setting(http: TestClient, service: ChatService) -> None:
+    response = http.post("/v1/chat/sessions", json={"allow_orders": True}, headers=AUTH)
+    assert response.status_code == 422
+    assert not service.allow_orders
+
+
+@pytest.mark.parametrize(("max_steps", "status"), [(0, 422), (1, 200), (10, 200), (11, 422), (1000, 422)])
+def test_max_steps_is_bounded(http: TestClient, max_steps: int, status: int) -> None:
+    assert http.post("/v1/chat/sessions", json={"max_steps": max_steps}, headers=AUTH).status_code == status
+
+
+def test_clients_are_evicted_with_idle_sessions(http: TestClient, service: ChatService) -> None:
+    def create(token: str) -> str:
+        response = http.post("/v1/chat/sessions", json={"token": token}, headers=AUTH)
+        session = service.sessions[response.json()["session_id"]]
+        service.client(session.client_key)
+        return session.session_id
+
+    idle, shared, other = create("token-1"), create("token-2"), create("token-2")
+    assert service.summary()["finam_clients"] == 2
+
+    service.sessions[idle].last_active -= service.session_ttl + 1
+    create("token-3")
+    assert idle not in service.sessions
+    assert {key[0] for key in service._clients} == {"token-2", "token-3"}
+
+    # Клиент остается, пока его токен нужен хотя бы одной сессии
+    assert http.delete(f"/v1/chat/sessions/{shared}").json() == {"deleted": True}
+    assert ("token-2", None) in service._clients
+    http.delete(f"/v1/chat/sessions/{other}")
+    assert {key[0] for key in service._clients} == {"token-3"}
@@ -0,0 +1,160 @@
+"""Потоковая оценка submission совпадает с исходной оценкой словарями в памяти, в том числе по разделам на диске"""
+
+import csv
+import random
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from scripts import evaluate as ev
+
+# Бюджет, при котором файлы фикстуры раскладываются на несколько разделов во временных файлах
+TINY_MEMORY_MB = 0.005
+
+Rows = list[dict[str, str]]
+
+
+def reference_evaluate(submission_path: Path, private_path: Path, public_path: Path) -> dict:
+    """Исходный evaluate: все файлы загружаются словарями load_csv_data"""
+    submission = ev.load_csv_data(str(submission_path))
+    if not submission:
+        return {"public_score": 0.0, "private_score": 0.0, "metrics": {}, "errors": ["Submission file is empty"]}
+    public, private = ev.load_csv_data(str(public_path)), ev.load_csv_data(str(private_path))
+    required = set(public) | set(private)
+    is_valid, errors = ev.validate_submission(submission, required)
+    if not is_valid:
+        metrics = {"validation_failed": True, "submission_size": len(submission), "required_size": len(required)}
+        return {"public_score": 0.0, "private_score": 0.0, "metrics": metrics, "errors": errors}
+    public_score, public_metrics = ev.calculate_accuracy(submission, public) if public else (0.0, {})
+    private_score, private_metrics = ev.calculate_accuracy(submission, private) if private else (0.0, {})
+    metrics = {
+        "public_metrics": public_metrics,
+        "private_metrics": private_metrics,
+        "submission_size": len(submission),
+        "validation_passed": True,
+    }
+    scores = {"public_score": round(public_score, 2), "private_score": round(private_score, 2)}
+    return {**scores, "metrics": metrics, "errors": []}
+
+
+def write_csv(path: Path, rows: Rows, columns: tuple[str, ...] = ("uid", "type", "request")) -> Path:
+    with path.open("w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, columns, delimiter=";", extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+    return path
+
+
+def make_truth(rng: random.Random, count: int = 300) -> Rows:
+    methods = ["GET"] * 6 + ["POST", "DELETE"]
+    return [
+        {
+            "uid": f"q{i:04d}",
+            "type": rng.choice(methods),
+            # Путь с разделителем ";" проверяет разбор кавычек
+            "request": f"/v1/instruments/SYM{rng.randint(0, 40)}@MISX/bars?timeframe=TIME_FRAME_D;x={i % 3}",
+        }
+        for i in range(count)
+    ]
+
+
+def with_mistakes(truth: Rows, rng: random.Random) -> Rows:
+    """Предсказания: часть верна, часть с другим методом или путем, есть повтор uid (побеждает последний)"""
+    rows = []
+    for row in truth:
+        roll = rng.random()
+        if roll < 0.15:
+            row = {**row, "type": "POST" if row["type"] == "GET" else "GET"}
+        elif roll < 0.3:
+            row = {**row, "request": row["request"] + "&depth=5"}
+        rows.append(row)
+    rows.insert(5, {**rows[40], "request": "/v1/stale"})
+    rng.shuffle(rows)
+    return rows
+
+
+def valid(rows: Rows) -> Rows:
+    return rows
+
+
+def missing_and_extra(rows: Rows) -> Rows:
+    return [r for r in rows if r["uid"] not in ("q0001", "q0100")] + [{"uid": "zz", "type": "GET", "request": "/x"}]
+
+
+def bad_fields(rows: Rows) -> Rows:
+    broken = {"q0002": {"type": ""}, "q0003": {"request": ""}, "q0004": {"type": "FETCH"}, "q0005": {"request": "v1"}}
+    return [{**r, **broken.get(r["uid"], {})} for r in rows]
+
+
+def empty(_rows: Rows) -> Rows:
+    return []
+
+
+@pytest.mark.parametrize("memory_mb", [ev.DEFAULT_MEMORY_MB, TINY_MEMORY_MB], ids=["in-memory", "partitions"])
+@pytest.mark.parametrize("case", [valid, missing_and_extra, bad_fields, empty])
+def test_evaluate_matches_in_memory_baseline(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, case: Callable[[Rows], Rows], memory_mb: float
+) -> None:
+    rng = random.Random(0)
+    truth = make_truth(rng)
+    public = write_csv(tmp_path / "public.csv", truth[:100])
+    # Другой порядок колонок в эталоне: сопоставление по заголовку
+    private = write_csv(tmp_path / "private.csv", truth[100:], columns=("request", "uid", "type"))
+    submission = write_csv(tmp_path / "submission.csv", case(with_mistakes(truth, rng)))
+
+    partitions: list[int] = []
+    partition_file = ev.partition_file
+
+    def recording(rows: Any, count: int, directory: Path) -> list[Path]:  # noqa: ANN401
+        partitions.append(count)
+        return partition_file(rows, count, directory)
+
+    monkeypatch.setattr(ev, "partition_file", recording)
+    result = ev.evaluate(str(submission), str(private), str(public), memory_mb=memory_mb)
+
+    assert result == reference_evaluate(submission, private, public)
+    if memory_mb == TINY_MEMORY_MB:
+        # Все три файла разложены на одинаковое число разделов (> 1) на диске
+        assert len(partitions) == 3 and len(set(partitions)) == 1 and partitions[0] > 1
+    else:
+        assert partitions == []
+
+
+def test_fixture_exercises_scores(tmp_path: Path) -> None:
+    """Фикстура дает неполную, но ненулевую точность - сравнение выше не тривиально"""
+    rng = random.Random(0)
+    truth = make_truth(rng)
+    public = write_csv(tmp_path / "public.csv", truth[:100])
+    private = write_csv(tmp_path / "private.csv", truth[100:])
+    submission = write_csv(tmp_path / "submission.csv", with_mistakes(truth, rng))
+    result = ev.evaluate(str(submission), str(private), str(public))
+    assert not result["errors"]
+    assert 50 < result["public_score"] < 100 and 50 < result["private_score"] < 100
+
+
+@pytest.mark.parametrize("memory_mb", [ev.DEFAULT_MEMORY_MB, TINY_MEMORY_MB], ids=["in-memory", "partitions"])
+def test_scan_counts_duplicates_and_misses(tmp_path: Path, memory_mb: float) -> None:
+    rng = random.Random(1)
+    truth = make_truth(rng, 200)
+    rows = missing_and_extra(with_mistakes(truth, rng))
+    submission = write_csv(tmp_path / "submission.csv", rows)
+    truth_path = write_csv(tmp_path / "truth.csv", truth)
+    errors: list[tuple[str, str]] = []
+
+    def on_error(uid: str, kind: str, *_rows: Any) -> None:  # noqa: ANN401
+        errors.append((uid, kind))
+
+    scan = ev.scan_submission(submission, {"truth": truth_path}, memory_mb=memory_mb, on_error=on_error)
+
+    predicted = ev.load_csv_data(str(submission))
+    expected = ev.load_csv_data(str(truth_path))
+    assert (scan.rows, scan.uids, scan.duplicates) == (len(rows), len(predicted), len(rows) - len(predicted))
+    assert (scan.missing, scan.extra) == (2, 1)
+    misses = {uid for uid, row in expected.items() if predicted.get(uid) != row}
+    assert {uid for uid, _ in errors} == misses
+    assert {uid for uid, kind in errors if kind == "missing"} == {"q0001", "q0100"}
+    accuracy, metrics = ev.calculate_accuracy(predicted, expected)
+    assert scan.accuracy["truth"].accuracy * 100 == pytest.approx(accuracy)
+    assert scan.accuracy["truth"].correct == metrics["correct_predictions"]
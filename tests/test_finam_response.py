@@ -0,0 +1,106 @@
+"""Типизированные ответы: свечи из сырого JSON, десятичные поля в Decimal и методы клиента fetch_*"""
+
+import json
+from collections.abc import Iterator
+from decimal import Decimal
+
+import numpy as np
+import pytest
+import requests
+
+from src.app.adapters import FinamAPIClient, FinamSessionManager
+from src.app.adapters.finam_simulator import FinamSimulator
+from src.app.models import Bars, Order, Position, Quote, Trade
+
+
+def bar(timestamp: str, close: str = "1.5") -> dict:
+    values = {"open": "1", "high": "2", "low": "0.5", "close": close, "volume": "10"}
+    return {"timestamp": timestamp, **{name: {"value": value} for name, value in values.items()}}
+
+
+def test_canonical_response() -> None:
+    raw = json.dumps({"symbol": "SBER@MISX", "bars": [bar("2024-01-01T07:00:00Z"), bar("2024-01-01T08:00:00Z", "3")]})
+    bars = Bars.from_json(raw)
+    assert bars.symbol == "SBER@MISX"
+    assert bars.timestamp.tolist() == np.array(["2024-01-01T07:00", "2024-01-01T08:00"], "datetime64[s]").tolist()
+    assert bars.close.tolist() == [1.5, 3.0]
+
+
+def test_nested_keys_are_not_taken_for_bars() -> None:
+    raw = json.dumps(
+        {
+            "bars": [{**bar("2024-01-01T07:00:00Z"), "meta": {"timestamp": "2000-01-01T00:00:00Z"}}],
+            "symbol": "SBER@MISX",
+            "request": {"symbol": "OTHER"},
+        }
+    )
+    bars = Bars.from_json(raw)
+    assert bars.symbol == "SBER@MISX"
+    assert len(bars) == 1
+    assert str(bars.timestamp[0]) == "2024-01-01T07:00:00"
+
+
+def test_timezone_offset_is_converted_to_utc() -> None:
+    raw = json.dumps({"symbol": "SBER@MISX", "bars": [bar("2024-01-01T10:00:00+03:00"), bar("2024-01-01T07:00:00Z")]})
+    bars = Bars.from_json(raw)
+    assert bars.timestamp[0] == bars.timestamp[1]
+
+
+def test_prices_keep_fixed_point_notation() -> None:
+    rows = [bar("2024-01-01T07:00:00Z", "250.10"), bar("2024-01-01T08:00:00Z", "250.05")]
+    raw = json.dumps({"symbol": "SBER@MISX", "bars": rows})
+    bars = Bars.from_json(raw)
+    assert bars[0].close == Decimal("250.10")
+    assert bars[1].close == Decimal("250.05")
+    response = bars.to_response()
+    assert [b["close"]["value"] for b in response["bars"]] == ["250.10", "250.05"]
+    assert response["bars"][0]["volume"] == {"value": "10"}
+
+
+def test_models_decode_decimal_values() -> None:
+    quote = Quote.from_response({"symbol": "SBER@MISX", "quote": {"bid": {"value": "0.1"}, "ask": {"value": "0.3"}}})
+    assert quote.ask - quote.bid == Decimal("0.2")
+    assert quote.last is None
+
+    order = Order.from_dict(
+        {"order_id": "1", "status": "ORDER_STATUS_NEW", "order": {"symbol": "SBER", "limit_price": {"value": "250.5"}}}
+    )
+    assert (order.symbol, order.limit_price) == ("SBER", Decimal("250.5"))
+
+
+@pytest.fixture
+def client() -> Iterator[FinamAPIClient]:
+    with FinamSimulator() as simulator:
+        client = FinamAPIClient(access_token="secret", base_url=simulator.url)
+        client.session_manager = FinamSessionManager("secret", simulator.url)
+        yield client
+
+
+def test_client_returns_models(client: FinamAPIClient) -> None:
+    quote = client.fetch_quote("SBER@MISX")
+    assert quote.symbol == "SBER@MISX"
+    assert isinstance(quote.bid, Decimal) and quote.ask > quote.bid
+
+    levels = client.fetch_orderbook("SBER@MISX", depth=5)
+    assert levels and all(isinstance(level.price, Decimal) for level in levels)
+
+    positions = client.fetch_positions("ACC1")
+    assert positions and all(isinstance(p, Position) and p.symbol for p in positions)
+    assert [p.symbol for p in positions] == [p["symbol"] for p in client.get_account("ACC1")["positions"]]
+
+    trades = client.fetch_trades("ACC1")
+    assert trades and all(isinstance(t, Trade) and isinstance(t.price, Decimal) for t in trades)
+
+
+def test_client_orders(client: FinamAPIClient) -> None:
+    assert client.fetch_orders("ACC1") == []
+    body = {"symbol": "SBER@MISX", "quantity": {"value": "10"}, "side": "SIDE_BUY", "type": "ORDER_TYPE_MARKET"}
+    created = client.create_order("ACC1", body)
+    orders = client.fetch_orders("ACC1")
+    assert [o.order_id for o in orders] == [created["order_id"]]
+    assert orders[0].quantity == Decimal("10")
+
+
+def test_client_raises_on_http_error(client: FinamAPIClient) -> None:
+    with pytest.raises(requests.HTTPError):
+        client.fetch_quote("UNKNOWN@MISX")
@@ -0,0 +1,70 @@
+"""Обмен токена на JWT: обновление после 401 и пауза после неудачного обмена"""
+
+from collections.abc import Iterator
+from typing import Any
+
+import pytest
+import requests
+
+from src.app.adapters import FinamAPIClient, FinamSessionManager
+from src.app.adapters.finam_simulator import FinamSimulator
+
+
+@pytest.fixture
+def simulator() -> Iterator[FinamSimulator]:
+    with FinamSimulator() as simulator:
+        yield simulator
+
+
+def make_client(url: str) -> FinamAPIClient:
+    # Свой менеджер на тест: общий кэш get_session_manager переживает тесты
+    client = FinamAPIClient(access_token="secret", base_url=url)
+    client.session_manager = FinamSessionManager("secret", url)
+    return client
+
+
+def test_revoked_jwt_is_refreshed_on_401(simulator: FinamSimulator) -> None:
+    client = make_client(simulator.url)
+    assert "error" not in client.get_quote("SBER@MISX")
+    first = client.session_manager.get_token()  # type: ignore[union-attr]
+
+    # JWT отозван раньше срока: API отвечает 401, клиент получает новый и повторяет запрос
+    simulator._tokens[first] = 0.0
+    assert "error" not in client.get_quote("SBER@MISX")
+    assert client.session_manager.get_token() != first  # type: ignore[union-attr]
+    assert simulator.stats["unauthorized"] == 1
+
+
+def test_failed_exchange_is_cached_and_secret_not_sent(
+    simulator: FinamSimulator, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    client = make_client(simulator.url)
+    manager = client.session_manager
+    assert manager is not None
+    exchanges = []
+
+    def fail(*args: Any, **kwargs: Any) -> None:  # noqa: ANN401
+        exchanges.append(args)
+        raise requests.ConnectionError("auth is down")
+
+    sent: list[dict[str, str]] = []
+    request = client.session.request
+
+    def record(*args: Any, headers: dict[str, str], **kwargs: Any) -> requests.Response:  # noqa: ANN401
+        sent.append(headers)
+        return request(*args, headers=headers, **kwargs)
+
+    monkeypatch.setattr(manager._http, "post", fail)
+    monkeypatch.setattr(client.session, "request", record)
+    for _ in range(3):
+        response = client.get_quote("SBER@MISX")
+        assert response["type"] == "SessionError"
+    # Обмен выполнен один раз, остальные запросы получили ошибку из кэша без сети
+    assert len(exchanges) == 1
+    assert not sent
+
+    # После паузы обмен повторяется
+    manager._retry_at = 0.0
+    monkeypatch.undo()
+    assert "error" not in client.get_quote("SBER@MISX")
+    assert manager._failure is None
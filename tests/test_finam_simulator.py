@@ -0,0 +1,24 @@
+"""Ответы симулятора на некорректные параметры запроса"""
+
+import pytest
+
+from src.app.adapters.finam_simulator import GRPC_INVALID_ARGUMENT, FinamSimulator, SimulatorConfig
+
+
+@pytest.mark.parametrize(
+    "target",
+    [
+        "/v1/instruments/SBER@MISX/orderbook?depth=ten",
+        "/v1/accounts/ACC1/trades?limit=1.5",
+        "/v1/accounts/ACC1/transactions?limit=all",
+    ],
+)
+def test_non_integer_parameter_is_invalid_argument(target: str) -> None:
+    with FinamSimulator(SimulatorConfig(require_auth=False)) as simulator:
+        status, body = simulator.handle("GET", target)
+        assert status == 400
+        assert body["code"] == GRPC_INVALID_ARGUMENT
+        assert simulator.stats["errors"] == 1
+
+        status, _ = simulator.handle("GET", target.split("?")[0] + "?depth=5&limit=5")
+        assert status == 200
@@ -0,0 +1,179 @@
+"""Подписки на котировки и стаканы: локальный потоковый сервер, переподключение, устаревание и транспорт"""
+
+import threading
+import time
+from collections.abc import Callable, Iterator
+from typing import Any
+
+import pytest
+
+from src.app.adapters import FinamAPIClient, MarketDataStream, StreamTransport, finam_stream
+from src.app.adapters.finam_simulator import FinamSimulator, SimulatorConfig
+from src.app.adapters.finam_stream import StreamConnection
+from src.app.adapters.finam_stream_server import LocalStreamServer
+
+SYMBOL = "SBER@MISX"
+
+
+def wait_until(condition: Callable[[], Any], timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "условие не выполнилось вовремя"
+        time.sleep(0.01)
+
+
+def subscribed(url: str) -> FinamAPIClient:
+    client = FinamAPIClient(access_token="test", base_url=url, use_jwt=False)
+    client.subscribe([SYMBOL])
+    return client
+
+
+def is_live(client: FinamAPIClient) -> bool:
+    stream = client.market_data
+    assert stream is not None
+    return stream.is_live(SYMBOL, "quotes") and stream.is_live(SYMBOL, "orderbook")
+
+
+@pytest.fixture
+def server(monkeypatch: pytest.MonkeyPatch) -> Iterator[LocalStreamServer]:
+    monkeypatch.setattr(finam_stream, "RECONNECT_DELAY", 0.05)
+    with LocalStreamServer(interval=0.02, depth=5, seed=1) as server:
+        yield server
+
+
+@pytest.fixture
+def client(server: LocalStreamServer) -> Iterator[FinamAPIClient]:
+    client = subscribed(server.url)
+    yield client
+    assert client.market_data is not None
+    client.market_data.close()
+
+
+def test_subscribe_and_snapshot(client: FinamAPIClient) -> None:
+    wait_until(lambda: is_live(client))
+    stream = client.market_data
+    assert stream is not None and stream.symbols == {SYMBOL}
+
+    quote = stream.get_quote(SYMBOL)
+    assert quote is not None and quote["quote"]["symbol"] == SYMBOL
+    assert float(quote["quote"]["ask"]["value"]) > float(quote["quote"]["bid"]["value"])
+
+    book = stream.get_orderbook(SYMBOL, depth=3)
+    assert book is not None
+    rows = book["orderbook"]["rows"]
+    asks = [float(r["price"]["value"]) for r in rows if "sell_size" in r]
+    bids = [float(r["price"]["value"]) for r in rows if "buy_size" in r]
+    assert 0 < len(asks) <= 3 and 0 < len(bids) <= 3
+    assert min(asks) > max(bids)
+
+
+def test_client_answers_from_stream(client: FinamAPIClient) -> None:
+    wait_until(lambda: is_live(client))
+    # REST путей у потокового сервера нет (404): ответ без ошибки пришел из памяти
+    assert client.get_quote(SYMBOL)["symbol"] == SYMBOL
+    assert len(client.get_orderbook(SYMBOL, depth=2)["orderbook"]["rows"]) <= 4
+    assert "error" in client.get_quote("GAZP@MISX")
+
+
+def test_reconnect_after_disconnect(server: LocalStreamServer, client: FinamAPIClient) -> None:
+    wait_until(lambda: is_live(client))
+    assert server.connections == 2
+
+    server.disconnect()
+    wait_until(lambda: server.connections >= 4)
+    wait_until(lambda: is_live(client))
+
+
+def test_stale_data_falls_back_to_rest() -> None:
+    # Снимок стакана приходит один раз, следующее событие - через минуту
+    with LocalStreamServer(interval=60, depth=5, seed=1) as server:
+        client = subscribed(server.url)
+        stream = client.market_data
+        assert stream is not None
+        stream.max_age = 0.2
+        wait_until(lambda: stream.get_orderbook(SYMBOL) is not None)
+
+        time.sleep(0.3)
+        assert not stream.is_live(SYMBOL, "orderbook")
+        assert stream.lookup("GET", f"/v1/instruments/{SYMBOL}/orderbook") is None
+        assert "error" in client.get_orderbook(SYMBOL)
+        stream.close()
+
+
+def test_unsubscribe_forgets_state(client: FinamAPIClient) -> None:
+    wait_until(lambda: is_live(client))
+    stream = client.market_data
+    assert stream is not None
+    stream.unsubscribe(SYMBOL)
+    assert not stream.symbols
+    assert stream.get_quote(SYMBOL) is None
+    assert stream.lookup("GET", f"/v1/instruments/{SYMBOL}/quotes/latest") is None
+
+
+def test_simulator_serves_the_same_streams() -> None:
+    with FinamSimulator(SimulatorConfig(stream_interval=0.02)) as simulator:
+        client = subscribed(simulator.url)
+        wait_until(lambda: is_live(client))
+        assert client.get_quote(SYMBOL)["quote"]["symbol"] == SYMBOL
+        assert client.market_data is not None
+        client.market_data.close()
+
+
+class ListTransport(StreamTransport):
+    """Транспорт с заранее заданными событиями: поток остается открытым после них"""
+
+    def __init__(self, events: list[dict[str, Any]]) -> None:
+        self.events = events
+
+    def connect(self, symbol: str, kind: str) -> StreamConnection:
+        events = [e for e in self.events if ("quote" in e) == (kind == "quotes")]
+        return ListConnection(events)
+
+
+class ListConnection(StreamConnection):
+    def __init__(self, events: list[dict[str, Any]]) -> None:
+        self.events = events
+        self.closed = threading.Event()
+
+    def __iter__(self) -> Iterator[dict[str, Any]]:
+        yield from self.events
+        self.closed.wait()
+
+    def close(self) -> None:
+        self.closed.set()
+
+
+def test_state_is_transport_agnostic() -> None:
+    events = [
+        {"quote": [{"symbol": SYMBOL, "bid": {"value": "300.1"}, "ask": {"value": "300.2"}}]},
+        # Событие с частью полей дополняет котировку
+        {"quote": [{"symbol": SYMBOL, "last": {"value": "300.15"}}]},
+        {
+            "order_book": [{
+                "symbol": SYMBOL,
+                "is_data_snapshot": True,
+                "rows": [
+                    {"price": {"value": "300.2"}, "sell_size": {"value": "5"}},
+                    {"price": {"value": "300.1"}, "buy_size": {"value": "7"}},
+                ],
+            }]
+        },
+        {
+            "order_book": [{
+                "symbol": SYMBOL,
+                "rows": [{"price": {"value": "300.2"}, "sell_size": {"value": "0"}, "action": "ACTION_REMOVE"}],
+            }]
+        },
+    ]
+    client = FinamAPIClient(access_token="test", base_url="http://127.0.0.1:9", use_jwt=False)
+    stream = MarketDataStream(client, transport=ListTransport(events))
+    stream.subscribe_quotes(SYMBOL)
+    stream.subscribe_orderbook(SYMBOL)
+    wait_until(lambda: (q := stream.get_quote(SYMBOL)) is not None and "last" in q["quote"])
+
+    quote = stream.get_quote(SYMBOL)
+    assert quote is not None
+    assert quote["quote"]["bid"] == {"value": "300.1"} and quote["quote"]["last"] == {"value": "300.15"}
+
+    wait_until(lambda: (b := stream.get_orderbook(SYMBOL)) is not None and len(b["orderbook"]["rows"]) == 1)
+    stream.close()
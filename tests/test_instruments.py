@@ -0,0 +1,82 @@
+"""Поиск инструментов в вопросе: падежные формы, имена собственные против обычных слов, опечатки и тикеры"""
+
+import pytest
+
+from src.app.core.instruments import InstrumentResolver, format_instrument_hint
+
+
+@pytest.fixture(scope="module")
+def resolver() -> InstrumentResolver:
+    return InstrumentResolver()
+
+
+def symbols(resolver: InstrumentResolver, text: str) -> list[str]:
+    return [candidate.symbol for candidate in resolver.resolve(text)]
+
+
+@pytest.mark.parametrize(
+    ("text", "symbol"),
+    [
+        # Формы из описания модуля
+        ("Сбербанк", "SBER@MISX"),
+        ("Котировка Роснефти", "ROSN@MISX"),
+        ("Что по Газпрому?", "GAZP@MISX"),
+        # Все падежи: стеммер сводит не все формы к одной основе ("газпром" -> "газпр", "газпрома" -> "газпром")
+        *((f"стакан {form}", "GAZP@MISX") for form in ("газпром", "газпрома", "газпрому", "газпромом", "газпроме")),
+        *((f"цена {form}", "CHMF@MISX") for form in ("северсталь", "северстали", "северсталью")),
+        *((f"акции {form}", "GMKN@MISX") for form in ("норникель", "норникеля", "норникелю", "норникелем")),
+        *((f"бумаги {form}", "FIVE@MISX") for form in ("пятерочка", "пятерочки", "пятерочку", "пятерочкой")),
+        ("дай стакан по лукойлу", "LKOH@MISX"),
+        ("что с Яндексом", "YNDX@MISX"),
+        ("котировки Московской биржи", "MOEX@MISX"),
+        ("фьючерс на юань", "CRM5@RTSX"),
+    ],
+)
+def test_case_forms(resolver: InstrumentResolver, text: str, symbol: str) -> None:
+    assert symbols(resolver, text)[:1] == [symbol]
+
+
+@pytest.mark.parametrize(
+    "text",
+    ["Пик активности торгов приходится на открытие", "в пик спроса", "цены на пик", "Самолет летит"],
+)
+def test_ordinary_words_are_not_instruments(resolver: InstrumentResolver, text: str) -> None:
+    assert symbols(resolver, text) == []
+
+
+@pytest.mark.parametrize("text", ["Купи акции ПИК", "Сколько стоят акции Пик?", "«Пик» вырос?", "котировка PIKK"])
+def test_proper_name_is_found(resolver: InstrumentResolver, text: str) -> None:
+    assert symbols(resolver, text) == ["PIKK@MISX"]
+
+
+def test_asset_names_need_proper_name_unless_aliased() -> None:
+    resolver = InstrumentResolver()
+    assets = [
+        {"symbol": "SMLT@MISX", "ticker": "SMLT", "name": "Самолет"},
+        {"symbol": "SBER@MISX", "ticker": "SBER", "name": "Сбербанк"},
+    ]
+    assert resolver.add_assets(assets) == 2
+    assert symbols(resolver, "самолет летит") == []
+    assert symbols(resolver, "Самолет растет") == []
+    assert symbols(resolver, "акции Самолета") == ["SMLT@MISX"]
+    # Название есть и среди алиасов: строчное написание находит инструмент
+    assert symbols(resolver, "акции сбербанка") == ["SBER@MISX"]
+    assert resolver.resolve("сбербанк")[0].name == "Сбербанк"
+
+
+def test_longer_name_wins(resolver: InstrumentResolver) -> None:
+    assert symbols(resolver, "котировки газпром нефти") == ["SIBN@MISX"]
+    assert symbols(resolver, "привилегированные акции сбербанка")[:1] == ["SBERP@MISX"]
+
+
+def test_typos_and_tickers(resolver: InstrumentResolver) -> None:
+    candidate = resolver.resolve("стакан газпромм")[0]
+    assert candidate.symbol == "GAZP@MISX" and candidate.score < 1
+    assert symbols(resolver, "аэрофлод") == ["AFLT@MISX"]
+    assert symbols(resolver, "SBER и LKOH@MISX") == ["LKOH@MISX", "SBER@MISX"]
+    assert symbols(resolver, "x5 и VK") == ["FIVE@MISX", "VKCO@MISX"]
+
+
+def test_hint(resolver: InstrumentResolver) -> None:
+    assert format_instrument_hint(resolver.resolve("Роснефти")) == "Инструменты: роснефти → ROSN@MISX (роснефть)"
+    assert format_instrument_hint([]) == ""
@@ -0,0 +1,115 @@
+"""Стакан на массивах: снимок и обновления уровней, односторонний стакан, глубина, дисбаланс и VWAP"""
+
+import math
+from typing import Any
+
+import numpy as np
+import pytest
+
+from src.app.models import OrderBook
+from src.app.models.order_book import BUY, SELL
+
+
+def row(price: str, size: str, side: str = BUY, action: str = "ACTION_ADD") -> dict[str, Any]:
+    return {"price": {"value": price}, "buy_size" if side == BUY else "sell_size": {"value": size}, "action": action}
+
+
+@pytest.fixture
+def book() -> OrderBook:
+    rows = [
+        row("100.0", "10"), row("99.5", "20"), row("99.0", "30"),
+        row("100.5", "5", SELL), row("101.0", "15", SELL), row("102.0", "40", SELL),
+    ]  # fmt: skip
+    return OrderBook.from_response({"symbol": "SBER@MISX", "orderbook": {"rows": rows}})
+
+
+def test_snapshot_is_sorted_from_best_price(book: OrderBook) -> None:
+    assert book.symbol == "SBER@MISX"
+    assert book.bid_prices.tolist() == [100.0, 99.5, 99.0]
+    assert book.ask_prices.tolist() == [100.5, 101.0, 102.0]
+    assert book.levels(2) == {"bids": [(100.0, 10.0), (99.5, 20.0)], "asks": [(100.5, 5.0), (101.0, 15.0)]}
+
+
+def test_snapshot_dedupes_price_levels() -> None:
+    rows = [row("100", "10"), row("99", "5"), row("100", "7"), row("98", "0"), row("101", "3", SELL)]
+    book = OrderBook("X")
+    book.apply(rows, snapshot=True)
+    # Последняя строка уровня побеждает, как при update; пустые уровни отброшены
+    assert book.levels() == {"bids": [(100.0, 7.0), (99.0, 5.0)], "asks": [(101.0, 3.0)]}
+
+    book.apply([row("102", "1", SELL)], snapshot=True)
+    assert len(book) == 1 and math.isnan(book.best_bid)
+
+
+def test_apply_updates_inserts_and_deletes(book: OrderBook) -> None:
+    book.apply([
+        row("100.0", "25", action="ACTION_UPDATE"),
+        row("99.75", "8"),
+        row("99.5", "20", action="ACTION_REMOVE"),
+        row("101.0", "0", SELL, action="ACTION_UPDATE"),
+        row("103.0", "1", SELL, action="ACTION_REMOVE"),
+    ])  # fmt: skip
+    assert book.levels() == {
+        "bids": [(100.0, 25.0), (99.75, 8.0), (99.0, 30.0)],
+        "asks": [(100.5, 5.0), (102.0, 40.0)],
+    }
+
+
+def test_update_sets_and_removes_levels(book: OrderBook) -> None:
+    book.update(SELL, 100.25, 3)
+    assert book.best_ask == 100.25
+    book.update(SELL, 100.25, 0)
+    book.update(BUY, 100.0, -1)
+    book.update(BUY, 42.0, 0)
+    assert book.best_ask == 100.5 and book.best_bid == 99.5
+    assert len(book) == 5
+
+
+def test_spread_and_mid(book: OrderBook) -> None:
+    assert book.spread() == pytest.approx(0.5)
+    assert book.mid() == pytest.approx(100.25)
+
+
+@pytest.mark.parametrize("side", [BUY, SELL])
+def test_one_sided_book_has_no_spread_or_mid(side: str) -> None:
+    book = OrderBook("X")
+    book.apply([row("100", "10", side)], snapshot=True)
+    assert math.isnan(book.spread()) and math.isnan(book.mid())
+    assert book.imbalance() == (1.0 if side == BUY else -1.0)
+    summary = book.summary()
+    assert summary["spread"] is None and summary["mid"] is None
+
+    empty = OrderBook("X")
+    assert math.isnan(empty.spread()) and empty.imbalance() == 0.0
+    assert empty.cumulative_depth(BUY).tolist() == []
+
+
+def test_cumulative_depth(book: OrderBook) -> None:
+    assert book.cumulative_depth(BUY).tolist() == [10.0, 30.0, 60.0]
+    assert book.cumulative_depth(SELL, 2).tolist() == [5.0, 20.0]
+
+
+def test_imbalance(book: OrderBook) -> None:
+    assert book.imbalance(1) == pytest.approx((10 - 5) / 15)
+    assert book.imbalance() == pytest.approx((60 - 60) / 120)
+
+
+def test_vwap_walks_the_opposite_side(book: OrderBook) -> None:
+    # Покупка забирает ask: 5 по 100.5 и 5 по 101.0
+    assert book.vwap(BUY, 10) == pytest.approx((5 * 100.5 + 5 * 101.0) / 10)
+    # Продажа забирает bid: 10 по 100.0 и 5 по 99.5
+    assert book.vwap(SELL, 15) == pytest.approx((10 * 100.0 + 5 * 99.5) / 15)
+    assert book.vwap(BUY, 5) == 100.5
+    assert book.vwap(BUY, 60) == pytest.approx((5 * 100.5 + 15 * 101.0 + 40 * 102.0) / 60)
+    assert math.isnan(book.vwap(BUY, 61))
+    assert math.isnan(book.vwap(SELL, 0))
+
+
+def test_summary_vwaps_match_vwap(book: OrderBook) -> None:
+    lots = (1, 10, 60, 100)
+    summary = book.summary(levels=2, lots=lots)
+    for side, key in ((BUY, "vwap_buy"), (SELL, "vwap_sell")):
+        expected = [book.vwap(side, n) for n in lots]
+        got = [summary[key][str(n)] for n in lots]
+        np.testing.assert_allclose([np.nan if g is None else g for g in got], expected)
+    assert (summary["bid_depth_2"], summary["ask_depth_2"]) == (30.0, 20.0)
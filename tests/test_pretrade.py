@@ -0,0 +1,70 @@
+"""Проверка заявок: количество в штуках, кратное лоту, и стоимость"""
+
+from datetime import UTC, datetime
+from typing import Any
+
+from src.app.core.pretrade import PreTradeValidator
+from src.app.models import FinamRequest
+
+ORDERS = "/v1/accounts/ACC1/orders"
+
+
+class FakeClient:
+    """Справочные данные Finam API по пути запроса"""
+
+    def __init__(self, cash: str = "100000", held: str = "0", lot_size: str = "10") -> None:
+        self.responses = {
+            "/v1/assets/SBER@MISX": {"lot_size": {"value": lot_size}, "decimals": 2, "min_step": 1},
+            "/v1/assets/SBER@MISX/params?account_id=ACC1": {
+                "tradeable": True,
+                "longable": {"value": "AVAILABLE"},
+                "shortable": {"value": "NOT_AVAILABLE"},
+            },
+            "/v1/assets/SBER@MISX/schedule": {"sessions": []},
+            "/v1/accounts/ACC1": {
+                "portfolio_mc": {"available_cash": {"value": cash}},
+                "positions": [{"symbol": "SBER@MISX", "quantity": {"value": held}}],
+            },
+        }
+        self.requests: list[str] = []
+
+    def execute_finam_request(self, request: FinamRequest) -> dict[str, Any]:
+        self.requests.append(request.url)
+        return self.responses.get(request.url, {"error": "not found", "status_code": 404})
+
+
+def check(client: FakeClient, quantity: str, side: str = "SIDE_BUY", price: str = "300") -> Any:  # noqa: ANN401
+    validator = PreTradeValidator(client, clock=lambda: datetime(2025, 1, 1, tzinfo=UTC))  # type: ignore[arg-type]
+    body = {"symbol": "SBER@MISX", "quantity": quantity, "side": side, "type": "ORDER_TYPE_LIMIT"}
+    return validator.check(FinamRequest(method="POST", url=ORDERS, body={**body, "limit_price": price}))
+
+
+def test_quantity_multiple_of_lot_is_kept() -> None:
+    result = check(FakeClient(), "30")
+    assert result.ok and not result.corrections
+    assert result.body["quantity"] == {"value": "30"}
+
+
+def test_quantity_rounded_down_to_lot() -> None:
+    result = check(FakeClient(), "35")
+    assert result.ok
+    assert result.body["quantity"] == {"value": "30"}
+    assert result.corrections
+
+
+def test_quantity_below_one_lot_rejected() -> None:
+    assert not check(FakeClient(), "5").ok
+
+
+def test_cost_is_quantity_times_price() -> None:
+    # 30 шт. по 300 = 9000: без лишнего умножения на лот укладывается в 10000
+    assert check(FakeClient(cash="10000"), "30").ok
+    result = check(FakeClient(cash="8000"), "30")
+    assert not result.ok
+    assert "9000" in result.errors[0]
+    assert "20 шт." in result.errors[0]
+
+
+def test_sale_within_position_is_not_short() -> None:
+    assert check(FakeClient(held="30"), "30", side="SIDE_SELL").ok
+    assert not check(FakeClient(held="30"), "40", side="SIDE_SELL").ok
@@ -0,0 +1,106 @@
+"""Индексы векторов: точный поиск, полнота IVFPQIndex относительно точного, обучение PQ и сохранение"""
+
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pytest
+
+from src.app.interfaces import vector_index
+from src.app.interfaces.vector_index import PQ_CENTROIDS, TRAIN_PER_CENTROID, ExactIndex, IVFPQIndex, VectorIndex
+
+DIM = 32
+K = 10
+
+
+def normalized(x: np.ndarray) -> np.ndarray:
+    return (x / np.linalg.norm(x, axis=1, keepdims=True)).astype(np.float32)
+
+
+@pytest.fixture(scope="module")
+def data() -> tuple[np.ndarray, np.ndarray]:
+    """Векторы вокруг 50 центров (как эмбеддинги тем) и запросы из той же смеси"""
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(50, DIM))
+    vectors = normalized(centers[rng.integers(50, size=6000)] + 0.4 * rng.normal(size=(6000, DIM)))
+    return vectors[:5000], vectors[5000:5100]
+
+
+@pytest.fixture(scope="module")
+def ivfpq(data: tuple[np.ndarray, np.ndarray]) -> IVFPQIndex:
+    index = IVFPQIndex(DIM, nlist=16, nprobe=8)
+    index.add(data[0])
+    return index
+
+
+def recall(found: np.ndarray, expected: np.ndarray) -> float:
+    return np.mean([len(set(f) & set(e)) / len(e) for f, e in zip(found, expected, strict=True)])
+
+
+def test_exact_index_matches_brute_force(data: tuple[np.ndarray, np.ndarray]) -> None:
+    vectors, queries = data
+    index = ExactIndex(DIM)
+    index.add(vectors[:3000])
+    index.add(vectors[3000:])
+    scores, ids = index.search(queries, K)
+    expected = np.argsort(-(queries @ vectors.T), axis=1, kind="stable")[:, :K]
+    assert recall(ids, expected) == 1.0
+    assert np.all(np.diff(scores, axis=1) <= 0)
+
+    index.remove(ids[:, 0])
+    assert len(index) == len(vectors) - len(set(ids[:, 0]))
+    assert not np.isin(ids[:, 0], index.search(queries, K)[1]).any()
+
+
+def test_missing_results_are_padded() -> None:
+    index = ExactIndex(DIM)
+    index.add(normalized(np.ones((3, DIM))))
+    scores, ids = index.search(np.ones(DIM), K)
+    assert ids[0, 3:].tolist() == [-1] * (K - 3)
+    assert np.isneginf(scores[0, 3:]).all()
+
+
+def test_ivfpq_recall_against_exact(data: tuple[np.ndarray, np.ndarray], ivfpq: IVFPQIndex) -> None:
+    vectors, queries = data
+    exact = ExactIndex(DIM)
+    exact.add(vectors)
+    expected = exact.search(queries, K)[1]
+
+    assert recall(ivfpq.search(queries, K)[1], expected) >= 0.95
+    # Без переоценки порядок по грубым PQ-оценкам, но точные соседи - среди refine * k лучших кандидатов
+    assert recall(ivfpq.search(queries, K * ivfpq.refine, refine=0)[1], expected) >= 0.95
+
+
+def test_pq_sample_does_not_shrink_with_nlist(
+    data: tuple[np.ndarray, np.ndarray], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    sizes: list[tuple[int, int]] = []
+    kmeans = vector_index.kmeans
+
+    def recording(x: np.ndarray, k: int, **kwargs: Any) -> np.ndarray:  # noqa: ANN401
+        sizes.append((k, len(x)))
+        return kmeans(x, k, **kwargs)
+
+    monkeypatch.setattr(vector_index, "kmeans", recording)
+    vectors = data[0]
+    IVFPQIndex(DIM, nlist=16).train(vectors)
+    # Центры списков - на nlist * TRAIN_PER_CENTROID векторах, кодовые книги - на всех доступных
+    assert sizes[0] == (16, 16 * TRAIN_PER_CENTROID)
+    assert sizes[1:] == [(PQ_CENTROIDS, min(len(vectors), PQ_CENTROIDS * TRAIN_PER_CENTROID))] * (DIM // 8)
+
+
+@pytest.mark.parametrize("keep_vectors", [True, False])
+def test_save_load_round_trip(data: tuple[np.ndarray, np.ndarray], tmp_path: Path, keep_vectors: bool) -> None:
+    vectors, queries = data
+    for index in (ExactIndex(DIM), IVFPQIndex(DIM, nlist=16, keep_vectors=keep_vectors)):
+        index.add(vectors[:2000])
+        index.remove(np.arange(10))
+        path = tmp_path / f"{index.kind}.npz"
+        index.save(path)
+
+        loaded = VectorIndex.load(path)
+        assert type(loaded) is type(index) and len(loaded) == len(index)
+        for got, expected in zip(loaded.search(queries, K), index.search(queries, K), strict=True):
+            np.testing.assert_array_equal(got, expected)
+        # Новые ID продолжают нумерацию, а не начинаются заново
+        assert loaded.add(vectors[2000:2001]).tolist() == [2000]